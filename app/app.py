@@ -1,32 +1,99 @@
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for
+from flask import Flask, request, jsonify, render_template, session, redirect, url_for, g, Response
 from flask_cors import CORS
-import traceback
 import hashlib
 import json
+import logging
+import sys
+import time
 from datetime import datetime
+from pathlib import Path
+
+# Ejecutado como script (python app/app.py) la raíz del proyecto, con el paquete shared, no está en el path
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from shared import logging_setup
+logging_setup.configure_logging()
+
+import metrics
+import recommendation_cursor
+from shared import car_tags
+from shared.slow_query_log import get_slow_query_log
+from user_store import get_user_store
+
+logger = logging.getLogger(__name__)
 
 # Importar el sistema de recomendaciones
+# recommender.py primero: caché, prefetch, ciclo de vida de la conexión, circuit breaker,
+# tabla top-N y paginación en el motor solo existen ahí; recommender_minimal es el respaldo
 try:
-    from recommender_minimal import get_recommendations
+    from recommender import get_recommendations, get_recommendation_page, prefetch_recommendations, start_recommender
     RECOMMENDER_AVAILABLE = True
-    print("✅ Usando recommender_minimal.py")
+    logger.info("Usando recommender.py")
+    # Conectar y calentar el pool en segundo plano antes de la primera petición
+    start_recommender()
 except ImportError as e:
+    logger.warning("recommender.py no disponible, usando recommender_minimal.py: %s", e)
+    prefetch_recommendations = None  # recommender_minimal no hace prefetch de candidatos
+    get_recommendation_page = None  # ni pagina en el motor: se pagina la lista completa
     try:
-        from recommender import get_recommendations
+        from recommender_minimal import get_recommendations
         RECOMMENDER_AVAILABLE = True
-        print("✅ Usando recommender.py")
+        logger.info("Usando recommender_minimal.py")
     except ImportError as e2:
-        print(f"❌ Warning: No se pudo importar sistema de recomendaciones: {e2}")
+        logger.warning("No se pudo importar sistema de recomendaciones: %s", e2)
         RECOMMENDER_AVAILABLE = False
 
+# Recomendaciones con el driver asíncrono (la vista async requiere flask[async])
+try:
+    from async_recommender import get_recommendations_async
+    ASYNC_RECOMMENDER_AVAILABLE = True
+except ImportError as e:
+    logger.warning("Recomendador asíncrono no disponible: %s", e)
+    ASYNC_RECOMMENDER_AVAILABLE = False
+
 app = Flask(__name__)
 CORS(app)
 app.secret_key = 'tu_clave_secreta_aqui_cambiala_por_una_segura'
 
-# Simulación de base de datos de usuarios (en producción usar Neo4j)
-USERS_DB = {}
-USER_PROFILES = {}
-USER_FAVORITES = {}
+# Usuarios, perfiles y favoritos persistentes (SQLite compartido entre procesos, ver user_store.py)
+user_store = get_user_store()
+
+# ===== MÉTRICAS =====
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.metrics_token = metrics.begin_request()
+
+@app.after_request
+def finish_request_metrics(response):
+    token = g.pop('metrics_token', None)
+    if token is None:
+        return response
+    stages = metrics.end_request(token)
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'sin_ruta'
+    metrics.observe_request(request.method, endpoint, response.status_code, time.perf_counter() - g.request_start)
+    if stages:
+        response.headers['Server-Timing'] = metrics.server_timing_header(stages)
+    return response
+
+def collect_app_metrics():
+    slow_queries = get_slow_query_log()
+    return [
+        ("log_events_dropped_total", "counter", "Eventos de log descartados por cola llena",
+         logging_setup.get_dropped_count()),
+        ("slow_queries_total", "counter", "Consultas que superaron SLOW_QUERY_MS", slow_queries.slow_queries),
+        ("slow_query_profiles_total", "counter", "Planes PROFILE guardados de consultas lentas",
+         slow_queries.profiles_written)
+    ]
+
+metrics.REGISTRY.register_collector(collect_app_metrics)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Métricas en formato de texto de Prometheus"""
+    return app.response_class(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
 
 @app.route("/")
 def index():
@@ -46,23 +113,19 @@ def register():
         if len(password) < 6:
             return jsonify({"success": False, "message": "La contraseña debe tener al menos 6 caracteres"})
         
-        if email in USERS_DB:
+        if user_store.get_user(email) is not None:
             return jsonify({"success": False, "message": "El usuario ya existe"})
         
-        # Crear usuario
+        # Crear usuario con perfil y favoritos vacíos
         password_hash = hashlib.sha256(password.encode()).hexdigest()
-        USERS_DB[email] = {
+        user_store.create_user(email, {
             "password": password_hash,
             "created_at": datetime.now().isoformat()
-        }
-        
-        # Inicializar perfil y favoritos
-        USER_PROFILES[email] = {}
-        USER_FAVORITES[email] = []
+        })
         
         session['logged_in'] = True
         session['user_email'] = email
-        print(f"✅ Usuario registrado: {email}")
+        logger.info("Usuario registrado", extra={"user": email})
         
         return jsonify({"success": True, "redirect": url_for("profile_setup")})
     
@@ -78,15 +141,16 @@ def login():
         # Para demo, aceptar cualquier usuario/contraseña
         if email and password:
             # Verificar si existe en BD
-            if email in USERS_DB:
+            user = user_store.get_user(email)
+            if user is not None:
                 password_hash = hashlib.sha256(password.encode()).hexdigest()
-                if USERS_DB[email]["password"] == password_hash:
+                if user["password"] == password_hash:
                     session['logged_in'] = True
                     session['user_email'] = email
-                    print(f"✅ Usuario logueado: {email}")
+                    logger.info("Usuario logueado", extra={"user": email})
                     
                     # Verificar si tiene perfil configurado
-                    if email in USER_PROFILES and USER_PROFILES[email].get('displayName'):
+                    if user_store.get_profile(email).get('displayName'):
                         return jsonify({"success": True, "redirect": url_for("brands")})
                     else:
                         return jsonify({"success": True, "redirect": url_for("profile_setup")})
@@ -96,16 +160,14 @@ def login():
                 # Para demo, crear usuario automáticamente
                 if len(password) >= 6:
                     password_hash = hashlib.sha256(password.encode()).hexdigest()
-                    USERS_DB[email] = {
+                    user_store.create_user(email, {
                         "password": password_hash,
                         "created_at": datetime.now().isoformat()
-                    }
-                    USER_PROFILES[email] = {}
-                    USER_FAVORITES[email] = []
+                    })
                     
                     session['logged_in'] = True
                     session['user_email'] = email
-                    print(f"✅ Usuario creado y logueado: {email}")
+                    logger.info("Usuario creado y logueado", extra={"user": email})
                     return jsonify({"success": True, "redirect": url_for("profile_setup")})
                 else:
                     return jsonify({"success": False, "message": "La contraseña debe tener al menos 6 caracteres"})
@@ -184,13 +246,13 @@ def save_profile():
             'updated_at': datetime.now().isoformat()
         }
         
-        USER_PROFILES[user_email] = profile_data
+        user_store.save_profile(user_email, profile_data)
         session['user_profile'] = profile_data
         
-        print(f"👤 Perfil guardado para {user_email}: {profile_data}")
+        logger.info("Perfil guardado", extra={"user": user_email})
         return jsonify({"success": True})
     except Exception as e:
-        print(f"❌ Error guardando perfil: {e}")
+        logger.exception("Error guardando perfil")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route("/api/user-info", methods=["GET"])
@@ -199,7 +261,7 @@ def user_info():
         return jsonify({"error": "No autenticado"}), 401
     
     user_email = session.get('user_email')
-    profile = USER_PROFILES.get(user_email, {})
+    profile = user_store.get_profile(user_email)
     
     return jsonify({
         "email": user_email,
@@ -215,8 +277,8 @@ def user_profile():
         return jsonify({"error": "No autenticado"}), 401
     
     user_email = session.get('user_email')
-    profile = USER_PROFILES.get(user_email, {})
-    user_data = USERS_DB.get(user_email, {})
+    profile = user_store.get_profile(user_email)
+    user_data = user_store.get_user(user_email) or {}
     
     return jsonify({
         "email": user_email,
@@ -232,9 +294,9 @@ def user_favorites():
         return jsonify({"error": "No autenticado"}), 401
     
     user_email = session.get('user_email')
-    favorites = USER_FAVORITES.get(user_email, [])
+    favorites = user_store.get_favorites(user_email)
     
-    return jsonify({"favorites": favorites})
+    return jsonify({"favorites": favorites, "count": len(favorites)})
 
 @app.route("/api/add-favorite", methods=["POST"])
 def add_favorite():
@@ -246,20 +308,33 @@ def add_favorite():
         user_email = session.get('user_email')
         car_data = data.get('car')
         
-        if user_email not in USER_FAVORITES:
-            USER_FAVORITES[user_email] = []
-        
-        # Verificar si ya está en favoritos
-        existing = next((f for f in USER_FAVORITES[user_email] if f.get('id') == car_data.get('id')), None)
-        if existing:
+        # El índice de favoritos ignora autos que ya están
+        if not user_store.add_favorites(user_email, [car_data]):
             return jsonify({"success": False, "message": "Ya está en favoritos"})
         
-        USER_FAVORITES[user_email].append(car_data)
-        print(f"❤️ Favorito agregado para {user_email}: {car_data.get('name')}")
+        logger.info("Favorito agregado", extra={"user": user_email, "car_id": car_data.get('id')})
         
         return jsonify({"success": True})
     except Exception as e:
-        print(f"❌ Error agregando favorito: {e}")
+        logger.exception("Error agregando favorito")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route("/api/add-favorites", methods=["POST"])
+def add_favorites():
+    if not session.get('logged_in'):
+        return jsonify({"success": False, "error": "No autenticado"}), 401
+    
+    try:
+        data = request.get_json()
+        user_email = session.get('user_email')
+        cars = data.get('cars') or []
+        
+        added = user_store.add_favorites(user_email, cars)
+        logger.info("Favoritos agregados", extra={"user": user_email, "added": len(added)})
+        
+        return jsonify({"success": True, "added": added, "count": user_store.favorite_count(user_email)})
+    except Exception as e:
+        logger.exception("Error agregando favoritos")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route("/api/remove-favorite", methods=["POST"])
@@ -272,15 +347,82 @@ def remove_favorite():
         user_email = session.get('user_email')
         car_id = data.get('carId')
         
-        if user_email in USER_FAVORITES:
-            USER_FAVORITES[user_email] = [f for f in USER_FAVORITES[user_email] if f.get('id') != car_id]
-            print(f"💔 Favorito eliminado para {user_email}: {car_id}")
+        if user_store.remove_favorites(user_email, [car_id]):
+            logger.info("Favorito eliminado", extra={"user": user_email, "car_id": car_id})
         
         return jsonify({"success": True})
     except Exception as e:
-        print(f"❌ Error eliminando favorito: {e}")
+        logger.exception("Error eliminando favorito")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route("/api/remove-favorites", methods=["POST"])
+def remove_favorites():
+    if not session.get('logged_in'):
+        return jsonify({"success": False, "error": "No autenticado"}), 401
+    
+    try:
+        data = request.get_json()
+        user_email = session.get('user_email')
+        car_ids = data.get('carIds') or []
+        
+        removed = user_store.remove_favorites(user_email, car_ids)
+        logger.info("Favoritos eliminados", extra={"user": user_email, "removed": removed})
+        
+        return jsonify({"success": True, "removed": removed, "count": user_store.favorite_count(user_email)})
+    except Exception as e:
+        logger.exception("Error eliminando favoritos")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route("/api/clear-favorites", methods=["POST"])
+def clear_favorites():
+    if not session.get('logged_in'):
+        return jsonify({"success": False, "error": "No autenticado"}), 401
+    
+    try:
+        user_email = session.get('user_email')
+        removed = user_store.clear_favorites(user_email)
+        logger.info("Favoritos limpiados", extra={"user": user_email, "removed": removed})
+        
+        return jsonify({"success": True, "removed": removed})
+    except Exception as e:
+        logger.exception("Error limpiando favoritos")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route("/api/favorites-count", methods=["GET"])
+def favorites_count():
+    if not session.get('logged_in'):
+        return jsonify({"error": "No autenticado"}), 401
+    
+    user_email = session.get('user_email')
+    return jsonify({"count": user_store.favorite_count(user_email)})
+
+@app.route("/api/is-favorite", methods=["GET"])
+def is_favorite():
+    if not session.get('logged_in'):
+        return jsonify({"error": "No autenticado"}), 401
+    
+    user_email = session.get('user_email')
+    car_id = request.args.get('carId')
+    return jsonify({"carId": car_id, "favorite": user_store.has_favorite(user_email, car_id)})
+
+@app.route("/api/export-favorites", methods=["GET"])
+def export_favorites():
+    if not session.get('logged_in'):
+        return jsonify({"error": "No autenticado"}), 401
+    
+    user_email = session.get('user_email')
+    favorites = user_store.get_favorites(user_email)
+    payload = {
+        "email": user_email,
+        "exportedAt": datetime.now().isoformat(),
+        "count": len(favorites),
+        "favorites": favorites
+    }
+    
+    response = app.response_class(json.dumps(payload, ensure_ascii=False, indent=2), mimetype="application/json")
+    response.headers["Content-Disposition"] = "attachment; filename=mis-favoritos.json"
+    return response
+
 @app.route("/api/save-theme", methods=["POST"])
 def save_theme():
     if not session.get('logged_in'):
@@ -291,11 +433,8 @@ def save_theme():
         theme = data.get('theme')
         user_email = session.get('user_email')
         
-        if user_email not in USER_PROFILES:
-            USER_PROFILES[user_email] = {}
-        
-        USER_PROFILES[user_email]['theme'] = theme
-        print(f"🎨 Tema guardado para {user_email}: {theme}")
+        user_store.update_profile(user_email, theme=theme)
+        logger.debug("Tema guardado", extra={"user": user_email, "theme": theme})
         
         return jsonify({"success": True})
     except Exception as e:
@@ -307,7 +446,7 @@ def user_theme():
         return jsonify({"theme": "light"})
     
     user_email = session.get('user_email')
-    profile = USER_PROFILES.get(user_email, {})
+    profile = user_store.get_profile(user_email)
     
     return jsonify({"theme": profile.get('theme', 'light')})
 
@@ -318,11 +457,11 @@ def save_brands():
     try:
         data = request.get_json()
         brands_data = data.get('brands')
-        print(f"🏷️ Guardando brands: {brands_data}")
+        logger.debug("Paso del asistente guardado", extra={"step": "brands", "value": brands_data})
         session['selected_brands'] = brands_data
         return jsonify({"success": True})
     except Exception as e:
-        print(f"❌ Error guardando brands: {e}")
+        logger.exception("Error guardando brands")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route("/api/save-budget", methods=["POST"])
@@ -330,11 +469,11 @@ def save_budget():
     try:
         data = request.get_json()
         budget_data = data.get('budget')
-        print(f"💰 Guardando budget: {budget_data}")
+        logger.debug("Paso del asistente guardado", extra={"step": "budget", "value": budget_data})
         session['selected_budget'] = budget_data
         return jsonify({"success": True})
     except Exception as e:
-        print(f"❌ Error guardando budget: {e}")
+        logger.exception("Error guardando budget")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route("/api/save-fuel", methods=["POST"])
@@ -342,11 +481,11 @@ def save_fuel():
     try:
         data = request.get_json()
         fuel_data = data.get('fuel')
-        print(f"⛽ Guardando fuel: {fuel_data}")
+        logger.debug("Paso del asistente guardado", extra={"step": "fuel", "value": fuel_data})
         session['selected_fuel'] = fuel_data
         return jsonify({"success": True})
     except Exception as e:
-        print(f"❌ Error guardando fuel: {e}")
+        logger.exception("Error guardando fuel")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route("/api/save-types", methods=["POST"])
@@ -354,11 +493,17 @@ def save_types():
     try:
         data = request.get_json()
         types_data = data.get('types')
-        print(f"🚗 Guardando types: {types_data}")
+        logger.debug("Paso del asistente guardado", extra={"step": "types", "value": types_data})
         session['selected_types'] = types_data
+        
+        # Con marcas, presupuesto, combustible y tipos ya se pueden buscar candidatos
+        # mientras el usuario elige la transmisión
+        if prefetch_recommendations is not None:
+            prefetch_recommendations(session.get('selected_brands'), session.get('selected_budget'),
+                                     session.get('selected_fuel'), types_data)
         return jsonify({"success": True})
     except Exception as e:
-        print(f"❌ Error guardando types: {e}")
+        logger.exception("Error guardando types")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route("/api/save-transmission", methods=["POST"])
@@ -366,86 +511,262 @@ def save_transmission():
     try:
         data = request.get_json()
         transmission_data = data.get('transmission')
-        print(f"⚙️ Guardando transmission: {transmission_data}")
+        logger.debug("Paso del asistente guardado", extra={"step": "transmission", "value": transmission_data})
         session['selected_transmission'] = transmission_data
         return jsonify({"success": True})
     except Exception as e:
-        print(f"❌ Error guardando transmission: {e}")
+        logger.exception("Error guardando transmission")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# ===== SELECCIONES DEL ASISTENTE =====
+
+# Paso del asistente -> clave en la sesión
+SELECTION_KEYS = {
+    "brands": "selected_brands",
+    "budget": "selected_budget",
+    "fuel": "selected_fuel",
+    "types": "selected_types",
+    "transmission": "selected_transmission"
+}
+
+# Tipos JSON aceptados en cada paso (lo que envían los scripts de static/js)
+SELECTION_TYPES = {
+    "brands": (dict, list),
+    "budget": (str,),
+    "fuel": (str, list),
+    "types": (list, str),
+    "transmission": (str, list)
+}
+
+def get_session_selections():
+    """Selecciones del asistente guardadas en la sesión"""
+    return {name: session.get(key) for name, key in SELECTION_KEYS.items()}
+
+def save_session_selections(selections):
+    """Guardar todas las selecciones en la sesión (una sola reescritura de la cookie)"""
+    session.update({SELECTION_KEYS[name]: value for name, value in selections.items()})
+
+def get_missing_selections(selections):
+    """Pasos del asistente sin completar"""
+    return [name for name in SELECTION_KEYS if not selections.get(name)]
+
+def get_invalid_selections(selections):
+    """Pasos cuyo valor no tiene el tipo esperado"""
+    return [name for name, types in SELECTION_TYPES.items()
+            if selections.get(name) and not isinstance(selections[name], types)]
+
+def compute_recommendations(selections, user_email):
+    """Recomendaciones para las selecciones dadas, personalizadas con el perfil del usuario"""
+    user_profile = user_store.get_profile(user_email)
+    gender = user_profile.get('gender')
+    age_range = user_profile.get('ageRange')
+    
+    if RECOMMENDER_AVAILABLE:
+        recommendations = get_recommendations(
+            selections["brands"], selections["budget"], selections["fuel"],
+            selections["types"], selections["transmission"], gender, age_range
+        )
+        if not isinstance(recommendations, list):
+            recommendations = get_sample_recommendations()
+    else:
+        recommendations = get_sample_recommendations()
+    
+    # Aplicar personalización demográfica adicional si no se hizo en recommender
+    if gender and age_range and not any('demographic_bonus' in car for car in recommendations):
+        recommendations = apply_demographic_scoring(recommendations, gender, age_range)
+    
+    return recommendations
+
+@app.route("/api/submit-preferences", methods=["POST"])
+def submit_preferences():
+    """Asistente completo en una sola petición: valida, guarda en la sesión y devuelve recomendaciones"""
+    if not session.get('logged_in'):
+        return jsonify({"success": False, "error": "No autenticado"}), 401
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        selections = {name: data.get(name) for name in SELECTION_KEYS}
+        
+        missing_data = get_missing_selections(selections)
+        invalid_data = get_invalid_selections(selections)
+        if missing_data or invalid_data:
+            errors = []
+            if missing_data:
+                errors.append(f"Faltan datos de selección: {', '.join(missing_data)}")
+            if invalid_data:
+                errors.append(f"Datos de selección inválidos: {', '.join(invalid_data)}")
+            return jsonify({
+                "success": False,
+                "error": "; ".join(errors),
+                "missing": missing_data,
+                "invalid": invalid_data
+            }), 400
+        
+        save_session_selections(selections)
+        recommendations = compute_recommendations(selections, session.get('user_email'))
+        logger.info("Preferencias recibidas en una petición", extra={"count": len(recommendations)})
+        
+        return jsonify({"success": True, "recommendations": recommendations})
+        
+    except Exception as e:
+        logger.exception("Error en submit_preferences")
+        
+        return jsonify({
+            "success": False,
+            "error": f"Error interno del servidor: {str(e)}",
+            "details": "Revisa la consola del servidor para más información"
+        }), 500
+
+# ===== PAGINACIÓN Y STREAMING DE RECOMENDACIONES =====
+
+# Autos por página (?limit=) y máximo permitido
+RECOMMENDATION_PAGE_SIZE = 10
+MAX_RECOMMENDATION_PAGE_SIZE = 50
+
+# Autos de la primera página del streaming: las primeras tarjetas llegan antes que el resto
+STREAM_FIRST_PAGE_SIZE = 3
+
+# Formato de streaming -> tipo MIME
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream"
+}
+
+def get_page_size():
+    """Parámetro ?limit= validado (ValueError si no es un entero entre 1 y el máximo)"""
+    limit = int(request.args.get("limit", RECOMMENDATION_PAGE_SIZE))
+    if not 1 <= limit <= MAX_RECOMMENDATION_PAGE_SIZE:
+        raise ValueError(f"limit debe estar entre 1 y {MAX_RECOMMENDATION_PAGE_SIZE}")
+    return limit
+
+def get_stream_format():
+    """Formato de streaming pedido con ?stream= o con el encabezado Accept (None = JSON)"""
+    requested = request.args.get("stream")
+    if requested:
+        if requested not in STREAM_FORMATS:
+            raise ValueError(f"stream debe ser uno de: {', '.join(STREAM_FORMATS)}")
+        return requested
+    best = request.accept_mimetypes.best_match(["application/json"] + list(STREAM_FORMATS.values()))
+    return next((name for name, mimetype in STREAM_FORMATS.items() if mimetype == best), None)
+
+def recommendation_page_fetcher(selections, user_email):
+    """
+    Función (cursor, tamaño) -> (página, cursor siguiente) para las selecciones dadas
+    
+    Con recommender.py cada página es una consulta que solo pide esos autos; con
+    recommender_minimal o los datos de ejemplo se pagina la lista completa
+    """
+    user_profile = user_store.get_profile(user_email)
+    search = tuple(selections[name] for name in SELECTION_KEYS) + (user_profile.get('gender'), user_profile.get('ageRange'))
+    
+    if get_recommendation_page is not None:
+        return lambda cursor, page_size: get_recommendation_page(*search, cursor=cursor, page_size=page_size)
+    
+    recommendations = compute_recommendations(selections, user_email)
+    fingerprint = recommendation_cursor.fingerprint(*search)
+    return lambda cursor, page_size: recommendation_cursor.paginate(recommendations, cursor, page_size, fingerprint)
+
+def format_stream_event(stream_format, event, data):
+    """Un evento del streaming: una línea NDJSON o un mensaje SSE"""
+    payload = json.dumps(data, ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {payload}\n\n"
+    return json.dumps({event: data}, ensure_ascii=False) + "\n"
+
+def stream_recommendations(fetch_page, cursor, limit, stream_format):
+    """
+    Respuesta que emite cada auto en cuanto su página está puntuada
+    
+    La primera página (pequeña) se pide antes de responder, así un cursor inválido
+    todavía devuelve 400; el resto se pide mientras se envía. El evento final "end"
+    lleva el cursor para continuar ({"next_cursor": ..., "count": ...})
+    """
+    first_page, cursor = fetch_page(cursor, min(STREAM_FIRST_PAGE_SIZE, limit))
+    
+    def generate(page, cursor):
+        sent = 0
+        try:
+            while True:
+                for car in page:
+                    yield format_stream_event(stream_format, "recommendation", car)
+                sent += len(page)
+                if cursor is None or sent >= limit:
+                    break
+                page, cursor = fetch_page(cursor, limit - sent)
+            yield format_stream_event(stream_format, "end", {"next_cursor": cursor, "count": sent})
+        except Exception as e:
+            logger.exception("Error en el streaming de recomendaciones")
+            yield format_stream_event(stream_format, "error", {"error": str(e)})
+    
+    return Response(generate(first_page, cursor), mimetype=STREAM_FORMATS[stream_format],
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route("/api/recommendations", methods=["GET"])
 def api_recommendations():
+    """
+    Recomendaciones para las selecciones de la sesión
+    
+    Sin parámetros devuelve la lista de siempre. Con ?limit= o ?cursor= devuelve una página
+    {"recommendations": [...], "next_cursor": ...} ordenada por (puntuación, id); con
+    ?stream=ndjson|sse (o Accept: application/x-ndjson / text/event-stream) emite los autos
+    a medida que se puntúan, hasta limit autos
+    """
     try:
-        print("\n" + "="*60)
-        print("🎯 API RECOMMENDATIONS - INICIANDO")
-        print("="*60)
+        start = time.perf_counter()
         
         # Obtener datos de la sesión
-        brands = session.get('selected_brands')
-        budget = session.get('selected_budget')
-        fuel = session.get('selected_fuel')
-        types = session.get('selected_types')
-        transmission = session.get('selected_transmission')
+        selections = get_session_selections()
+        brands, budget, fuel, types, transmission = (selections[name] for name in SELECTION_KEYS)
         user_email = session.get('user_email')
-        
-        # Debug detallado
-        print("📊 DATOS DE SESIÓN:")
-        print(f"  🏷️  Brands: {brands} (tipo: {type(brands)})")
-        print(f"  💰 Budget: {budget} (tipo: {type(budget)})")
-        print(f"  ⛽ Fuel: {fuel} (tipo: {type(fuel)})")
-        print(f"  🚗 Types: {types} (tipo: {type(types)})")
-        print(f"  ⚙️  Transmission: {transmission} (tipo: {type(transmission)})")
-        print(f"  👤 Usuario: {user_email}")
+        logger.debug("Datos de sesión", extra={"user": user_email, "selections": selections})
         
         # Verificar que todos los datos estén presentes
-        missing_data = []
-        if not brands: missing_data.append("brands")
-        if not budget: missing_data.append("budget")
-        if not fuel: missing_data.append("fuel")
-        if not types: missing_data.append("types")
-        if not transmission: missing_data.append("transmission")
-        
+        missing_data = get_missing_selections(selections)
         if missing_data:
-            print(f"❌ FALTAN DATOS: {', '.join(missing_data)}")
+            logger.info("Faltan datos de selección", extra={"user": user_email, "missing": missing_data})
             return jsonify({
                 "error": f"Faltan datos de selección: {', '.join(missing_data)}",
-                "session_data": {
-                    "brands": brands,
-                    "budget": budget,
-                    "fuel": fuel,
-                    "types": types,
-                    "transmission": transmission
-                },
+                "session_data": selections,
                 "missing": missing_data
             }), 400
         
-        print("✅ TODOS LOS DATOS PRESENTES")
+        # Paginación por cursor o streaming
+        cursor = request.args.get('cursor')
+        try:
+            stream_format = get_stream_format()
+            page_size = get_page_size()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if stream_format or cursor or 'limit' in request.args:
+            fetch_page = recommendation_page_fetcher(selections, user_email)
+            if stream_format:
+                return stream_recommendations(fetch_page, cursor, page_size, stream_format)
+            
+            page, next_cursor = fetch_page(cursor, page_size)
+            logger.info("Página de recomendaciones generada", extra={
+                "user": user_email,
+                "count": len(page),
+                "has_cursor": bool(cursor),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+            })
+            return jsonify({"recommendations": page, "next_cursor": next_cursor})
         
         # Obtener perfil del usuario para personalización
-        user_profile = USER_PROFILES.get(user_email, {})
+        user_profile = user_store.get_profile(user_email)
         gender = user_profile.get('gender')
         age_range = user_profile.get('ageRange')
         
-        print(f"👤 PERFIL DE USUARIO:")
-        print(f"  Género: {gender}")
-        print(f"  Edad: {age_range}")
-        
         # Si el sistema de recomendaciones no está disponible, usar datos de ejemplo
         if not RECOMMENDER_AVAILABLE:
-            print("⚠️ RECOMMENDER NO DISPONIBLE - Usando datos de ejemplo")
+            logger.warning("Recommender no disponible, usando datos de ejemplo")
             sample_recommendations = get_sample_recommendations()
         else:
-            print("🔍 Llamando a get_recommendations...")
             # Usar el sistema de recomendaciones real con personalización demográfica
             result = get_recommendations(brands, budget, fuel, types, transmission, gender, age_range)
             
-            print(f"📋 Resultado recibido:")
-            print(f"  Tipo: {type(result)}")
-            print(f"  Cantidad: {len(result) if isinstance(result, list) else 'N/A'}")
-            
             # Asegurar que el resultado sea una lista
             if not isinstance(result, list):
-                print(f"⚠️ get_recommendations devolvió {type(result)}, esperaba lista")
+                logger.warning("get_recommendations devolvió %s, esperaba lista", type(result).__name__)
                 sample_recommendations = get_sample_recommendations()
             else:
                 sample_recommendations = result
@@ -453,18 +774,68 @@ def api_recommendations():
         # Aplicar personalización demográfica adicional si no se hizo en recommender
         if gender and age_range and not any('demographic_bonus' in car for car in sample_recommendations):
             sample_recommendations = apply_demographic_scoring(sample_recommendations, gender, age_range)
-            print(f"🎯 Personalización adicional aplicada por género: {gender}, edad: {age_range}")
         
-        print(f"🎉 ÉXITO: Devolviendo {len(sample_recommendations)} recomendaciones")
-        print("="*60)
+        logger.info("Recomendaciones generadas", extra={
+            "user": user_email,
+            "count": len(sample_recommendations),
+            "gender": gender,
+            "age_range": age_range,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+        })
         
         return jsonify(sample_recommendations)
         
+    except recommendation_cursor.InvalidCursorError as e:
+        return jsonify({"error": str(e)}), 400
+        
     except Exception as e:
         # Log completo del error
-        error_traceback = traceback.format_exc()
-        print(f"💥 ERROR en api_recommendations:")
-        print(error_traceback)
+        logger.exception("Error en api_recommendations")
+        
+        return jsonify({
+            "error": f"Error interno del servidor: {str(e)}",
+            "details": "Revisa la consola del servidor para más información"
+        }), 500
+
+@app.route("/api/recommendations/async", methods=["GET"])
+async def api_recommendations_async():
+    """
+    Mismas recomendaciones que /api/recommendations con el driver asíncrono
+    
+    Las consultas comparten el loop y el pool del recomendador asíncrono; con un servidor
+    WSGI síncrono la vista sigue ocupando su hilo mientras espera (ver async_recommender.py)
+    """
+    try:
+        selections = get_session_selections()
+        brands, budget, fuel, types, transmission = (selections[name] for name in SELECTION_KEYS)
+        
+        missing_data = get_missing_selections(selections)
+        if missing_data:
+            return jsonify({
+                "error": f"Faltan datos de selección: {', '.join(missing_data)}",
+                "session_data": selections,
+                "missing": missing_data
+            }), 400
+        
+        user_profile = user_store.get_profile(session.get('user_email'))
+        gender = user_profile.get('gender')
+        age_range = user_profile.get('ageRange')
+        
+        if ASYNC_RECOMMENDER_AVAILABLE:
+            recommendations = await get_recommendations_async(brands, budget, fuel, types, transmission, gender, age_range)
+        elif RECOMMENDER_AVAILABLE:
+            recommendations = get_recommendations(brands, budget, fuel, types, transmission, gender, age_range)
+        else:
+            recommendations = get_sample_recommendations()
+        
+        # Aplicar personalización demográfica adicional si no se hizo en recommender
+        if gender and age_range and not any('demographic_bonus' in car for car in recommendations):
+            recommendations = apply_demographic_scoring(recommendations, gender, age_range)
+        
+        return jsonify(recommendations)
+        
+    except Exception as e:
+        logger.exception("Error en api_recommendations_async")
         
         return jsonify({
             "error": f"Error interno del servidor: {str(e)}",
@@ -596,45 +967,38 @@ def apply_demographic_scoring(recommendations, gender, age_range):
     
     for car in recommendations:
         demographic_bonus = 0
-        car_type = car.get('type', '').lower()
-        car_brand = car.get('brand', '').lower()
-        car_name = car.get('name', '').lower()
-        features_text = str(car.get('features', [])).lower()
+        tags = car_tags.tags_for_car(car)
         
         # Lógica para mujeres
         if gender == 'femenino':
             if age_group == 'young':  # 18-25: igual que hombres jóvenes
-                if car_type in ['coupé', 'convertible'] or any(sport_word in car_name for sport_word in ['sport', 'gt', 'turbo', 'mustang', 'm3']):
+                if tags & car_tags.SPORTY_EXTENDED:
                     demographic_bonus += 5
             elif age_group == 'reproductive':  # 26-45: preferencia familiar
-                if car_type in ['suv']:
+                if tags & car_tags.TAG_SUV:
                     demographic_bonus += 15
-                elif car_type == 'sedán' and any(family_word in features_text for family_word in ['familia', 'seguridad', 'espacio', 'asientos']):
+                elif tags & car_tags.TAG_SEDAN and tags & car_tags.TAG_FAMILY:
                     demographic_bonus += 10
             elif age_group == 'mature':  # 46+: comfort y luxury
-                if any(luxury_brand in car_brand for luxury_brand in ['mercedes', 'bmw', 'audi', 'lexus']):
+                if tags & car_tags.TAG_LUXURY_BRAND:
                     demographic_bonus += 12
-                if any(premium_word in features_text for premium_word in ['premium', 'lujo', 'cuero']):
+                if tags & car_tags.TAG_PREMIUM:
                     demographic_bonus += 8
         
         # Lógica para hombres
         elif gender == 'masculino':
             if age_group == 'young':  # 18-25: deportivos
-                if car_type in ['coupé', 'convertible'] or any(sport_word in car_name for sport_word in ['sport', 'gt', 'turbo', 'mustang', 'm3']):
+                if tags & car_tags.SPORTY_EXTENDED:
                     demographic_bonus += 8
             elif age_group == 'mature':  # 46+: comfort y luxury
-                if any(luxury_brand in car_brand for luxury_brand in ['mercedes', 'bmw', 'audi', 'lexus']):
+                if tags & car_tags.TAG_LUXURY_BRAND:
                     demographic_bonus += 12
-                if any(premium_word in features_text for premium_word in ['premium', 'lujo', 'cuero']):
+                if tags & car_tags.TAG_PREMIUM:
                     demographic_bonus += 8
         
         # Para todos: bonificación por características de comfort en edad madura
-        if age_group == 'mature':
-            comfort_features = ['cuero', 'premium', 'lujo', 'confort']
-            for feature in comfort_features:
-                if feature in features_text:
-                    demographic_bonus += 3
-                    break
+        if age_group == 'mature' and tags & car_tags.COMFORT_ES:
+            demographic_bonus += 3
         
         # Aplicar bonificación
         if demographic_bonus > 0:
@@ -666,8 +1030,8 @@ def debug_session():
         "session_data": session_data,
         "session_keys": list(session_data.keys()),
         "recommender_available": RECOMMENDER_AVAILABLE,
-        "users_count": len(USERS_DB),
-        "profiles_count": len(USER_PROFILES),
+        "users_count": user_store.count_users(),
+        "profiles_count": user_store.count_profiles(),
         "all_present": all([
             session.get('selected_brands'),
             session.get('selected_budget'),
@@ -676,13 +1040,13 @@ def debug_session():
             session.get('selected_transmission')
         ])
     }
-    print(f"🔍 Debug session solicitado: {debug_info}")
+    logger.debug("Debug session solicitado", extra={"debug_info": debug_info})
     return jsonify(debug_info)
 
 @app.route("/api/debug/clear-session", methods=["POST"])
 def clear_session():
     session.clear()
-    print("🧹 Sesión limpiada")
+    logger.info("Sesión limpiada")
     return jsonify({"success": True, "message": "Sesión limpiada"})
 
 @app.route("/api/debug/system-status", methods=["GET"])
@@ -691,9 +1055,9 @@ def system_status():
         "flask": "✅ Funcionando",
         "recommender": "✅ Disponible" if RECOMMENDER_AVAILABLE else "❌ No disponible",
         "session_active": "✅ Activa" if session.get('logged_in') else "❌ No logueado",
-        "users_count": len(USERS_DB),
-        "profiles_count": len(USER_PROFILES),
-        "favorites_count": sum(len(favs) for favs in USER_FAVORITES.values()),
+        "users_count": user_store.count_users(),
+        "profiles_count": user_store.count_profiles(),
+        "favorites_count": user_store.count_favorites(),
         "demographic_features": "✅ Activas"
     }
     
@@ -716,7 +1080,7 @@ def system_status():
 def logout():
     user_email = session.get('user_email', 'Usuario')
     session.clear()
-    print(f"👋 Usuario {user_email} cerró sesión")
+    logger.info("Usuario cerró sesión", extra={"user": user_email})
     return redirect(url_for('login'))
 
 # Manejadores de errores
@@ -744,10 +1108,17 @@ if __name__ == "__main__":
     print("  ⚙️  GET  /transmission -> selección de transmisión")
     print("  🎯 GET  /recommendations -> página de recomendaciones")
     print("  📊 GET  /api/recommendations -> obtener recomendaciones JSON")
+    print("  📄 GET  /api/recommendations?limit=10&cursor=... -> página siguiente (o ?stream=ndjson|sse)")
+    print("  📨 POST /api/submit-preferences -> guardar el asistente completo y obtener recomendaciones")
+    print("  ⚡ GET  /api/recommendations/async -> recomendaciones con el driver asíncrono")
     print("  👤 POST /api/save-profile -> guardar perfil de usuario")
     print("  ❤️  POST /api/add-favorite -> agregar favorito")
+    print("  📦 POST /api/add-favorites | /api/remove-favorites -> favoritos en lote")
+    print("  🗑️  POST /api/clear-favorites -> limpiar favoritos")
+    print("  💾 GET  /api/export-favorites -> exportar favoritos (JSON)")
     print("  🎨 POST /api/save-theme -> guardar tema preferido")
     print("  🔍 GET  /api/debug/system-status -> estado del sistema")
+    print("  📈 GET  /metrics -> métricas Prometheus (latencias por etapa, caché, pool)")
     print("\n🎯 FUNCIONALIDADES DEMOGRÁFICAS:")
     print("  👩 Mujeres jóvenes (18-25): Deportivos permitidos")
     print("  👩‍👧‍👦 Mujeres reproductivas (26-45): +15 SUVs, +10 sedanes familiares")
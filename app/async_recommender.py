@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Recomendador asíncrono sobre el driver asíncrono de Neo4j (AsyncGraphDatabase)
+Reutiliza la normalización, la consulta Cypher, la caché y la puntuación de CarRecommender;
+solo el viaje de ida y vuelta a Neo4j es asíncrono. Todas las consultas comparten un event
+loop y un pool de conexiones, pero con un servidor WSGI síncrono (Flask con gunicorn sync o
+gthread) cada vista async sigue ocupando su hilo del worker mientras espera: las consultas
+en curso por proceso siguen limitadas por los hilos del servidor. Tener cientos en curso
+requiere servir la aplicación con un servidor ASGI
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import List, Dict, Optional
+
+from neo4j import AsyncGraphDatabase, unit_of_work
+
+import circuit_breaker
+import driver_lifecycle
+import fake_neo4j
+import metrics
+from circuit_breaker import CircuitBreaker, DatabaseUnavailableError
+from materialized_topn import MaterializedTopN
+from recommendation_cache import RecommendationCache
+from recommender import CarRecommender, QUERY_MODES, get_fallback_recommendations
+from shared import car_tags, catalog_version
+from shared.catalog_version import CatalogVersionWatcher
+
+logger = logging.getLogger(__name__)
+
+class AsyncCarRecommender(CarRecommender):
+    def __init__(self, uri: str, user: str, password: str, cache_size: int = 1024,
+                 cache_ttl: float = 300, driver=None, query_mode: str = 'standard',
+                 driver_config: Optional[Dict] = None, breaker: Optional[CircuitBreaker] = None,
+                 query_timeout: Optional[float] = None, database: Optional[str] = None,
+                 topn_table: Optional[str] = None, catalog_check_interval: Optional[float] = None):
+        """
+        Inicializar recomendador asíncrono (sin E/S: la conexión se verifica con connect())
+
+        Args:
+            uri: URI de conexión (ej: neo4j://localhost:7687)
+            user: Usuario de Neo4j
+            password: Contraseña de Neo4j
+            cache_size: Combinaciones de preferencias en caché (0 = sin caché)
+            cache_ttl: Segundos de vigencia de cada entrada de la caché
+            driver: Driver asíncrono ya creado (ej: fake_neo4j.FakeAsyncDriver)
+            query_mode: "standard", "compact" o "denormalized" (ver CarRecommender.__init__)
+            driver_config: Opciones del pool (ver driver_lifecycle.pool_config_from_env)
+            breaker: Circuit breaker de las consultas (la sonda la configura RecommendationLoop)
+            query_timeout: Segundos máximos de cada consulta de recomendaciones (None = sin límite)
+            database: Base de datos de las sesiones (None = la predeterminada del servidor)
+            topn_table: Archivo de la tabla top-N (solo lectura: la actualiza el proceso síncrono o el script)
+            catalog_check_interval: Segundos entre lecturas de la versión del catálogo (None = no se lee)
+        """
+        # No se llama a CarRecommender.__init__: crearía un driver síncrono y un snapshot
+        if query_mode not in QUERY_MODES:
+            raise ValueError(f"Modo de consulta desconocido: {query_mode}")
+        self.query_mode = query_mode
+        self.snapshot = None
+        self.prefetcher = None
+        self.cache = RecommendationCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self.breaker = breaker
+        self.query_timeout = query_timeout
+        self.session_config = {'database': database} if database else {}
+        self.topn_table = None
+        self.catalog_watcher = CatalogVersionWatcher(catalog_check_interval) if catalog_check_interval else None
+        if topn_table:
+            try:
+                self.topn_table = MaterializedTopN(topn_table)
+            except Exception as e:
+                logger.warning(f"Tabla top-N no disponible ({e}), usando consultas a Neo4j")
+        self.driver = driver if driver is not None else AsyncGraphDatabase.driver(uri, auth=(user, password),
+                                                                                  **(driver_config or {}))
+
+    async def connect(self):
+        """Verificar la conexión a Neo4j (y que el modo compacto se puede usar, como CarRecommender.__init__)"""
+        try:
+            await self.ping_async()
+            logger.info("Conexión asíncrona exitosa a Neo4j")
+        except Exception as e:
+            logger.error(f"Error conectando a Neo4j (asíncrono): {e}")
+            raise
+        if self.query_mode == 'compact' and not await self.compact_tags_ready_async():
+            self.refuse_compact_mode()
+
+    async def ping_async(self):
+        """Consulta mínima a Neo4j (lanza excepción si no responde)"""
+        @unit_of_work(timeout=self.query_timeout)
+        async def read(tx):
+            result = await tx.run("RETURN 1")
+            await result.consume()
+
+        async with self.driver.session(**self.session_config) as session:
+            await session.execute_read(read)
+
+    async def compact_tags_ready_async(self) -> bool:
+        """Versión asíncrona de CarRecommender.compact_tags_ready"""
+        @unit_of_work(timeout=self.query_timeout)
+        async def read(tx):
+            result = await tx.run(car_tags.UNTAGGED_COUNT_QUERY)
+            record = await result.single()
+            return record['untagged']
+
+        try:
+            async with self.driver.session(**self.session_config) as session:
+                untagged = await session.execute_read(read)
+        except Exception as e:
+            logger.warning(f"No se pudo comprobar las etiquetas de los autos: {e}")
+            return False
+        if untagged:
+            logger.warning("Autos sin etiquetas precalculadas: %d", untagged)
+        return untagged == 0
+
+    async def check_catalog_version_async(self):
+        """Versión asíncrona de CarRecommender.check_catalog_version (versión y cambios en una transacción)"""
+        watcher = self.catalog_watcher
+        if watcher is None or not watcher.due() or not self.catalog_reads_allowed():
+            return
+        since = watcher.version
+
+        @unit_of_work(timeout=self.query_timeout)
+        async def read(tx):
+            result = await tx.run(catalog_version.VERSION_QUERY, version_id=catalog_version.VERSION_ID)
+            record = await result.single()
+            version = record['version'] if record is not None else 0
+            if since is None or version <= since:
+                return version, []
+            result = await tx.run(catalog_version.CHANGES_QUERY, since=since)
+            return version, [dict(record) async for record in result]
+
+        try:
+            async with self.driver.session(**self.session_config) as session:
+                version, changes = await session.execute_read(read)
+        except Exception as e:
+            logger.warning(f"No se pudo leer la versión del catálogo: {e}")
+            return
+        changes = watcher.advance(since, version, changes)
+        if changes:
+            self.on_catalog_changes(changes)
+
+    def on_catalog_changes(self, changes: List[tuple]):
+        """
+        Vaciar la caché ante cambios del catálogo
+
+        La tabla top-N es aquí de solo lectura: con la versión del catálogo vigilada responde
+        en cuanto otro proceso la reescribe a esa versión (lookup_topn_table); sin ella deja
+        de responder hasta que se reescriba
+        """
+        logger.info("Catálogo modificado", extra={"changes": changes[:20], "count": len(changes)})
+        if self.cache is not None:
+            self.cache.invalidate()
+        if self.topn_table is not None and self.catalog_watcher is None:
+            self.topn_table.invalidate()
+
+    async def close(self):
+        """Cerrar conexión"""
+        if self.breaker:
+            self.breaker.close()
+        if self.topn_table:
+            self.topn_table.close()
+        await self.driver.close()
+
+    @metrics.timed('execute_recommendation_query')
+    async def execute_recommendation_query_async(self, query: str, parameters: Dict, converter=None) -> List[Dict]:
+        """Ejecutar consulta de recomendaciones sin bloquear el event loop (mismo breaker que la versión síncrona)"""
+        converter = converter or self.record_to_car
+        if self.breaker is not None and not self.breaker.allow_request():
+            raise DatabaseUnavailableError("Circuito abierto: consulta a Neo4j omitida")
+
+        # Transacción de lectura: en un clúster la atiende un seguidor
+        @unit_of_work(timeout=self.query_timeout)
+        async def read(tx):
+            result = await tx.run(query, parameters)
+            return [converter(record) async for record in result]
+
+        try:
+            start = time.perf_counter()
+            async with self.driver.session(**self.session_config) as session:
+                recommendations = await session.execute_read(read)
+            if self.breaker is not None:
+                self.breaker.record_success((time.perf_counter() - start) * 1000)
+            return recommendations
+
+        except Exception as e:
+            logger.error("Error ejecutando consulta de recomendaciones: %s", e,
+                         extra={"query": query, "parameters": parameters})
+            if self.breaker is not None:
+                self.breaker.record_failure(e)
+                raise DatabaseUnavailableError(str(e)) from e
+            return []
+
+    async def fetch_candidates_async(self, preferences: Dict) -> List[Dict]:
+        """Obtener autos candidatos desde Neo4j"""
+        query, parameters = self.build_candidate_query(preferences)
+        logger.debug("Query generada", extra={"query": query, "parameters": parameters})
+        return await self.execute_recommendation_query_async(query, parameters)
+
+    async def get_recommendations_async(self, brands=None, budget=None, fuel=None, types=None,
+                                        transmission=None, gender=None, age_range=None) -> List[Dict]:
+        """Versión asíncrona de CarRecommender.get_recommendations (mismos argumentos y resultado)"""
+        cache_key = None
+        try:
+            await self.check_catalog_version_async()
+            preferences = self.normalize_preferences(brands, budget, fuel, types, transmission)
+
+            cache_key, cached = self.lookup_cache(preferences, gender, age_range)
+            if cached is not None:
+                return cached
+
+            # La búsqueda en la tabla top-N (mmap) no hace E/S de red
+            recommendations = self.lookup_topn_table(preferences, gender, age_range)
+            if recommendations is None and self.query_mode == 'compact':
+                query, parameters = self.build_compact_query(preferences, gender, age_range)
+                recommendations = await self.execute_recommendation_query_async(
+                    query, parameters, converter=self.record_to_ranked_car
+                )
+            elif recommendations is None:
+                recommendations = await self.fetch_candidates_async(preferences)
+                logger.debug("Encontradas %d recomendaciones iniciales", len(recommendations))
+
+                recommendations = self.rank_recommendations(recommendations, preferences, gender, age_range)
+            self.store_cache(cache_key, recommendations)
+            return recommendations
+
+        except DatabaseUnavailableError as e:
+            stale = self.lookup_stale_cache(cache_key, e)
+            if stale is None:
+                raise
+            return stale
+
+        except Exception as e:
+            logger.error(f"Error general en get_recommendations_async: {e}")
+            return []
+
+# Segundos máximos para crear el recomendador y verificar la conexión
+CONNECT_TIMEOUT = 30
+
+class RecommendationLoop:
+    """
+    Event loop propio en un hilo de fondo que es dueño del driver asíncrono
+
+    El driver asíncrono de Neo4j queda ligado al event loop donde se usa, pero Flask
+    ejecuta cada vista async en un event loop nuevo. Las vistas envían sus consultas a
+    este loop compartido, así todas las peticiones comparten un solo pool de conexiones
+    """
+
+    def __init__(self, recommender_factory, connect_timeout: float = CONNECT_TIMEOUT):
+        """
+        Args:
+            recommender_factory: Función sin argumentos que crea el AsyncCarRecommender
+            connect_timeout: Segundos máximos para conectar; si no conecta, se cierran el
+                driver y el loop antes de lanzar la excepción
+        """
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="async-recommender", daemon=True)
+        self._thread.start()
+        try:
+            # El tiempo límite se aplica dentro del loop para cerrar el driver antes de volver
+            self.recommender = self.run(self._create(recommender_factory, connect_timeout), timeout=connect_timeout + 5)
+        except Exception:
+            self._stop_loop()
+            raise
+        # La sonda del circuito corre en su propio hilo y consulta a través de este loop
+        if self.recommender.breaker is not None:
+            self.recommender.breaker.set_probe(lambda: self.run(self.recommender.ping_async(), timeout=30))
+
+    @staticmethod
+    async def _create(recommender_factory, connect_timeout: float) -> AsyncCarRecommender:
+        recommender = recommender_factory()
+        try:
+            await asyncio.wait_for(recommender.connect(), connect_timeout)
+        except BaseException:
+            await recommender.close()
+            raise
+        return recommender
+
+    def _stop_loop(self):
+        """Detener el loop, esperar a su hilo y liberar el loop"""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        if not self._thread.is_alive():
+            self.loop.close()
+
+    def submit(self, coroutine):
+        """Programar una corrutina en el loop compartido (devuelve concurrent.futures.Future)"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine, timeout: Optional[float] = None):
+        """Ejecutar una corrutina en el loop compartido y esperar su resultado (código síncrono)"""
+        return self.submit(coroutine).result(timeout)
+
+    async def recommend(self, *args, **kwargs) -> List[Dict]:
+        """Obtener recomendaciones desde cualquier event loop"""
+        future = self.submit(self.recommender.get_recommendations_async(*args, **kwargs))
+        return await asyncio.wrap_future(future)
+
+    def close(self):
+        """Cerrar el driver y detener el loop"""
+        try:
+            self.run(self.recommender.close(), timeout=5)
+        finally:
+            self._stop_loop()
+
+_loop_connection = None
+_loop_lock = threading.Lock()
+
+def get_loop_connection() -> driver_lifecycle.ManagedConnection:
+    """
+    Conexión gestionada (singleton) del loop de recomendaciones asíncronas
+
+    Igual que recommender.get_recommender_connection: el loop se crea en un hilo de fondo
+    y, si Neo4j no responde, se reintenta con espera exponencial; cada intento fallido
+    cierra su driver y su loop
+    """
+    global _loop_connection
+    with _loop_lock:
+        if _loop_connection is None:
+            # Misma configuración que recommender.create_recommender
+            URI = driver_lifecycle.uri_from_env()
+            USER = "neo4j"
+            PASSWORD = "proyectoNEO4J"
+            cache_size = int(os.environ.get("RECOMMENDATION_CACHE_SIZE", "1024"))
+            cache_ttl = float(os.environ.get("RECOMMENDATION_CACHE_TTL", "300"))
+            query_mode = os.environ.get("RECOMMENDATION_QUERY_MODE", "standard").lower()
+            query_timeout = float(os.environ.get("NEO4J_QUERY_TIMEOUT", "5")) or None
+            topn_table = os.environ.get("RECOMMENDATION_TOPN_TABLE") or None
+            catalog_check_interval = float(os.environ.get("CATALOG_VERSION_CHECK_SECONDS", "1")) or None
+
+            def factory():
+                driver = fake_neo4j.async_driver_from_uri(URI) if fake_neo4j.is_fake_uri(URI) else None
+                return AsyncCarRecommender(URI, USER, PASSWORD, cache_size=cache_size,
+                                           cache_ttl=cache_ttl, driver=driver, query_mode=query_mode,
+                                           driver_config=driver_lifecycle.pool_config_from_env(),
+                                           breaker=circuit_breaker.breaker_from_env("async"),
+                                           query_timeout=query_timeout,
+                                           database=driver_lifecycle.session_config_from_env().get('database'),
+                                           topn_table=topn_table,
+                                           catalog_check_interval=catalog_check_interval)
+
+            _loop_connection = driver_lifecycle.ManagedConnection(
+                lambda: RecommendationLoop(factory),
+                connect_wait=float(os.environ.get("NEO4J_CONNECT_WAIT", "5")),
+                min_backoff=float(os.environ.get("NEO4J_RECONNECT_MIN_SECONDS", "1")),
+                max_backoff=float(os.environ.get("NEO4J_RECONNECT_MAX_SECONDS", "60")),
+                name="async-recommender"
+            )
+        _loop_connection.start()
+    return _loop_connection
+
+def get_recommendation_loop(wait: Optional[float] = None) -> Optional[RecommendationLoop]:
+    """
+    Loop de recomendaciones asíncronas, o None mientras no haya conexión (código síncrono)
+
+    Args:
+        wait: Segundos de espera al primer intento de conexión (ver ManagedConnection.get)
+    """
+    return get_loop_connection().get(wait)
+
+def collect_metrics():
+    """Colector de metrics.REGISTRY: pool del driver asíncrono"""
+    recommendation_loop = _loop_connection.instance if _loop_connection is not None else None
+    if recommendation_loop is None:
+        return []
+    return metrics.pool_metric_families(metrics.driver_pool_stats(recommendation_loop.recommender.driver), "async")
+
+metrics.REGISTRY.register_collector(collect_metrics)
+
+async def get_recommendations_async(brands=None, budget=None, fuel=None, types=None, transmission=None,
+                                    gender=None, age_range=None) -> List[Dict]:
+    """
+    Función asíncrona equivalente a recommender.get_recommendations
+
+    Usable desde vistas async de Flask o cualquier otro event loop
+    """
+    connection = get_loop_connection()
+    recommendation_loop = connection.instance
+    if recommendation_loop is None:
+        # Primer intento de conexión en curso: esperarlo en un hilo sin bloquear el event loop
+        recommendation_loop = await asyncio.to_thread(connection.get)
+
+    if recommendation_loop is None:
+        logger.error("No hay conexión asíncrona a Neo4j disponible")
+        return get_fallback_recommendations(brands, budget, fuel, types, transmission, gender, age_range)
+
+    try:
+        return await recommendation_loop.recommend(brands, budget, fuel, types, transmission, gender, age_range)
+    except DatabaseUnavailableError as e:
+        logger.warning(f"Neo4j no disponible y sin resultado previo en caché: {e}")
+        return get_fallback_recommendations(brands, budget, fuel, types, transmission, gender, age_range)
+    except Exception as e:
+        logger.error(f"Error en get_recommendations_async: {e}")
+        return get_fallback_recommendations(brands, budget, fuel, types, transmission, gender, age_range)
+
+def cleanup():
+    """Detener los reintentos y cerrar el loop de recomendaciones asíncronas"""
+    global _loop_connection
+    if _loop_connection is not None:
+        _loop_connection.close()
+        _loop_connection = None
+
+import atexit
+atexit.register(cleanup)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Prefetch especulativo de candidatos durante el asistente
+Cuando el usuario guarda los tipos ya se conocen marcas, presupuesto, combustible y tipos:
+la consulta de candidatos sin filtro de transmisión se lanza en segundo plano y el último
+paso solo filtra por transmisión y puntúa el conjunto ya obtenido
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable
+
+from recommendation_cache import RecommendationCache
+
+logger = logging.getLogger(__name__)
+
+class CandidatePrefetcher:
+    def __init__(self, fetch: Callable[[Dict, Optional[int]], List[Dict[str, Any]]], max_workers: int = 4,
+                 max_entries: int = 256, ttl: float = 60, row_limit: int = 2000):
+        """
+        Inicializar prefetcher
+
+        Args:
+            fetch: Función (preferencias, límite) -> candidatos ordenados por precio ascendente
+            max_workers: Consultas de prefetch simultáneas
+            max_entries: Combinaciones de preferencias guardadas
+            ttl: Segundos que un conjunto prefetch se considera vigente
+            row_limit: Máximo de filas por conjunto (None = sin límite)
+        """
+        self.fetch = fetch
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.row_limit = row_limit
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # clave -> (expira_en, future)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+
+    @staticmethod
+    def make_key(preferences: Dict) -> tuple:
+        """Clave de las preferencias sin transmisión (lo que se conoce al guardar los tipos)"""
+        return RecommendationCache.make_key({**preferences, 'transmission': None})
+
+    def prefetch(self, preferences: Dict) -> bool:
+        """
+        Lanzar en segundo plano la consulta de candidatos sin filtro de transmisión
+
+        Returns:
+            True si se lanzó una consulta nueva (False si ya había una vigente)
+        """
+        key = self.make_key(preferences)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= now:
+                return False
+
+            base_preferences = {**preferences, 'transmission': None}
+            future = self._executor.submit(self.fetch, base_preferences, self.row_limit)
+            self._entries[key] = (now + self.ttl, future)
+            self._entries.move_to_end(key)
+            self.started += 1
+
+            while len(self._entries) > self.max_entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                evicted.cancel()
+        return True
+
+    def take(self, preferences: Dict, limit: Optional[int], timeout: float = 5) -> Optional[List[Dict[str, Any]]]:
+        """
+        Candidatos para las preferencias completas a partir del conjunto prefetch
+
+        Filtra por transmisión y conserva el orden por precio de la consulta original,
+        así el resultado es el mismo que el de build_recommendation_query con límite
+
+        Returns:
+            Copia de los candidatos, o None si no hay conjunto vigente o no alcanza para responder
+        """
+        key = self.make_key(preferences)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+
+        try:
+            rows = entry[1].result(timeout)
+        except Exception as e:
+            logger.warning(f"Prefetch de candidatos no disponible: {e}")
+            self.misses += 1
+            return None
+
+        # Un conjunto vacío puede ser un error de consulta: se repite la consulta completa
+        if not rows:
+            self.misses += 1
+            return None
+
+        transmission = preferences.get('transmission')
+        candidates = [car for car in rows if not transmission or car['transmission'] == transmission]
+
+        # Un conjunto truncado solo sirve si el filtro dejó suficientes filas
+        truncated = self.row_limit is not None and len(rows) >= self.row_limit
+        if truncated and (limit is None or len(candidates) < limit):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if limit is not None:
+            candidates = candidates[:limit]
+        return [dict(car) for car in candidates]
+
+    def invalidate(self):
+        """Descartar todos los conjuntos (ej: cambió el catálogo)"""
+        with self._lock:
+            for _, future in self._entries.values():
+                future.cancel()
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+    def close(self):
+        self.invalidate()
+        self._executor.shutdown(wait=False, cancel_futures=True)
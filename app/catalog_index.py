@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Índices de bits por atributo para filtrar el catálogo de autos
+Cada valor de marca/tipo/combustible/transmisión guarda un bitset con las posiciones de sus autos
+
+Los bitsets son enteros de Python: cada uno se construye una sola vez a partir de un
+bytearray (en vez de acumular un OR por fila, que copia el entero completo cada vez) y
+las posiciones activas se recorren por bytes, saltando los bytes vacíos
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Any, Iterable, Optional
+
+# Atributo de la fila del catálogo -> clave de las preferencias normalizadas
+INDEXED_ATTRIBUTES = {
+    'marca': 'brands',
+    'tipo': 'types',
+    'combustible': 'fuel',
+    'transmision': 'transmission'
+}
+
+# Bytes con algún bit activo y posiciones de los bits activos de cada valor de byte
+_NONZERO_BYTE = re.compile(b'[^\x00]')
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+def _bitmap(positions: List[int], size: int) -> int:
+    """Bitset con las posiciones dadas activas"""
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+class CatalogIndex:
+    def __init__(self, rows: List[Dict[str, Any]]):
+        """
+        Construir índices sobre filas del catálogo
+
+        Las filas deben venir ordenadas por precio ascendente: la posición de cada
+        fila es su bit, así que un rango de precios es un rango contiguo de bits
+        y los bits menores de un resultado son los autos más baratos
+        """
+        self.rows = rows
+        self.prices = [row['precio'] for row in rows]
+        self.all_mask = (1 << len(rows)) - 1
+
+        # Posiciones de cada valor; después, un bitset por valor
+        positions = {attribute: {} for attribute in INDEXED_ATTRIBUTES}
+        for position, row in enumerate(rows):
+            for attribute, members in positions.items():
+                members.setdefault(row.get(attribute), []).append(position)
+        self.bitmaps = {
+            attribute: {value: _bitmap(members, len(rows)) for value, members in values.items()}
+            for attribute, values in positions.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def values(self, attribute: str) -> List[Any]:
+        """Valores indexados de un atributo"""
+        return [value for value in self.bitmaps[attribute] if value is not None]
+
+    def value_mask(self, attribute: str, values: Iterable[Any]) -> int:
+        """Unión de los bitsets de varios valores de un atributo"""
+        bitmap = self.bitmaps[attribute]
+        mask = 0
+        for value in values:
+            mask |= bitmap.get(value, 0)
+        return mask
+
+    def price_mask(self, min_price: float, max_price: float) -> int:
+        """Bitset de los autos dentro del rango de precios (búsqueda binaria)"""
+        start = bisect_left(self.prices, min_price)
+        end = bisect_right(self.prices, max_price)
+        if start >= end:
+            return 0
+        return ((1 << end) - 1) ^ ((1 << start) - 1)
+
+    def filter_mask(self, preferences: Dict) -> int:
+        """Bitset de los autos que cumplen las preferencias normalizadas"""
+        mask = self.price_mask(preferences['min_price'], preferences['max_price'])
+
+        for attribute, preference_key in INDEXED_ATTRIBUTES.items():
+            if not mask:
+                break
+            wanted = preferences.get(preference_key)
+            if not wanted:
+                continue
+            if isinstance(wanted, str):
+                wanted = [wanted]
+            mask &= self.value_mask(attribute, wanted)
+
+        return mask
+
+    def positions(self, mask: int, limit: Optional[int] = None) -> List[int]:
+        """Posiciones activas de un bitset, de menor a mayor (orden de precio)"""
+        positions = []
+        if limit is not None and limit <= 0:
+            return positions
+        data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+        for match in _NONZERO_BYTE.finditer(data):
+            offset = match.start()
+            for bit in _BYTE_BITS[data[offset]]:
+                positions.append(offset * 8 + bit)
+                if limit is not None and len(positions) >= limit:
+                    return positions
+        return positions
+
+    def count(self, preferences: Dict) -> int:
+        """Número de autos que cumplen las preferencias"""
+        return bin(self.filter_mask(preferences)).count("1")
+
+    def search(self, preferences: Dict, limit: Optional[int] = 20) -> List[Dict[str, Any]]:
+        """Filas que cumplen las preferencias, ordenadas por precio ascendente"""
+        mask = self.filter_mask(preferences)
+        return [self.rows[position] for position in self.positions(mask, limit)]
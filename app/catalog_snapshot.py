@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Snapshot en memoria del catálogo de autos
+Carga todo el catálogo desde Neo4j y responde las búsquedas de candidatos sin consultar la base de datos
+"""
+
+import logging
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+from catalog_index import CatalogIndex
+from shared import car_tags
+
+logger = logging.getLogger(__name__)
+
+# Consulta única para cargar el catálogo completo con sus atributos
+CATALOG_QUERY = """
+    MATCH (a:Auto)
+    OPTIONAL MATCH (a)-[:ES_MARCA]->(m:Marca)
+    OPTIONAL MATCH (a)-[:ES_TIPO]->(t:Tipo)
+    OPTIONAL MATCH (a)-[:USA_COMBUSTIBLE]->(c:Combustible)
+    OPTIONAL MATCH (a)-[:TIENE_TRANSMISION]->(tr:Transmision)
+    RETURN a.id as id, a.modelo as modelo, a.año as año, a.precio as precio,
+           a.caracteristicas as caracteristicas, a.etiquetas as etiquetas,
+           m.nombre as marca, t.categoria as tipo,
+           c.tipo as combustible, tr.tipo as transmision
+"""
+
+class CatalogSnapshot:
+    def __init__(self, driver, refresh_interval: Optional[float] = None, database: Optional[str] = None):
+        """
+        Inicializar snapshot del catálogo
+
+        Args:
+            driver: Driver de Neo4j usado como fuente de verdad
+            refresh_interval: Segundos entre recargas automáticas (None = solo bajo demanda)
+            database: Base de datos de la sesión (None = la predeterminada del servidor)
+        """
+        self.driver = driver
+        self.session_config = {'database': database} if database else {}
+        self.refresh_interval = refresh_interval
+        self.loaded_at = None
+        self._index = CatalogIndex([])  # Filas ordenadas por precio con sus bitsets
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._refresh_thread = None
+
+    @property
+    def is_loaded(self) -> bool:
+        """Indica si el snapshot tiene datos cargados"""
+        return self.loaded_at is not None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def load(self) -> int:
+        """
+        Cargar el catálogo completo desde Neo4j
+
+        Returns:
+            Número de autos cargados
+        """
+        def read_catalog(tx):
+            return [dict(record) for record in tx.run(CATALOG_QUERY)]
+
+        start = time.perf_counter()
+        with self.driver.session(**self.session_config) as session:
+            rows = session.execute_read(read_catalog)
+
+        # Mismo orden que la consulta de recomendaciones (ORDER BY a.precio ASC)
+        rows = [row for row in rows if row['precio'] is not None]
+        rows.sort(key=lambda row: row['precio'])
+
+        # Autos creados antes de las etiquetas precalculadas se etiquetan una vez aquí
+        for row in rows:
+            if row['etiquetas'] is None:
+                row['etiquetas'] = car_tags.compute_tags(row)
+
+        index = CatalogIndex(rows)
+
+        # Reemplazar el snapshot de forma atómica
+        with self._lock:
+            self._index = index
+            self.loaded_at = time.time()
+
+        elapsed = (time.perf_counter() - start) * 1000
+        logger.info(f"Snapshot del catálogo cargado: {len(rows)} autos en {elapsed:.1f} ms")
+        return len(rows)
+
+    def refresh(self) -> bool:
+        """Recargar el catálogo conservando el snapshot anterior si falla"""
+        try:
+            self.load()
+            return True
+        except Exception as e:
+            logger.error(f"Error recargando snapshot del catálogo: {e}")
+            return False
+
+    def start_auto_refresh(self):
+        """Iniciar recarga periódica en segundo plano"""
+        if not self.refresh_interval or self._refresh_thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(
+            target=self._refresh_loop,
+            name="catalog-snapshot-refresh",
+            daemon=True
+        )
+        self._refresh_thread.start()
+
+    def _refresh_loop(self):
+        """Bucle de recarga periódica"""
+        while not self._stop_event.wait(self.refresh_interval):
+            self.refresh()
+
+    def stop(self):
+        """Detener la recarga periódica"""
+        self._stop_event.set()
+        if self._refresh_thread is not None:
+            self._refresh_thread.join(timeout=1)
+            self._refresh_thread = None
+
+    def find_candidates(self, preferences: Dict, limit: Optional[int] = 20) -> List[Dict[str, Any]]:
+        """
+        Buscar autos que cumplan las preferencias normalizadas
+
+        Aplica los mismos filtros que build_recommendation_query usando los
+        índices de bits y devuelve las filas en orden de precio ascendente
+        """
+        with self._lock:
+            index = self._index
+
+        return index.search(preferences, limit)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Circuit breaker para las consultas de recomendaciones a Neo4j
+Tras varios fallos seguidos (o consultas más lentas que el umbral) el circuito se abre y
+las consultas se rechazan al instante con DatabaseUnavailableError, en vez de esperar a
+que el driver agote su tiempo; el recomendador responde entonces con el último resultado
+bueno de la caché para las mismas preferencias
+
+Con el circuito abierto, una sonda (RETURN 1) comprueba periódicamente si Neo4j volvió;
+cuando responde, el circuito pasa a semiabierto y deja pasar una consulta real de prueba:
+si va bien se cierra, si falla se vuelve a abrir. Sin sonda, la primera petición tras
+reset_timeout hace de prueba
+
+Variables de entorno:
+    RECOMMENDATION_BREAKER_FAILURES: Fallos seguidos que abren el circuito (por defecto 5; 0 desactiva)
+    RECOMMENDATION_BREAKER_LATENCY_MS: Consultas más lentas cuentan como fallo (por defecto 2000)
+    RECOMMENDATION_BREAKER_RESET_SECONDS: Segundos entre sondas con el circuito abierto (por defecto 10)
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class DatabaseUnavailableError(Exception):
+    """La consulta no se ejecutó (circuito abierto) o falló por un problema de la base de datos"""
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, latency_threshold_ms: float = 2000,
+                 reset_timeout: float = 10, probe: Optional[Callable[[], Any]] = None,
+                 name: str = "neo4j"):
+        """
+        Inicializar circuit breaker
+
+        Args:
+            failure_threshold: Fallos (o consultas lentas) seguidos que abren el circuito
+            latency_threshold_ms: Duración a partir de la cual una consulta cuenta como fallo
+            reset_timeout: Segundos con el circuito abierto antes de cada sonda o prueba
+            probe: Función que lanza excepción si la base de datos no responde (ver set_probe)
+            name: Nombre para el hilo de la sonda y el log
+        """
+        self.failure_threshold = failure_threshold
+        self.latency_threshold_ms = latency_threshold_ms
+        self.reset_timeout = reset_timeout
+        self.probe = probe
+        self.name = name
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._probe_thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    def set_probe(self, probe: Callable[[], Any]):
+        self.probe = probe
+
+    def allow_request(self) -> bool:
+        """
+        Decidir si una consulta puede ir a Neo4j
+
+        En semiabierto solo pasa una consulta de prueba a la vez
+        """
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self.state == OPEN and self.probe is None and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, elapsed_ms: float):
+        """Registrar una consulta terminada (las lentas cuentan como fallo)"""
+        if not self.enabled:
+            return
+        if elapsed_ms >= self.latency_threshold_ms:
+            self.slow_calls += 1
+            self._record_failure(f"consulta lenta ({elapsed_ms:.0f} ms)")
+            return
+        with self._lock:
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            if self.state != CLOSED:
+                self.state = CLOSED
+                self.opened_at = None
+                logger.info("Circuito %s cerrado: Neo4j responde de nuevo", self.name)
+
+    def record_failure(self, error: Exception):
+        """Registrar una consulta fallida"""
+        if not self.enabled:
+            return
+        self.failures += 1
+        self._record_failure(str(error))
+
+    def _record_failure(self, reason: str):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                logger.warning("Circuito %s abierto tras %d fallos seguidos: %s",
+                               self.name, self.consecutive_failures, reason)
+                self._start_probe()
+
+    def _start_probe(self):
+        """Lanzar el hilo de sondas si hay sonda y no está corriendo (con el lock tomado)"""
+        if self.probe is None or self._stop.is_set():
+            return
+        if self._probe_thread is not None and self._probe_thread.is_alive():
+            return
+        self._probe_thread = threading.Thread(target=self._probe_loop, name=f"{self.name}-breaker-probe", daemon=True)
+        self._probe_thread.start()
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.reset_timeout):
+            with self._lock:
+                if self.state != OPEN:
+                    return
+            try:
+                self.probe()
+            except Exception as e:
+                logger.debug("Sonda del circuito %s sin respuesta: %s", self.name, e)
+                continue
+            with self._lock:
+                if self.state == OPEN:
+                    self.state = HALF_OPEN
+                    logger.info("Circuito %s semiabierto: la sonda respondió", self.name)
+            return
+
+    def close(self):
+        """Detener el hilo de sondas"""
+        self._stop.set()
+        if self._probe_thread is not None:
+            self._probe_thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+                'failures': self.failures,
+                'slow_calls': self.slow_calls,
+                'open_for': round(time.monotonic() - self.opened_at, 1) if self.opened_at else None
+            }
+
+def breaker_from_env(name: str = "neo4j") -> CircuitBreaker:
+    """Circuit breaker configurado con las variables de entorno"""
+    return CircuitBreaker(
+        failure_threshold=int(os.environ.get("RECOMMENDATION_BREAKER_FAILURES", "5")),
+        latency_threshold_ms=float(os.environ.get("RECOMMENDATION_BREAKER_LATENCY_MS", "2000")),
+        reset_timeout=float(os.environ.get("RECOMMENDATION_BREAKER_RESET_SECONDS", "10")),
+        name=name
+    )
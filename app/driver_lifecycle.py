@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Ciclo de vida de la conexión a Neo4j
+El recomendador se crea en un hilo de fondo al arrancar la aplicación en vez de en la
+primera petición: si Neo4j no responde, se reintenta con espera exponencial (con jitter)
+hasta conseguirlo, y mientras tanto las peticiones usan las recomendaciones de respaldo.
+Tras conectar se ejecuta el calentamiento (ver CarRecommender.warm_up) sin bloquear a nadie
+
+Las lecturas usan transacciones de lectura (execute_read) y las escrituras de escritura
+(execute_write): con la URI de enrutamiento neo4j:// el driver envía las lecturas a los
+seguidores de un clúster y las escrituras al líder; con una sola instancia funciona igual
+
+Variables de entorno:
+    NEO4J_URI: URI de conexión (por defecto neo4j://localhost:7687, fake://... para el driver simulado)
+    NEO4J_DATABASE: Base de datos (por defecto la del servidor; indicarla ahorra un viaje al enrutar)
+    NEO4J_MAX_POOL_SIZE: Conexiones máximas del pool (por defecto 100)
+    NEO4J_ACQUISITION_TIMEOUT: Segundos de espera por una conexión libre (por defecto 60)
+    NEO4J_MAX_CONNECTION_LIFETIME: Segundos antes de renovar una conexión (por defecto 3600)
+    NEO4J_CONNECTION_TIMEOUT: Segundos para abrir una conexión nueva (por defecto 5)
+    NEO4J_MAX_RETRY_SECONDS: Tiempo máximo de reintentos de execute_read/execute_write (por defecto 2)
+    NEO4J_CONNECT_WAIT: Segundos que la primera petición espera al primer intento (por defecto 5)
+    NEO4J_RECONNECT_MIN_SECONDS: Espera tras el primer fallo (por defecto 1)
+    NEO4J_RECONNECT_MAX_SECONDS: Espera máxima entre reintentos (por defecto 60)
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+# URI de enrutamiento: lecturas repartidas entre los miembros del clúster
+DEFAULT_URI = "neo4j://localhost:7687"
+
+def uri_from_env() -> str:
+    return os.environ.get("NEO4J_URI", DEFAULT_URI)
+
+def session_config_from_env() -> Dict[str, Any]:
+    """Opciones de driver.session(): la base de datos si está configurada"""
+    database = os.environ.get("NEO4J_DATABASE")
+    return {'database': database} if database else {}
+
+def pool_config_from_env() -> Dict[str, Any]:
+    """Configuración del pool para GraphDatabase.driver / AsyncGraphDatabase.driver"""
+    return {
+        'max_connection_pool_size': int(os.environ.get("NEO4J_MAX_POOL_SIZE", "100")),
+        'connection_acquisition_timeout': float(os.environ.get("NEO4J_ACQUISITION_TIMEOUT", "60")),
+        'max_connection_lifetime': float(os.environ.get("NEO4J_MAX_CONNECTION_LIFETIME", "3600")),
+        'connection_timeout': float(os.environ.get("NEO4J_CONNECTION_TIMEOUT", "5")),
+        # execute_read reintenta los errores transitorios: acotado para no esquivar el circuit breaker
+        'max_transaction_retry_time': float(os.environ.get("NEO4J_MAX_RETRY_SECONDS", "2"))
+    }
+
+class ManagedConnection:
+    """
+    Instancia conectada a Neo4j creada en segundo plano, con reintentos
+
+    get() nunca bloquea más de connect_wait segundos (y solo mientras dura el primer
+    intento): después devuelve la instancia o None si todavía no hay conexión
+    """
+
+    def __init__(self, factory: Callable[[], Any], warm_up: Optional[Callable[[Any], None]] = None,
+                 connect_wait: float = 5, min_backoff: float = 1, max_backoff: float = 60,
+                 name: str = "neo4j"):
+        """
+        Args:
+            factory: Función sin argumentos que crea la instancia (lanza excepción si no conecta)
+            warm_up: Función que recibe la instancia recién creada (se ejecuta en el mismo hilo)
+            connect_wait: Segundos que get() espera al primer intento de conexión
+            min_backoff: Espera tras el primer fallo
+            max_backoff: Espera máxima entre reintentos
+            name: Nombre para los hilos y el log
+        """
+        self.factory = factory
+        self.warm_up = warm_up
+        self.connect_wait = connect_wait
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.name = name
+        self.instance = None
+        self.state = 'idle'  # idle, connecting, retrying, warming_up, connected, closed
+        self.attempts = 0
+        self.failures = 0
+        self.last_error = None
+        self.connected_at = None
+        self.next_attempt_at = None
+        self._first_attempt = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Lanzar el hilo de conexión (idempotente)"""
+        with self._lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-connect", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        backoff = self.min_backoff
+        while not self._stop.is_set():
+            self.state = 'connecting'
+            self.attempts += 1
+            try:
+                instance = self.factory()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                delay = backoff * random.uniform(0.5, 1.0)
+                self.next_attempt_at = time.time() + delay
+                self.state = 'retrying'
+                logger.warning("Sin conexión a Neo4j (%s, intento %d), reintento en %.1fs: %s",
+                               self.name, self.attempts, delay, e)
+                self._first_attempt.set()
+                self._stop.wait(delay)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            with self._lock:
+                if self._stop.is_set():
+                    instance.close()
+                    return
+                self.instance = instance
+                self.connected_at = time.time()
+                self.next_attempt_at = None
+            self._first_attempt.set()
+            logger.info("Conexión a Neo4j lista (%s) tras %d intentos", self.name, self.attempts)
+
+            if self.warm_up is not None:
+                self.state = 'warming_up'
+                try:
+                    self.warm_up(instance)
+                except Exception as e:
+                    logger.warning("Calentamiento de la conexión incompleto (%s): %s", self.name, e)
+            if not self._stop.is_set():
+                self.state = 'connected'
+            return
+
+    def get(self, wait: Optional[float] = None):
+        """
+        Instancia conectada o None (las peticiones usan entonces el respaldo)
+
+        Args:
+            wait: Segundos de espera al primer intento (por defecto connect_wait)
+        """
+        self.start()
+        if self.instance is None:
+            self._first_attempt.wait(self.connect_wait if wait is None else wait)
+        return self.instance
+
+    @property
+    def connected(self) -> bool:
+        return self.instance is not None
+
+    def close(self, timeout: float = 5):
+        """Detener los reintentos y cerrar la instancia"""
+        self._stop.set()
+        self.state = 'closed'
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._lock:
+            instance, self.instance = self.instance, None
+        if instance is not None:
+            instance.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'connected': self.connected,
+            'attempts': self.attempts,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'connected_at': self.connected_at,
+            'next_attempt_in': round(max(self.next_attempt_at - time.time(), 0), 1) if self.next_attempt_at else None
+        }
@@ -0,0 +1,976 @@
+#!/usr/bin/env python3
+"""
+Driver de Neo4j simulado en memoria para pruebas y benchmarks
+Implementa el subconjunto de GraphDatabase.driver(...).session().run() que usa el proyecto
+sobre un grafo en memoria de autos, con latencia configurable por consulta
+
+Uso:
+    driver = driver_from_uri("fake://setup?latency_ms=2")
+    recommender = CarRecommender(None, None, None, driver=driver)
+
+    async_driver = async_driver_from_uri("fake://setup?latency_ms=2")  # Interfaz de AsyncGraphDatabase
+
+Fuentes de datos (host de la URI):
+    setup      datos de setup_neo4j_database.py (por defecto)
+    export     nodos de export.csv
+    synthetic  catálogo aleatorio (parámetros cars y seed)
+"""
+
+import ast
+import asyncio
+import random
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from urllib.parse import urlparse, parse_qs
+
+from shared import car_tags
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Etiqueta de categoría -> (relación desde Auto, propiedad identificadora)
+CATEGORY_SCHEMA = {
+    'Marca': ('ES_MARCA', 'nombre'),
+    'Tipo': ('ES_TIPO', 'categoria'),
+    'Combustible': ('USA_COMBUSTIBLE', 'tipo'),
+    'Transmision': ('TIENE_TRANSMISION', 'tipo')
+}
+RELATION_LABELS = {relation: label for label, (relation, _) in CATEGORY_SCHEMA.items()}
+
+class FakeQueryError(Exception):
+    """Consulta no soportada por el grafo simulado"""
+
+class FakeRecord(dict):
+    """Registro con acceso por clave, como neo4j.Record"""
+
+    def data(self) -> Dict[str, Any]:
+        return dict(self)
+
+    def value(self, key=0):
+        if isinstance(key, int):
+            return list(self.values())[key]
+        return self[key]
+
+class FakeSummary:
+    """Resumen mínimo de una consulta (con EXPLAIN/PROFILE, un plan de un solo operador)"""
+
+    def __init__(self, query: str, elapsed_ms: float, rows: int = 0):
+        self.query = query
+        self.plan = None
+        self.profile = None
+        self.result_available_after = elapsed_ms
+        self.result_consumed_after = 0
+
+        mode = query.lstrip()[:8].upper()
+        if mode.startswith('EXPLAIN') or mode.startswith('PROFILE'):
+            # Mismas claves que el plan del driver oficial; el motor simulado no tiene operadores reales
+            self.plan = {'operatorType': 'FakeScan', 'identifiers': [], 'args': {'runtime': 'fake'}, 'children': []}
+        if mode.startswith('PROFILE'):
+            self.profile = dict(self.plan, rows=rows, dbHits=0, time=int(elapsed_ms * 1_000_000))
+
+class FakeResult:
+    def __init__(self, records: List[FakeRecord], summary: FakeSummary):
+        self._records = records
+        self._summary = summary
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def single(self) -> Optional[FakeRecord]:
+        return self._records[0] if self._records else None
+
+    def data(self) -> List[Dict[str, Any]]:
+        return [record.data() for record in self._records]
+
+    def values(self) -> List[List[Any]]:
+        return [list(record.values()) for record in self._records]
+
+    def consume(self) -> FakeSummary:
+        return self._summary
+
+class FakeGraph:
+    """Grafo en memoria con el esquema Auto/Marca/Tipo/Combustible/Transmision"""
+
+    def __init__(self):
+        self.cars = {}  # id -> propiedades del auto
+        self.links = {}  # id -> {relación: valor de la categoría}
+        self.categories = {label: {} for label in CATEGORY_SCHEMA}  # etiqueta -> valor -> propiedades
+        self.catalog_version = 0  # :CatalogVersion (ver shared/catalog_version.py)
+        self.catalog_changes = []  # :CatalogChange como (versión, acción, id del auto)
+        self.lock = threading.RLock()
+
+    # ===== Escritura =====
+
+    def clear(self):
+        with self.lock:
+            self.cars.clear()
+            self.links.clear()
+            for nodes in self.categories.values():
+                nodes.clear()
+            self.catalog_version = 0
+            self.catalog_changes.clear()
+
+    def merge_category(self, label: str, value: Any, properties: Dict[str, Any] = None):
+        if label not in self.categories:
+            raise FakeQueryError(f"Etiqueta no soportada: {label}")
+        with self.lock:
+            node = self.categories[label].setdefault(value, {CATEGORY_SCHEMA[label][1]: value})
+            if properties:
+                node.update(properties)
+
+    def upsert_car(self, properties: Dict[str, Any]):
+        car_id = properties.get('id')
+        with self.lock:
+            car = self.cars.setdefault(car_id, {})
+            car.update({key: value for key, value in properties.items() if value is not None})
+            self.links.setdefault(car_id, {})
+
+    def link(self, car_id: Any, relation: str, value: Any, create_category: bool = True) -> bool:
+        label = RELATION_LABELS.get(relation)
+        if label is None:
+            raise FakeQueryError(f"Relación no soportada: {relation}")
+        with self.lock:
+            if car_id not in self.cars or value is None:
+                return False
+            if value not in self.categories[label]:
+                if not create_category:
+                    return False
+                self.merge_category(label, value)
+            self.links[car_id][relation] = value
+            return True
+
+    def unlink(self, car_id: Any, relation: str) -> int:
+        with self.lock:
+            return 0 if self.links.get(car_id, {}).pop(relation, None) is None else 1
+
+    def record_catalog_change(self, action: str, car_id: Any) -> int:
+        with self.lock:
+            self.catalog_version += 1
+            self.catalog_changes.append((self.catalog_version, action, car_id))
+            return self.catalog_version
+
+    def delete_car(self, car_id: Any) -> int:
+        with self.lock:
+            if car_id not in self.cars:
+                return 0
+            del self.cars[car_id]
+            del self.links[car_id]
+            return 1
+
+    # ===== Lectura =====
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Autos con sus categorías resueltas, una fila por auto"""
+        with self.lock:
+            rows = []
+            for car_id, car in self.cars.items():
+                row = dict(car)
+                row['_links'] = dict(self.links.get(car_id, {}))
+                rows.append(row)
+            return rows
+
+    def relationship_count(self) -> int:
+        with self.lock:
+            return sum(len(links) for links in self.links.values())
+
+    def label_count(self, label: str) -> int:
+        with self.lock:
+            if label == 'Auto':
+                return len(self.cars)
+            return len(self.categories.get(label, {}))
+
+    # ===== Fuentes de datos =====
+
+    @classmethod
+    def from_setup_script(cls) -> 'FakeGraph':
+        """Poblar el grafo ejecutando setup_neo4j_database.py contra el driver simulado"""
+        if str(PROJECT_ROOT) not in sys.path:
+            sys.path.insert(0, str(PROJECT_ROOT))
+        from setup_neo4j_database import Neo4jSetup
+
+        graph = cls()
+        setup = Neo4jSetup.__new__(Neo4jSetup)
+        setup.driver = FakeDriver(graph)
+        setup.setup_complete_database()
+        return graph
+
+    @classmethod
+    def from_export_csv(cls, path: Path = PROJECT_ROOT / "export.csv") -> 'FakeGraph':
+        """Cargar los nodos de export.csv (el archivo no incluye relaciones)"""
+        graph = cls()
+        node_pattern = re.compile(r'\(:(\w+) \{(.*)\}\)')
+
+        with open(path, encoding="utf-8-sig") as export_file:
+            for number, line in enumerate(export_file):
+                match = node_pattern.search(line)
+                if not match:
+                    continue
+                label, body = match.groups()
+                properties = {}
+                for item in re.split(r',(?=[\wñ]+: )', body):
+                    key, _, raw = item.partition(': ')
+                    properties[key] = _parse_literal(raw)
+
+                if label == 'Auto':
+                    properties.setdefault('id', f"export_{number}")
+                    graph.upsert_car(properties)
+                elif label in CATEGORY_SCHEMA:
+                    graph.merge_category(label, properties.get(CATEGORY_SCHEMA[label][1]), properties)
+        return graph
+
+    @classmethod
+    def synthetic(cls, cars: int = 10000, seed: int = 0) -> 'FakeGraph':
+        """Generar un catálogo aleatorio reproducible"""
+        rng = random.Random(seed)
+        brands = ["Toyota", "Honda", "Ford", "BMW", "Mercedes-Benz", "Audi", "Volkswagen", "Nissan",
+                  "Hyundai", "Kia", "Mazda", "Subaru", "Chevrolet", "Tesla", "Lexus", "Volvo"]
+        types = ["Sedán", "SUV", "Hatchback", "Pickup", "Coupé", "Convertible", "Van", "Wagon"]
+        fuels = ["Gasolina", "Diésel", "Eléctrico", "Híbrido"]
+        transmissions = ["Automática", "Manual", "Semiautomática"]
+        features = ["Aire acondicionado", "Bluetooth", "Cámara trasera", "Asientos de cuero",
+                    "Sistema de sonido premium", "Espacio familiar", "Seguridad avanzada",
+                    "Motor turbo", "Techo panorámico", "Pantalla táctil", "Confort superior"]
+
+        graph = cls()
+        for number in range(1, cars + 1):
+            car_id = f"car_{number}"
+            brand = rng.choice(brands)
+            graph.upsert_car({
+                'id': car_id,
+                'modelo': f"{brand[:3].upper()}-{rng.randint(100, 999)}",
+                'año': rng.randint(2015, 2025),
+                'precio': rng.randrange(12000, 150000, 500),
+                'caracteristicas': rng.sample(features, rng.randint(0, 4))
+            })
+            attributes = {
+                'marca': brand,
+                'tipo': rng.choice(types),
+                'combustible': rng.choice(fuels),
+                'transmision': rng.choice(transmissions)
+            }
+            for relation, value in zip(('ES_MARCA', 'ES_TIPO', 'USA_COMBUSTIBLE', 'TIENE_TRANSMISION'), attributes.values()):
+                graph.link(car_id, relation, value)
+            # Etiquetas y atributos desnormalizados, como los guardan los scripts de carga
+            car = graph.cars[car_id]
+            car.update(attributes)
+            car['etiquetas'] = car_tags.compute_tags(car)
+        return graph
+
+def _parse_literal(raw: str) -> Any:
+    """Interpretar un valor de export.csv (números o texto sin comillas)"""
+    raw = raw.strip()
+    try:
+        return ast.literal_eval(raw)
+    except (ValueError, SyntaxError):
+        return raw
+
+# ===== Motor de consultas =====
+
+_PROPERTY_FILTER = re.compile(r'(\w+)\.([\wñ]+) (>=|<=|<>|>|<|=|IN) \$(\w+)')
+_RETURN_ITEM = re.compile(r'^(.+?) (?:as|AS) (\w+)$')
+
+# ----- Expresiones (WITH, ORDER BY y proyecciones de la consulta compacta) -----
+
+_EXPRESSION_TOKEN = re.compile(r'\s*(\$\w+|\w+\.[\wñ]+|\d+\.\d+|\d+|<>|>=|<=|[-+*/%()=<>,\[\]]|\w+)')
+_EXPRESSION_WORDS = {'AND': 'and', 'OR': 'or', 'NOT': 'not', 'IN': 'in',
+                     'true': 'True', 'false': 'False', 'null': 'None'}
+_EXPRESSION_FUNCTIONS = {
+    'toFloat': lambda value: None if value is None else float(value),
+    'size': lambda value: None if value is None else len(value),
+    'coalesce': lambda *values: next((value for value in values if value is not None), None),
+    'round': lambda value, digits=0: None if value is None else round(value, digits)
+}
+_compiled_expressions = {}
+
+def _translate_expression(tokens: List[str], position: int, stop: tuple = ()) -> tuple:
+    """Traducir tokens Cypher a Python hasta encontrar un token de stop (CASE se traduce a if/else)"""
+    parts = []
+    while position < len(tokens) and tokens[position] not in stop:
+        token = tokens[position]
+        following = tokens[position + 1] if position + 1 < len(tokens) else None
+        if token == 'CASE':
+            branches, default = [], 'None'
+            position += 1
+            while tokens[position] == 'WHEN':
+                condition, position = _translate_expression(tokens, position + 1, ('THEN',))
+                value, position = _translate_expression(tokens, position + 1, ('WHEN', 'ELSE', 'END'))
+                branches.append((condition, value))
+            if tokens[position] == 'ELSE':
+                default, position = _translate_expression(tokens, position + 1, ('END',))
+            translated = default
+            for condition, value in reversed(branches):
+                translated = f"(({value}) if ({condition}) else {translated})"
+            parts.append(translated)
+        elif token.startswith('$'):
+            parts.append(f"_p[{token[1:]!r}]")
+        elif re.fullmatch(r'\w+\.[\wñ]+', token) and not token[0].isdigit():
+            variable, prop = token.split('.', 1)
+            parts.append(f"_v({variable!r}, {prop!r})")
+        elif token in _EXPRESSION_WORDS:
+            parts.append(_EXPRESSION_WORDS[token])
+        elif token in _EXPRESSION_FUNCTIONS and following == '(':
+            parts.append(f"_f[{token!r}]")
+        elif re.fullmatch(r'[A-Za-z_]\w*', token):
+            parts.append(f"_w({token!r})")
+        else:
+            parts.append({'=': '==', '<>': '!='}.get(token, token))
+        position += 1
+    return " ".join(parts), position
+
+def _compile_expression(expression: str):
+    """
+    Compilar una expresión Cypher sencilla a una función (propiedad, variable, parámetros) -> valor
+
+    Soporta aritmética, comparaciones, AND/OR/NOT, IN, CASE WHEN y las funciones de
+    _EXPRESSION_FUNCTIONS: lo que usan las consultas del proyecto, no Cypher completo
+    """
+    compiled = _compiled_expressions.get(expression)
+    if compiled is None:
+        tokens = _EXPRESSION_TOKEN.findall(expression)
+        source, _ = _translate_expression(tokens, 0)
+        compiled = eval(f"lambda _v, _w, _p: {source}", {'__builtins__': {}, '_f': _EXPRESSION_FUNCTIONS})
+        _compiled_expressions[expression] = compiled
+    return compiled
+
+def _split_return_items(clause: str) -> List[str]:
+    """Separar los elementos de un RETURN respetando paréntesis"""
+    items, depth, current = [], 0, ''
+    for char in clause:
+        if char == ',' and depth == 0:
+            items.append(current.strip())
+            current = ''
+            continue
+        depth += (char == '(') - (char == ')')
+        current += char
+    if current.strip():
+        items.append(current.strip())
+    return items
+
+def _compare(value: Any, operator: str, expected: Any) -> bool:
+    if value is None:
+        return False
+    if operator == 'IN':
+        return value in expected
+    if operator == '=':
+        return value == expected
+    if operator == '<>':
+        return value != expected
+    try:
+        if operator == '>=':
+            return value >= expected
+        if operator == '<=':
+            return value <= expected
+        if operator == '>':
+            return value > expected
+        return value < expected
+    except TypeError:
+        return False
+
+class _QueryEngine:
+    """Interpreta las formas de consulta Cypher que usa el proyecto"""
+
+    def __init__(self, graph: FakeGraph):
+        self.graph = graph
+        self.handlers = [
+            (re.compile(r'^(CREATE|DROP) (CONSTRAINT|INDEX)'), self._schema),
+            (re.compile(r'^MATCH \(n\) (CALL \{ WITH n )?DETACH DELETE n'), self._clear),
+            (re.compile(r'^RETURN (.+)$'), self._literal),
+            (re.compile(r'^CALL dbms\.components\(\)'), self._components),
+            (re.compile(r'^CALL db\.labels\(\)'), self._labels),
+            (re.compile(r'^CALL db\.relationshipTypes\(\)'), self._relationship_types),
+            (re.compile(r'^MERGE \(v:CatalogVersion \{id: \$version_id\}\) SET'), self._record_catalog_change),
+            (re.compile(r'^MATCH \(c:CatalogChange\) WHERE c\.version <= \$oldest DELETE c$'), self._prune_catalog_changes),
+            (re.compile(r'^MATCH \(v:CatalogVersion \{id: \$version_id\}\) RETURN'), self._catalog_version),
+            (re.compile(r'^MATCH \(c:CatalogChange\) WHERE c\.version > \$since RETURN'), self._catalog_changes),
+            (re.compile(r'^UNWIND \$(\w+) AS (\w+) (CREATE|MERGE) \(a:Auto'), self._unwind_cars),
+            (re.compile(r'^UNWIND \$(\w+) AS (\w+) MERGE \(:(\w+) \{(\w+): \2\}\)$'), self._unwind_categories),
+            (re.compile(r'^UNWIND \$(\w+) AS (\w+) MATCH \(a:Auto \{id: \2\.id\}\) SET (.+)$'), self._unwind_set),
+            (re.compile(r'^MERGE \((\w+):(\w+) \{(\w+): \$(\w+)\}\)$'), self._merge_category),
+            (re.compile(r'^CREATE \(a:Auto \{(.+)\}\)$'), self._create_car),
+            (re.compile(r'^MATCH \(a:Auto \{id: \$(\w+)\}\) (MATCH|MERGE) \((\w+):(\w+) \{(\w+): \$(\w+)\}\) '
+                        r'MERGE \(a\)-\[:(\w+)\]->\(\3\)$'), self._link),
+            (re.compile(r'^MATCH \(a:Auto \{id: \$(\w+)\}\)-\[r:(\w+)\]->\(\) DELETE r$'), self._unlink),
+            (re.compile(r'^MATCH \(a:Auto \{id: \$(\w+)\}\) DETACH DELETE a RETURN count\(a\) as (\w+)$'), self._delete_car),
+            (re.compile(r'^MATCH \(a:Auto \{id: \$(\w+)\}\) SET (.+?)( RETURN a)?$'), self._set_car),
+            (re.compile(r'^MATCH \(\)-\[r\]->\(\) RETURN count\(r\) as (\w+)$'), self._relationship_count),
+            (re.compile(r'^MATCH \((\w+)(?::(\w+))?\) RETURN count\(\1\) as (\w+)$'), self._label_count),
+            (re.compile(r'^MATCH \(a:Auto\)-\[:(\w+)\]->\((\w+):(\w+)\) RETURN \2\.(\w+) as (\w+), '
+                        r'count\(a\) as (\w+) ORDER BY \6 DESC$'), self._group_count),
+            (re.compile(r'^MATCH \((\w+):(\w+)\) RETURN (DISTINCT )?\1\.(\w+) as (\w+)( ORDER BY .+)?$'), self._category_values),
+            (re.compile(r'^MATCH \(a:Auto\) (WHERE .+ )?RETURN (min|max|avg|count)\('), self._aggregate),
+            (re.compile(r'^MATCH \(a:Auto\b.* RETURN a \{'), self._ranked_rows),
+            (re.compile(r'^MATCH \(a:Auto[ )]'), self._car_rows),
+        ]
+
+    def run(self, query: str, parameters: Dict[str, Any]) -> List[FakeRecord]:
+        text = " ".join(query.split())
+        text = re.sub(r'^(EXPLAIN|PROFILE) ', '', text)
+        for pattern, handler in self.handlers:
+            match = pattern.search(text)
+            if match:
+                return handler(match, text, parameters)
+        raise FakeQueryError(f"Consulta no soportada por el driver simulado: {text[:120]}")
+
+    # ----- Esquema y utilidades -----
+
+    def _schema(self, match, text, parameters):
+        return []
+
+    def _clear(self, match, text, parameters):
+        self.graph.clear()
+        return []
+
+    def _literal(self, match, text, parameters):
+        record = FakeRecord()
+        for item in _split_return_items(match.group(1)):
+            aliased = _RETURN_ITEM.match(item)
+            expression, alias = aliased.groups() if aliased else (item, item)
+            if expression.startswith('$'):
+                record[alias] = parameters.get(expression[1:])
+            else:
+                record[alias] = _parse_literal(expression)
+        return [record]
+
+    def _components(self, match, text, parameters):
+        return [FakeRecord(name="Neo4j Kernel", versions=["5-fake"], edition="fake")]
+
+    def _labels(self, match, text, parameters):
+        labels = ['Auto'] + [label for label in CATEGORY_SCHEMA if self.graph.categories[label]]
+        return [FakeRecord(label=label) for label in labels]
+
+    def _relationship_types(self, match, text, parameters):
+        return [FakeRecord(relationshipType=relation) for relation in RELATION_LABELS]
+
+    # ----- Escritura -----
+
+    def _unwind_cars(self, match, text, parameters):
+        rows = parameters.get(match.group(1)) or []
+        variable = match.group(2)
+        auto_map = re.search(r'\(a:Auto \{(.+?)\}\)', text).group(1)
+        assignments = re.findall(r'([\wñ]+): ' + variable + r'\.([\wñ]+)', auto_map)
+        assignments += re.findall(r'a\.([\wñ]+) = ' + variable + r'\.([\wñ]+)', text)
+        links = [
+            (CATEGORY_SCHEMA[label][0], field)
+            for label, field in re.findall(r'\(\w+:(\w+) \{\w+: ' + variable + r'\.(\w+)\}\)', text)
+            if label in CATEGORY_SCHEMA
+        ]
+
+        for row in rows:
+            self.graph.upsert_car({key: row.get(field) for key, field in assignments})
+            for relation, field in links:
+                self.graph.link(row.get('id'), relation, row.get(field))
+        return [FakeRecord(created=len(rows))]
+
+    def _unwind_categories(self, match, text, parameters):
+        for value in parameters.get(match.group(1)) or []:
+            self.graph.merge_category(match.group(3), value)
+        return []
+
+    def _unwind_set(self, match, text, parameters):
+        variable = match.group(2)
+        assignments = re.findall(r'a\.([\wñ]+) = ' + variable + r'\.([\wñ]+)', match.group(3))
+        for row in parameters.get(match.group(1)) or []:
+            if row.get('id') in self.graph.cars:
+                self.graph.upsert_car({'id': row.get('id'), **{key: row.get(field) for key, field in assignments}})
+        return []
+
+    def _merge_category(self, match, text, parameters):
+        self.graph.merge_category(match.group(2), parameters.get(match.group(4)))
+        return []
+
+    def _create_car(self, match, text, parameters):
+        properties = {
+            key: parameters.get(param)
+            for key, param in re.findall(r'([\wñ]+): \$(\w+)', match.group(1))
+        }
+        self.graph.upsert_car(properties)
+        return []
+
+    def _link(self, match, text, parameters):
+        car_param, mode, _, label, _, value_param, relation = match.groups()
+        self.graph.link(parameters.get(car_param), relation, parameters.get(value_param),
+                        create_category=(mode == 'MERGE'))
+        return []
+
+    def _unlink(self, match, text, parameters):
+        self.graph.unlink(parameters.get(match.group(1)), match.group(2))
+        return []
+
+    def _delete_car(self, match, text, parameters):
+        deleted = self.graph.delete_car(parameters.get(match.group(1)))
+        return [FakeRecord({match.group(2): deleted})]
+
+    def _set_car(self, match, text, parameters):
+        car_id = parameters.get(match.group(1))
+        if car_id not in self.graph.cars:
+            return []
+        properties = {
+            key: parameters.get(param)
+            for key, param in re.findall(r'a\.([\wñ]+) = \$(\w+)', match.group(2))
+        }
+        properties['id'] = car_id
+        self.graph.upsert_car(properties)
+        return [FakeRecord(a=dict(self.graph.cars[car_id]))]
+
+    # ----- Versión del catálogo -----
+
+    def _record_catalog_change(self, match, text, parameters):
+        version = self.graph.record_catalog_change(parameters.get('action'), parameters.get('car_id'))
+        return [FakeRecord(version=version)]
+
+    def _prune_catalog_changes(self, match, text, parameters):
+        with self.graph.lock:
+            self.graph.catalog_changes[:] = [change for change in self.graph.catalog_changes
+                                             if change[0] > parameters['oldest']]
+        return []
+
+    def _catalog_version(self, match, text, parameters):
+        version = self.graph.catalog_version
+        return [FakeRecord(version=version)] if version else []
+
+    def _catalog_changes(self, match, text, parameters):
+        with self.graph.lock:
+            changes = [change for change in self.graph.catalog_changes if change[0] > parameters['since']]
+        return [FakeRecord(version=version, action=action, car_id=car_id) for version, action, car_id in changes]
+
+    # ----- Conteos y agregados -----
+
+    def _relationship_count(self, match, text, parameters):
+        return [FakeRecord({match.group(1): self.graph.relationship_count()})]
+
+    def _label_count(self, match, text, parameters):
+        label = match.group(2)
+        if label is None:
+            total = self.graph.label_count('Auto') + sum(self.graph.label_count(l) for l in CATEGORY_SCHEMA)
+        else:
+            total = self.graph.label_count(label)
+        return [FakeRecord({match.group(3): total})]
+
+    def _group_count(self, match, text, parameters):
+        relation, _, _, _, value_alias, count_alias = match.groups()
+        counts = {}
+        for row in self.graph.rows():
+            value = row['_links'].get(relation)
+            if value is not None:
+                counts[value] = counts.get(value, 0) + 1
+        ordered = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return [FakeRecord({value_alias: value, count_alias: count}) for value, count in ordered]
+
+    def _category_values(self, match, text, parameters):
+        _, label, _, prop, alias, order = match.groups()
+        nodes = self.graph.categories.get(label, {})
+        values = [node.get(prop) for node in nodes.values()]
+        if order:
+            values.sort(key=lambda value: (value is None, value))
+        return [FakeRecord({alias: value}) for value in values]
+
+    def _aggregate(self, match, text, parameters):
+        rows = self._filter_rows(text, parameters)
+        record = FakeRecord()
+        return_clause = text.split(' RETURN ', 1)[1]
+        for item in _split_return_items(return_clause):
+            function, prop, alias = re.match(r'(\w+)\((?:\w+\.)?([\wñ]+)\) as (\w+)', item).groups()
+            values = [row.get(prop) for row in rows if row.get(prop) is not None]
+            if function == 'count':
+                record[alias] = len(rows) if prop == 'a' else len(values)
+            elif not values:
+                record[alias] = None
+            elif function == 'min':
+                record[alias] = min(values)
+            elif function == 'max':
+                record[alias] = max(values)
+            else:
+                record[alias] = sum(values) / len(values)
+        return [record]
+
+    # ----- Filas de autos -----
+
+    def _aliases(self, text: str) -> Dict[str, str]:
+        """Variable de la consulta -> etiqueta (a -> Auto, m -> Marca, ...)"""
+        return dict(re.findall(r'\((\w+):(\w+)[ )]', text))
+
+    def _resolve(self, row: Dict[str, Any], aliases: Dict[str, str], variable: str, prop: str) -> Any:
+        label = aliases.get(variable, 'Auto')
+        if label == 'Auto':
+            return row.get(prop)
+        relation, key = CATEGORY_SCHEMA[label]
+        value = row['_links'].get(relation)
+        if value is None:
+            return None
+        return self.graph.categories[label].get(value, {}).get(prop)
+
+    def _filter_rows(self, text: str, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        aliases = self._aliases(text)
+        head = text.split(' RETURN ', 1)[0]
+        head = re.split(r' (?:OPTIONAL MATCH|WITH) ', head, maxsplit=1)[0]
+
+        # Las relaciones de un MATCH obligatorio excluyen autos sin esa categoría
+        required = [relation for relation in re.findall(r'\(a\)-\[:(\w+)\]->', head)]
+        filters = [
+            (variable, prop, operator, param)
+            for variable, prop, operator, param in _PROPERTY_FILTER.findall(head)
+            if parameters.get(param) is not None
+        ]
+        # Propiedades en el patrón del nodo: MATCH (a:Auto {id: $car_id})
+        filters += [('a', prop, '=', param) for prop, param in re.findall(r'\(a:Auto \{([\wñ]+): \$(\w+)\}\)', head)]
+        not_null = re.findall(r'(\w+)\.([\wñ]+) IS NOT NULL', head)
+        is_null = re.findall(r'(\w+)\.([\wñ]+) IS NULL', head)
+
+        rows = []
+        for row in self.graph.rows():
+            if any(relation not in row['_links'] for relation in required):
+                continue
+            if any(self._resolve(row, aliases, v, p) is None for v, p in not_null):
+                continue
+            if any(self._resolve(row, aliases, v, p) is not None for v, p in is_null):
+                continue
+            if all(_compare(self._resolve(row, aliases, v, p), op, parameters[param]) for v, p, op, param in filters):
+                rows.append(row)
+        return rows
+
+    def _car_rows(self, match, text, parameters):
+        if ' RETURN ' not in text:
+            raise FakeQueryError(f"Consulta no soportada por el driver simulado: {text[:120]}")
+
+        aliases = self._aliases(text)
+        rows = self._filter_rows(text, parameters)
+
+        return_clause = text.rsplit(' RETURN ', 1)[1]
+        tail = re.search(r' (ORDER BY .+|SKIP .+|LIMIT .+)$', return_clause)
+        if tail:
+            return_clause = return_clause[:tail.start()]
+        # ORDER BY/SKIP/LIMIT pueden venir tras el RETURN o en un WITH previo (paginación)
+        tail_text = text
+
+        columns = []
+        for item in _split_return_items(return_clause):
+            aliased = _RETURN_ITEM.match(item)
+            expression, alias = aliased.groups() if aliased else (item, item)
+            columns.append((expression, alias))
+
+        def project(row):
+            record = FakeRecord()
+            for expression, alias in columns:
+                reference = re.fullmatch(r'(\w+)\.([\wñ]+)', expression)
+                record[alias] = self._resolve(row, aliases, *reference.groups()) if reference else None
+            return record
+
+        records = [project(row) for row in rows]
+
+        order = re.search(r'ORDER BY (\w+)(?:\.([\wñ]+))?( ASC| DESC)?', tail_text)
+        if order:
+            variable, prop, direction = order.groups()
+            descending = (direction or '').strip() == 'DESC'
+            if prop is None:
+                key = lambda pair: pair[1].get(variable)
+            else:
+                key = lambda pair: self._resolve(pair[0], aliases, variable, prop)
+            pairs = sorted(zip(rows, records), key=lambda pair: (key(pair) is None, key(pair) if key(pair) is not None else 0),
+                           reverse=descending)
+            records = [record for _, record in pairs]
+
+        skip = re.search(r'SKIP (\d+|\$\w+)', tail_text)
+        if skip:
+            records = records[self._number(skip.group(1), parameters):]
+        limit = re.search(r'LIMIT (\d+|\$\w+)', tail_text)
+        if limit:
+            records = records[:self._number(limit.group(1), parameters)]
+        return records
+
+    def _ranked_rows(self, match, text, parameters):
+        """
+        Consulta compacta: WITH con expresiones (y WHERE opcional), ORDER BY, LIMIT y RETURN a {proyección de mapa}
+
+        Las variables de categoría se resuelven con _resolve como en _car_rows
+        """
+        aliases = self._aliases(text)
+        rows = self._filter_rows(text, parameters)
+
+        with_clauses = re.findall(r' WITH (.+?)(?= WITH | ORDER BY | SKIP | LIMIT | RETURN )', text)
+        computed = []  # (alias, expresión compilada) en orden de aparición
+        conditions = []  # WHERE tras un WITH (ej: paginación por clave)
+        for clause in with_clauses:
+            if ' WHERE ' in clause:
+                clause, condition = clause.split(' WHERE ', 1)
+                conditions.append(_compile_expression(condition))
+            for item in _split_return_items(clause):
+                aliased = _RETURN_ITEM.match(item)
+                if aliased and aliased.group(1) != aliased.group(2):
+                    computed.append((aliased.group(2), _compile_expression(aliased.group(1))))
+
+        order = re.search(r' ORDER BY (.+?)(?= SKIP | LIMIT | RETURN )', text)
+        order_keys = []
+        for item in _split_return_items(order.group(1)) if order else []:
+            direction = re.search(r' (ASC|DESC)$', item)
+            expression = item[:direction.start()] if direction else item
+            order_keys.append((_compile_expression(expression), bool(direction) and direction.group(1) == 'DESC'))
+
+        projection = re.search(r' RETURN a \{(.+)\} (?:as|AS) (\w+)$', text)
+        items = []
+        for item in _split_return_items(projection.group(1)):
+            if item.startswith('.'):
+                items.append((item[1:], None))
+            else:
+                key, expression = item.split(':', 1)
+                items.append((key.strip(), _compile_expression(expression.strip())))
+
+        scored = []
+        for row in rows:
+            values = {}
+            resolve = lambda variable, prop, row=row: self._resolve(row, aliases, variable, prop)
+            lookup = values.get
+            for alias, expression in computed:
+                values[alias] = expression(resolve, lookup, parameters)
+            if all(condition(resolve, lookup, parameters) for condition in conditions):
+                scored.append((row, values, resolve))
+
+        # Orden estable por cada clave, de la última a la primera (null es el mayor valor, como en Neo4j)
+        for expression, descending in reversed(order_keys):
+            keyed = [(expression(resolve, values.get, parameters), (row, values, resolve))
+                     for row, values, resolve in scored]
+            present = sorted((pair for pair in keyed if pair[0] is not None), key=lambda pair: pair[0], reverse=descending)
+            nulls = [entry for value, entry in keyed if value is None]
+            present = [entry for _, entry in present]
+            scored = nulls + present if descending else present + nulls
+
+        skip = re.search(r' SKIP (\d+|\$\w+)', text)
+        if skip:
+            scored = scored[self._number(skip.group(1), parameters):]
+        limit = re.search(r' LIMIT (\d+|\$\w+)', text)
+        if limit:
+            scored = scored[:self._number(limit.group(1), parameters)]
+
+        records = []
+        for row, values, resolve in scored:
+            projected = {
+                key: row.get(key) if expression is None else expression(resolve, values.get, parameters)
+                for key, expression in items
+            }
+            records.append(FakeRecord({projection.group(2): projected}))
+        return records
+
+    @staticmethod
+    def _number(token: str, parameters: Dict[str, Any]) -> int:
+        return int(parameters[token[1:]]) if token.startswith('$') else int(token)
+
+# ===== API compatible con el driver de Neo4j =====
+
+class FakeTransaction:
+    def __init__(self, session: 'FakeSession'):
+        self._session = session
+
+    def run(self, query: str, parameters: Dict[str, Any] = None, **kwargs) -> FakeResult:
+        return self._session.run(query, parameters, **kwargs)
+
+class FakeSession:
+    def __init__(self, driver: 'FakeDriver', **config):
+        self._driver = driver
+        self.config = config
+        self._open = True
+        driver.session_opened()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._open:
+            self._open = False
+            self._driver.session_closed()
+
+    def run(self, query: str, parameters: Dict[str, Any] = None, **kwargs) -> FakeResult:
+        query = getattr(query, 'text', query)  # neo4j.Query(texto, timeout=...): el timeout no se simula
+        params = dict(parameters or {})
+        params.update(kwargs)
+
+        start = time.perf_counter()
+        self._driver.simulate_latency()
+        records = self._driver.engine.run(query, params)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._driver.queries_run += 1
+        summary = FakeSummary(query, elapsed_ms, len(records))
+        if summary.plan is not None and summary.profile is None:
+            records = []  # EXPLAIN solo planifica, no devuelve filas
+        return FakeResult(records, summary)
+
+    def execute_read(self, transaction_function, *args, **kwargs):
+        self._driver.read_transactions += 1
+        return transaction_function(FakeTransaction(self), *args, **kwargs)
+
+    def execute_write(self, transaction_function, *args, **kwargs):
+        self._driver.write_transactions += 1
+        with self._driver.graph.lock:
+            return transaction_function(FakeTransaction(self), *args, **kwargs)
+
+    # Nombres anteriores a neo4j 5
+    read_transaction = execute_read
+    write_transaction = execute_write
+
+class FakeDriver:
+    def __init__(self, graph: FakeGraph = None, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+        """
+        Inicializar driver simulado
+
+        Args:
+            graph: Grafo en memoria (por defecto, los datos de setup_neo4j_database.py)
+            latency_ms: Latencia inyectada en cada consulta (simula el viaje de ida y vuelta)
+            jitter_ms: Variación aleatoria máxima sobre la latencia
+        """
+        self.graph = graph if graph is not None else FakeGraph.from_setup_script()
+        self.engine = _QueryEngine(self.graph)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.queries_run = 0
+        self.read_transactions = 0  # execute_read/execute_write: en un clúster, seguidores o líder
+        self.write_transactions = 0
+        self.closed = False
+        self.active_sessions = 0
+        self._sessions_lock = threading.Lock()
+
+    def session_opened(self):
+        with self._sessions_lock:
+            self.active_sessions += 1
+
+    def session_closed(self):
+        with self._sessions_lock:
+            self.active_sessions -= 1
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Sesiones abiertas como si fueran conexiones del pool (ver metrics.driver_pool_stats)"""
+        return {'in_use': self.active_sessions, 'idle': 0, 'max_size': None}
+
+    def latency_seconds(self) -> float:
+        delay = self.latency_ms
+        if self.jitter_ms:
+            delay += random.uniform(0, self.jitter_ms)
+        return delay / 1000
+
+    def simulate_latency(self):
+        delay = self.latency_seconds()
+        if delay > 0:
+            time.sleep(delay)
+
+    def session(self, **config) -> FakeSession:
+        return FakeSession(self, **config)
+
+    def verify_connectivity(self):
+        return None
+
+    def close(self):
+        self.closed = True
+
+# ===== API compatible con AsyncGraphDatabase =====
+
+class FakeAsyncResult:
+    def __init__(self, result: FakeResult):
+        self._records = list(result)
+        self._summary = result.consume()
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for record in self._records:
+            yield record
+
+    async def single(self) -> Optional[FakeRecord]:
+        return self._records[0] if self._records else None
+
+    async def data(self) -> List[Dict[str, Any]]:
+        return [record.data() for record in self._records]
+
+    async def consume(self) -> FakeSummary:
+        return self._summary
+
+class FakeAsyncTransaction:
+    def __init__(self, session: 'FakeAsyncSession'):
+        self._session = session
+
+    async def run(self, query: str, parameters: Dict[str, Any] = None, **kwargs) -> FakeAsyncResult:
+        return await self._session.run(query, parameters, **kwargs)
+
+class FakeAsyncSession:
+    def __init__(self, driver: 'FakeAsyncDriver', **config):
+        self._driver = driver
+        self._session = FakeSession(driver, **config)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        self._session.close()
+
+    async def run(self, query: str, parameters: Dict[str, Any] = None, **kwargs) -> FakeAsyncResult:
+        # La latencia se espera sin bloquear el event loop; la consulta en memoria es inmediata
+        delay = self._driver.latency_seconds()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return FakeAsyncResult(self._session.run(query, parameters, **kwargs))
+
+    async def execute_read(self, transaction_function, *args, **kwargs):
+        self._driver.read_transactions += 1
+        return await transaction_function(FakeAsyncTransaction(self), *args, **kwargs)
+
+    async def execute_write(self, transaction_function, *args, **kwargs):
+        self._driver.write_transactions += 1
+        return await transaction_function(FakeAsyncTransaction(self), *args, **kwargs)
+
+class FakeAsyncDriver(FakeDriver):
+    """Driver simulado con la interfaz de AsyncGraphDatabase.driver(...)"""
+
+    def simulate_latency(self):
+        pass  # FakeAsyncSession.run espera la latencia con asyncio.sleep
+
+    def session(self, **config) -> FakeAsyncSession:
+        return FakeAsyncSession(self, **config)
+
+    async def verify_connectivity(self):
+        return None
+
+    async def close(self):
+        self.closed = True
+
+def driver_from_uri(uri: str) -> FakeDriver:
+    """
+    Crear un driver simulado a partir de una URI fake://
+
+    Ejemplos: fake://setup, fake://export?latency_ms=5, fake://synthetic?cars=10000&seed=1
+    """
+    parsed = urlparse(uri)
+    if parsed.scheme != 'fake':
+        raise ValueError(f"URI no soportada por el driver simulado: {uri}")
+
+    options = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+    source = parsed.netloc or 'setup'
+
+    if source == 'setup':
+        graph = FakeGraph.from_setup_script()
+    elif source == 'export':
+        graph = FakeGraph.from_export_csv(Path(options.get('path', PROJECT_ROOT / "export.csv")))
+    elif source == 'synthetic':
+        graph = FakeGraph.synthetic(int(options.get('cars', 10000)), int(options.get('seed', 0)))
+    else:
+        raise ValueError(f"Fuente de datos desconocida: {source}")
+
+    return FakeDriver(
+        graph,
+        latency_ms=float(options.get('latency_ms', 0)),
+        jitter_ms=float(options.get('jitter_ms', 0))
+    )
+
+def async_driver_from_uri(uri: str) -> FakeAsyncDriver:
+    """Crear un driver simulado asíncrono a partir de una URI fake:// (mismas opciones)"""
+    driver = driver_from_uri(uri)
+    return FakeAsyncDriver(driver.graph, latency_ms=driver.latency_ms, jitter_ms=driver.jitter_ms)
+
+def is_fake_uri(uri: Optional[str]) -> bool:
+    """Indica si la URI apunta al driver simulado"""
+    return bool(uri) and uri.startswith('fake://')
@@ -0,0 +1,565 @@
+#!/usr/bin/env python3
+"""
+Tabla materializada de los mejores autos por combinación de preferencias
+El espacio de preferencias es enumerable (marcas, tramos de presupuesto del formulario,
+combustibles, tipos y transmisiones): un proceso por lotes calcula, para cada celda
+(marca, tipo, combustible, transmisión, tramo), los top_n autos ordenados por la parte
+variable de la puntuación y los guarda en un archivo binario compacto que la aplicación
+abre con mmap. En la petición se fusionan las listas de las marcas (y tipos) elegidos
+y solo se decodifican los autos necesarios: la consulta a Neo4j pasa a ser una búsqueda
+
+Dentro de una celda los filtros son iguales para todos los autos, así que los puntos de
+marca, tipo, combustible y transmisión son constantes y el orden depende solo del precio
+(relativo al máximo del tramo) y del número de características. La bonificación
+demográfica se aplica después sobre los candidatos fusionados: la búsqueda toma autos
+hasta que ninguno de los restantes puede superar al último de los `limit` mejores aun con
+la bonificación máxima; si para eso hace falta un auto que quedó fuera de una celda
+truncada, devuelve None y el recomendador consulta Neo4j como siempre. El resultado es el
+mismo que el del modo de consulta compacto (todos los autos que cumplen los filtros)
+
+La tabla guarda la versión del catálogo con la que se escribió (shared/catalog_version.py).
+sync la pone al día con el registro de cambios del Gestionador: update_cars recalcula solo
+las celdas de las marcas de los autos cambiados (antes y después del cambio) y reescribe
+el archivo de forma atómica; una carga masiva, muchos cambios o un registro incompleto
+reconstruyen la tabla. Si otro proceso ya la escribió a la versión actual no se toca
+
+Formato (little-endian):
+    cabecera   HEADER: magia, longitud de los metadatos, celdas, entradas, autos, longitud de los registros
+    metadatos  JSON: top_n, built_at, catalog_version, vocabularios de marca/tipo/combustible/transmisión y tramos
+    celdas     CELL_STRUCT por celda (inicio en entradas, autos, truncada), en orden de cell_id
+    entradas   uint32 por auto de cada celda (índice en autos), en orden de puntuación
+    autos      CAR_STRUCT por auto (precio, características, posición del registro)
+    registros  JSON por auto con las columnas de CATALOG_QUERY
+"""
+
+import heapq
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import List, Dict, Any, Optional, Iterable
+
+from catalog_snapshot import CATALOG_QUERY
+from shared import car_tags, catalog_version
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TOPN\x00\x00\x00\x01'
+HEADER = struct.Struct('<8sIIIII')
+CELL_STRUCT = struct.Struct('<IHH')   # inicio, autos, 1 si la celda tiene más autos que top_n
+CAR_STRUCT = struct.Struct('<dIII')   # precio, características, inicio y longitud del registro
+ENTRY_STRUCT = struct.Struct('<I')
+
+# Autos guardados por celda
+DEFAULT_TOP_N = 100
+
+# Tramos del formulario de presupuesto (templates/budget.html) como los interpreta parse_budget_range
+BUDGET_BUCKETS = (
+    ("15000-30000", 15000, 30000),
+    ("30000-50000", 30000, 50000),
+    ("50000-100000", 50000, 100000),
+    ("100000+", 100000, float('inf'))
+)
+
+# Margen para el redondeo a 2 decimales de la puntuación
+SCORE_EPSILON = 0.01
+
+# Autos cambiados a partir de los cuales sync reconstruye la tabla en vez de ir marca por marca
+REBUILD_AFTER_CHANGES = 50
+
+# Autos de algunas marcas (para recalcular sus celdas)
+BRAND_CATALOG_QUERY = """
+    MATCH (a:Auto)-[:ES_MARCA]->(m:Marca)
+    WHERE m.nombre IN $brands
+    OPTIONAL MATCH (a)-[:ES_TIPO]->(t:Tipo)
+    OPTIONAL MATCH (a)-[:USA_COMBUSTIBLE]->(c:Combustible)
+    OPTIONAL MATCH (a)-[:TIENE_TRANSMISION]->(tr:Transmision)
+    RETURN a.id as id, a.modelo as modelo, a.año as año, a.precio as precio,
+           a.caracteristicas as caracteristicas, a.etiquetas as etiquetas,
+           m.nombre as marca, t.categoria as tipo,
+           c.tipo as combustible, tr.tipo as transmision
+"""
+
+# Marca actual de algunos autos (ninguna fila para los eliminados)
+CAR_BRAND_QUERY = """
+    MATCH (a:Auto)
+    WHERE a.id IN $car_ids
+    OPTIONAL MATCH (a)-[:ES_MARCA]->(m:Marca)
+    RETURN a.id as id, m.nombre as marca
+"""
+
+def partial_score(price: float, feature_count: int, max_price: float) -> float:
+    """Parte de la puntuación que varía dentro de una celda (precio y características)"""
+    score = feature_count * 2
+    if max_price != float('inf'):
+        score += (1 - price / max_price) * 30
+    return score
+
+def budget_buckets_for(price: float, budgets) -> List[int]:
+    """Índices de los tramos (1..n, 0 = cualquiera) que incluyen el precio"""
+    return [0] + [position + 1 for position, (_, low, high) in enumerate(budgets) if low <= price <= high]
+
+# ===== Construcción =====
+
+def prepare_rows(rows: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Filas de CATALOG_QUERY por id (sin autos sin precio, con etiquetas calculadas si faltan)"""
+    prepared = {}
+    for row in rows:
+        row = dict(row)
+        if row['precio'] is None:
+            continue
+        if row['etiquetas'] is None:
+            row['etiquetas'] = car_tags.compute_tags(row)
+        prepared[row['id']] = row
+    return prepared
+
+def build_cells(rows: Dict[str, Dict[str, Any]], top_n: int = DEFAULT_TOP_N,
+                budgets=BUDGET_BUCKETS) -> Dict[tuple, tuple]:
+    """
+    Calcular las celdas de un conjunto de autos
+
+    Returns:
+        {(marca, tipo, combustible, transmisión, tramo): (ids ordenados, truncada)} donde
+        tipo, combustible y transmisión pueden ser None (cualquiera) y tramo es el índice
+        del tramo (0 = cualquiera)
+    """
+    members: Dict[tuple, List[str]] = {}
+    for car_id, row in rows.items():
+        for car_type in {row['tipo'], None}:
+            for fuel in {row['combustible'], None}:
+                for transmission in {row['transmision'], None}:
+                    for bucket in budget_buckets_for(row['precio'], budgets):
+                        members.setdefault((row['marca'], car_type, fuel, transmission, bucket), []).append(car_id)
+
+    cells = {}
+    for key, car_ids in members.items():
+        max_price = budgets[key[4] - 1][2] if key[4] else float('inf')
+        ranked = heapq.nsmallest(top_n, car_ids, key=lambda car_id: cell_sort_key(rows[car_id], max_price))
+        cells[key] = (ranked, len(car_ids) > top_n)
+    return cells
+
+def cell_sort_key(row: Dict[str, Any], max_price: float) -> tuple:
+    """Orden dentro de una celda: puntuación desc, precio asc, id"""
+    return (-partial_score(row['precio'], len(row['caracteristicas'] or []), max_price), row['precio'], str(row['id']))
+
+def write_table(path: str, cells: Dict[tuple, tuple], rows: Dict[str, Dict[str, Any]],
+                top_n: int = DEFAULT_TOP_N, budgets=BUDGET_BUCKETS, version: int = 0) -> Dict[str, Any]:
+    """
+    Escribir la tabla en path de forma atómica (archivo temporal + os.replace)
+
+    version es la versión del catálogo leída antes que las filas: la tabla tiene al menos
+    los cambios hasta esa versión
+
+    Los lectores que ya tienen el archivo anterior abierto con mmap siguen usándolo
+    hasta que recargan (MaterializedTopN.reload_if_changed)
+    """
+    # Vocabularios: las marcas incluyen None (autos sin marca) porque nunca son "cualquiera"
+    brands = sorted({key[0] for key in cells}, key=lambda value: (value is None, value or ''))
+    vocabularies = [sorted({key[position] for key in cells if key[position] is not None}) for position in (1, 2, 3)]
+    meta = {
+        'top_n': top_n,
+        'built_at': time.time(),
+        'catalog_version': version,
+        'brands': brands,
+        'types': vocabularies[0],
+        'fuels': vocabularies[1],
+        'transmissions': vocabularies[2],
+        'budgets': [[label, low, None if high == float('inf') else high] for label, low, high in budgets]
+    }
+    layout = TableLayout(meta)
+
+    # Solo se guardan los autos que aparecen en alguna celda
+    car_ids = sorted({car_id for ranked, _ in cells.values() for car_id in ranked}, key=str)
+    car_index = {car_id: position for position, car_id in enumerate(car_ids)}
+
+    directory = bytearray(CELL_STRUCT.size * layout.cell_count)
+    entries = bytearray()
+    for key, (ranked, truncated) in cells.items():
+        CELL_STRUCT.pack_into(directory, CELL_STRUCT.size * layout.cell_id(*key),
+                              len(entries) // ENTRY_STRUCT.size, len(ranked), int(truncated))
+        entries += struct.pack(f'<{len(ranked)}I', *(car_index[car_id] for car_id in ranked))
+
+    cars = bytearray()
+    records = bytearray()
+    for car_id in car_ids:
+        row = rows[car_id]
+        record = json.dumps(row, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        cars += CAR_STRUCT.pack(float(row['precio']), len(row['caracteristicas'] or []), len(records), len(record))
+        records += record
+
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    header = HEADER.pack(MAGIC, len(meta_bytes), layout.cell_count, len(entries) // ENTRY_STRUCT.size,
+                         len(car_ids), len(records))
+
+    directory_name = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(prefix='.topn-', dir=directory_name)
+    try:
+        with os.fdopen(descriptor, 'wb') as output:
+            for part in (header, meta_bytes, directory, entries, cars, records):
+                output.write(part)
+        os.replace(temporary, path)
+    except Exception:
+        os.unlink(temporary)
+        raise
+
+    logger.info("Tabla top-N escrita en %s: %d celdas con autos, %d autos, %d bytes", path, len(cells),
+                len(car_ids), HEADER.size + len(meta_bytes) + len(directory) + len(entries) + len(cars) + len(records))
+    return {'cells': len(cells), 'cars': len(car_ids), 'entries': len(entries) // ENTRY_STRUCT.size,
+            'catalog_version': version}
+
+def read_catalog(driver, query: str, database: Optional[str] = None, **parameters) -> tuple:
+    """(versión del catálogo, filas) en una misma transacción de lectura"""
+    def read(tx):
+        version = catalog_version.read_version(tx)
+        return version, [dict(record) for record in tx.run(query, parameters)]
+
+    with driver.session(**({'database': database} if database else {})) as session:
+        return session.execute_read(read)
+
+def rebuild(driver, path: str, top_n: int = DEFAULT_TOP_N, database: Optional[str] = None) -> Dict[str, Any]:
+    """Construir la tabla completa desde Neo4j"""
+    start = time.perf_counter()
+    version, rows = read_catalog(driver, CATALOG_QUERY, database)
+    rows = prepare_rows(rows)
+    cells = build_cells(rows, top_n)
+    result = write_table(path, cells, rows, top_n, version=version)
+    result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+def update_car(driver, path: str, car_id: str, database: Optional[str] = None) -> Dict[str, Any]:
+    """Actualizar la tabla tras crear, modificar o eliminar un auto (ver update_cars)"""
+    return update_cars(driver, path, [car_id], database)
+
+def update_cars(driver, path: str, car_ids: List[str], database: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Actualizar la tabla tras crear, modificar o eliminar algunos autos
+
+    Solo cambian las celdas de las marcas anteriores de los autos (si estaban en la tabla)
+    y de las actuales: se recalculan con los autos de esas marcas y el resto se copia del
+    archivo. Sin tabla previa, o si algún auto no tiene marca, se reconstruye completa
+    """
+    if not os.path.exists(path):
+        return rebuild(driver, path, database=database)
+
+    start = time.perf_counter()
+    table = MaterializedTopN(path)
+    try:
+        top_n = table.top_n
+        budgets = table.budgets
+        cells, rows = table.export()
+    finally:
+        table.close()
+
+    # La versión se lee antes que los autos: un cambio posterior se vuelve a aplicar en el próximo sync
+    version, current = read_catalog(driver, CAR_BRAND_QUERY, database, car_ids=list(car_ids))
+    brands = {row['marca'] for row in current}
+    brands.update(rows[car_id]['marca'] for car_id in car_ids if car_id in rows)
+    if None in brands:
+        return rebuild(driver, path, top_n, database)
+    if not brands:
+        # Autos eliminados que no estaban en ninguna celda: solo cambia la versión
+        result = write_table(path, cells, rows, top_n, budgets, version)
+        result['brands'] = []
+        result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+    # Celdas de las demás marcas sin cambios; las de las marcas afectadas se recalculan
+    cells = {key: value for key, value in cells.items() if key[0] not in brands}
+    rows = {key: row for key, row in rows.items() if row['marca'] not in brands}
+    _, brand_rows = read_catalog(driver, BRAND_CATALOG_QUERY, database, brands=sorted(brands))
+    brand_rows = prepare_rows(brand_rows)
+    cells.update(build_cells(brand_rows, top_n, budgets))
+    rows.update(brand_rows)
+
+    result = write_table(path, cells, rows, top_n, budgets, version)
+    result['brands'] = sorted(brands)
+    result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+def sync(driver, path: str, top_n: int = DEFAULT_TOP_N, database: Optional[str] = None,
+         max_changes: int = REBUILD_AFTER_CHANGES) -> Dict[str, Any]:
+    """
+    Poner la tabla al día con el registro de cambios del catálogo
+
+    Lee la versión guardada en el archivo y los cambios posteriores: si ya está al día
+    (por ejemplo, porque otro proceso de la aplicación la acaba de reescribir) no hace nada;
+    si el registro no cubre todos los cambios, hay una carga masiva o más de max_changes
+    autos cambiados, reconstruye la tabla; si no, recalcula las marcas afectadas
+    """
+    if not os.path.exists(path):
+        return rebuild(driver, path, top_n, database)
+
+    table = MaterializedTopN(path)
+    try:
+        top_n = table.top_n
+        since = table.catalog_version
+    finally:
+        table.close()
+
+    with driver.session(**({'database': database} if database else {})) as session:
+        version, changes = session.execute_read(catalog_version.read_state, since)
+    if version == since:
+        return {'up_to_date': True, 'catalog_version': version}
+
+    pending = catalog_version.pending_changes(since, version, changes)
+    car_ids = None if pending is None else {car_id for _, car_id in pending}
+    if car_ids is None or None in car_ids or len(car_ids) > max_changes:
+        return rebuild(driver, path, top_n, database)
+    return update_cars(driver, path, sorted(car_ids, key=str), database)
+
+# ===== Lectura =====
+
+class TableLayout:
+    """Vocabularios y numeración de las celdas (0 = cualquiera en tipo, combustible, transmisión y tramo)"""
+
+    def __init__(self, meta: Dict[str, Any]):
+        self.brands = {value: position for position, value in enumerate(meta['brands'])}
+        self.types = {value: position + 1 for position, value in enumerate(meta['types'])}
+        self.fuels = {value: position + 1 for position, value in enumerate(meta['fuels'])}
+        self.transmissions = {value: position + 1 for position, value in enumerate(meta['transmissions'])}
+        self.budgets = [(label, low, float('inf') if high is None else high) for label, low, high in meta['budgets']]
+        self.sizes = (len(self.brands), len(self.types) + 1, len(self.fuels) + 1,
+                      len(self.transmissions) + 1, len(self.budgets) + 1)
+        self.cell_count = self.sizes[0] * self.sizes[1] * self.sizes[2] * self.sizes[3] * self.sizes[4]
+
+    def cell_id(self, brand, car_type, fuel, transmission, bucket: int) -> int:
+        """Posición de la celda a partir de sus valores (None = cualquiera)"""
+        return self.cell_id_from_codes(self.brands[brand], self.types.get(car_type, 0),
+                                       self.fuels.get(fuel, 0), self.transmissions.get(transmission, 0), bucket)
+
+    def cell_id_from_codes(self, brand: int, car_type: int, fuel: int, transmission: int, bucket: int) -> int:
+        _, types, fuels, transmissions, budgets = self.sizes
+        return (((brand * types + car_type) * fuels + fuel) * transmissions + transmission) * budgets + bucket
+
+    def bucket_for(self, min_price: float, max_price: float) -> Optional[int]:
+        """Tramo de un rango de presupuesto normalizado (None si no es uno de los tramos)"""
+        if min_price == 0 and max_price == float('inf'):
+            return 0
+        for position, (_, low, high) in enumerate(self.budgets):
+            if low == min_price and high == max_price:
+                return position + 1
+        return None
+
+class MaterializedTopN:
+    def __init__(self, path: str, check_interval: float = 5):
+        """
+        Abrir la tabla con mmap
+
+        Args:
+            path: Archivo escrito por write_table
+            check_interval: Segundos entre comprobaciones de si el archivo cambió en disco
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self.stale = False
+        self._lock = threading.Lock()
+        self._mmap = None
+        self._file = None
+        self._checked_at = 0
+        self._open()
+
+    def _open(self):
+        with open(self.path, 'rb') as source:
+            stat = os.fstat(source.fileno())
+            mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, meta_length, cell_count, entry_count, car_count, records_length = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC:
+            mapped.close()
+            raise ValueError(f"{self.path} no es una tabla top-N")
+        meta = json.loads(mapped[HEADER.size:HEADER.size + meta_length].decode('utf-8'))
+        layout = TableLayout(meta)
+        if layout.cell_count != cell_count:
+            mapped.close()
+            raise ValueError(f"{self.path}: directorio de celdas inconsistente")
+
+        previous = self._mmap
+        with self._lock:
+            self._mmap = mapped
+            self._stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self.meta = meta
+            self.layout = layout
+            self.car_count = car_count
+            self._cells_at = HEADER.size + meta_length
+            self._entries_at = self._cells_at + cell_count * CELL_STRUCT.size
+            self._cars_at = self._entries_at + entry_count * ENTRY_STRUCT.size
+            self._records_at = self._cars_at + car_count * CAR_STRUCT.size
+            self.loaded_at = time.time()
+            self.stale = False
+        # El mmap anterior se libera cuando no quedan referencias (búsquedas en curso)
+        if previous is not None:
+            logger.info("Tabla top-N recargada: %s (%d autos)", self.path, car_count)
+
+    @property
+    def top_n(self) -> int:
+        return self.meta['top_n']
+
+    @property
+    def budgets(self) -> List[tuple]:
+        return self.layout.budgets
+
+    @property
+    def catalog_version(self) -> Optional[int]:
+        """Versión del catálogo de la tabla (None en tablas escritas antes de guardarla)"""
+        return self.meta.get('catalog_version')
+
+    def reload(self):
+        """Volver a abrir el archivo (tras reescribirlo)"""
+        self._open()
+
+    def reload_if_changed(self) -> bool:
+        """Recargar si el archivo cambió en disco (como mucho cada check_interval segundos)"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+        try:
+            stat = os.stat(self.path)
+            if (stat.st_ino, stat.st_mtime_ns, stat.st_size) == self._stat:
+                return False
+            self._open()
+            return True
+        except Exception as e:
+            logger.error("No se pudo recargar la tabla top-N %s: %s", self.path, e)
+            return False
+
+    def invalidate(self):
+        """Dejar de responder hasta la próxima recarga (ej: falló una actualización incremental)"""
+        self.stale = True
+
+    def close(self):
+        with self._lock:
+            mapped, self._mmap = self._mmap, None
+        if mapped is not None:
+            mapped.close()
+
+    def _cell(self, mapped, cell_id: int) -> tuple:
+        start, count, truncated = CELL_STRUCT.unpack_from(mapped, self._cells_at + cell_id * CELL_STRUCT.size)
+        return struct.unpack_from(f'<{count}I', mapped, self._entries_at + start * ENTRY_STRUCT.size), bool(truncated)
+
+    def _car(self, mapped, car_index: int) -> tuple:
+        return CAR_STRUCT.unpack_from(mapped, self._cars_at + car_index * CAR_STRUCT.size)
+
+    def _record(self, mapped, car_index: int) -> Dict[str, Any]:
+        _, _, offset, length = self._car(mapped, car_index)
+        start = self._records_at + offset
+        return json.loads(mapped[start:start + length].decode('utf-8'))
+
+    def lookup(self, preferences: Dict, max_bonus: float = 0, limit: int = 10,
+               min_version: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Candidatos suficientes para los `limit` mejores resultados
+
+        Args:
+            preferences: Salida de normalize_preferences
+            max_bonus: Mayor bonificación demográfica que se sumará después
+            limit: Recomendaciones que se devolverán
+            min_version: Versión del catálogo que ya conoce el llamador (None = cualquiera)
+
+        Returns:
+            Filas de CATALOG_QUERY ordenadas por precio (como la consulta de candidatos),
+            o None si la tabla no puede responder con exactitud (presupuesto fuera de los
+            tramos, celda truncada o tabla anterior a min_version)
+        """
+        self.reload_if_changed()
+        with self._lock:
+            mapped, layout, version = self._mmap, self.layout, self.meta.get('catalog_version')
+        if mapped is None or self.stale:
+            return None
+        if min_version is not None and (version is None or version < min_version):
+            # Falta algún cambio ya visto por el llamador: se responde cuando se ponga al día
+            self.misses += 1
+            return None
+
+        bucket = layout.bucket_for(preferences['min_price'], preferences['max_price'])
+        if bucket is None:
+            self.misses += 1
+            return None
+        max_price = layout.budgets[bucket - 1][2] if bucket else float('inf')
+
+        # Valores sin autos en la tabla no aportan celdas (la consulta tampoco devolvería nada)
+        brands = [layout.brands[brand] for brand in preferences['brands'] if brand in layout.brands] \
+            if preferences['brands'] else list(layout.brands.values())
+        types = [layout.types[car_type] for car_type in preferences['types'] if car_type in layout.types] \
+            if preferences['types'] else [0]
+        fuel = layout.fuels.get(preferences['fuel'], -1) if preferences['fuel'] else 0
+        transmission = layout.transmissions.get(preferences['transmission'], -1) if preferences['transmission'] else 0
+        if fuel < 0 or transmission < 0:
+            self.hits += 1
+            return []
+
+        # Cada celda es una lista ordenada por (-puntuación, precio, índice); las truncadas
+        # terminan con un centinela que representa a los autos que no se guardaron
+        def scored(entries, truncated):
+            key = None
+            for car_index in entries:
+                price, feature_count, _, _ = self._car(mapped, car_index)
+                key = (-partial_score(price, feature_count, max_price), price, car_index)
+                yield key
+            if truncated and key is not None:
+                yield (key[0], float('inf'), -1)
+
+        streams = []
+        for brand in brands:
+            for car_type in types:
+                entries, truncated = self._cell(mapped, layout.cell_id_from_codes(brand, car_type, fuel, transmission, bucket))
+                if entries:
+                    streams.append(scored(entries, truncated))
+
+        taken = []
+        for key in heapq.merge(*streams):
+            # Ninguno de los restantes alcanza al último de los `limit` mejores
+            if len(taken) >= limit and -key[0] + max_bonus + SCORE_EPSILON < -taken[limit - 1][0]:
+                break
+            if key[2] < 0:
+                self.misses += 1
+                return None
+            taken.append(key)
+
+        self.hits += 1
+        taken.sort(key=lambda key: (key[1], key[2]))
+        return [self._record(mapped, key[2]) for key in taken]
+
+    def export(self) -> tuple:
+        """Celdas y filas de la tabla en el formato de build_cells (para update_car)"""
+        with self._lock:
+            mapped, layout = self._mmap, self.layout
+        brands = list(layout.brands)
+        axes = [[None] + list(vocabulary) for vocabulary in (layout.types, layout.fuels, layout.transmissions)]
+        rows = {}
+        cells = {}
+        for brand_code, brand in enumerate(brands):
+            for type_code, car_type in enumerate(axes[0]):
+                for fuel_code, fuel in enumerate(axes[1]):
+                    for transmission_code, transmission in enumerate(axes[2]):
+                        for bucket in range(len(layout.budgets) + 1):
+                            cell_id = layout.cell_id_from_codes(brand_code, type_code, fuel_code, transmission_code, bucket)
+                            entries, truncated = self._cell(mapped, cell_id)
+                            if not entries:
+                                continue
+                            ranked = []
+                            for car_index in entries:
+                                if car_index not in rows:
+                                    rows[car_index] = self._record(mapped, car_index)
+                                ranked.append(rows[car_index]['id'])
+                            cells[(brand, car_type, fuel, transmission, bucket)] = (ranked, truncated)
+        return cells, {row['id']: row for row in rows.values()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'path': self.path,
+            'cars': self.car_count,
+            'top_n': self.top_n,
+            'built_at': self.meta['built_at'],
+            'catalog_version': self.catalog_version,
+            'loaded_at': self.loaded_at,
+            'stale': self.stale,
+            'hits': self.hits,
+            'misses': self.misses
+        }
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Métricas de la aplicación en formato de texto de Prometheus
+Histogramas de latencia por etapa de la recomendación y por endpoint, contadores y
+valores leídos al momento de exportar (caché, prefetch, pool de conexiones de Neo4j)
+
+Las etapas se miden con stage_timer()/timed(); además de alimentar el histograma, cada
+etapa se acumula en un registro por petición (begin_request/end_request) que app.py
+devuelve en la cabecera Server-Timing
+"""
+
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Callable, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Límites (segundos) pensados para etapas de microsegundos hasta consultas de varios segundos
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Etapas de la petición en curso: nombre -> segundos acumulados
+_request_stages: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar('request_stages', default=None)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # valores de etiquetas -> [conteos por bucket, suma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labelvalues, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labelvalues, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labelnames, labelvalues, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+class Registry:
+    """Métricas propias más colectores que leen valores de otros módulos al exportar"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []  # Funciones sin argumentos -> [(nombre, tipo, ayuda, valor o {etiquetas: valor})]
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], List[Tuple[str, str, str, Any]]]):
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.warning("Colector de métricas falló: %s", e)
+                continue
+            for name, metric_type, documentation, value in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                samples = value if isinstance(value, dict) else {(): value}
+                for labels, sample in samples.items():
+                    label_text = '{' + ','.join(f'{key}="{_escape(val)}"' for key, val in labels) + '}' if labels else ''
+                    lines.append(f"{name}{label_text} {_format_value(sample)}")
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "recommendation_stage_seconds", "Duración de cada etapa de la recomendación", ["stage"]
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Duración de las peticiones HTTP", ["method", "endpoint", "status"]
+))
+REQUESTS_TOTAL = REGISTRY.register(Counter(
+    "http_requests_total", "Peticiones HTTP atendidas", ["method", "endpoint", "status"]
+))
+
+# ===== Tiempos por etapa =====
+
+def record_stage(stage: str, seconds: float):
+    """Registrar la duración de una etapa (histograma y petición en curso)"""
+    STAGE_SECONDS.observe(seconds, stage)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+@contextmanager
+def stage_timer(stage: str):
+    """Medir un bloque de código como etapa"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def timed(stage: str):
+    """Decorador que mide cada llamada a la función (síncrona o async) como etapa"""
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    record_stage(stage, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record_stage(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def begin_request() -> contextvars.Token:
+    """Empezar a acumular etapas para la petición en curso"""
+    return _request_stages.set({})
+
+def end_request(token: Optional[contextvars.Token] = None) -> Dict[str, float]:
+    """Terminar la petición en curso y devolver sus etapas (segundos)"""
+    stages = _request_stages.get() or {}
+    if token is not None:
+        _request_stages.reset(token)
+    else:
+        _request_stages.set(None)
+    return stages
+
+def observe_request(method: str, endpoint: str, status: int, seconds: float):
+    REQUEST_SECONDS.observe(seconds, method, endpoint, str(status))
+    REQUESTS_TOTAL.inc(method, endpoint, str(status))
+
+def server_timing_header(stages: Dict[str, float]) -> str:
+    """Cabecera Server-Timing (milisegundos) para ver las etapas desde el navegador"""
+    return ', '.join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in stages.items())
+
+# ===== Pool de conexiones =====
+
+def driver_pool_stats(driver) -> Dict[str, Any]:
+    """
+    Conexiones del pool del driver de Neo4j (en uso, libres y máximo)
+
+    El driver oficial no expone estas cifras públicamente: se leen de su pool interno
+    y se devuelve {} si la versión instalada no tiene esa estructura
+    """
+    if driver is None:
+        return {}
+    if hasattr(driver, 'pool_stats'):
+        return driver.pool_stats()
+
+    pool = getattr(driver, '_pool', None)
+    connections = getattr(pool, 'connections', None)
+    if connections is None:
+        return {}
+    try:
+        in_use = idle = 0
+        for address_connections in list(connections.values()):
+            for connection in list(address_connections):
+                if getattr(connection, 'in_use', False):
+                    in_use += 1
+                else:
+                    idle += 1
+        config = getattr(pool, 'pool_config', None)
+        return {
+            'in_use': in_use,
+            'idle': idle,
+            'max_size': getattr(config, 'max_connection_pool_size', None)
+        }
+    except Exception as e:
+        logger.debug("No se pudieron leer las estadísticas del pool: %s", e)
+        return {}
+
+def pool_metric_families(stats: Dict[str, Any], driver_name: str) -> List[Tuple[str, str, str, Any]]:
+    """Familias de métricas para el colector a partir de driver_pool_stats"""
+    if not stats:
+        return []
+    labels = (('driver', driver_name),)
+    families = [
+        ("neo4j_pool_connections_in_use", "gauge", "Conexiones del pool en uso", {labels: stats.get('in_use', 0)}),
+        ("neo4j_pool_connections_idle", "gauge", "Conexiones del pool libres", {labels: stats.get('idle', 0)})
+    ]
+    if stats.get('max_size') is not None:
+        families.append(("neo4j_pool_connections_max", "gauge", "Tamaño máximo del pool", {labels: stats['max_size']}))
+    return families
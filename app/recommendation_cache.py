@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Caché de recomendaciones por preferencias normalizadas
+Caché acotada con expiración (TTL), desalojo LRU y contadores de aciertos/fallos
+
+Las entradas vencidas no se borran hasta que las desaloja el LRU: get_stale() las sigue
+devolviendo para responder mientras Neo4j no está disponible (ver circuit_breaker)
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class RecommendationCache:
+    def __init__(self, max_size: int = 1024, ttl: float = 300):
+        """
+        Inicializar caché
+
+        Args:
+            max_size: Número máximo de combinaciones guardadas
+            ttl: Segundos que una entrada se considera vigente
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_hits = 0
+        self._entries = OrderedDict()  # clave -> (expira_en, recomendaciones)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(preferences: Dict, gender: Optional[str] = None, age_group: Optional[str] = None) -> tuple:
+        """
+        Construir clave a partir de la salida de normalize_preferences
+
+        Las listas se ordenan para que el orden de selección no genere claves distintas
+        """
+        brands = preferences.get('brands')
+        types = preferences.get('types')
+        return (
+            tuple(sorted(brands)) if brands else None,
+            preferences.get('min_price'),
+            preferences.get('max_price'),
+            preferences.get('fuel'),
+            tuple(sorted(types)) if types else None,
+            preferences.get('transmission'),
+            gender,
+            age_group
+        )
+
+    @staticmethod
+    def _copy(recommendations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Copiar resultados para que los llamadores no modifiquen la caché"""
+        return [dict(car) for car in recommendations]
+
+    def get(self, key: tuple) -> Optional[List[Dict[str, Any]]]:
+        """Obtener recomendaciones vigentes para una clave"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._copy(entry[1])
+
+    def get_stale(self, key: tuple) -> Optional[List[Dict[str, Any]]]:
+        """Obtener las últimas recomendaciones guardadas para una clave, aunque hayan vencido"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self.stale_hits += 1
+            return self._copy(entry[1])
+
+    def set(self, key: tuple, recommendations: List[Dict[str, Any]]):
+        """Guardar recomendaciones desalojando la entrada menos usada si hace falta"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, self._copy(recommendations))
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Vaciar la caché (el catálogo cambió)"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+        logger.info("Caché de recomendaciones invalidada")
+
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas de uso de la caché"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'stale_hits': self.stale_hits
+            }
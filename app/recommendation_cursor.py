@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Cursores opacos para paginar recomendaciones
+Las páginas siguen el mismo orden que la lista sin paginar (puntuación desc, puntuación base
+desc, precio asc) con el id como último desempate, y el cursor guarda la clave del último
+auto entregado: la página siguiente son los autos con clave posterior (paginación por clave,
+sin OFFSET), así que cada página solo pide al motor los autos que va a devolver
+
+El cursor también lleva una huella de la búsqueda (preferencias y perfil demográfico):
+un cursor de otra búsqueda se rechaza con InvalidCursorError en vez de mezclar resultados
+"""
+
+import base64
+import hashlib
+import json
+import logging
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class InvalidCursorError(ValueError):
+    """Cursor mal formado o de otra búsqueda"""
+
+def fingerprint(*values) -> str:
+    """Huella corta de los argumentos de la búsqueda (listas sin importar el orden)"""
+    normalized = [sorted(value) if isinstance(value, (list, tuple)) else value for value in values]
+    digest = hashlib.sha1(json.dumps(normalized, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return digest[:12]
+
+def page_key(car: Dict[str, Any]) -> tuple:
+    """
+    Clave (puntuación, bonificación demográfica, precio, id) de un auto
+
+    Con la misma puntuación, menos bonificación es más puntuación base: ordenar por
+    bonificación asc equivale al "puntuación base desc" de la lista sin paginar
+    """
+    return (car.get('similarity_score', 0), car.get('demographic_bonus', 0), car['price'], car['id'])
+
+def sort_key(car: Dict[str, Any]) -> tuple:
+    score, bonus, price, car_id = page_key(car)
+    return (-score, bonus, price, str(car_id))
+
+def encode_cursor(key: tuple, search: str) -> str:
+    payload = json.dumps(list(key) + [search], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str, search: str) -> tuple:
+    """
+    Clave (puntuación, bonificación, precio, id) del último auto de la página anterior
+
+    Raises:
+        InvalidCursorError: El cursor no se puede leer o es de otra búsqueda
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        score, bonus, price, car_id, cursor_search = json.loads(payload)
+        score, bonus, price = float(score), int(bonus), float(price)
+    except Exception as e:
+        raise InvalidCursorError(f"Cursor inválido: {cursor!r}") from e
+    if cursor_search != search:
+        raise InvalidCursorError("El cursor pertenece a otra búsqueda")
+    return score, bonus, price, car_id
+
+def next_cursor(page: List[Dict[str, Any]], has_more: bool, search: str) -> Optional[str]:
+    """Cursor de la página siguiente (None si no hay más autos)"""
+    if not has_more or not page:
+        return None
+    return encode_cursor(page_key(page[-1]), search)
+
+def paginate(recommendations: List[Dict[str, Any]], cursor: Optional[str], page_size: int, search: str) -> tuple:
+    """
+    Paginar una lista ya puntuada (snapshot, respaldo o recommender_minimal)
+
+    Returns:
+        (página, cursor siguiente o None)
+    """
+    ordered = sorted(recommendations, key=sort_key)
+    if cursor:
+        score, bonus, price, car_id = decode_cursor(cursor, search)
+        after = (-score, bonus, price, str(car_id))
+        ordered = [car for car in ordered if sort_key(car) > after]
+    page = ordered[:page_size]
+    return page, next_cursor(page, len(ordered) > page_size, search)
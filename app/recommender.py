@@ -5,32 +5,280 @@ Conecta con la base de datos y genera recomendaciones basadas en las preferencia
 Incluye personalización demográfica por género y edad
 """
 
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, unit_of_work
+import itertools
 import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import List, Dict, Any, Optional
 
+# Ejecutado como script (python app/recommender.py) la raíz del proyecto, con el paquete shared, no está en el path
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fake_neo4j
+import circuit_breaker
+import driver_lifecycle
+import materialized_topn
+import metrics
+import recommendation_cursor
+import scoring
+from candidate_prefetch import CandidatePrefetcher
+from catalog_snapshot import CatalogSnapshot
+from circuit_breaker import CircuitBreaker, DatabaseUnavailableError
+from materialized_topn import MaterializedTopN
+from recommendation_cache import RecommendationCache
+from shared import car_tags, catalog_version, logging_setup
+from shared.catalog_version import CatalogVersionWatcher
+from shared.slow_query_log import get_slow_query_log
+
 # Configurar logging
-logging.basicConfig(level=logging.INFO)
+logging_setup.configure_logging()
 logger = logging.getLogger(__name__)
 
+# Candidatos que devuelve la consulta de recomendaciones (antes de puntuar)
+CANDIDATE_LIMIT = 20
+
+# Recomendaciones que se devuelven al usuario
+RESULT_LIMIT = 10
+
+# "standard": candidatos más baratos y puntuación en Python; "compact": puntuación, orden y límite en Neo4j;
+# "denormalized": como standard pero filtrando por las propiedades de Auto (ver car_attributes)
+QUERY_MODES = ('standard', 'compact', 'denormalized')
+
 class CarRecommender:
-    def __init__(self, uri: str, user: str, password: str):
-        """Inicializar conexión a Neo4j"""
+    def __init__(self, uri: str, user: str, password: str, use_snapshot: bool = False,
+                 snapshot_refresh_interval: Optional[float] = None,
+                 cache_size: int = 1024, cache_ttl: float = 300, driver=None,
+                 prefetch_workers: int = 0, prefetch_ttl: float = 60, query_mode: str = 'standard',
+                 driver_config: Optional[Dict[str, Any]] = None, breaker: Optional[CircuitBreaker] = None,
+                 query_timeout: Optional[float] = None, database: Optional[str] = None,
+                 topn_table: Optional[str] = None, catalog_check_interval: Optional[float] = None):
+        """
+        Inicializar conexión a Neo4j
+        
+        Args:
+            uri: URI de conexión (ej: neo4j://localhost:7687)
+            user: Usuario de Neo4j
+            password: Contraseña de Neo4j
+            use_snapshot: Responder desde un snapshot en memoria del catálogo
+            snapshot_refresh_interval: Segundos entre recargas automáticas del snapshot
+            cache_size: Combinaciones de preferencias en caché (0 = sin caché)
+            cache_ttl: Segundos de vigencia de cada entrada de la caché
+            driver: Driver ya creado (ej: fake_neo4j.FakeDriver); si se omite se conecta a uri
+            prefetch_workers: Consultas de prefetch simultáneas (0 = sin prefetch)
+            prefetch_ttl: Segundos de vigencia de cada conjunto prefetch
+            query_mode: "standard", "compact" (ver build_compact_query) o "denormalized" (ver build_denormalized_query)
+            driver_config: Opciones del pool para GraphDatabase.driver (ver driver_lifecycle.pool_config_from_env)
+            breaker: Circuit breaker de las consultas de recomendaciones (None = sin breaker)
+            query_timeout: Segundos máximos de cada consulta de recomendaciones en Neo4j (None = sin límite)
+            database: Base de datos de las sesiones (None = la predeterminada del servidor)
+            topn_table: Archivo de la tabla top-N materializada (ver materialized_topn; None = sin tabla)
+            catalog_check_interval: Segundos entre lecturas de la versión del catálogo que anota
+                Gestionador desde otro proceso (ver check_catalog_version; None = no se lee)
+        
+        Todas las consultas del recomendador son lecturas (execute_read): con una URI neo4j://
+        de un clúster se reparten entre los seguidores
+        """
+        if query_mode not in QUERY_MODES:
+            raise ValueError(f"Modo de consulta desconocido: {query_mode}")
+        self.query_mode = query_mode
+        self.snapshot = None
+        self.prefetcher = None
+        self.cache = RecommendationCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self.breaker = breaker
+        self.query_timeout = query_timeout
+        self.session_config = {'database': database} if database else {}
+        self.topn_table = None
+        self.catalog_watcher = CatalogVersionWatcher(catalog_check_interval) if catalog_check_interval else None
+        # Recarga del snapshot y de la tabla top-N tras un cambio, fuera de la petición que lo detecta
+        self.catalog_refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="catalog-refresh")
         try:
-            self.driver = GraphDatabase.driver(uri, auth=(user, password))
+            self.driver = driver if driver is not None else GraphDatabase.driver(uri, auth=(user, password),
+                                                                                 **(driver_config or {}))
             # Verificar conexión
-            with self.driver.session() as session:
-                session.run("RETURN 1")
+            self.ping()
             logger.info("Conexión exitosa a Neo4j")
         except Exception as e:
             logger.error(f"Error conectando a Neo4j: {e}")
+            # Los reintentos crean un driver nuevo: no dejar abierto el que falló
+            if driver is None and hasattr(self, 'driver'):
+                self.driver.close()
             raise
+        
+        if self.query_mode == 'compact' and not self.compact_tags_ready():
+            self.refuse_compact_mode()
+        
+        if use_snapshot:
+            self.snapshot = CatalogSnapshot(self.driver, snapshot_refresh_interval, database)
+            if self.snapshot.refresh():
+                self.snapshot.start_auto_refresh()
+            else:
+                logger.warning("Snapshot no disponible, usando consultas a Neo4j")
+        
+        if topn_table:
+            try:
+                self.topn_table = MaterializedTopN(topn_table)
+                logger.info("Tabla top-N cargada: %s (%d autos)", topn_table, self.topn_table.car_count)
+                # Aplicar los cambios del catálogo hechos desde que se escribió la tabla
+                self.catalog_refresher.submit(self.sync_topn_table)
+            except Exception as e:
+                logger.warning(f"Tabla top-N no disponible ({e}), usando consultas a Neo4j")
+        
+        if prefetch_workers > 0:
+            self.prefetcher = CandidatePrefetcher(self.fetch_prefetch_candidates, max_workers=prefetch_workers,
+                                                  ttl=prefetch_ttl)
+        
+        # Con el circuito abierto, la sonda comprueba si Neo4j volvió
+        if self.breaker is not None:
+            self.breaker.set_probe(self.ping)
     
     def close(self):
         """Cerrar conexión"""
+        self.catalog_refresher.shutdown(wait=True, cancel_futures=True)
+        if self.breaker:
+            self.breaker.close()
+        if self.prefetcher:
+            self.prefetcher.close()
+        if self.snapshot:
+            self.snapshot.stop()
+        if self.topn_table:
+            self.topn_table.close()
         if hasattr(self, 'driver'):
             self.driver.close()
     
+    def ping(self):
+        """Consulta mínima a Neo4j (lanza excepción si no responde)"""
+        @unit_of_work(timeout=self.query_timeout)
+        def read(tx):
+            tx.run("RETURN 1").consume()
+        
+        with self.driver.session(**self.session_config) as session:
+            session.execute_read(read)
+    
+    def compact_tags_ready(self) -> bool:
+        """
+        True si todos los autos tienen etiquetas precalculadas
+        
+        La consulta compacta lee las etiquetas del nodo (scoring.CYPHER_TAGS) y no puede
+        calcularlas en Cypher como hacen record_to_car, el snapshot y la tabla top-N
+        """
+        try:
+            untagged = self.read_transaction(car_tags.count_untagged)
+        except Exception as e:
+            logger.warning(f"No se pudo comprobar las etiquetas de los autos: {e}")
+            return False
+        if untagged:
+            logger.warning("Autos sin etiquetas precalculadas: %d", untagged)
+        return untagged == 0
+    
+    def refuse_compact_mode(self):
+        """Usar el modo standard porque hay autos sin etiquetas (ver compact_tags_ready)"""
+        logger.warning("Modo compacto rechazado: hay autos sin etiquetas precalculadas y la consulta "
+                       "no les daría bonificación demográfica (ejecutar scripts/setup/backfill_attributes.py); "
+                       "usando el modo standard")
+        self.query_mode = 'standard'
+    
+    def refresh_catalog(self) -> bool:
+        """Recargar bajo demanda el snapshot del catálogo"""
+        if self.snapshot is None:
+            return False
+        return self.snapshot.refresh()
+    
+    def read_transaction(self, work, *args):
+        """Ejecutar work(tx, ...) en una transacción de lectura con el timeout de las consultas"""
+        with self.driver.session(**self.session_config) as session:
+            return session.execute_read(unit_of_work(timeout=self.query_timeout)(work), *args)
+    
+    def catalog_reads_allowed(self) -> bool:
+        """False con el circuito abierto o semiabierto: la versión del catálogo se lee cuando Neo4j vuelva"""
+        return self.breaker is None or not self.breaker.enabled or self.breaker.state == circuit_breaker.CLOSED
+    
+    def check_catalog_version(self):
+        """
+        Aplicar los cambios del catálogo hechos por otros procesos antes de responder desde la caché
+        
+        Gestionador anota cada cambio en Neo4j (shared/catalog_version.py); la versión se lee
+        como mucho una vez por intervalo y por un solo hilo, así que una escritura tarda a lo
+        sumo catalog_check_interval en invalidar la caché de cada proceso de la aplicación
+        """
+        watcher = self.catalog_watcher
+        if watcher is None or not watcher.due() or not self.catalog_reads_allowed():
+            return
+        since = watcher.version
+        try:
+            version, changes = self.read_transaction(catalog_version.read_state, since)
+        except Exception as e:
+            logger.warning(f"No se pudo leer la versión del catálogo: {e}")
+            return
+        changes = watcher.advance(since, version, changes)
+        if changes:
+            self.on_catalog_changes(changes)
+        elif since is None and self.topn_table is not None and (self.topn_table.catalog_version or -1) < version:
+            # Primera lectura con una tabla anterior a la versión actual: no responde hasta ponerse al día
+            self.schedule_catalog_refresh(self.sync_topn_table)
+    
+    def schedule_catalog_refresh(self, work):
+        """Ejecutar work en el hilo de recarga del catálogo"""
+        try:
+            self.catalog_refresher.submit(work)
+        except RuntimeError:
+            # Recomendador cerrándose: no hay nada que recargar
+            pass
+    
+    def on_catalog_change(self, action: str = None, car_id: str = None):
+        """Invalidar la caché (y recargar el snapshot y la tabla top-N) cuando cambia el catálogo"""
+        self.on_catalog_changes([(action, car_id)])
+    
+    def on_catalog_changes(self, changes: List[tuple]):
+        """
+        Aplicar cambios del catálogo [(acción, id_auto)] (id None = carga masiva o cambio completo)
+        
+        La caché y el prefetch se vacían en el momento; el snapshot y la tabla top-N se
+        recargan en segundo plano (la tabla deja de responder hasta estar al día y el
+        snapshot sigue con la versión anterior mientras se recarga)
+        """
+        logger.info("Catálogo modificado", extra={"changes": changes[:20], "count": len(changes)})
+        if self.cache is not None:
+            self.cache.invalidate()
+        if self.prefetcher is not None:
+            self.prefetcher.invalidate()
+        if self.snapshot is None and self.topn_table is None:
+            return
+        if self.topn_table is not None:
+            self.topn_table.invalidate()
+        self.schedule_catalog_refresh(self.refresh_catalog_copies)
+    
+    def refresh_catalog_copies(self):
+        """Actualizar la tabla top-N y recargar el snapshot"""
+        if self.topn_table is not None:
+            self.sync_topn_table()
+        if self.snapshot is not None:
+            self.snapshot.refresh()
+    
+    def sync_topn_table(self):
+        """
+        Poner la tabla top-N al día con el registro de cambios del catálogo
+        
+        Los cambios se leen de Neo4j (materialized_topn.sync), no de quién avisó: cada
+        proceso que detecta un cambio llama aquí, y si otro ya reescribió el archivo a la
+        versión actual solo se recarga. Si falla, la tabla deja de responder hasta que se
+        vuelva a escribir y las peticiones consultan Neo4j
+        """
+        table = self.topn_table
+        database = self.session_config.get('database')
+        try:
+            result = materialized_topn.sync(self.driver, table.path, table.top_n, database)
+            table.reload()
+            logger.info("Tabla top-N actualizada", extra={"result": result})
+        except Exception as e:
+            logger.error(f"Error actualizando la tabla top-N: {e}")
+            table.invalidate()
+    
     def parse_budget_range(self, budget_str: str) -> tuple:
         """Convertir string de presupuesto a rango numérico"""
         try:
@@ -46,6 +294,7 @@ class CarRecommender:
             logger.warning(f"Error parseando presupuesto '{budget_str}': {e}")
             return (0, float('inf'))
     
+    @metrics.timed('normalize_preferences')
     def normalize_preferences(self, brands=None, budget=None, fuel=None, types=None, transmission=None):
         """Normalizar y validar las preferencias del usuario"""
         # Normalizar marcas
@@ -116,8 +365,15 @@ class CarRecommender:
             'transmission': transmission
         }
     
-    def build_recommendation_query(self, preferences: Dict) -> tuple:
-        """Construir consulta Cypher dinámica basada en preferencias"""
+    @metrics.timed('build_recommendation_query')
+    def build_recommendation_query(self, preferences: Dict, limit: Optional[int] = CANDIDATE_LIMIT) -> tuple:
+        """
+        Construir consulta Cypher dinámica basada en preferencias
+        
+        Args:
+            preferences: Salida de normalize_preferences
+            limit: Máximo de candidatos (None = todos los que cumplan los filtros)
+        """
         query_parts = ["MATCH (a:Auto)"]
         where_conditions = []
         parameters = {}
@@ -162,47 +418,271 @@ class CarRecommender:
             OPTIONAL MATCH (a)-[:USA_COMBUSTIBLE]->(c:Combustible)
             OPTIONAL MATCH (a)-[:TIENE_TRANSMISION]->(tr:Transmision)
             RETURN a.id as id, a.modelo as modelo, a.año as año, a.precio as precio,
-                   a.caracteristicas as caracteristicas,
+                   a.caracteristicas as caracteristicas, a.etiquetas as etiquetas,
                    m.nombre as marca, t.categoria as tipo, 
                    c.tipo as combustible, tr.tipo as transmision
             ORDER BY a.precio ASC
-            LIMIT 20
         """)
+        if limit is not None:
+            query_parts.append("LIMIT $limit")
+            parameters['limit'] = limit
         
         query = " ".join(query_parts)
         return query, parameters
     
-    def execute_recommendation_query(self, query: str, parameters: Dict) -> List[Dict]:
-        """Ejecutar consulta de recomendaciones"""
+    @metrics.timed('build_recommendation_query')
+    def build_denormalized_query(self, preferences: Dict, limit: Optional[int] = CANDIDATE_LIMIT) -> tuple:
+        """
+        Misma consulta que build_recommendation_query sin recorrer relaciones
+        
+        Filtra y proyecta las propiedades marca, tipo, combustible y transmision del auto,
+        que usan los índices compuestos (atributo, precio) de car_attributes. Requiere haber
+        rellenado esas propiedades (scripts/setup/backfill_attributes.py)
+        """
+        where_conditions = ["a.precio >= $min_price AND a.precio <= $max_price"]
+        parameters = {'min_price': preferences['min_price'], 'max_price': preferences['max_price']}
+        
+        # Filtro -> (propiedad del auto, operador, parámetro)
+        filters = [
+            ('brands', 'marca', 'IN'),
+            ('types', 'tipo', 'IN'),
+            ('fuel', 'combustible', '='),
+            ('transmission', 'transmision', '=')
+        ]
+        for preference, field, operator in filters:
+            if preferences[preference]:
+                where_conditions.append(f"a.{field} {operator} ${preference}")
+                parameters[preference] = preferences[preference]
+        
+        query_parts = [
+            "MATCH (a:Auto)",
+            "WHERE " + " AND ".join(where_conditions),
+            """
+            RETURN a.id as id, a.modelo as modelo, a.año as año, a.precio as precio,
+                   a.caracteristicas as caracteristicas, a.etiquetas as etiquetas,
+                   a.marca as marca, a.tipo as tipo,
+                   a.combustible as combustible, a.transmision as transmision
+            ORDER BY a.precio ASC
+            """
+        ]
+        if limit is not None:
+            query_parts.append("LIMIT $limit")
+            parameters['limit'] = limit
+        
+        query = " ".join(query_parts)
+        return query, parameters
+    
+    def build_candidate_query(self, preferences: Dict, limit: Optional[int] = CANDIDATE_LIMIT) -> tuple:
+        """Consulta de candidatos del modo configurado (relaciones o propiedades desnormalizadas)"""
+        if self.query_mode == 'denormalized':
+            return self.build_denormalized_query(preferences, limit)
+        return self.build_recommendation_query(preferences, limit)
+    
+    @metrics.timed('build_compact_query')
+    def build_compact_query(self, preferences: Dict, gender: str = None, age_range: str = None,
+                            limit: int = RESULT_LIMIT, after: Optional[tuple] = None) -> tuple:
+        """
+        Construir consulta que puntúa, ordena y limita en Neo4j
+        
+        Cada relación se expande una sola vez: las categorías filtradas con un MATCH cuyo
+        filtro va en el patrón y las demás con un OPTIONAL MATCH. La puntuación (similitud y
+        demografía, ver scoring.similarity_score_cypher) se calcula en Cypher, así el LIMIT se
+        aplica a los más relevantes y no a los más baratos. Devuelve una columna `auto` con
+        un mapa por auto (record_to_ranked_car). Los filtros dentro del patrón requieren Neo4j 5
+        
+        Args:
+            preferences: Salida de normalize_preferences
+            gender: Género del usuario para personalización
+            age_range: Rango de edad del usuario para personalización
+            limit: Máximo de recomendaciones
+            after: Clave (puntuación, bonificación, precio, id) del último auto de la página
+                anterior (ver recommendation_cursor)
+        """
+        parameters = {
+            'min_price': preferences['min_price'],
+            'max_price': preferences['max_price'],
+            'limit': limit
+        }
+        
+        # Variable, relación, etiqueta y filtro de cada categoría
+        categories = [
+            ('m', 'ES_MARCA', 'Marca', "m.nombre IN $brands" if preferences['brands'] else None),
+            ('t', 'ES_TIPO', 'Tipo', "t.categoria IN $types" if preferences['types'] else None),
+            ('c', 'USA_COMBUSTIBLE', 'Combustible', "c.tipo = $fuel" if preferences['fuel'] else None),
+            ('tr', 'TIENE_TRANSMISION', 'Transmision', "tr.tipo = $transmission" if preferences['transmission'] else None)
+        ]
+        
+        patterns = ["(a:Auto WHERE a.precio >= $min_price AND a.precio <= $max_price)"]
+        patterns += [
+            f"(a)-[:{relation}]->({variable}:{label} WHERE {condition})"
+            for variable, relation, label, condition in categories if condition
+        ]
+        query_parts = ["MATCH " + ", ".join(patterns)]
+        query_parts += [
+            f"OPTIONAL MATCH (a)-[:{relation}]->({variable}:{label})"
+            for variable, relation, label, condition in categories if not condition
+        ]
+        
+        # Los parámetros de los filtros son los mismos que usa la puntuación
+        base_score = scoring.similarity_score_cypher(preferences, parameters)
+        age_group = self.get_age_group(age_range) if gender and age_range else None
+        bonus = scoring.demographic_bonus_cypher(gender, age_group) if age_group else "0"
+        
+        # Paginación por clave: solo los autos posteriores al último de la página anterior
+        # en el orden de la lista (bonificación asc = puntuación base desc con la misma puntuación)
+        page_filter = ""
+        if after is not None:
+            page_filter = (
+                "WHERE base + bonus < $after_score OR (base + bonus = $after_score AND ("
+                "bonus > $after_bonus OR (bonus = $after_bonus AND ("
+                "a.precio > $after_price OR (a.precio = $after_price AND a.id > $after_id)))))"
+            )
+            parameters['after_score'], parameters['after_bonus'], parameters['after_price'], parameters['after_id'] = after
+        
+        query_parts.append(f"""
+            WITH a, m, t, c, tr, {base_score} AS base
+            WITH a, m, t, c, tr, base, {bonus} AS bonus {page_filter}
+            ORDER BY base + bonus DESC, bonus ASC, a.precio ASC, a.id ASC
+            LIMIT $limit
+            RETURN a {{.id, .modelo, .año, .precio, .caracteristicas, .etiquetas,
+                      marca: m.nombre, tipo: t.categoria, combustible: c.tipo, transmision: tr.tipo,
+                      similarity_score: base + bonus, demographic_bonus: bonus}} AS auto
+        """)
+        
+        query = " ".join(query_parts)
+        return query, parameters
+    
+    @metrics.timed('execute_recommendation_query')
+    def execute_recommendation_query(self, query: str, parameters: Dict, converter=None) -> List[Dict]:
+        """
+        Ejecutar consulta de recomendaciones
+        
+        Args:
+            converter: Conversión de cada registro (por defecto record_to_car)
+        
+        Raises:
+            DatabaseUnavailableError: Circuito abierto, o la consulta falló con el breaker activo
+        """
+        converter = converter or self.record_to_car
+        if self.breaker is not None and not self.breaker.allow_request():
+            raise DatabaseUnavailableError("Circuito abierto: consulta a Neo4j omitida")
+        
+        # Transacción de lectura: en un clúster la atiende un seguidor
+        @unit_of_work(timeout=self.query_timeout)
+        def read(tx):
+            return [converter(record) for record in tx.run(query, parameters)]
+        
         try:
-            with self.driver.session() as session:
-                result = session.run(query, parameters)
-                recommendations = []
-                
-                for record in result:
-                    car_data = {
-                        'id': record['id'],
-                        'name': f"{record['marca']} {record['modelo']} {record['año']}" if record['marca'] else f"{record['modelo']} {record['año']}",
-                        'model': record['modelo'],
-                        'brand': record['marca'] or 'Marca no especificada',
-                        'year': record['año'],
-                        'price': float(record['precio']) if record['precio'] else 0,
-                        'type': record['tipo'] or 'Tipo no especificado',
-                        'fuel': record['combustible'] or 'Combustible no especificado',
-                        'transmission': record['transmision'] or 'Transmisión no especificada',
-                        'features': record['caracteristicas'] or [],
-                        'image': None  # Placeholder para imágenes futuras
-                    }
-                    recommendations.append(car_data)
-                
-                return recommendations
+            start = time.perf_counter()
+            with self.driver.session(**self.session_config) as session:
+                recommendations = session.execute_read(read)
+            
+            # Consultas lentas: registro y PROFILE en segundo plano
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if self.breaker is not None:
+                self.breaker.record_success(elapsed_ms)
+            get_slow_query_log().observe(self.driver, query, parameters, elapsed_ms, source="recommender",
+                                         database=self.session_config.get('database'),
+                                         profile_allowed=self.catalog_reads_allowed)
+            return recommendations
                 
         except Exception as e:
-            logger.error(f"Error ejecutando consulta de recomendaciones: {e}")
-            logger.error(f"Query: {query}")
-            logger.error(f"Parameters: {parameters}")
+            logger.error("Error ejecutando consulta de recomendaciones: %s", e,
+                         extra={"query": query, "parameters": parameters})
+            if self.breaker is not None:
+                self.breaker.record_failure(e)
+                raise DatabaseUnavailableError(str(e)) from e
             return []
     
+    def fetch_local_candidates(self, preferences: Dict, limit: Optional[int] = CANDIDATE_LIMIT) -> Optional[List[Dict]]:
+        """Candidatos desde el snapshot o el prefetch (None si hay que consultar Neo4j)"""
+        if self.snapshot is not None and self.snapshot.is_loaded:
+            with metrics.stage_timer('snapshot_candidates'):
+                rows = self.snapshot.find_candidates(preferences, limit)
+                return [self.record_to_car(row) for row in rows]
+        
+        if self.prefetcher is not None:
+            with metrics.stage_timer('prefetch_candidates'):
+                prefetched = self.prefetcher.take(preferences, limit)
+            if prefetched is not None:
+                logger.debug("Candidatos servidos desde prefetch (%d)", len(prefetched))
+                return prefetched
+        
+        return None
+    
+    def fetch_candidates(self, preferences: Dict) -> List[Dict]:
+        """Obtener autos candidatos desde el snapshot, el prefetch o Neo4j"""
+        candidates = self.fetch_local_candidates(preferences)
+        if candidates is not None:
+            return candidates
+        
+        query, parameters = self.build_candidate_query(preferences)
+        logger.debug("Query generada", extra={"query": query, "parameters": parameters})
+        return self.execute_recommendation_query(query, parameters)
+    
+    def fetch_ranked_recommendations(self, preferences: Dict, gender: str = None, age_range: str = None) -> List[Dict]:
+        """
+        Recomendaciones ya puntuadas en modo compacto
+        
+        Con snapshot o prefetch se puntúan en Python todos los candidatos (sin límite por
+        precio), que da el mismo resultado que la consulta compacta
+        """
+        candidates = self.fetch_local_candidates(preferences, limit=None)
+        if candidates is not None:
+            return self.rank_recommendations(candidates, preferences, gender, age_range)
+        
+        query, parameters = self.build_compact_query(preferences, gender, age_range)
+        logger.debug("Query compacta generada", extra={"query": query, "parameters": parameters})
+        return self.execute_recommendation_query(query, parameters, converter=self.record_to_ranked_car)
+    
+    def fetch_prefetch_candidates(self, preferences: Dict, limit: Optional[int]) -> List[Dict]:
+        """Consulta de candidatos para el prefetch (preferencias sin transmisión)"""
+        query, parameters = self.build_candidate_query(preferences, limit=limit)
+        return self.execute_recommendation_query(query, parameters)
+    
+    def prefetch_candidates(self, brands=None, budget=None, fuel=None, types=None) -> bool:
+        """
+        Lanzar en segundo plano la búsqueda de candidatos antes de conocer la transmisión
+        
+        Returns:
+            True si se lanzó una consulta nueva
+        """
+        # Con el snapshot en memoria los candidatos ya son inmediatos
+        if self.prefetcher is None or (self.snapshot is not None and self.snapshot.is_loaded):
+            return False
+        preferences = self.normalize_preferences(brands, budget, fuel, types)
+        return self.prefetcher.prefetch(preferences)
+    
+    @staticmethod
+    def record_to_car(record) -> Dict:
+        """Convertir un registro de Neo4j (o fila del snapshot) al formato de la API"""
+        return {
+            'id': record['id'],
+            'name': f"{record['marca']} {record['modelo']} {record['año']}" if record['marca'] else f"{record['modelo']} {record['año']}",
+            'model': record['modelo'],
+            'brand': record['marca'] or 'Marca no especificada',
+            'year': record['año'],
+            'price': float(record['precio']) if record['precio'] else 0,
+            'type': record['tipo'] or 'Tipo no especificado',
+            'fuel': record['combustible'] or 'Combustible no especificado',
+            'transmission': record['transmision'] or 'Transmisión no especificada',
+            'features': record['caracteristicas'] or [],
+            # Autos anteriores a las etiquetas precalculadas se etiquetan al vuelo
+            'tags': record['etiquetas'] if record['etiquetas'] is not None else car_tags.compute_tags(record),
+            'image': None  # Placeholder para imágenes futuras
+        }
+    
+    @classmethod
+    def record_to_ranked_car(cls, record) -> Dict:
+        """Convertir un registro de build_compact_query (puntuación incluida)"""
+        row = record['auto']
+        car = cls.record_to_car(row)
+        car['similarity_score'] = row['similarity_score']
+        if row['demographic_bonus'] > 0:
+            car['demographic_bonus'] = row['demographic_bonus']
+        return car
+    
+    @metrics.timed('add_similarity_score')
     def add_similarity_score(self, recommendations: List[Dict], preferences: Dict) -> List[Dict]:
         """Agregar puntuación de similitud basada en preferencias"""
         for car in recommendations:
@@ -240,78 +720,78 @@ class CarRecommender:
         
         return recommendations
     
+    @metrics.timed('apply_demographic_scoring')
     def apply_demographic_scoring(self, recommendations: List[Dict], gender: str, age_range: str) -> List[Dict]:
         """Aplicar personalización demográfica según género y edad"""
         
         # Definir grupos de edad
         age_group = self.get_age_group(age_range)
         
-        logger.info(f"Aplicando scoring demográfico: género={gender}, edad_grupo={age_group}")
+        logger.debug("Aplicando scoring demográfico: género=%s, edad_grupo=%s", gender, age_group)
         
         for car in recommendations:
             demographic_bonus = 0
-            car_type = car.get('type', '').lower()
-            car_brand = car.get('brand', '').lower()
-            car_name = car.get('name', '').lower()
-            features_text = str(car.get('features', [])).lower()
+            tags = car_tags.tags_for_car(car)
             
             # Lógica para mujeres
             if gender == 'femenino':
                 if age_group == 'young':  # 18-25: igual que hombres jóvenes
-                    if car_type in ['coupé', 'convertible'] or any(sport_word in car_name for sport_word in ['sport', 'gt', 'turbo']):
+                    if tags & car_tags.SPORTY:
                         demographic_bonus += 5
-                        logger.debug(f"Bonus joven femenino deportivo: +5 para {car['name']}")
+                        logger.debug("Bonus joven femenino deportivo: +5 para %s", car['name'])
                         
                 elif age_group == 'reproductive':  # 26-45: preferencia familiar
-                    if car_type in ['suv']:
+                    if tags & car_tags.TAG_SUV:
                         demographic_bonus += 15
-                        logger.debug(f"Bonus reproductivo femenino SUV: +15 para {car['name']}")
-                    elif car_type == 'sedán':
+                        logger.debug("Bonus reproductivo femenino SUV: +15 para %s", car['name'])
+                    elif tags & car_tags.TAG_SEDAN:
                         demographic_bonus += 10
-                        logger.debug(f"Bonus reproductivo femenino sedán: +10 para {car['name']}")
+                        logger.debug("Bonus reproductivo femenino sedán: +10 para %s", car['name'])
                     # Bonus por características familiares
-                    if any(family_word in features_text for family_word in ['familia', 'seguridad', 'espacio', 'asientos']):
+                    if tags & car_tags.TAG_FAMILY:
                         demographic_bonus += 8
-                        logger.debug(f"Bonus características familiares: +8 para {car['name']}")
+                        logger.debug("Bonus características familiares: +8 para %s", car['name'])
                         
                 elif age_group == 'mature':  # 46+: comfort y luxury
-                    if any(luxury_brand in car_brand for luxury_brand in ['mercedes', 'bmw', 'audi', 'lexus']):
+                    if tags & car_tags.TAG_LUXURY_BRAND:
                         demographic_bonus += 12
-                        logger.debug(f"Bonus marca premium mujer madura: +12 para {car['name']}")
+                        logger.debug("Bonus marca premium mujer madura: +12 para %s", car['name'])
             
             # Lógica para hombres
             elif gender == 'masculino':
                 if age_group == 'young':  # 18-25: deportivos
-                    if car_type in ['coupé', 'convertible'] or any(sport_word in car_name for sport_word in ['sport', 'gt', 'turbo']):
+                    if tags & car_tags.SPORTY:
                         demographic_bonus += 8
-                        logger.debug(f"Bonus joven masculino deportivo: +8 para {car['name']}")
+                        logger.debug("Bonus joven masculino deportivo: +8 para %s", car['name'])
                         
                 elif age_group == 'mature':  # 46+: comfort y luxury
-                    if any(luxury_brand in car_brand for luxury_brand in ['mercedes', 'bmw', 'audi', 'lexus']):
+                    if tags & car_tags.TAG_LUXURY_BRAND:
                         demographic_bonus += 12
-                        logger.debug(f"Bonus marca premium hombre maduro: +12 para {car['name']}")
+                        logger.debug("Bonus marca premium hombre maduro: +12 para %s", car['name'])
             
             # Para todos: bonificación por características de comfort en edad madura
-            if age_group == 'mature':
-                comfort_features = ['cuero', 'premium', 'lujo', 'confort', 'leather', 'luxury']
-                for feature in comfort_features:
-                    if feature in features_text:
-                        demographic_bonus += 3
-                        logger.debug(f"Bonus comfort maduro: +3 para {car['name']}")
-                        break
+            if age_group == 'mature' and tags & car_tags.COMFORT:
+                demographic_bonus += 3
+                logger.debug("Bonus comfort maduro: +3 para %s", car['name'])
             
             # Aplicar bonificación
             if demographic_bonus > 0:
                 original_score = car.get('similarity_score', 0)
                 car['similarity_score'] = original_score + demographic_bonus
                 car['demographic_bonus'] = demographic_bonus
-                logger.info(f"Bonus demográfico aplicado: {car['name']} +{demographic_bonus} (total: {car['similarity_score']})")
+                logger.debug("Bonus demográfico aplicado: %s +%s (total: %s)", car['name'], demographic_bonus, car['similarity_score'])
         
         # Reordenar por puntuación actualizada
         recommendations.sort(key=lambda x: x.get('similarity_score', 0), reverse=True)
         
         return recommendations
     
+    def max_demographic_bonus(self, gender: str, age_range: str) -> int:
+        """Mayor bonificación posible para el perfil (la de un auto con todas las etiquetas)"""
+        probe = {'name': '', 'tags': car_tags.ALL_TAGS}
+        self.apply_demographic_scoring([probe], gender, age_range)
+        return probe.get('demographic_bonus', 0)
+    
     def get_age_group(self, age_range: str) -> str:
         """Convertir rango de edad a grupo demográfico"""
         if age_range in ['18-25']:
@@ -323,6 +803,84 @@ class CarRecommender:
         else:
             return 'unknown'
     
+    def lookup_cache(self, preferences: Dict, gender: str = None, age_range: str = None) -> tuple:
+        """
+        Buscar recomendaciones en caché
+        
+        Returns:
+            (clave, recomendaciones) donde recomendaciones es None si no hay entrada vigente
+        """
+        if self.cache is None:
+            return None, None
+        
+        demographic = (gender, self.get_age_group(age_range)) if gender and age_range else (None, None)
+        cache_key = self.cache.make_key(preferences, *demographic)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Recomendaciones servidas desde caché (%d)", len(cached))
+        return cache_key, cached
+    
+    def lookup_topn_table(self, preferences: Dict, gender: str = None, age_range: str = None) -> Optional[List[Dict]]:
+        """
+        Recomendaciones desde la tabla top-N materializada (None si no puede responder)
+        
+        La tabla da los candidatos necesarios sin consultar Neo4j y se puntúan con
+        rank_recommendations: el resultado es el del modo compacto
+        """
+        if self.topn_table is None:
+            return None
+        max_bonus = self.max_demographic_bonus(gender, age_range) if gender and age_range else 0
+        # Con la versión del catálogo vigilada, la tabla solo responde si incluye los cambios vistos
+        min_version = self.catalog_watcher.version if self.catalog_watcher is not None else None
+        with metrics.stage_timer('topn_lookup'):
+            rows = self.topn_table.lookup(preferences, max_bonus, RESULT_LIMIT, min_version)
+        if rows is None:
+            return None
+        logger.debug("Candidatos servidos desde la tabla top-N (%d)", len(rows))
+        return self.rank_recommendations([self.record_to_car(row) for row in rows], preferences, gender, age_range)
+    
+    def lookup_stale_cache(self, cache_key: Optional[tuple], error: Exception) -> Optional[List[Dict]]:
+        """Último resultado bueno para la clave cuando Neo4j no está disponible (None si no hay)"""
+        if cache_key is None:
+            return None
+        stale = self.cache.get_stale(cache_key)
+        if stale is not None:
+            logger.warning("Neo4j no disponible, recomendaciones servidas desde caché vencida: %s", error)
+        return stale
+    
+    def store_cache(self, cache_key: Optional[tuple], recommendations: List[Dict]):
+        """Guardar recomendaciones en caché"""
+        # Solo se guardan resultados no vacíos: una lista vacía también puede ser un error de consulta
+        if cache_key is not None and recommendations:
+            self.cache.set(cache_key, recommendations)
+    
+    def rank_recommendations(self, recommendations: List[Dict], preferences: Dict,
+                             gender: str = None, age_range: str = None,
+                             limit: Optional[int] = RESULT_LIMIT) -> List[Dict]:
+        """Puntuar candidatos (similitud + demografía) y devolver los `limit` mejores (None = todos)"""
+        # Puntuación vectorizada con NumPy (mismas reglas, una sola pasada)
+        if recommendations and scoring.NUMPY_AVAILABLE:
+            age_group = self.get_age_group(age_range) if gender and age_range else None
+            with metrics.stage_timer('rank_candidates'):
+                recommendations = scoring.rank_candidates(recommendations, preferences, gender, age_group, top_k=limit)
+            logger.debug("Puntuación vectorizada aplicada")
+        
+        # Agregar puntuación de similitud básica
+        elif recommendations:
+            recommendations = self.add_similarity_score(recommendations, preferences)
+            logger.debug("Puntuación básica aplicada")
+            
+            # Aplicar personalización demográfica si se proporciona
+            if gender and age_range:
+                recommendations = self.apply_demographic_scoring(recommendations, gender, age_range)
+                logger.debug("Personalización demográfica aplicada")
+            
+            # Mismo orden que las páginas y la consulta compacta (empates por bonificación, precio e id)
+            recommendations.sort(key=recommendation_cursor.sort_key)
+        
+        # Limitar a máximo `limit` recomendaciones
+        return recommendations[:limit]
+    
     def get_recommendations(self, brands=None, budget=None, fuel=None, types=None, transmission=None, gender=None, age_range=None) -> List[Dict]:
         """
         Obtener recomendaciones de autos basadas en preferencias del usuario
@@ -340,58 +898,102 @@ class CarRecommender:
         Returns:
             Lista de diccionarios con recomendaciones de autos personalizadas
         """
+        cache_key = None
         try:
-            # Log de entrada para debugging
-            logger.info("=== GENERANDO RECOMENDACIONES PERSONALIZADAS ===")
-            logger.info(f"Brands: {brands}")
-            logger.info(f"Budget: {budget}")
-            logger.info(f"Fuel: {fuel}")
-            logger.info(f"Types: {types}")
-            logger.info(f"Transmission: {transmission}")
-            logger.info(f"Gender: {gender}")
-            logger.info(f"Age Range: {age_range}")
+            # Cambios del catálogo hechos por Gestionador desde otro proceso
+            self.check_catalog_version()
             
             # Normalizar preferencias
             preferences = self.normalize_preferences(brands, budget, fuel, types, transmission)
-            logger.info(f"Preferencias normalizadas: {preferences}")
-            
-            # Construir y ejecutar consulta
-            query, parameters = self.build_recommendation_query(preferences)
-            logger.info(f"Query generada: {query}")
-            logger.info(f"Parámetros: {parameters}")
+            logger.debug("Generando recomendaciones personalizadas", extra={
+                "preferences": preferences, "gender": gender, "age_range": age_range
+            })
             
-            # Ejecutar consulta
-            recommendations = self.execute_recommendation_query(query, parameters)
-            logger.info(f"Encontradas {len(recommendations)} recomendaciones iniciales")
+            # Consultar caché por preferencias normalizadas y grupo demográfico
+            cache_key, cached = self.lookup_cache(preferences, gender, age_range)
+            if cached is not None:
+                return cached
             
-            # Agregar puntuación de similitud básica
-            if recommendations:
-                recommendations = self.add_similarity_score(recommendations, preferences)
-                logger.info(f"Puntuación básica aplicada")
+            # Tabla top-N materializada: búsqueda sin consulta (None si no puede responder)
+            recommendations = self.lookup_topn_table(preferences, gender, age_range)
+            if recommendations is None and self.query_mode == 'compact':
+                # Puntuación, orden y límite en Neo4j
+                recommendations = self.fetch_ranked_recommendations(preferences, gender, age_range)
+            elif recommendations is None:
+                # Obtener candidatos (snapshot en memoria o consulta a Neo4j)
+                recommendations = self.fetch_candidates(preferences)
+                logger.debug("Encontradas %d recomendaciones iniciales", len(recommendations))
                 
-                # Aplicar personalización demográfica si se proporciona
-                if gender and age_range:
-                    recommendations = self.apply_demographic_scoring(recommendations, gender, age_range)
-                    logger.info(f"Personalización demográfica aplicada")
+                recommendations = self.rank_recommendations(recommendations, preferences, gender, age_range)
+            self.store_cache(cache_key, recommendations)
             
-            # Limitar a máximo 10 recomendaciones
-            recommendations = recommendations[:10]
-            
-            logger.info(f"Devolviendo {len(recommendations)} recomendaciones finales personalizadas")
+            logger.debug("Devolviendo %d recomendaciones finales personalizadas", len(recommendations))
             return recommendations
             
-        except Exception as e:
-            logger.error(f"Error general en get_recommendations: {e}")
+        except DatabaseUnavailableError as e:
+            # Circuito abierto o Neo4j caído: último resultado bueno, o el respaldo de get_recommendations
+            stale = self.lookup_stale_cache(cache_key, e)
+            if stale is None:
+                raise
+            return stale
+            
+        except Exception:
+            logger.exception("Error general en get_recommendations")
             return []
     
+    def get_recommendation_page(self, brands=None, budget=None, fuel=None, types=None, transmission=None,
+                                gender=None, age_range=None, cursor: str = None,
+                                page_size: int = RESULT_LIMIT) -> tuple:
+        """
+        Página de recomendaciones en el orden de get_recommendations (ver recommendation_cursor)
+        
+        Fuera del modo compacto las páginas recorren la misma lista que get_recommendations
+        (puntuada en Python, con las etiquetas que falten calculadas al vuelo). En modo
+        compacto, con snapshot o prefetch se puntúan en Python todos los candidatos; si no,
+        la consulta compacta filtra por la clave del cursor y pide solo page_size + 1 autos
+        a Neo4j (el extra indica si hay página siguiente)
+        
+        Args:
+            cursor: Cursor devuelto por la página anterior (None = primera página)
+            page_size: Autos por página
+        
+        Returns:
+            (recomendaciones, cursor de la página siguiente o None)
+        
+        Raises:
+            InvalidCursorError: Cursor mal formado o de otra búsqueda
+            DatabaseUnavailableError: Circuito abierto o Neo4j caído
+        """
+        search = recommendation_cursor.fingerprint(brands, budget, fuel, types, transmission, gender, age_range)
+        if self.query_mode != 'compact':
+            # La consulta compacta lee las etiquetas del nodo: solo se usa si todos los autos las tienen
+            ranked = self.get_recommendations(brands, budget, fuel, types, transmission, gender, age_range)
+            return recommendation_cursor.paginate(ranked, cursor, page_size, search)
+        
+        preferences = self.normalize_preferences(brands, budget, fuel, types, transmission)
+        self.check_catalog_version()
+        
+        candidates = self.fetch_local_candidates(preferences, limit=None)
+        if candidates is not None:
+            ranked = self.rank_recommendations(candidates, preferences, gender, age_range, limit=None)
+            return recommendation_cursor.paginate(ranked, cursor, page_size, search)
+        
+        after = recommendation_cursor.decode_cursor(cursor, search) if cursor else None
+        query, parameters = self.build_compact_query(preferences, gender, age_range, limit=page_size + 1,
+                                                     after=after)
+        logger.debug("Query de página generada", extra={"query": query, "parameters": parameters})
+        rows = self.execute_recommendation_query(query, parameters, converter=self.record_to_ranked_car)
+        page = rows[:page_size]
+        return page, recommendation_cursor.next_cursor(page, len(rows) > page_size, search)
+    
     def get_statistics(self) -> Dict[str, Any]:
         """Obtener estadísticas de la base de datos"""
         try:
-            with self.driver.session() as session:
+            def read_statistics(tx):
                 stats = {}
                 
                 # Contar autos por marca
-                result = session.run("""
+                result = tx.run("""
                     MATCH (a:Auto)-[:ES_MARCA]->(m:Marca)
                     RETURN m.nombre as marca, count(a) as cantidad
                     ORDER BY cantidad DESC
@@ -399,7 +1001,7 @@ class CarRecommender:
                 stats['cars_by_brand'] = [dict(record) for record in result]
                 
                 # Contar autos por tipo
-                result = session.run("""
+                result = tx.run("""
                     MATCH (a:Auto)-[:ES_TIPO]->(t:Tipo)
                     RETURN t.categoria as tipo, count(a) as cantidad
                     ORDER BY cantidad DESC
@@ -407,7 +1009,7 @@ class CarRecommender:
                 stats['cars_by_type'] = [dict(record) for record in result]
                 
                 # Rango de precios
-                result = session.run("""
+                result = tx.run("""
                     MATCH (a:Auto)
                     RETURN min(a.precio) as precio_min, max(a.precio) as precio_max, avg(a.precio) as precio_promedio
                 """)
@@ -419,34 +1021,175 @@ class CarRecommender:
                 }
                 
                 # Total de autos
-                result = session.run("MATCH (a:Auto) RETURN count(a) as total")
+                result = tx.run("MATCH (a:Auto) RETURN count(a) as total")
                 stats['total_cars'] = result.single()['total']
                 
                 return stats
+            
+            with self.driver.session(**self.session_config) as session:
+                return session.execute_read(read_statistics)
                 
         except Exception as e:
             logger.error(f"Error obteniendo estadísticas: {e}")
             return {}
+    
+    def hot_query_shapes(self) -> List[tuple]:
+        """
+        Una consulta (texto y parámetros de ejemplo) por cada combinación de filtros presentes
+        
+        El texto de la consulta solo depende de qué filtros hay (los valores van como
+        parámetros), así que estas 16 formas cubren las peticiones del modo actual (en modo
+        compact, las que no tienen perfil demográfico)
+        """
+        shapes = []
+        for brands, fuel, types, transmission in itertools.product((None, ['Toyota']), (None, 'Gasolina'),
+                                                                   (None, ['SUV']), (None, 'Automática')):
+            preferences = {
+                'brands': brands, 'min_price': 0, 'max_price': 1e9,
+                'fuel': fuel, 'types': types, 'transmission': transmission
+            }
+            if self.query_mode == 'compact':
+                shapes.append(self.build_compact_query(preferences))
+            else:
+                shapes.append(self.build_candidate_query(preferences))
+        return shapes
+    
+    def warm_up(self, connections: int = 4) -> Dict[str, Any]:
+        """
+        Abrir conexiones del pool y planificar las consultas habituales antes de la primera petición
+        
+        Cada conexión se mantiene ocupada hasta que todas están abiertas (si no, el pool
+        reutilizaría la primera). Las consultas se envían con EXPLAIN: Neo4j las planifica
+        y guarda el plan en su caché sin ejecutarlas
+        
+        Args:
+            connections: Conexiones a abrir en paralelo (0 = solo planificar)
+        """
+        start = time.perf_counter()
+        opened = 0
+        if connections > 0:
+            barrier = threading.Barrier(connections)
+            
+            def hold_connection(tx):
+                tx.run("RETURN 1").consume()
+                try:
+                    barrier.wait(timeout=10)
+                except threading.BrokenBarrierError:
+                    pass  # Pool más pequeño que connections: se abren las que quepan
+            
+            def open_connection():
+                with self.driver.session(**self.session_config) as session:
+                    session.execute_read(hold_connection)
+            
+            with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="neo4j-warmup") as executor:
+                futures = [executor.submit(open_connection) for _ in range(connections)]
+                for future in futures:
+                    try:
+                        future.result()
+                        opened += 1
+                    except Exception as e:
+                        logger.warning(f"No se pudo abrir conexión de calentamiento: {e}")
+        
+        def explain(tx, query, parameters):
+            tx.run("EXPLAIN " + query, parameters).consume()
+        
+        planned = 0
+        with self.driver.session(**self.session_config) as session:
+            for query, parameters in self.hot_query_shapes():
+                try:
+                    session.execute_read(explain, query, parameters)
+                    planned += 1
+                except Exception as e:
+                    logger.warning(f"No se pudo planificar la consulta: {e}")
+        
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        logger.info("Calentamiento de Neo4j completo",
+                    extra={"connections": opened, "query_shapes": planned, "elapsed_ms": elapsed_ms})
+        return {'connections': opened, 'query_shapes': planned, 'elapsed_ms': elapsed_ms}
 
-# Instancia global del recomendador
-_recommender_instance = None
+# Conexión gestionada del recomendador (ver driver_lifecycle)
+_recommender_connection = None
+_connection_lock = threading.Lock()
 
-def get_recommender_instance():
-    """Obtener instancia singleton del recomendador"""
-    global _recommender_instance
-    if _recommender_instance is None:
-        # Configuración de conexión
-        URI = "bolt://localhost:7687"  # Puerto correcto para bolt
-        USER = "neo4j"
-        PASSWORD = "proyectoNEO4J"
-        
-        try:
-            _recommender_instance = CarRecommender(URI, USER, PASSWORD)
-        except Exception as e:
-            logger.error(f"No se pudo crear instancia del recomendador: {e}")
-            _recommender_instance = None
+def create_recommender() -> CarRecommender:
+    """Crear el recomendador con la configuración de las variables de entorno (lanza excepción si no conecta)"""
+    # Configuración de conexión (neo4j://: enrutamiento de lecturas en un clúster)
+    URI = driver_lifecycle.uri_from_env()
+    USER = "neo4j"
+    PASSWORD = "proyectoNEO4J"
+    
+    # fake://... usa el driver simulado en memoria (benchmarks sin base de datos)
+    driver = fake_neo4j.driver_from_uri(URI) if fake_neo4j.is_fake_uri(URI) else None
+    
+    # Motor de recomendaciones: "neo4j" (consulta por petición) o "snapshot" (catálogo en memoria)
+    use_snapshot = os.environ.get("RECOMMENDER_ENGINE", "neo4j").lower() == "snapshot"
+    refresh_interval = float(os.environ.get("CATALOG_REFRESH_SECONDS", "300"))
+    cache_size = int(os.environ.get("RECOMMENDATION_CACHE_SIZE", "1024"))
+    cache_ttl = float(os.environ.get("RECOMMENDATION_CACHE_TTL", "300"))
+    prefetch_workers = int(os.environ.get("RECOMMENDATION_PREFETCH_WORKERS", "4"))
+    prefetch_ttl = float(os.environ.get("RECOMMENDATION_PREFETCH_TTL", "60"))
+    query_mode = os.environ.get("RECOMMENDATION_QUERY_MODE", "standard").lower()
+    query_timeout = float(os.environ.get("NEO4J_QUERY_TIMEOUT", "5")) or None
+    # Tabla top-N materializada (scripts/setup/build_topn_table.py); vacía = sin tabla
+    topn_table = os.environ.get("RECOMMENDATION_TOPN_TABLE") or None
+    # Segundos entre lecturas de la versión del catálogo que anota Gestionador (0 = no se lee)
+    catalog_check_interval = float(os.environ.get("CATALOG_VERSION_CHECK_SECONDS", "1")) or None
+    
+    return CarRecommender(
+        URI, USER, PASSWORD,
+        use_snapshot=use_snapshot,
+        snapshot_refresh_interval=refresh_interval,
+        cache_size=cache_size,
+        cache_ttl=cache_ttl,
+        driver=driver,
+        prefetch_workers=prefetch_workers,
+        prefetch_ttl=prefetch_ttl,
+        query_mode=query_mode,
+        driver_config=driver_lifecycle.pool_config_from_env(),
+        breaker=circuit_breaker.breaker_from_env("recommender"),
+        query_timeout=query_timeout,
+        database=driver_lifecycle.session_config_from_env().get('database'),
+        topn_table=topn_table,
+        catalog_check_interval=catalog_check_interval
+    )
+
+def warm_up_recommender(recommender: CarRecommender):
+    """Calentamiento tras conectar (NEO4J_WARMUP_CONNECTIONS=0 solo planifica las consultas)"""
+    recommender.warm_up(int(os.environ.get("NEO4J_WARMUP_CONNECTIONS", "4")))
+
+def get_recommender_connection() -> driver_lifecycle.ManagedConnection:
+    """Obtener la conexión gestionada (singleton), lanzando el hilo de conexión si hace falta"""
+    global _recommender_connection
+    with _connection_lock:
+        if _recommender_connection is None:
+            _recommender_connection = driver_lifecycle.ManagedConnection(
+                create_recommender,
+                warm_up=warm_up_recommender,
+                connect_wait=float(os.environ.get("NEO4J_CONNECT_WAIT", "5")),
+                min_backoff=float(os.environ.get("NEO4J_RECONNECT_MIN_SECONDS", "1")),
+                max_backoff=float(os.environ.get("NEO4J_RECONNECT_MAX_SECONDS", "60")),
+                name="recommender"
+            )
+        _recommender_connection.start()
+    return _recommender_connection
+
+def start_recommender():
+    """Conectar en segundo plano al arrancar la aplicación (la primera petición no paga la conexión)"""
+    get_recommender_connection()
+
+def _current_instance() -> Optional[CarRecommender]:
+    """Instancia ya conectada, sin lanzar ni esperar la conexión"""
+    connection = _recommender_connection
+    return connection.instance if connection is not None else None
+
+def get_recommender_instance() -> Optional[CarRecommender]:
+    """
+    Obtener instancia singleton del recomendador
     
-    return _recommender_instance
+    None mientras no haya conexión: el hilo de conexión sigue reintentando en segundo
+    plano, así que la instancia aparece en cuanto Neo4j vuelve a estar disponible
+    """
+    return get_recommender_connection().get()
 
 def get_recommendations(brands=None, budget=None, fuel=None, types=None, transmission=None, gender=None, age_range=None):
     """
@@ -463,10 +1206,160 @@ def get_recommendations(brands=None, budget=None, fuel=None, types=None, transmi
     
     try:
         return recommender.get_recommendations(brands, budget, fuel, types, transmission, gender, age_range)
+    except DatabaseUnavailableError as e:
+        logger.warning(f"Neo4j no disponible y sin resultado previo en caché: {e}")
+        return get_fallback_recommendations(brands, budget, fuel, types, transmission, gender, age_range)
     except Exception as e:
         logger.error(f"Error en get_recommendations: {e}")
         return get_fallback_recommendations(brands, budget, fuel, types, transmission, gender, age_range)
 
+def get_recommendation_page(brands=None, budget=None, fuel=None, types=None, transmission=None, gender=None,
+                            age_range=None, cursor: str = None, page_size: int = RESULT_LIMIT) -> tuple:
+    """
+    Página de recomendaciones con cursor (ver CarRecommender.get_recommendation_page)
+    
+    Sin conexión a Neo4j se pagina la lista de respaldo
+    
+    Raises:
+        InvalidCursorError: Cursor mal formado o de otra búsqueda
+    """
+    recommender = get_recommender_instance()
+    if recommender is not None:
+        try:
+            return recommender.get_recommendation_page(brands, budget, fuel, types, transmission, gender, age_range,
+                                                       cursor, page_size)
+        except recommendation_cursor.InvalidCursorError:
+            raise
+        except Exception as e:
+            logger.warning(f"Página de recomendaciones desde el respaldo: {e}")
+    
+    search = recommendation_cursor.fingerprint(brands, budget, fuel, types, transmission, gender, age_range)
+    fallback = get_fallback_recommendations(brands, budget, fuel, types, transmission, gender, age_range)
+    return recommendation_cursor.paginate(fallback, cursor, page_size, search)
+
+def prefetch_recommendations(brands=None, budget=None, fuel=None, types=None) -> bool:
+    """
+    Prefetch especulativo de candidatos (llamado desde /api/save-types)
+    
+    Nunca lanza excepciones: un fallo solo significa que el último paso consultará Neo4j
+    """
+    recommender = get_recommender_instance()
+    if recommender is None:
+        return False
+    try:
+        return recommender.prefetch_candidates(brands, budget, fuel, types)
+    except Exception as e:
+        logger.warning(f"No se pudo lanzar el prefetch de candidatos: {e}")
+        return False
+
+def collect_metrics() -> List[tuple]:
+    """Colector de metrics.REGISTRY: estado de la conexión, caché, prefetch y pool de la instancia ya creada"""
+    connection = _recommender_connection
+    if connection is None:
+        return []
+    
+    families = [
+        ("neo4j_connected", "gauge", "1 si el recomendador tiene conexión a Neo4j", int(connection.connected)),
+        ("neo4j_connect_attempts_total", "counter", "Intentos de conexión a Neo4j", connection.attempts),
+        ("neo4j_connect_failures_total", "counter", "Intentos de conexión a Neo4j fallidos", connection.failures)
+    ]
+    recommender = connection.instance
+    if recommender is None:
+        return families
+    
+    cache = recommender.cache
+    if cache is not None:
+        families += [
+            ("recommendation_cache_hits_total", "counter", "Aciertos de la caché de recomendaciones", cache.hits),
+            ("recommendation_cache_misses_total", "counter", "Fallos de la caché de recomendaciones", cache.misses),
+            ("recommendation_cache_evictions_total", "counter", "Entradas desalojadas de la caché", cache.evictions),
+            ("recommendation_cache_entries", "gauge", "Entradas en la caché de recomendaciones", len(cache)),
+            ("recommendation_cache_stale_hits_total", "counter", "Recomendaciones servidas desde caché vencida", cache.stale_hits)
+        ]
+    prefetcher = recommender.prefetcher
+    if prefetcher is not None:
+        families += [
+            ("recommendation_prefetch_hits_total", "counter", "Recomendaciones servidas desde prefetch", prefetcher.hits),
+            ("recommendation_prefetch_misses_total", "counter", "Recomendaciones sin prefetch utilizable", prefetcher.misses)
+        ]
+    breaker = recommender.breaker
+    if breaker is not None:
+        families += [
+            ("recommendation_breaker_open", "gauge", "1 si el circuito de consultas a Neo4j no está cerrado",
+             int(breaker.state != circuit_breaker.CLOSED)),
+            ("recommendation_breaker_opened_total", "counter", "Veces que se abrió el circuito", breaker.times_opened),
+            ("recommendation_breaker_rejected_total", "counter", "Consultas rechazadas con el circuito abierto", breaker.rejected)
+        ]
+    topn_table = recommender.topn_table
+    if topn_table is not None:
+        families += [
+            ("recommendation_topn_hits_total", "counter", "Recomendaciones servidas desde la tabla top-N", topn_table.hits),
+            ("recommendation_topn_misses_total", "counter", "Búsquedas que la tabla top-N no pudo responder", topn_table.misses)
+        ]
+    watcher = recommender.catalog_watcher
+    if watcher is not None and watcher.version is not None:
+        families += [
+            ("catalog_version", "gauge", "Última versión del catálogo vista por este proceso", watcher.version),
+            ("catalog_changes_applied_total", "counter", "Cambios del catálogo de otros procesos aplicados",
+             watcher.changes_applied)
+        ]
+    families += metrics.pool_metric_families(metrics.driver_pool_stats(recommender.driver), "recommender")
+    return families
+
+metrics.REGISTRY.register_collector(collect_metrics)
+
+def get_prefetch_stats() -> Dict[str, Any]:
+    """Estadísticas del prefetch de candidatos"""
+    recommender = _current_instance()
+    if recommender is None or recommender.prefetcher is None:
+        return {}
+    return recommender.prefetcher.stats()
+
+def refresh_catalog_snapshot() -> bool:
+    """Recargar bajo demanda el snapshot del catálogo (si el motor lo usa)"""
+    recommender = get_recommender_instance()
+    if recommender is None:
+        return False
+    return recommender.refresh_catalog()
+
+def invalidate_recommendation_cache(action: str = None, car_id: str = None):
+    """
+    Notificar un cambio del catálogo hecho en este mismo proceso (ej: Gestionador.add_catalog_listener)
+    
+    Los cambios de otros procesos llegan por la versión del catálogo (check_catalog_version).
+    Usa la instancia ya creada: si no existe todavía no hay nada que invalidar
+    """
+    recommender = _current_instance()
+    if recommender is not None:
+        recommender.on_catalog_change(action, car_id)
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Estadísticas de la caché de recomendaciones"""
+    recommender = _current_instance()
+    if recommender is None or recommender.cache is None:
+        return {}
+    return recommender.cache.stats()
+
+def get_breaker_stats() -> Dict[str, Any]:
+    """Estado del circuit breaker de las consultas de recomendaciones"""
+    recommender = _current_instance()
+    if recommender is None or recommender.breaker is None:
+        return {}
+    return recommender.breaker.stats()
+
+def get_topn_stats() -> Dict[str, Any]:
+    """Estado de la tabla top-N materializada"""
+    recommender = _current_instance()
+    if recommender is None or recommender.topn_table is None:
+        return {}
+    return recommender.topn_table.stats()
+
+def get_connection_stats() -> Dict[str, Any]:
+    """Estado de la conexión gestionada (intentos, último error, próximo reintento)"""
+    if _recommender_connection is None:
+        return {}
+    return _recommender_connection.stats()
+
 def get_fallback_recommendations(brands=None, budget=None, fuel=None, types=None, transmission=None, gender=None, age_range=None):
     """Recomendaciones de respaldo cuando Neo4j no está disponible"""
     logger.warning("Usando recomendaciones de respaldo con personalización demográfica")
@@ -621,47 +1514,40 @@ def apply_demographic_scoring_fallback(recommendations, gender, age_range):
     
     for car in recommendations:
         demographic_bonus = 0
-        car_type = car.get('type', '').lower()
-        car_brand = car.get('brand', '').lower()
-        car_name = car.get('name', '').lower()
-        features_text = str(car.get('features', [])).lower()
+        tags = car_tags.tags_for_car(car)
         
         # Lógica para mujeres
         if gender == 'femenino':
             if age_group == 'young':  # 18-25: igual que hombres jóvenes
-                if car_type in ['coupé', 'convertible'] or any(sport_word in car_name for sport_word in ['sport', 'gt', 'turbo', 'mustang', 'm3']):
+                if tags & car_tags.SPORTY_EXTENDED:
                     demographic_bonus += 5
                     
             elif age_group == 'reproductive':  # 26-45: preferencia familiar
-                if car_type in ['suv']:
+                if tags & car_tags.TAG_SUV:
                     demographic_bonus += 15
-                elif car_type == 'sedán':
+                elif tags & car_tags.TAG_SEDAN:
                     demographic_bonus += 10
                 # Bonus por características familiares
-                if any(family_word in features_text for family_word in ['familia', 'seguridad', 'espacio', 'asientos']):
+                if tags & car_tags.TAG_FAMILY:
                     demographic_bonus += 8
                     
             elif age_group == 'mature':  # 46+: comfort y luxury
-                if any(luxury_brand in car_brand for luxury_brand in ['mercedes', 'bmw', 'audi', 'lexus']):
+                if tags & car_tags.TAG_LUXURY_BRAND:
                     demographic_bonus += 12
         
         # Lógica para hombres
         elif gender == 'masculino':
             if age_group == 'young':  # 18-25: deportivos
-                if car_type in ['coupé', 'convertible'] or any(sport_word in car_name for sport_word in ['sport', 'gt', 'turbo', 'mustang', 'm3']):
+                if tags & car_tags.SPORTY_EXTENDED:
                     demographic_bonus += 8
                     
             elif age_group == 'mature':  # 46+: comfort y luxury
-                if any(luxury_brand in car_brand for luxury_brand in ['mercedes', 'bmw', 'audi', 'lexus']):
+                if tags & car_tags.TAG_LUXURY_BRAND:
                     demographic_bonus += 12
         
         # Para todos: bonificación por características de comfort en edad madura
-        if age_group == 'mature':
-            comfort_features = ['cuero', 'premium', 'lujo', 'confort', 'leather', 'luxury']
-            for feature in comfort_features:
-                if feature in features_text:
-                    demographic_bonus += 3
-                    break
+        if age_group == 'mature' and tags & car_tags.COMFORT:
+            demographic_bonus += 3
         
         # Aplicar bonificación
         if demographic_bonus > 0:
@@ -698,10 +1584,10 @@ def test_connection():
 # Función para limpiar recursos al cerrar la aplicación
 def cleanup():
     """Limpiar recursos del recomendador"""
-    global _recommender_instance
-    if _recommender_instance:
-        _recommender_instance.close()
-        _recommender_instance = None
+    global _recommender_connection
+    if _recommender_connection is not None:
+        _recommender_connection.close()
+        _recommender_connection = None
 
 # Registrar función de limpieza
 import atexit
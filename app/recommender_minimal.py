@@ -5,18 +5,34 @@ Sistema de recomendaciones de autos usando Neo4j (versión simplificada para Pyt
 
 from neo4j import GraphDatabase
 import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+# Ejecutado como script (python app/recommender_minimal.py) la raíz del proyecto, con el paquete shared, no está en el path
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fake_neo4j
+import metrics
+from shared import logging_setup
+
+logging_setup.configure_logging()
+logger = logging.getLogger(__name__)
 
 class CarRecommender:
-    def __init__(self, uri, user, password):
-        """Inicializar conexión a Neo4j"""
+    def __init__(self, uri, user, password, driver=None):
+        """Inicializar conexión a Neo4j (o usar un driver ya creado)"""
         try:
-            self.driver = GraphDatabase.driver(uri, auth=(user, password))
+            self.driver = driver if driver is not None else GraphDatabase.driver(uri, auth=(user, password))
             # Verificar conexión
             with self.driver.session() as session:
                 session.run("RETURN 1")
-            print("✓ Conexión exitosa a Neo4j")
+            logger.info("Conexión exitosa a Neo4j")
         except Exception as e:
-            print(f"✗ Error conectando a Neo4j: {e}")
+            logger.error("Error conectando a Neo4j: %s", e)
             raise
     
     def close(self):
@@ -35,18 +51,16 @@ class CarRecommender:
             else:
                 return (0, int(budget_str))
         except Exception as e:
-            print(f"Error parseando presupuesto '{budget_str}': {e}")
+            logger.warning("Error parseando presupuesto '%s': %s", budget_str, e)
             return (0, 999999999)
     
     def get_recommendations(self, brands=None, budget=None, fuel=None, types=None, transmission=None):
         """Obtener recomendaciones de autos"""
         try:
-            print("=== GENERANDO RECOMENDACIONES ===")
-            print(f"Brands: {brands}")
-            print(f"Budget: {budget}")
-            print(f"Fuel: {fuel}")
-            print(f"Types: {types}")
-            print(f"Transmission: {transmission}")
+            stage_start = time.perf_counter()
+            logger.debug("Generando recomendaciones", extra={
+                "brands": brands, "budget": budget, "fuel": fuel, "types": types, "transmission": transmission
+            })
             
             # Normalizar entrada
             if brands and isinstance(brands, dict):
@@ -57,6 +71,9 @@ class CarRecommender:
             else:
                 min_price, max_price = 0, 999999999
             
+            # La normalización de combustible, tipos y transmisión se mide junto con la consulta
+            stage_start = self._end_stage('normalize_preferences', stage_start)
+            
             # Construir consulta base
             query = """
                 MATCH (a:Auto)
@@ -137,8 +154,8 @@ class CarRecommender:
                 LIMIT 20
             """
             
-            print(f"Query: {query}")
-            print(f"Parameters: {parameters}")
+            logger.debug("Query generada", extra={"query": query, "parameters": parameters})
+            stage_start = self._end_stage('build_recommendation_query', stage_start)
             
             # Ejecutar consulta
             with self.driver.session() as session:
@@ -161,16 +178,24 @@ class CarRecommender:
                     }
                     recommendations.append(car_data)
                 
-                print(f"Encontradas {len(recommendations)} recomendaciones")
+                self._end_stage('execute_recommendation_query', stage_start)
+                logger.debug("Encontradas %d recomendaciones", len(recommendations))
                 return recommendations
                 
-        except Exception as e:
-            print(f"Error en get_recommendations: {e}")
+        except Exception:
+            logger.exception("Error en get_recommendations")
             return self.get_fallback_recommendations(brands, budget, fuel, types, transmission)
     
+    @staticmethod
+    def _end_stage(stage, stage_start):
+        """Registrar la etapa que empezó en stage_start y devolver el inicio de la siguiente"""
+        now = time.perf_counter()
+        metrics.record_stage(stage, now - stage_start)
+        return now
+    
     def get_fallback_recommendations(self, brands=None, budget=None, fuel=None, types=None, transmission=None):
         """Recomendaciones de respaldo"""
-        print("Usando recomendaciones de respaldo")
+        logger.warning("Usando recomendaciones de respaldo")
         
         fallback_cars = [
             {
@@ -225,38 +250,53 @@ def get_recommender_instance():
     if _recommender_instance is None:
         # Configuración específica con tu contraseña
         configs = [
-            {"uri": "bolt://localhost:7687", "user": "neo4j", "password": "estructura"},
+            {"uri": os.environ.get("NEO4J_URI", "bolt://localhost:7687"), "user": "neo4j", "password": "estructura"},
         ]
         
         for config in configs:
             try:
-                print(f"Probando conexión: {config['uri']} con usuario {config['user']}")
-                _recommender_instance = CarRecommender(config["uri"], config["user"], config["password"])
-                print(f"✓ Conexión exitosa con configuración: {config}")
+                logger.info("Probando conexión: %s con usuario %s", config['uri'], config['user'])
+                # fake://... usa el driver simulado en memoria
+                driver = fake_neo4j.driver_from_uri(config["uri"]) if fake_neo4j.is_fake_uri(config["uri"]) else None
+                _recommender_instance = CarRecommender(config["uri"], config["user"], config["password"], driver=driver)
+                logger.info("Conexión exitosa con %s", config['uri'])
                 break
             except Exception as e:
-                print(f"✗ Falló configuración {config}: {e}")
+                logger.warning("Falló la conexión a %s: %s", config['uri'], e)
                 continue
         
         if _recommender_instance is None:
-            print("⚠️ No se pudo conectar a Neo4j, usando modo de respaldo")
+            logger.warning("No se pudo conectar a Neo4j, usando modo de respaldo")
     
     return _recommender_instance
 
-def get_recommendations(brands=None, budget=None, fuel=None, types=None, transmission=None):
-    """Función principal para obtener recomendaciones"""
+def get_recommendations(brands=None, budget=None, fuel=None, types=None, transmission=None, gender=None, age_range=None):
+    """
+    Función principal para obtener recomendaciones
+    
+    gender y age_range se aceptan por compatibilidad con app.py, que aplica
+    la personalización demográfica cuando esta versión no la hace
+    """
     recommender = get_recommender_instance()
     
     if recommender is None:
-        print("No hay conexión a Neo4j, usando datos de ejemplo")
+        logger.warning("No hay conexión a Neo4j, usando datos de ejemplo")
         return CarRecommender(None, None, None).get_fallback_recommendations(brands, budget, fuel, types, transmission)
     
     try:
         return recommender.get_recommendations(brands, budget, fuel, types, transmission)
     except Exception as e:
-        print(f"Error en get_recommendations: {e}")
+        logger.error("Error en get_recommendations: %s", e)
         return CarRecommender(None, None, None).get_fallback_recommendations(brands, budget, fuel, types, transmission)
 
+def collect_metrics():
+    """Colector de metrics.REGISTRY: pool de conexiones de la instancia ya creada"""
+    if _recommender_instance is None:
+        return []
+    return metrics.pool_metric_families(metrics.driver_pool_stats(_recommender_instance.driver), "recommender_minimal")
+
+metrics.REGISTRY.register_collector(collect_metrics)
+
 def test_connection():
     """Probar conexión"""
     try:
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Puntuación vectorizada de candidatos con NumPy
+Convierte los candidatos en columnas (precio, códigos de marca/tipo, etiquetas precalculadas)
+y calcula en una sola pasada la misma puntuación que add_similarity_score + apply_demographic_scoring
+
+Las mismas reglas también se generan como expresiones Cypher para que la consulta
+compacta puntúe, ordene y limite directamente en Neo4j
+"""
+
+import logging
+from typing import List, Dict, Any, Optional
+
+from shared import car_tags
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:  # NumPy es opcional: sin él se usa la puntuación en Python puro
+    np = None
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Etiquetas que usan las reglas demográficas de CarRecommender.apply_demographic_scoring
+FLAG_MASKS = (
+    car_tags.SPORTY,
+    car_tags.TAG_SUV,
+    car_tags.TAG_SEDAN,
+    car_tags.TAG_FAMILY,
+    car_tags.TAG_LUXURY_BRAND,
+    car_tags.COMFORT
+)
+
+class CandidateColumns:
+    """Candidatos en formato columnar"""
+
+    def __init__(self, cars: List[Dict[str, Any]]):
+        self.cars = cars
+        self.price = np.fromiter((car['price'] for car in cars), dtype=np.float64, count=len(cars))
+        self.feature_count = np.fromiter((len(car['features'] or []) for car in cars), dtype=np.float64, count=len(cars))
+
+        # Códigos enteros por valor de atributo
+        self.codes = {}
+        self.vocabulary = {}
+        for attribute in ('brand', 'type', 'fuel', 'transmission'):
+            vocabulary = {}
+            self.codes[attribute] = np.fromiter(
+                (vocabulary.setdefault(car[attribute], len(vocabulary)) for car in cars),
+                dtype=np.int32, count=len(cars)
+            )
+            self.vocabulary[attribute] = vocabulary
+
+        # Banderas demográficas como pruebas de bits sobre las etiquetas precalculadas
+        tags = np.fromiter((car_tags.tags_for_car(car) for car in cars), dtype=np.int64, count=len(cars))
+        masks = np.array(FLAG_MASKS, dtype=np.int64)
+        flags = (tags[:, None] & masks) != 0
+        (self.is_sporty, self.is_suv, self.is_sedan,
+         self.has_family, self.is_luxury, self.has_comfort) = flags.T
+
+    def __len__(self) -> int:
+        return len(self.cars)
+
+    def matches(self, attribute: str, values) -> 'np.ndarray':
+        """Máscara de autos cuyo atributo está en values"""
+        if isinstance(values, str):
+            values = [values]
+        vocabulary = self.vocabulary[attribute]
+        wanted = [vocabulary[value] for value in values if value in vocabulary]
+        return np.isin(self.codes[attribute], wanted)
+
+def similarity_scores(columns: CandidateColumns, preferences: Dict) -> 'np.ndarray':
+    """Puntuación de similitud (mismas reglas y orden de sumas que add_similarity_score)"""
+    score = np.zeros(len(columns))
+
+    if preferences['max_price'] != float('inf'):
+        score += (1 - columns.price / preferences['max_price']) * 30
+    if preferences['brands']:
+        score += np.where(columns.matches('brand', preferences['brands']), 25, 0)
+    if preferences['types']:
+        score += np.where(columns.matches('type', preferences['types']), 20, 0)
+    if preferences['fuel']:
+        score += np.where(columns.matches('fuel', preferences['fuel']), 15, 0)
+    if preferences['transmission']:
+        score += np.where(columns.matches('transmission', preferences['transmission']), 10, 0)
+    score += columns.feature_count * 2
+
+    return np.round(score, 2)
+
+def demographic_bonus(columns: CandidateColumns, gender: str, age_group: str) -> 'np.ndarray':
+    """Bonificación demográfica (mismas reglas que apply_demographic_scoring)"""
+    bonus = np.zeros(len(columns))
+
+    if gender == 'femenino':
+        if age_group == 'young':
+            bonus += np.where(columns.is_sporty, 5, 0)
+        elif age_group == 'reproductive':
+            bonus += np.where(columns.is_suv, 15, np.where(columns.is_sedan, 10, 0))
+            bonus += np.where(columns.has_family, 8, 0)
+        elif age_group == 'mature':
+            bonus += np.where(columns.is_luxury, 12, 0)
+    elif gender == 'masculino':
+        if age_group == 'young':
+            bonus += np.where(columns.is_sporty, 8, 0)
+        elif age_group == 'mature':
+            bonus += np.where(columns.is_luxury, 12, 0)
+
+    if age_group == 'mature':
+        bonus += np.where(columns.has_comfort, 3, 0)
+
+    return bonus
+
+def rank_candidates(cars: List[Dict[str, Any]], preferences: Dict, gender: Optional[str] = None,
+                    age_group: Optional[str] = None, top_k: Optional[int] = 10) -> List[Dict[str, Any]]:
+    """
+    Puntuar y ordenar candidatos devolviendo los top_k mejores
+
+    Orden: puntuación final desc, puntuación base desc, precio asc e id (el de la consulta
+    compacta y de las páginas, ver recommendation_cursor), sin recorrer los autos en Python
+    """
+    if not cars:
+        return []
+
+    columns = CandidateColumns(cars)
+    base = similarity_scores(columns, preferences)
+    bonus = demographic_bonus(columns, gender, age_group) if gender and age_group else np.zeros(len(columns))
+    final = base + bonus
+
+    # Preselección con argpartition incluyendo empates en el límite
+    selected = np.arange(len(columns))
+    if top_k is not None and top_k < len(columns):
+        threshold = final[np.argpartition(-final, top_k - 1)[top_k - 1]]
+        selected = np.flatnonzero(final >= threshold)
+
+    # Puntuación final desc, puntuación base desc, precio asc, id
+    ids = np.array([str(cars[position]['id']) for position in selected])
+    order = selected[np.lexsort((ids, columns.price[selected], -base[selected], -final[selected]))]
+    if top_k is not None:
+        order = order[:top_k]
+
+    ranked = []
+    for position in order:
+        car = cars[position]
+        car['similarity_score'] = float(final[position])
+        if bonus[position] > 0:
+            car['demographic_bonus'] = int(bonus[position])
+        ranked.append(car)
+    return ranked
+
+# ===== Misma puntuación como expresiones Cypher (modo de consulta compacto) =====
+
+# Etiquetas del nodo; el recomendador solo usa el modo compacto si todos los autos las tienen
+# (CarRecommender.compact_tags_ready)
+CYPHER_TAGS = "coalesce(a.etiquetas, 0)"
+
+def has_tag_cypher(mask: int, tags: str = CYPHER_TAGS) -> str:
+    """
+    Condición Cypher "tiene alguno de los bits de mask"
+
+    Cypher no tiene operadores de bits: el bit k está activo si tags % 2^(k+1) >= 2^k
+    """
+    tests = [f"{tags} % {1 << (bit + 1)} >= {1 << bit}" for bit in range(mask.bit_length()) if mask >> bit & 1]
+    return tests[0] if len(tests) == 1 else "(" + " OR ".join(tests) + ")"
+
+def similarity_score_cypher(preferences: Dict, parameters: Dict[str, Any]) -> str:
+    """
+    Puntuación de similitud como expresión Cypher (mismas reglas y orden de sumas que add_similarity_score)
+
+    Usa las variables a, m, t, c y tr de build_compact_query y agrega a parameters
+    los parámetros que necesita
+    """
+    terms = []
+    if preferences['max_price'] != float('inf'):
+        terms.append("(1 - toFloat(a.precio) / $max_price) * 30")
+        parameters['max_price'] = preferences['max_price']
+    if preferences['brands']:
+        terms.append("CASE WHEN m.nombre IN $brands THEN 25 ELSE 0 END")
+        parameters['brands'] = preferences['brands']
+    if preferences['types']:
+        terms.append("CASE WHEN t.categoria IN $types THEN 20 ELSE 0 END")
+        parameters['types'] = preferences['types']
+    if preferences['fuel']:
+        terms.append("CASE WHEN c.tipo = $fuel THEN 15 ELSE 0 END")
+        parameters['fuel'] = preferences['fuel']
+    if preferences['transmission']:
+        terms.append("CASE WHEN tr.tipo = $transmission THEN 10 ELSE 0 END")
+        parameters['transmission'] = preferences['transmission']
+    terms.append("size(coalesce(a.caracteristicas, [])) * 2")
+
+    return "round(" + " + ".join(terms) + ", 2)"
+
+def demographic_bonus_cypher(gender: Optional[str], age_group: Optional[str]) -> str:
+    """Bonificación demográfica como expresión Cypher (mismas reglas que apply_demographic_scoring)"""
+    terms = []
+
+    if gender == 'femenino':
+        if age_group == 'young':
+            terms.append(f"CASE WHEN {has_tag_cypher(car_tags.SPORTY)} THEN 5 ELSE 0 END")
+        elif age_group == 'reproductive':
+            terms.append(f"CASE WHEN {has_tag_cypher(car_tags.TAG_SUV)} THEN 15 "
+                         f"WHEN {has_tag_cypher(car_tags.TAG_SEDAN)} THEN 10 ELSE 0 END")
+            terms.append(f"CASE WHEN {has_tag_cypher(car_tags.TAG_FAMILY)} THEN 8 ELSE 0 END")
+        elif age_group == 'mature':
+            terms.append(f"CASE WHEN {has_tag_cypher(car_tags.TAG_LUXURY_BRAND)} THEN 12 ELSE 0 END")
+    elif gender == 'masculino':
+        if age_group == 'young':
+            terms.append(f"CASE WHEN {has_tag_cypher(car_tags.SPORTY)} THEN 8 ELSE 0 END")
+        elif age_group == 'mature':
+            terms.append(f"CASE WHEN {has_tag_cypher(car_tags.TAG_LUXURY_BRAND)} THEN 12 ELSE 0 END")
+
+    if age_group == 'mature':
+        terms.append(f"CASE WHEN {has_tag_cypher(car_tags.COMFORT)} THEN 3 ELSE 0 END")
+
+    return " + ".join(terms) if terms else "0"
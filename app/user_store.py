@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+"""
+Almacén de usuarios, perfiles y favoritos
+Reemplaza los diccionarios USERS_DB/USER_PROFILES/USER_FAVORITES de app.py por una capa con
+backend intercambiable (SQLite en modo WAL o memoria), escrituras diferidas en un hilo de
+fondo (write-behind) y lecturas desde una caché caliente en memoria
+
+Varios procesos (ej: workers de gunicorn) pueden compartir el mismo archivo SQLite: cada
+proceso detecta las escrituras de los demás con PRAGMA data_version y descarta su caché
+
+Los favoritos son una fila por (usuario, auto) y se escriben en el momento con INSERT y
+DELETE en una transacción: dos procesos que agregan o quitan favoritos del mismo usuario
+a la vez no se pisan, y los resultados (autos agregados, eliminados) son los de la base
+"""
+
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_DB_PATH = PROJECT_ROOT / "data" / "users.db"
+
+# Espacios de claves (una fila por usuario en cada uno)
+USERS = 'users'
+PROFILES = 'profiles'
+FAVORITES = 'favorites'  # Solo en la caché y en bases anteriores (ver SQLiteBackend.migrate_favorites)
+
+_MISSING = object()  # Clave ausente de la cola y de la caché
+
+class FavoriteIndex:
+    """
+    Favoritos de un usuario: índice de ids en orden de inserción y datos de cada auto aparte
+
+    Pertenencia, alta y baja en O(1); el orden de inserción se conserva para listarlos
+    """
+
+    def __init__(self, ids: Iterable[str] = (), cars: Optional[Dict[str, Dict[str, Any]]] = None):
+        self._ids = dict.fromkeys(ids)  # Conjunto ordenado de ids
+        self._cars = dict(cars or {})  # id -> datos del auto
+
+    @classmethod
+    def from_value(cls, value: Any) -> 'FavoriteIndex':
+        """Crear desde el valor persistido (o la lista de autos del formato anterior)"""
+        if isinstance(value, dict):
+            return cls(value.get('ids', []), value.get('cars'))
+        index = cls()
+        index.add_many(value or [])
+        return index
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, car_id: str) -> bool:
+        return car_id in self._ids
+
+    def add_many(self, cars: Iterable[Dict[str, Any]]) -> List[str]:
+        """Agregar autos nuevos (ignora duplicados y autos sin id); devuelve los ids agregados"""
+        added = []
+        for car in cars:
+            car_id = car.get('id') if isinstance(car, dict) else None
+            if car_id is None or car_id in self._ids:
+                continue
+            self._ids[car_id] = None
+            self._cars[car_id] = car
+            added.append(car_id)
+        return added
+
+    def remove_many(self, car_ids: Iterable[str]) -> int:
+        """Eliminar autos por id; devuelve cuántos existían"""
+        removed = 0
+        for car_id in car_ids:
+            if car_id in self._ids:
+                del self._ids[car_id]
+                self._cars.pop(car_id, None)
+                removed += 1
+        return removed
+
+    def clear(self) -> int:
+        removed = len(self._ids)
+        self._ids.clear()
+        self._cars.clear()
+        return removed
+
+    def cars(self) -> List[Dict[str, Any]]:
+        """Autos en orden de inserción"""
+        return [self._cars[car_id] for car_id in self._ids]
+
+# ===== Backends =====
+
+class MemoryBackend:
+    """Backend en memoria (un solo proceso, se pierde al reiniciar)"""
+
+    def __init__(self):
+        self._data = {}  # (espacio, clave) -> valor
+        self._favorites = {}  # usuario -> FavoriteIndex
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._data.get((namespace, key))
+
+    def write_many(self, items: Iterable[Tuple[Tuple[str, str], Optional[Any]]]):
+        with self._lock:
+            for slot, value in items:
+                if value is None:
+                    self._data.pop(slot, None)
+                else:
+                    self._data[slot] = value
+
+    def values(self, namespace: str) -> List[Any]:
+        with self._lock:
+            return [value for (space, _), value in self._data.items() if space == namespace]
+
+    def count(self, namespace: str) -> int:
+        return len(self.values(namespace))
+
+    def favorites(self, email: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            index = self._favorites.get(email)
+            return index.cars() if index is not None else []
+
+    def add_favorites(self, email: str, cars: List[Dict[str, Any]]) -> List[str]:
+        with self._lock:
+            return self._favorites.setdefault(email, FavoriteIndex()).add_many(cars)
+
+    def remove_favorites(self, email: str, car_ids: List[str]) -> int:
+        with self._lock:
+            index = self._favorites.get(email)
+            return index.remove_many(car_ids) if index is not None else 0
+
+    def replace_favorites(self, email: str, cars: List[Dict[str, Any]]) -> int:
+        with self._lock:
+            previous = self._favorites.pop(email, None)
+            self._favorites[email] = FavoriteIndex()
+            self._favorites[email].add_many(cars)
+            return len(previous) if previous is not None else 0
+
+    def count_favorites(self) -> int:
+        with self._lock:
+            return sum(len(index) for index in self._favorites.values())
+
+    def data_version(self) -> int:
+        return 0  # Nadie más escribe en este backend
+
+    def reopen(self):
+        pass
+
+    def close(self):
+        pass
+
+class SQLiteBackend:
+    """Backend SQLite en modo WAL (lectores concurrentes, un escritor a la vez, varios procesos)"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS kv (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        ) WITHOUT ROWID
+    """
+
+    # Una fila por favorito; el id autoincremental conserva el orden de inserción
+    FAVORITES_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS favorites (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL,
+            car_id TEXT NOT NULL,
+            car TEXT NOT NULL,
+            added_at REAL NOT NULL,
+            UNIQUE (email, car_id)
+        )
+    """
+
+    def __init__(self, path: Path, busy_timeout_ms: int = 5000):
+        """
+        Args:
+            path: Archivo de la base de datos (se crea si no existe)
+            busy_timeout_ms: Espera máxima cuando otro proceso tiene el bloqueo de escritura
+        """
+        self.path = Path(path)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._lock = threading.Lock()
+        self._connection = None
+        self.reopen()
+
+    def reopen(self):
+        """Abrir una conexión propia (también tras un fork del proceso)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        connection.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")  # Seguro en WAL; solo se arriesga el último commit ante un corte de luz
+        connection.execute(self.SCHEMA)
+        connection.execute(self.FAVORITES_SCHEMA)
+        with self._lock:
+            self._connection = connection
+        self.migrate_favorites()
+
+    def _transaction(self, work):
+        """Ejecutar work(connection) en una transacción con el bloqueo de escritura tomado desde el inicio"""
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(connection)
+                connection.execute("COMMIT")
+                return result
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def migrate_favorites(self):
+        """Pasar los favoritos guardados como un valor JSON por usuario (kv) a filas"""
+        def migrate(connection):
+            rows = connection.execute("SELECT key, value FROM kv WHERE namespace = ?", (FAVORITES,)).fetchall()
+            for email, value in rows:
+                _insert_favorites(connection, email, FavoriteIndex.from_value(json.loads(value)).cars())
+            connection.execute("DELETE FROM kv WHERE namespace = ?", (FAVORITES,))
+            return len(rows)
+
+        migrated = self._transaction(migrate)
+        if migrated:
+            logger.info(f"Favoritos de {migrated} usuarios migrados a filas")
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def write_many(self, items: Iterable[Tuple[Tuple[str, str], Optional[Any]]]):
+        now = time.time()
+        upserts = []
+        deletes = []
+        for (namespace, key), value in items:
+            if value is None:
+                deletes.append((namespace, key))
+            else:
+                upserts.append((namespace, key, json.dumps(value, ensure_ascii=False), now))
+
+        def write(connection):
+            connection.executemany(
+                "INSERT INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                upserts
+            )
+            connection.executemany("DELETE FROM kv WHERE namespace = ? AND key = ?", deletes)
+
+        self._transaction(write)
+
+    def values(self, namespace: str) -> List[Any]:
+        with self._lock:
+            rows = self._connection.execute("SELECT value FROM kv WHERE namespace = ?", (namespace,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def count(self, namespace: str) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT count(*) FROM kv WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+    def favorites(self, email: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connection.execute("SELECT car FROM favorites WHERE email = ? ORDER BY id", (email,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def add_favorites(self, email: str, cars: List[Dict[str, Any]]) -> List[str]:
+        return self._transaction(lambda connection: _insert_favorites(connection, email, cars))
+
+    def remove_favorites(self, email: str, car_ids: List[str]) -> int:
+        def remove(connection):
+            return sum(connection.execute("DELETE FROM favorites WHERE email = ? AND car_id = ?",
+                                          (email, str(car_id))).rowcount for car_id in car_ids)
+
+        return self._transaction(remove)
+
+    def replace_favorites(self, email: str, cars: List[Dict[str, Any]]) -> int:
+        def replace(connection):
+            removed = connection.execute("DELETE FROM favorites WHERE email = ?", (email,)).rowcount
+            _insert_favorites(connection, email, cars)
+            return removed
+
+        return self._transaction(replace)
+
+    def count_favorites(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT count(*) FROM favorites").fetchone()[0]
+
+    def data_version(self) -> int:
+        """Cambia cuando otra conexión (otro proceso) confirma una escritura"""
+        with self._lock:
+            return self._connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+def _insert_favorites(connection, email: str, cars: Iterable[Dict[str, Any]]) -> List[str]:
+    """Insertar favoritos (ignora duplicados y autos sin id); devuelve los ids agregados"""
+    now = time.time()
+    added = []
+    for car in cars:
+        car_id = car.get('id') if isinstance(car, dict) else None
+        if car_id is None:
+            continue
+        cursor = connection.execute(
+            "INSERT INTO favorites (email, car_id, car, added_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (email, car_id) DO NOTHING",
+            (email, str(car_id), json.dumps(car, ensure_ascii=False), now)
+        )
+        if cursor.rowcount:
+            added.append(car_id)
+    return added
+
+# ===== Almacén =====
+
+class UserStore:
+    def __init__(self, backend, flush_interval: float = 0.05, sync_interval: float = 0.5,
+                 cache_size: int = 10000):
+        """
+        Inicializar almacén
+
+        Args:
+            backend: MemoryBackend o SQLiteBackend
+            flush_interval: Segundos máximos que una escritura espera en la cola antes de persistirse
+            sync_interval: Segundos entre comprobaciones de escrituras de otros procesos
+            cache_size: Claves en la caché caliente (LRU)
+        """
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.sync_interval = sync_interval
+        self.cache_size = cache_size
+
+        self._cache = OrderedDict()  # (espacio, clave) -> valor leído o escrito
+        self._pending = {}  # Escrituras en cola: (espacio, clave) -> valor (None = borrar)
+        self._inflight = {}  # Escrituras que el hilo de fondo está confirmando
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flushed = threading.Condition(self._lock)
+        self._stop = False
+        self._writer = None
+        self._pid = None
+        self._data_version = None
+        self._next_sync = 0.0
+        self._generation = 0  # Cambia al descartar la caché o escribir favoritos: lecturas en curso no la rellenan
+
+    # ----- Hilo de escritura diferida -----
+
+    def _ensure_writer(self):
+        """Arrancar el hilo de escritura (de nuevo si el proceso se bifurcó tras crearse)"""
+        if self._pid == os.getpid() and self._writer is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._writer is not None:
+                return
+            if self._pid is not None:
+                # Proceso hijo: el hilo y la conexión del padre no existen aquí
+                self.backend.reopen()
+                self._cache.clear()
+            self._pid = os.getpid()
+            self._stop = False
+            self._writer = threading.Thread(target=self._write_loop, name="user-store-writer", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            with self._lock:
+                if not self._pending:
+                    self._flushed.notify_all()
+                    if self._stop:
+                        return
+                    continue
+                batch = self._pending
+                self._pending = {}
+                self._inflight = batch
+
+            try:
+                self.backend.write_many(batch.items())
+            except Exception as e:
+                logger.error(f"Error persistiendo {len(batch)} escrituras de usuarios: {e}")
+                with self._lock:
+                    # Reencolar lo que no fue reemplazado por una escritura más reciente
+                    for slot, value in batch.items():
+                        self._pending.setdefault(slot, value)
+                time.sleep(self.flush_interval)
+            finally:
+                with self._lock:
+                    self._inflight = {}
+                    self._flushed.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Esperar a que todas las escrituras en cola estén persistidas"""
+        self._ensure_writer()
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self._pending or self._inflight:
+                self._wake.set()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._flushed.wait(remaining)
+        return True
+
+    def close(self):
+        """Persistir la cola y cerrar el backend"""
+        if self._writer is not None and self._pid == os.getpid():
+            self.flush()
+            with self._lock:
+                self._stop = True
+            self._wake.set()
+            self._writer.join(timeout=5)
+            self._writer = None
+        self.backend.close()
+
+    # ----- Caché y acceso genérico -----
+
+    def _sync(self):
+        """Descartar la caché si otro proceso escribió en el backend"""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_sync:
+                return
+            self._next_sync = now + self.sync_interval
+        version = self.backend.data_version()
+        with self._lock:
+            if self._data_version is not None and version != self._data_version:
+                self._cache.clear()
+                self._generation += 1
+            self._data_version = version
+
+    def _remember(self, slot: Tuple[str, str], value: Any):
+        """Guardar en la caché caliente (con el lock tomado)"""
+        self._cache[slot] = value
+        self._cache.move_to_end(slot)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _lookup(self, slot: Tuple[str, str]) -> Any:
+        """Valor vigente en la cola o en la caché (con el lock tomado); _MISSING si no está"""
+        for layer in (self._pending, self._inflight):
+            if slot in layer:
+                return layer[slot]
+        if slot in self._cache:
+            self._cache.move_to_end(slot)
+            return self._cache[slot]
+        return _MISSING
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Leer un valor (cola de escritura > caché > backend)"""
+        self._ensure_writer()
+        self._sync()
+        slot = (namespace, key)
+        with self._lock:
+            value = self._lookup(slot)
+            generation = self._generation
+        if value is not _MISSING:
+            return _copy(value)
+
+        value = self.backend.get(namespace, key)
+        with self._lock:
+            if slot not in self._pending and slot not in self._inflight and generation == self._generation:
+                self._remember(slot, value)
+        return _copy(value)
+
+    def set(self, namespace: str, key: str, value: Optional[Any]):
+        """Escribir un valor (None = borrar): visible de inmediato, persistido en segundo plano"""
+        self._ensure_writer()
+        slot = (namespace, key)
+        value = _copy(value)
+        with self._lock:
+            self._pending[slot] = value
+            self._remember(slot, value)
+
+    def count(self, namespace: str) -> int:
+        """Número de claves guardadas en un espacio"""
+        self.flush()
+        return self.backend.count(namespace)
+
+    # ----- API de usuarios -----
+
+    def get_user(self, email: str) -> Optional[Dict[str, Any]]:
+        return self.get(USERS, email)
+
+    def save_user(self, email: str, user_data: Dict[str, Any]):
+        self.set(USERS, email, user_data)
+
+    def get_profile(self, email: str) -> Dict[str, Any]:
+        return self.get(PROFILES, email) or {}
+
+    def save_profile(self, email: str, profile: Dict[str, Any]):
+        self.set(PROFILES, email, profile)
+
+    def update_profile(self, email: str, **fields):
+        """Actualizar campos sueltos del perfil (ej: theme)"""
+        profile = self.get_profile(email)
+        profile.update(fields)
+        self.save_profile(email, profile)
+
+    # ----- API de favoritos -----
+
+    def _favorite_index(self, email: str) -> FavoriteIndex:
+        """Índice de favoritos del usuario para lecturas (caché caliente, cargado del backend)"""
+        self._ensure_writer()
+        self._sync()
+        slot = (FAVORITES, email)
+        with self._lock:
+            index = self._cache.get(slot)
+            if index is not None:
+                self._cache.move_to_end(slot)
+                return index
+            generation = self._generation
+
+        index = FavoriteIndex()
+        index.add_many(self.backend.favorites(email))
+        with self._lock:
+            if generation == self._generation:
+                self._remember(slot, index)
+        return index
+
+    def _write_favorites(self, email: str, write):
+        """Escribir en el backend y descartar el índice en caché (la próxima lectura lo recarga)"""
+        self._ensure_writer()
+        try:
+            return write(self.backend)
+        finally:
+            with self._lock:
+                self._cache.pop((FAVORITES, email), None)
+                self._generation += 1
+
+    def get_favorites(self, email: str) -> List[Dict[str, Any]]:
+        return self._favorite_index(email).cars()
+
+    def save_favorites(self, email: str, favorites: List[Dict[str, Any]]):
+        """Reemplazar todos los favoritos"""
+        self._write_favorites(email, lambda backend: backend.replace_favorites(email, favorites))
+
+    def add_favorites(self, email: str, cars: List[Dict[str, Any]]) -> List[str]:
+        """Agregar autos a favoritos; devuelve los ids que no estaban"""
+        return self._write_favorites(email, lambda backend: backend.add_favorites(email, cars))
+
+    def remove_favorites(self, email: str, car_ids: List[str]) -> int:
+        """Eliminar autos de favoritos; devuelve cuántos se eliminaron"""
+        return self._write_favorites(email, lambda backend: backend.remove_favorites(email, car_ids))
+
+    def clear_favorites(self, email: str) -> int:
+        """Eliminar todos los favoritos; devuelve cuántos había"""
+        return self._write_favorites(email, lambda backend: backend.replace_favorites(email, []))
+
+    def favorite_count(self, email: str) -> int:
+        return len(self._favorite_index(email))
+
+    def has_favorite(self, email: str, car_id: str) -> bool:
+        return car_id in self._favorite_index(email)
+
+    def create_user(self, email: str, user_data: Dict[str, Any]):
+        """Crear usuario con perfil y favoritos vacíos"""
+        self.save_user(email, user_data)
+        self.save_profile(email, {})
+        self.save_favorites(email, [])
+
+    def count_users(self) -> int:
+        return self.count(USERS)
+
+    def count_profiles(self) -> int:
+        return self.count(PROFILES)
+
+    def count_favorites(self) -> int:
+        """Total de favoritos de todos los usuarios"""
+        return self.backend.count_favorites()
+
+def _copy(value: Any) -> Any:
+    """Copia superficial para que los llamadores no modifiquen la caché"""
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+_user_store = None
+_store_lock = threading.Lock()
+
+def get_user_store() -> UserStore:
+    """
+    Obtener instancia singleton del almacén
+
+    Configuración por variables de entorno:
+        USER_STORE              sqlite (por defecto) o memory
+        USER_STORE_PATH         archivo SQLite (por defecto data/users.db)
+        USER_STORE_FLUSH_MS     espera máxima de una escritura en la cola
+        USER_STORE_SYNC_SECONDS intervalo de detección de escrituras de otros procesos
+    """
+    global _user_store
+    with _store_lock:
+        if _user_store is None:
+            kind = os.environ.get("USER_STORE", "sqlite").lower()
+            if kind == "memory":
+                backend = MemoryBackend()
+            else:
+                backend = SQLiteBackend(Path(os.environ.get("USER_STORE_PATH", DEFAULT_DB_PATH)))
+
+            _user_store = UserStore(
+                backend,
+                flush_interval=float(os.environ.get("USER_STORE_FLUSH_MS", "50")) / 1000,
+                sync_interval=float(os.environ.get("USER_STORE_SYNC_SECONDS", "0.5"))
+            )
+            logger.info(f"Almacén de usuarios: {kind}")
+
+    return _user_store
+
+def cleanup():
+    """Persistir escrituras pendientes al cerrar la aplicación"""
+    global _user_store
+    if _user_store is not None:
+        _user_store.close()
+        _user_store = None
+
+atexit.register(cleanup)
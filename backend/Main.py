@@ -1,3 +1,9 @@
+import sys
+from pathlib import Path
+
+# La raíz del proyecto en el path para el paquete shared (módulos comunes con la app)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
 from gestionador import Gestionador
 
 def main():
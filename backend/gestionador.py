@@ -1,35 +1,134 @@
 #!/usr/bin/env python3
 """
 Gestionador mejorado para Neo4j con funcionalidades específicas para el sistema de recomendaciones
+
+Las consultas van en transacciones explícitas: lecturas con execute_read y cambios del
+catálogo con execute_write. Con una URI neo4j:// el driver reparte las lecturas entre los
+seguidores de un clúster y envía las escrituras al líder
 """
 
 from neo4j import GraphDatabase
+from neo4j.exceptions import ClientError
 import logging
-from typing import List, Dict, Any, Optional
+import time
+from itertools import islice
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator
+
+# Módulos compartidos con la app (etiquetas precalculadas, atributos, versión del catálogo, logging y consultas lentas)
+from shared import car_attributes, car_tags, catalog_version, logging_setup
+from shared.slow_query_log import get_slow_query_log
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# Configurar logging (cola no bloqueante y salida JSON, ver shared/logging_setup.py)
+logging_setup.configure_logging()
 logger = logging.getLogger(__name__)
 
+# Segundos máximos que execute_read/execute_write reintentan errores transitorios
+# (el valor por defecto del driver son 30 s por transacción)
+MAX_RETRY_SECONDS = 5
+
+# Inserción masiva: un solo UNWIND por lote crea autos y relaciones opcionales.
+# Escritura idempotente: reintentar un lote ya escrito no duplica autos
+BULK_CREATE_QUERY = """
+    UNWIND $rows AS row
+    MERGE (a:Auto {id: row.id})
+    SET a.modelo = row.modelo,
+        a.año = row.año,
+        a.precio = row.precio,
+        a.caracteristicas = row.caracteristicas,
+        a.etiquetas = row.etiquetas,
+        a.marca = row.marca,
+        a.tipo = row.tipo,
+        a.combustible = row.combustible,
+        a.transmision = row.transmision
+    FOREACH (_ IN CASE WHEN row.marca IS NULL THEN [] ELSE [1] END |
+        MERGE (m:Marca {nombre: row.marca})
+        MERGE (a)-[:ES_MARCA]->(m))
+    FOREACH (_ IN CASE WHEN row.tipo IS NULL THEN [] ELSE [1] END |
+        MERGE (t:Tipo {categoria: row.tipo})
+        MERGE (a)-[:ES_TIPO]->(t))
+    FOREACH (_ IN CASE WHEN row.combustible IS NULL THEN [] ELSE [1] END |
+        MERGE (c:Combustible {tipo: row.combustible})
+        MERGE (a)-[:USA_COMBUSTIBLE]->(c))
+    FOREACH (_ IN CASE WHEN row.transmision IS NULL THEN [] ELSE [1] END |
+        MERGE (tr:Transmision {tipo: row.transmision})
+        MERGE (a)-[:TIENE_TRANSMISION]->(tr))
+    RETURN count(a) as created
+"""
+
+# Errores de los datos de una fila (restricciones, tipos): el lote se reintenta fila por fila.
+# Los de conexión o transitorios afectan a todo el lote y detienen la carga
+ROW_ERRORS = (ClientError, TypeError, ValueError)
+
+BULK_FIELDS = ['id', 'modelo', 'año', 'precio', 'caracteristicas', 'marca', 'tipo', 'combustible', 'transmision']
+
+# Campos que update_car puede cambiar (sus nombres van en el texto de la consulta)
+UPDATABLE_FIELDS = tuple(field for field in BULK_FIELDS if field != 'id')
+
+def _iter_batches(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """Agrupar un iterable en listas de tamaño batch_size sin materializarlo"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
 class Gestionador:
-    def __init__(self, uri: str, user: str, password: str):
+    def __init__(self, uri: str, user: str, password: str, driver=None, database: Optional[str] = None,
+                 max_retry_time: float = MAX_RETRY_SECONDS):
         """
         Inicializar conexión a Neo4j
         
         Args:
-            uri: URI de conexión (ej: bolt://localhost:7687)
+            uri: URI de conexión (ej: neo4j://localhost:7687)
             user: Usuario de Neo4j
             password: Contraseña de Neo4j
+            driver: Driver ya creado (ej: fake_neo4j.FakeDriver para pruebas sin base de datos)
+            database: Base de datos de las sesiones (None = la predeterminada del servidor)
+            max_retry_time: Segundos máximos de reintentos de cada transacción
         """
+        self.session_config = {'database': database} if database else {}
         try:
-            self.driver = GraphDatabase.driver(uri, auth=(user, password))
+            self.driver = driver if driver is not None else GraphDatabase.driver(
+                uri, auth=(user, password), max_transaction_retry_time=max_retry_time)
             # Verificar conexión
-            with self.driver.session() as session:
-                result = session.run("RETURN 'Conexión exitosa' as mensaje")
-                logger.info(f"Neo4j: {result.single()['mensaje']}")
+            mensaje = self._read(lambda tx: tx.run("RETURN 'Conexión exitosa' as mensaje").single()['mensaje'])
+            logger.info(f"Neo4j: {mensaje}")
         except Exception as e:
             logger.error(f"Error conectando a Neo4j: {e}")
             raise ConnectionError(f"No se pudo conectar a Neo4j: {e}")
+        
+        # Funciones a notificar cuando cambia el catálogo (ej: invalidar cachés)
+        self._catalog_listeners = []
+    
+    def add_catalog_listener(self, callback: Callable[[str, str], None]):
+        """
+        Registrar una función que se llama con (acción, id_auto) tras cada cambio del catálogo
+        
+        Solo llega a este proceso: la aplicación Flask corre en otro y se entera por la
+        versión del catálogo que cada escritura anota en Neo4j (shared/catalog_version.py)
+        
+        Ejemplo: gestionador.add_catalog_listener(recommender.invalidate_recommendation_cache)
+        """
+        self._catalog_listeners.append(callback)
+    
+    def _notify_catalog_change(self, action: str, car_id: str):
+        """Notificar a los listeners registrados sin interrumpir la operación"""
+        for callback in self._catalog_listeners:
+            try:
+                callback(action, car_id)
+            except Exception as e:
+                logger.error(f"Error notificando cambio del catálogo: {e}")
+    
+    def _read(self, work: Callable, *args, **kwargs):
+        """Ejecutar work(tx, ...) en una transacción de lectura (el resultado se consume dentro de work)"""
+        with self.driver.session(**self.session_config) as session:
+            return session.execute_read(work, *args, **kwargs)
+    
+    def _write(self, work: Callable, *args, **kwargs):
+        """Ejecutar work(tx, ...) en una transacción de escritura"""
+        with self.driver.session(**self.session_config) as session:
+            return session.execute_write(work, *args, **kwargs)
     
     def close(self):
         """Cerrar conexión a Neo4j"""
@@ -40,8 +139,7 @@ class Gestionador:
     def test_connection(self) -> bool:
         """Probar si la conexión a Neo4j está funcionando"""
         try:
-            with self.driver.session() as session:
-                session.run("RETURN 1 as test")
+            self._read(lambda tx: tx.run("RETURN 1 as test").consume())
             return True
         except Exception as e:
             logger.error(f"Error en conexión: {e}")
@@ -49,35 +147,37 @@ class Gestionador:
     
     def get_database_info(self) -> Dict[str, Any]:
         """Obtener información general de la base de datos"""
+        def read_info(tx):
+            # Obtener versión de Neo4j
+            version_result = tx.run("CALL dbms.components() YIELD name, versions")
+            neo4j_info = version_result.data()
+            
+            # Contar nodos y relaciones
+            nodes_result = tx.run("MATCH (n) RETURN count(n) as total_nodes")
+            total_nodes = nodes_result.single()["total_nodes"]
+            
+            rels_result = tx.run("MATCH ()-[r]->() RETURN count(r) as total_relationships")
+            total_relationships = rels_result.single()["total_relationships"]
+            
+            # Obtener etiquetas de nodos
+            labels_result = tx.run("CALL db.labels()")
+            labels = [record["label"] for record in labels_result]
+            
+            # Obtener tipos de relaciones
+            rel_types_result = tx.run("CALL db.relationshipTypes()")
+            relationship_types = [record["relationshipType"] for record in rel_types_result]
+            
+            return {
+                "neo4j_version": neo4j_info[0]["versions"][0] if neo4j_info else "Unknown",
+                "total_nodes": total_nodes,
+                "total_relationships": total_relationships,
+                "node_labels": labels,
+                "relationship_types": relationship_types,
+                "connection_status": "Connected"
+            }
+        
         try:
-            with self.driver.session() as session:
-                # Obtener versión de Neo4j
-                version_result = session.run("CALL dbms.components() YIELD name, versions")
-                neo4j_info = version_result.data()
-                
-                # Contar nodos y relaciones
-                nodes_result = session.run("MATCH (n) RETURN count(n) as total_nodes")
-                total_nodes = nodes_result.single()["total_nodes"]
-                
-                rels_result = session.run("MATCH ()-[r]->() RETURN count(r) as total_relationships")
-                total_relationships = rels_result.single()["total_relationships"]
-                
-                # Obtener etiquetas de nodos
-                labels_result = session.run("CALL db.labels()")
-                labels = [record["label"] for record in labels_result]
-                
-                # Obtener tipos de relaciones
-                rel_types_result = session.run("CALL db.relationshipTypes()")
-                relationship_types = [record["relationshipType"] for record in rel_types_result]
-                
-                return {
-                    "neo4j_version": neo4j_info[0]["versions"][0] if neo4j_info else "Unknown",
-                    "total_nodes": total_nodes,
-                    "total_relationships": total_relationships,
-                    "node_labels": labels,
-                    "relationship_types": relationship_types,
-                    "connection_status": "Connected"
-                }
+            return self._read(read_info)
         except Exception as e:
             logger.error(f"Error obteniendo información de la base de datos: {e}")
             return {"connection_status": "Error", "error": str(e)}
@@ -85,9 +185,7 @@ class Gestionador:
     def get_cars_count(self) -> int:
         """Obtener número total de autos en la base de datos"""
         try:
-            with self.driver.session() as session:
-                result = session.run("MATCH (a:Auto) RETURN count(a) as count")
-                return result.single()["count"]
+            return self._read(lambda tx: tx.run("MATCH (a:Auto) RETURN count(a) as count").single()["count"])
         except Exception as e:
             logger.error(f"Error contando autos: {e}")
             return 0
@@ -95,9 +193,7 @@ class Gestionador:
     def get_brands(self) -> List[str]:
         """Obtener lista de todas las marcas disponibles"""
         try:
-            with self.driver.session() as session:
-                result = session.run("MATCH (m:Marca) RETURN m.nombre as nombre ORDER BY m.nombre")
-                return [record["nombre"] for record in result]
+            return self._read(lambda tx: [record["nombre"] for record in tx.run("MATCH (m:Marca) RETURN m.nombre as nombre ORDER BY m.nombre")])
         except Exception as e:
             logger.error(f"Error obteniendo marcas: {e}")
             return []
@@ -105,9 +201,7 @@ class Gestionador:
     def get_car_types(self) -> List[str]:
         """Obtener lista de todos los tipos de vehículo disponibles"""
         try:
-            with self.driver.session() as session:
-                result = session.run("MATCH (t:Tipo) RETURN t.categoria as categoria ORDER BY t.categoria")
-                return [record["categoria"] for record in result]
+            return self._read(lambda tx: [record["categoria"] for record in tx.run("MATCH (t:Tipo) RETURN t.categoria as categoria ORDER BY t.categoria")])
         except Exception as e:
             logger.error(f"Error obteniendo tipos: {e}")
             return []
@@ -115,9 +209,7 @@ class Gestionador:
     def get_fuel_types(self) -> List[str]:
         """Obtener lista de todos los tipos de combustible disponibles"""
         try:
-            with self.driver.session() as session:
-                result = session.run("MATCH (c:Combustible) RETURN c.tipo as tipo ORDER BY c.tipo")
-                return [record["tipo"] for record in result]
+            return self._read(lambda tx: [record["tipo"] for record in tx.run("MATCH (c:Combustible) RETURN c.tipo as tipo ORDER BY c.tipo")])
         except Exception as e:
             logger.error(f"Error obteniendo combustibles: {e}")
             return []
@@ -125,9 +217,7 @@ class Gestionador:
     def get_transmission_types(self) -> List[str]:
         """Obtener lista de todos los tipos de transmisión disponibles"""
         try:
-            with self.driver.session() as session:
-                result = session.run("MATCH (tr:Transmision) RETURN tr.tipo as tipo ORDER BY tr.tipo")
-                return [record["tipo"] for record in result]
+            return self._read(lambda tx: [record["tipo"] for record in tx.run("MATCH (tr:Transmision) RETURN tr.tipo as tipo ORDER BY tr.tipo")])
         except Exception as e:
             logger.error(f"Error obteniendo transmisiones: {e}")
             return []
@@ -135,18 +225,16 @@ class Gestionador:
     def get_price_range(self) -> Dict[str, float]:
         """Obtener rango de precios de los autos"""
         try:
-            with self.driver.session() as session:
-                result = session.run("""
-                    MATCH (a:Auto) 
-                    WHERE a.precio IS NOT NULL
-                    RETURN min(a.precio) as min_price, max(a.precio) as max_price, avg(a.precio) as avg_price
-                """)
-                record = result.single()
-                return {
-                    "min_price": float(record["min_price"]) if record["min_price"] else 0.0,
-                    "max_price": float(record["max_price"]) if record["max_price"] else 0.0,
-                    "avg_price": float(record["avg_price"]) if record["avg_price"] else 0.0
-                }
+            record = self._read(lambda tx: tx.run("""
+                MATCH (a:Auto)
+                WHERE a.precio IS NOT NULL
+                RETURN min(a.precio) as min_price, max(a.precio) as max_price, avg(a.precio) as avg_price
+            """).single())
+            return {
+                "min_price": float(record["min_price"]) if record["min_price"] else 0.0,
+                "max_price": float(record["max_price"]) if record["max_price"] else 0.0,
+                "avg_price": float(record["avg_price"]) if record["avg_price"] else 0.0
+            }
         except Exception as e:
             logger.error(f"Error obteniendo rango de precios: {e}")
             return {"min_price": 0.0, "max_price": 0.0, "avg_price": 0.0}
@@ -159,20 +247,34 @@ class Gestionador:
             car_data: Diccionario con datos del auto (id, modelo, año, precio, etc.)
         """
         try:
-            with self.driver.session() as session:
+            # Mismas propiedades que create_cars_bulk, con las etiquetas precalculadas
+            # y las categorías también como propiedades (car_attributes)
+            parameters = dict(car_data)
+            parameters.setdefault('caracteristicas', None)
+            for field in car_attributes.ATTRIBUTE_FIELDS:
+                parameters.setdefault(field, None)
+            parameters['etiquetas'] = car_tags.compute_tags(car_data)
+            
+            def write(tx):
                 # Crear el nodo del auto
-                session.run("""
+                tx.run("""
                     CREATE (a:Auto {
                         id: $id,
                         modelo: $modelo,
                         año: $año,
-                        precio: $precio
+                        precio: $precio,
+                        caracteristicas: $caracteristicas,
+                        etiquetas: $etiquetas,
+                        marca: $marca,
+                        tipo: $tipo,
+                        combustible: $combustible,
+                        transmision: $transmision
                     })
-                """, **car_data)
+                """, parameters)
                 
                 # Conectar con marca si existe
                 if 'marca' in car_data:
-                    session.run("""
+                    tx.run("""
                         MATCH (a:Auto {id: $id})
                         MERGE (m:Marca {nombre: $marca})
                         MERGE (a)-[:ES_MARCA]->(m)
@@ -180,7 +282,7 @@ class Gestionador:
                 
                 # Conectar con tipo si existe
                 if 'tipo' in car_data:
-                    session.run("""
+                    tx.run("""
                         MATCH (a:Auto {id: $id})
                         MERGE (t:Tipo {categoria: $tipo})
                         MERGE (a)-[:ES_TIPO]->(t)
@@ -188,7 +290,7 @@ class Gestionador:
                 
                 # Conectar con combustible si existe
                 if 'combustible' in car_data:
-                    session.run("""
+                    tx.run("""
                         MATCH (a:Auto {id: $id})
                         MERGE (c:Combustible {tipo: $combustible})
                         MERGE (a)-[:USA_COMBUSTIBLE]->(c)
@@ -196,19 +298,119 @@ class Gestionador:
                 
                 # Conectar con transmisión si existe
                 if 'transmision' in car_data:
-                    session.run("""
+                    tx.run("""
                         MATCH (a:Auto {id: $id})
                         MERGE (tr:Transmision {tipo: $transmision})
                         MERGE (a)-[:TIENE_TRANSMISION]->(tr)
                     """, id=car_data['id'], transmision=car_data['transmision'])
                 
-                logger.info(f"Auto creado exitosamente: {car_data.get('id', 'ID desconocido')}")
-                return True
+                # Nueva versión del catálogo para los demás procesos
+                catalog_version.record_change(tx, 'create', car_data['id'])
+            
+            # Nodo, relaciones y versión en una sola transacción de escritura
+            self._write(write)
+            logger.debug("Auto creado exitosamente: %s", car_data.get('id', 'ID desconocido'))
+            
+            self._notify_catalog_change('create', car_data.get('id'))
+            return True
                 
         except Exception as e:
             logger.error(f"Error creando auto: {e}")
             return False
     
+    def create_cars_bulk(self, cars: Iterable[Dict[str, Any]], batch_size: int = 1000) -> Dict[str, Any]:
+        """
+        Crear muchos autos con una transacción UNWIND por lote
+        
+        Los autos se escriben con MERGE sobre el id: un id existente se actualiza. Si Neo4j
+        deja de responder (tras los reintentos del driver), la carga se detiene y el resumen
+        lo indica en 'aborted'; los lotes ya escritos se pueden volver a enviar sin duplicar
+        
+        Args:
+            cars: Iterable de diccionarios con el mismo formato que create_car
+            batch_size: Autos por transacción
+        
+        Returns:
+            Resumen con autos escritos, fallos por fila, rendimiento por lote y el error
+            que detuvo la carga (None si terminó)
+        """
+        summary = {'created': 0, 'failed': [], 'batches': [], 'seconds': 0.0, 'aborted': None}
+        start = time.perf_counter()
+        offset = 0
+        
+        for batch_number, batch in enumerate(_iter_batches(cars, batch_size), 1):
+            batch_start = time.perf_counter()
+            rows = []
+            
+            # Validar filas antes de enviarlas
+            for index, car in enumerate(batch, offset):
+                if not isinstance(car, dict) or car.get('id') is None:
+                    summary['failed'].append({'index': index, 'id': None, 'error': "Falta el campo 'id'"})
+                    continue
+                row = {field: car.get(field) for field in BULK_FIELDS}
+                row['etiquetas'] = car_tags.compute_tags(row)
+                row['_index'] = index
+                rows.append(row)
+            offset += len(batch)
+            
+            try:
+                created = self._write_bulk_rows(rows, summary['failed'])
+            except Exception as e:
+                logger.error(f"Carga masiva detenida en el lote {batch_number}: {e}")
+                summary['failed'].extend({'index': row['_index'], 'id': row['id'], 'error': str(e)} for row in rows)
+                summary['aborted'] = str(e)
+                break
+            summary['created'] += created
+            
+            elapsed = time.perf_counter() - batch_start
+            throughput = created / elapsed if elapsed > 0 else 0.0
+            summary['batches'].append({
+                'batch': batch_number,
+                'rows': len(batch),
+                'created': created,
+                'seconds': round(elapsed, 4),
+                'rows_per_second': round(throughput, 1)
+            })
+            logger.info(f"Lote {batch_number}: {created}/{len(batch)} autos en {elapsed:.2f}s ({throughput:,.0f} autos/s)")
+        
+        summary['seconds'] = round(time.perf_counter() - start, 4)
+        logger.info(f"Carga masiva completada: {summary['created']} autos creados, "
+                    f"{len(summary['failed'])} fallidos en {summary['seconds']:.2f}s")
+        
+        if summary['created']:
+            self._notify_catalog_change('bulk_create', None)
+        return summary
+    
+    def _write_bulk_rows(self, rows: List[Dict[str, Any]], failures: List[Dict[str, Any]]) -> int:
+        """
+        Escribir un lote en una transacción; si falla por los datos de alguna fila
+        (ROW_ERRORS), reintentar fila por fila para identificar exactamente cuáles
+        
+        Raises:
+            Errores de conexión o transitorios que siguen tras los reintentos del driver:
+            no dependen de las filas, así que partir el lote solo multiplicaría las esperas
+        """
+        if not rows:
+            return 0
+        
+        def write(tx, batch):
+            created = tx.run(BULK_CREATE_QUERY, rows=batch).single()["created"]
+            catalog_version.record_change(tx, 'bulk_create', None)
+            return created
+        
+        try:
+            return self._write(write, rows)
+        except ROW_ERRORS as e:
+            if len(rows) == 1:
+                failures.append({'index': rows[0]['_index'], 'id': rows[0]['id'], 'error': str(e)})
+                return 0
+            logger.warning(f"Lote fallido ({len(rows)} autos), reintentando fila por fila: {e}")
+        
+        created = 0
+        for row in rows:
+            created += self._write_bulk_rows([row], failures)
+        return created
+    
     def search_cars(self, filters: Dict[str, Any] = None, limit: int = 10) -> List[Dict[str, Any]]:
         """
         Buscar autos con filtros opcionales
@@ -270,11 +472,9 @@ class Gestionador:
             
             query = " ".join(query_parts)
             
-            with self.driver.session() as session:
-                result = session.run(query, parameters)
+            def read(tx):
                 cars = []
-                
-                for record in result:
+                for record in tx.run(query, parameters):
                     car = {
                         'id': record['id'],
                         'modelo': record['modelo'],
@@ -286,8 +486,16 @@ class Gestionador:
                         'transmision': record['transmision']
                     }
                     cars.append(car)
-                
                 return cars
+            
+            start = time.perf_counter()
+            cars = self._read(read)
+            
+            # Consultas lentas: registro y PROFILE en segundo plano
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            get_slow_query_log().observe(self.driver, query, parameters, elapsed_ms, source="gestionador.search_cars",
+                                         database=self.session_config.get('database'))
+            return cars
                 
         except Exception as e:
             logger.error(f"Error buscando autos: {e}")
@@ -296,37 +504,45 @@ class Gestionador:
     def delete_car(self, car_id: str) -> bool:
         """Eliminar un auto por su ID"""
         try:
-            with self.driver.session() as session:
-                result = session.run("""
+            def write(tx):
+                deleted = tx.run("""
                     MATCH (a:Auto {id: $car_id})
                     DETACH DELETE a
                     RETURN count(a) as deleted
-                """, car_id=car_id)
-                
-                deleted_count = result.single()["deleted"]
-                if deleted_count > 0:
-                    logger.info(f"Auto eliminado: {car_id}")
-                    return True
-                else:
-                    logger.warning(f"No se encontró auto con ID: {car_id}")
-                    return False
+                """, car_id=car_id).single()["deleted"]
+                if deleted > 0:
+                    catalog_version.record_change(tx, 'delete', car_id)
+                return deleted
+            
+            deleted_count = self._write(write)
+            if deleted_count > 0:
+                logger.info(f"Auto eliminado: {car_id}")
+                self._notify_catalog_change('delete', car_id)
+                return True
+            else:
+                logger.warning(f"No se encontró auto con ID: {car_id}")
+                return False
                     
         except Exception as e:
             logger.error(f"Error eliminando auto: {e}")
             return False
     
     def update_car(self, car_id: str, updates: Dict[str, Any]) -> bool:
-        """Actualizar un auto existente"""
+        """Actualizar un auto existente (solo los campos de UPDATABLE_FIELDS)"""
         try:
-            with self.driver.session() as session:
-                # Construir query de actualización dinámicamente
+            unknown = [key for key in updates if key not in UPDATABLE_FIELDS]
+            if unknown:
+                raise ValueError(f"Campos no actualizables: {', '.join(map(str, unknown))}")
+            
+            def write(tx):
+                # Construir query de actualización con los campos permitidos
                 set_clauses = []
                 parameters = {"car_id": car_id}
                 
+                # Las categorías también se guardan como propiedades (car_attributes)
                 for key, value in updates.items():
-                    if key not in ['marca', 'tipo', 'combustible', 'transmision']:  # Estas requieren manejo especial
-                        set_clauses.append(f"a.{key} = ${key}")
-                        parameters[key] = value
+                    set_clauses.append(f"a.{key} = ${key}")
+                    parameters[key] = value
                 
                 if set_clauses:
                     query = f"""
@@ -334,10 +550,27 @@ class Gestionador:
                         SET {', '.join(set_clauses)}
                         RETURN a
                     """
-                    session.run(query, parameters)
+                    tx.run(query, parameters)
                 
-                logger.info(f"Auto actualizado: {car_id}")
-                return True
+                # Cambiar la relación con la categoría junto con su propiedad
+                for field in car_attributes.ATTRIBUTE_FIELDS:
+                    if field in updates:
+                        tx.run(car_attributes.unlink_query(field), car_id=car_id)
+                        if updates[field] is not None:
+                            tx.run(car_attributes.relink_query(field), car_id=car_id, value=updates[field])
+                
+                # Recalcular etiquetas si cambió un campo del que dependen
+                if any(key in car_tags.TAG_FIELDS for key in updates):
+                    car_tags.assign_tags(tx, car_id)
+                
+                catalog_version.record_change(tx, 'update', car_id)
+            
+            # Propiedades, relaciones, etiquetas y versión cambian juntas o no cambian
+            self._write(write)
+            logger.info(f"Auto actualizado: {car_id}")
+            
+            self._notify_catalog_change('update', car_id)
+            return True
                 
         except Exception as e:
             logger.error(f"Error actualizando auto: {e}")
@@ -346,7 +579,7 @@ class Gestionador:
 def main():
     """Función principal para probar el gestionador"""
     # Configuración
-    URI = "bolt://localhost:7687"
+    URI = "neo4j://localhost:7687"  # Enrutamiento: lecturas a los seguidores si hay clúster
     USER = "neo4j"
     PASSWORD = "proyectoNEO4J"
     
@@ -3,6 +3,13 @@
 Script para migrar datos locales a Neo4j AuraDB
 """
 
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
 from neo4j import GraphDatabase
 
 # CREDENCIALES DE AURADB
@@ -59,154 +66,159 @@ def find_local_database():
     
     return None
 
-def export_from_local(config):
-    """Obtener todos los datos de tu base local"""
-    print("📤 Exportando datos de tu base local...")
-    
-    driver = GraphDatabase.driver(config["uri"], auth=(config["user"], config["password"]))
+# Migración por lotes
+PAGE_SIZE = 500
+CHECKPOINT_FILE = Path(__file__).parent / ".migration_checkpoint.json"
+
+# Página de autos de la base local, ordenada por id para poder reanudar
+EXPORT_PAGE_QUERY = """
+    MATCH (a:Auto)
+    WHERE $after_id IS NULL OR a.id > $after_id
+    WITH a ORDER BY a.id LIMIT $page_size
+    OPTIONAL MATCH (a)-[:ES_MARCA]->(m:Marca)
+    OPTIONAL MATCH (a)-[:ES_TIPO]->(t:Tipo)
+    OPTIONAL MATCH (a)-[:USA_COMBUSTIBLE]->(c:Combustible)
+    OPTIONAL MATCH (a)-[:TIENE_TRANSMISION]->(tr:Transmision)
+    RETURN a.id as id, a.modelo as modelo, a.año as año,
+           a.precio as precio, a.caracteristicas as caracteristicas, a.etiquetas as etiquetas,
+           m.nombre as marca, t.categoria as tipo,
+           c.tipo as combustible, tr.tipo as transmision
+    ORDER BY a.id
+"""
+
+# Escritura idempotente: reintentar un lote ya escrito no duplica autos
+IMPORT_BATCH_QUERY = """
+    UNWIND $cars AS car
+    MERGE (a:Auto {id: car.id})
+    SET a.modelo = car.modelo,
+        a.año = car.año,
+        a.precio = car.precio,
+        a.caracteristicas = car.caracteristicas,
+        a.etiquetas = car.etiquetas
+    FOREACH (_ IN CASE WHEN car.marca IS NULL THEN [] ELSE [1] END |
+        MERGE (m:Marca {nombre: car.marca})
+        MERGE (a)-[:ES_MARCA]->(m))
+    FOREACH (_ IN CASE WHEN car.tipo IS NULL THEN [] ELSE [1] END |
+        MERGE (t:Tipo {categoria: car.tipo})
+        MERGE (a)-[:ES_TIPO]->(t))
+    FOREACH (_ IN CASE WHEN car.combustible IS NULL THEN [] ELSE [1] END |
+        MERGE (c:Combustible {tipo: car.combustible})
+        MERGE (a)-[:USA_COMBUSTIBLE]->(c))
+    FOREACH (_ IN CASE WHEN car.transmision IS NULL THEN [] ELSE [1] END |
+        MERGE (tr:Transmision {tipo: car.transmision})
+        MERGE (a)-[:TIENE_TRANSMISION]->(tr))
+"""
+
+# Nodos de categorías (pocos, se copian completos aunque no tengan autos)
+CATEGORY_QUERIES = [
+    ("marcas", "MATCH (m:Marca) RETURN m.nombre as valor", "UNWIND $valores AS valor MERGE (:Marca {nombre: valor})"),
+    ("tipos", "MATCH (t:Tipo) RETURN t.categoria as valor", "UNWIND $valores AS valor MERGE (:Tipo {categoria: valor})"),
+    ("combustibles", "MATCH (c:Combustible) RETURN c.tipo as valor", "UNWIND $valores AS valor MERGE (:Combustible {tipo: valor})"),
+    ("transmisiones", "MATCH (tr:Transmision) RETURN tr.tipo as valor", "UNWIND $valores AS valor MERGE (:Transmision {tipo: valor})"),
+]
+
+def load_checkpoint():
+    """Leer el último id migrado (None si no hay migración pendiente)"""
+    if not CHECKPOINT_FILE.exists():
+        return None
+    try:
+        return json.loads(CHECKPOINT_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"   ⚠️ Checkpoint ilegible, se ignora: {e}")
+        return None
+
+def save_checkpoint(last_id, migrated):
+    """Guardar el último id confirmado en AuraDB (escritura atómica)"""
+    data = {
+        "last_id": last_id,
+        "migrated": migrated,
+        "updated_at": datetime.now().isoformat()
+    }
+    tmp_file = CHECKPOINT_FILE.with_suffix(".tmp")
+    tmp_file.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp_file, CHECKPOINT_FILE)
+
+def clear_checkpoint():
+    """Eliminar el checkpoint al terminar la migración"""
+    if CHECKPOINT_FILE.exists():
+        CHECKPOINT_FILE.unlink()
+
+def stream_from_local(session, page_size=PAGE_SIZE, after_id=None):
+    """
+    Recorrer los autos de la base local por páginas ordenadas por id
     
-    with driver.session() as session:
-        # Obtener todos los autos con sus relaciones
-        result = session.run("""
-            MATCH (a:Auto)
-            OPTIONAL MATCH (a)-[:ES_MARCA]->(m:Marca)
-            OPTIONAL MATCH (a)-[:ES_TIPO]->(t:Tipo)
-            OPTIONAL MATCH (a)-[:USA_COMBUSTIBLE]->(c:Combustible)
-            OPTIONAL MATCH (a)-[:TIENE_TRANSMISION]->(tr:Transmision)
-            RETURN a.id as id, a.modelo as modelo, a.año as año, 
-                   a.precio as precio, a.caracteristicas as caracteristicas,
-                   m.nombre as marca, t.categoria as tipo, 
-                   c.tipo as combustible, tr.tipo as transmision
-            ORDER BY a.id
-        """)
-        
-        cars = []
+    Solo se mantiene una página en memoria a la vez
+    """
+    while True:
+        result = session.run(EXPORT_PAGE_QUERY, after_id=after_id, page_size=page_size)
+        page = []
         for record in result:
-            car = {
-                'id': record['id'],
-                'modelo': record['modelo'],
-                'año': record['año'],
-                'precio': record['precio'],
-                'caracteristicas': record['caracteristicas'] or [],
-                'marca': record['marca'],
-                'tipo': record['tipo'],
-                'combustible': record['combustible'],
-                'transmision': record['transmision']
-            }
-            cars.append(car)
-        
-        # Obtener marcas únicas
-        brands_result = session.run("MATCH (m:Marca) RETURN DISTINCT m.nombre as nombre ORDER BY m.nombre")
-        brands = [record['nombre'] for record in brands_result]
+            car = record.data()
+            car['caracteristicas'] = car['caracteristicas'] or []
+            page.append(car)
         
-        # Obtener tipos únicos
-        types_result = session.run("MATCH (t:Tipo) RETURN DISTINCT t.categoria as categoria ORDER BY t.categoria")
-        types = [record['categoria'] for record in types_result]
-        
-        # Obtener combustibles únicos
-        fuels_result = session.run("MATCH (c:Combustible) RETURN DISTINCT c.tipo as tipo ORDER BY c.tipo")
-        fuels = [record['tipo'] for record in fuels_result]
-        
-        # Obtener transmisiones únicas
-        trans_result = session.run("MATCH (tr:Transmision) RETURN DISTINCT tr.tipo as tipo ORDER BY tr.tipo")
-        transmissions = [record['tipo'] for record in trans_result]
-        
-        print(f"   ✅ Exportados:")
-        print(f"      🚗 {len(cars)} autos")
-        print(f"      🏷️ {len(brands)} marcas: {', '.join(brands[:5])}{'...' if len(brands) > 5 else ''}")
-        print(f"      📦 {len(types)} tipos: {', '.join(types)}")
-        print(f"      ⛽ {len(fuels)} combustibles: {', '.join(fuels)}")
-        print(f"      ⚙️ {len(transmissions)} transmisiones: {', '.join(transmissions)}")
+        if not page:
+            return
         
-        driver.close()
-        return {
-            'cars': cars,
-            'brands': brands,
-            'types': types,
-            'fuels': fuels,
-            'transmissions': transmissions
-        }
+        yield page
+        after_id = page[-1]['id']
+
+def clear_aura(session):
+    """Limpiar AuraDB en transacciones pequeñas"""
+    session.run("""
+        MATCH (n)
+        CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS
+    """)
+    print("   🧹 AuraDB limpiada")
+
+def migrate_categories(local_session, aura_session):
+    """Copiar los nodos de categorías"""
+    for name, read_query, write_query in CATEGORY_QUERIES:
+        values = [record["valor"] for record in local_session.run(read_query) if record["valor"] is not None]
+        aura_session.run(write_query, valores=values)
+        print(f"   📦 {len(values)} {name}")
 
-def import_to_aura(data):
-    """Importar datos a AuraDB"""
-    print("📥 Importando datos a AuraDB...")
+def migrate_streaming(config, page_size=PAGE_SIZE, restart=False):
+    """
+    Migrar la base local a AuraDB por lotes
     
-    driver = GraphDatabase.driver(AURA_URI, auth=(AURA_USER, AURA_PASSWORD))
+    Cada lote se escribe con un UNWIND y después se guarda su último id en
+    el checkpoint, de modo que una migración interrumpida continúa donde quedó
+    """
+    checkpoint = None if restart else load_checkpoint()
+    after_id = checkpoint["last_id"] if checkpoint else None
+    migrated = checkpoint["migrated"] if checkpoint else 0
+    
+    local_driver = GraphDatabase.driver(config["uri"], auth=(config["user"], config["password"]))
+    aura_driver = GraphDatabase.driver(AURA_URI, auth=(AURA_USER, AURA_PASSWORD))
     
     try:
-        with driver.session() as session:
-            # Limpiar AuraDB
-            session.run("MATCH (n) DETACH DELETE n")
-            print("   🧹 AuraDB limpiada")
-            
-            # Crear marcas
-            for brand in data['brands']:
-                session.run("CREATE (m:Marca {nombre: $nombre})", nombre=brand)
-            print(f"   🏷️ Creadas {len(data['brands'])} marcas")
-            
-            # Crear tipos
-            for vehicle_type in data['types']:
-                session.run("CREATE (t:Tipo {categoria: $categoria})", categoria=vehicle_type)
-            print(f"   📦 Creados {len(data['types'])} tipos")
+        with local_driver.session() as local_session, aura_driver.session() as aura_session:
+            if checkpoint:
+                print(f"🔁 Reanudando migración después de '{after_id}' ({migrated} autos ya migrados)")
+            else:
+                print("📥 Iniciando migración a AuraDB...")
+                clear_aura(aura_session)
+                migrate_categories(local_session, aura_session)
             
-            # Crear combustibles
-            for fuel in data['fuels']:
-                session.run("CREATE (c:Combustible {tipo: $tipo})", tipo=fuel)
-            print(f"   ⛽ Creados {len(data['fuels'])} combustibles")
+            start = time.perf_counter()
+            session_migrated = 0
             
-            # Crear transmisiones
-            for transmission in data['transmissions']:
-                session.run("CREATE (tr:Transmision {tipo: $tipo})", tipo=transmission)
-            print(f"   ⚙️ Creadas {len(data['transmissions'])} transmisiones")
-            
-            # Crear autos con progreso
-            print(f"   🚗 Creando {len(data['cars'])} autos...")
-            for i, car in enumerate(data['cars'], 1):
-                if i % 10 == 0 or i == len(data['cars']):
-                    print(f"      Progreso: {i}/{len(data['cars'])} autos")
-                
-                # Crear auto
-                session.run("""
-                    CREATE (a:Auto {
-                        id: $id,
-                        modelo: $modelo,
-                        año: $año,
-                        precio: $precio,
-                        caracteristicas: $caracteristicas
-                    })
-                """, **car)
+            for page in stream_from_local(local_session, page_size, after_id):
+                batch_start = time.perf_counter()
+                aura_session.execute_write(lambda tx: tx.run(IMPORT_BATCH_QUERY, cars=page).consume())
                 
-                # Crear relaciones
-                if car['marca']:
-                    session.run("""
-                        MATCH (a:Auto {id: $id})
-                        MATCH (m:Marca {nombre: $marca})
-                        MERGE (a)-[:ES_MARCA]->(m)
-                    """, id=car['id'], marca=car['marca'])
+                migrated += len(page)
+                session_migrated += len(page)
+                save_checkpoint(page[-1]['id'], migrated)
                 
-                if car['tipo']:
-                    session.run("""
-                        MATCH (a:Auto {id: $id})
-                        MATCH (t:Tipo {categoria: $tipo})
-                        MERGE (a)-[:ES_TIPO]->(t)
-                    """, id=car['id'], tipo=car['tipo'])
-                
-                if car['combustible']:
-                    session.run("""
-                        MATCH (a:Auto {id: $id})
-                        MATCH (c:Combustible {tipo: $combustible})
-                        MERGE (a)-[:USA_COMBUSTIBLE]->(c)
-                    """, id=car['id'], combustible=car['combustible'])
-                
-                if car['transmision']:
-                    session.run("""
-                        MATCH (a:Auto {id: $id})
-                        MATCH (tr:Transmision {tipo: $transmision})
-                        MERGE (a)-[:TIENE_TRANSMISION]->(tr)
-                    """, id=car['id'], transmision=car['transmision'])
+                batch_elapsed = time.perf_counter() - batch_start
+                total_elapsed = time.perf_counter() - start
+                print(f"   🚗 {migrated} autos migrados | lote: {len(page) / batch_elapsed:,.0f} autos/s"
+                      f" | promedio: {session_migrated / total_elapsed:,.0f} autos/s")
             
             # Verificar resultado final
-            result = session.run("""
+            result = aura_session.run("""
                 MATCH (a:Auto) 
                 OPTIONAL MATCH (a)-[:ES_MARCA]->(m:Marca)
                 RETURN count(a) as total_autos, count(DISTINCT m.nombre) as marcas_conectadas
@@ -216,9 +228,13 @@ def import_to_aura(data):
             print(f"   ✅ Verificación final:")
             print(f"      🚗 {stats['total_autos']} autos importados")
             print(f"      🔗 {stats['marcas_conectadas']} marcas conectadas")
-            
+        
+        clear_checkpoint()
+        return migrated
+    
     finally:
-        driver.close()
+        local_driver.close()
+        aura_driver.close()
 
 def test_aura_queries():
     """Probar que las consultas funcionen en AuraDB"""
@@ -257,6 +273,11 @@ def test_aura_queries():
         driver.close()
 
 def main():
+    parser = argparse.ArgumentParser(description="Migrar la base local a Neo4j AuraDB")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="Autos por lote")
+    parser.add_argument("--restart", action="store_true", help="Ignorar el checkpoint y migrar desde cero")
+    args = parser.parse_args()
+    
     print("🚀 MIGRACIÓN A NEO4J AURADB")
     print("=" * 60)
     print("🎯 Migrando tu base de datos a la nube...")
@@ -275,16 +296,13 @@ def main():
             print("💡 Asegúrate de que Neo4j Desktop esté corriendo y tu base activa.")
             return
         
-        # Paso 3: Exportar datos
-        data = export_from_local(local_config)
-        if not data['cars']:
+        # Paso 3: Migrar datos por lotes (reanudable)
+        migrated = migrate_streaming(local_config, args.page_size, args.restart)
+        if not migrated:
             print("❌ No se encontraron autos para migrar.")
             return
         
-        # Paso 4: Importar a AuraDB
-        import_to_aura(data)
-        
-        # Paso 5: Verificar funcionamiento
+        # Paso 4: Verificar funcionamiento
         test_aura_queries()
         
         print("\n" + "=" * 60)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga del asistente de recomendaciones
+Recorre el flujo completo de la app Flask (login -> 5 pasos -> recomendaciones) con muchos
+usuarios simulados en paralelo y reporta latencias p50/p95/p99 y peticiones por segundo
+
+Ejemplos:
+    python scripts/bench/load_test.py --users 50 --iterations 20
+    python scripts/bench/load_test.py --backend real --output bench/release-1.2.json
+    python scripts/bench/load_test.py --baseline bench/release-1.1.json
+    python scripts/bench/load_test.py --flow submit
+
+Las consultas lentas de la prueba se registran en el directorio temporal
+(BENCH_SLOW_QUERY_LOG), no en logs/ del repositorio; SLOW_QUERY_LOG lo cambia
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+APP_DIR = PROJECT_ROOT / "app"
+
+# Registro de consultas lentas de las pruebas (shared/slow_query_log.py)
+BENCH_SLOW_QUERY_LOG = Path(tempfile.gettempdir()) / "bench_slow_queries.jsonl"
+
+# Valores que envía el frontend en cada paso (ver templates/*.html)
+BRANDS = ["Toyota", "Ford", "BMW", "Tesla", "Honda", "Mercedes", "Audi", "Nissan",
+          "Volkswagen", "Hyundai", "Kia", "Mazda", "Chevrolet", "Subaru", "Volvo", "Lexus"]
+BUDGETS = ["15000-30000", "30000-50000", "50000-100000", "100000+"]
+FUELS = ["gasolina", "diesel", "electrico", "hibrido"]
+TYPES = ["sedan", "suv", "hatchback", "pickup", "coupe", "convertible"]
+TRANSMISSIONS = ["automatic", "manual", "semiautomatic"]
+GENDERS = ["femenino", "masculino"]
+AGE_RANGES = ["18-25", "26-35", "36-45", "46-55", "56+"]
+
+ENDPOINTS = [
+    "/login", "/api/save-profile", "/api/save-brands", "/api/save-budget", "/api/save-fuel",
+    "/api/save-types", "/api/save-transmission", "/api/recommendations", "/api/submit-preferences"
+]
+
+def load_app(backend: str, module: str, fake_uri: str):
+    """Importar la app Flask configurando el motor de recomendaciones"""
+    if backend == "fake":
+        os.environ["NEO4J_URI"] = fake_uri
+
+    # Los usuarios simulados no deben quedar en data/users.db
+    os.environ.setdefault("USER_STORE", "memory")
+    # Un evento por petición a stderr no debe pesar en las latencias medidas
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Ni las consultas lentas en logs/slow_queries.jsonl
+    os.environ.setdefault("SLOW_QUERY_LOG", str(BENCH_SLOW_QUERY_LOG))
+
+    # app.py prefiere recommender.py; bloquearlo fuerza recommender_minimal.py
+    if module == "recommender_minimal":
+        sys.modules["recommender"] = None
+
+    sys.path.insert(0, str(PROJECT_ROOT))
+    sys.path.insert(0, str(APP_DIR))
+    from app import app
+    app.testing = True
+    return app
+
+def random_wizard(rng: random.Random, flow: str = "steps") -> list:
+    """
+    Pasos del asistente con selecciones aleatorias (método, endpoint, cuerpo)
+
+    flow="steps" envía cada paso por separado; flow="submit" envía todo en una petición
+    """
+    brands = rng.sample(BRANDS, rng.randint(1, 4))
+    profile = ("POST", "/api/save-profile", {
+        "displayName": "Bench",
+        "gender": rng.choice(GENDERS),
+        "ageRange": rng.choice(AGE_RANGES)
+    })
+    selections = {
+        "brands": {str(i): brand for i, brand in enumerate(brands, 1)},
+        "budget": rng.choice(BUDGETS),
+        "fuel": rng.choice(FUELS),
+        "types": rng.sample(TYPES, rng.randint(1, 3)),
+        "transmission": rng.choice(TRANSMISSIONS)
+    }
+    if flow == "submit":
+        return [profile, ("POST", "/api/submit-preferences", selections)]
+    return [profile] + [
+        ("POST", f"/api/save-{name}", {name: value}) for name, value in selections.items()
+    ] + [("GET", "/api/recommendations", None)]
+
+class LoadTest:
+    def __init__(self, app, users: int, iterations: int, seed: int, flow: str = "steps"):
+        self.app = app
+        self.flow = flow
+        self.users = users
+        self.iterations = iterations
+        self.seed = seed
+        self.samples = {endpoint: [] for endpoint in ENDPOINTS}  # endpoint -> latencias (ms)
+        self.errors = {endpoint: 0 for endpoint in ENDPOINTS}
+        self._lock = threading.Lock()
+
+    def _record(self, endpoint: str, elapsed_ms: float, ok: bool):
+        with self._lock:
+            self.samples[endpoint].append(elapsed_ms)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def _request(self, client, method: str, endpoint: str, body=None):
+        start = time.perf_counter()
+        if method == "POST":
+            response = client.post(endpoint, json=body)
+        else:
+            response = client.get(endpoint)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._record(endpoint, elapsed_ms, response.status_code < 400)
+        return response
+
+    def simulate_user(self, user_number: int):
+        """Un usuario: login y luego el asistente completo varias veces"""
+        rng = random.Random(self.seed + user_number)
+        client = self.app.test_client()
+        self._request(client, "POST", "/login", {
+            "username": f"bench{user_number}@bench.local",
+            "password": "benchpass"
+        })
+        for _ in range(self.iterations):
+            for method, endpoint, body in random_wizard(rng, self.flow):
+                self._request(client, method, endpoint, body)
+
+    def warm_up(self):
+        """Completar un asistente sin medir (conexión y carga del catálogo)"""
+        self.simulate_user(-1)
+        self.samples = {endpoint: [] for endpoint in ENDPOINTS}
+        self.errors = {endpoint: 0 for endpoint in ENDPOINTS}
+
+    def run(self) -> dict:
+        self.warm_up()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.users) as executor:
+            list(executor.map(self.simulate_user, range(self.users)))
+        wall_seconds = time.perf_counter() - start
+        return self.report(wall_seconds)
+
+    def report(self, wall_seconds: float) -> dict:
+        endpoints = {}
+        total_requests = 0
+        for endpoint, samples in self.samples.items():
+            if not samples:
+                continue
+            total_requests += len(samples)
+            ordered = sorted(samples)
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "errors": self.errors[endpoint],
+                "rps": round(len(samples) / wall_seconds, 2),
+                "mean_ms": round(sum(samples) / len(samples), 3),
+                "p50_ms": round(percentile(ordered, 50), 3),
+                "p95_ms": round(percentile(ordered, 95), 3),
+                "p99_ms": round(percentile(ordered, 99), 3),
+                "max_ms": round(ordered[-1], 3)
+            }
+        return {
+            "wall_seconds": round(wall_seconds, 3),
+            "total_requests": total_requests,
+            "total_rps": round(total_requests / wall_seconds, 2),
+            "endpoints": endpoints
+        }
+
+def percentile(ordered: list, pct: float) -> float:
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "desconocida"
+
+def print_report(result: dict, baseline: dict = None):
+    print(f"\n{'Endpoint':<28}{'req':>7}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    print("-" * 77)
+    for endpoint, stats in result["endpoints"].items():
+        line = (f"{endpoint:<28}{stats['requests']:>7}{stats['errors']:>6}{stats['rps']:>9.1f}"
+                f"{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}")
+        previous = (baseline or {}).get("endpoints", {}).get(endpoint)
+        if previous and previous["p99_ms"]:
+            change = (stats["p99_ms"] - previous["p99_ms"]) / previous["p99_ms"] * 100
+            line += f"   p99 {change:+.1f}%"
+        print(line)
+    print("-" * 77)
+    print(f"Total: {result['total_requests']} peticiones en {result['wall_seconds']:.2f}s "
+          f"({result['total_rps']:.1f} req/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del asistente de recomendaciones")
+    parser.add_argument("--users", type=int, default=20, help="Usuarios simulados concurrentes")
+    parser.add_argument("--iterations", type=int, default=10, help="Veces que cada usuario completa el asistente")
+    parser.add_argument("--backend", choices=["fake", "real"], default="fake",
+                        help="fake: driver simulado en memoria; real: Neo4j configurado en la app")
+    parser.add_argument("--fake-uri", default="fake://synthetic?cars=5000&latency_ms=2",
+                        help="URI del driver simulado (ver app/fake_neo4j.py)")
+    parser.add_argument("--module", choices=["auto", "recommender_minimal"], default="auto",
+                        help="auto: el que importe app.py (recommender.py); recommender_minimal: forzarlo")
+    parser.add_argument("--flow", choices=["steps", "submit"], default="steps",
+                        help="steps: un POST por paso + GET; submit: /api/submit-preferences")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="Guardar resultados en JSON")
+    parser.add_argument("--baseline", type=Path, help="JSON de una ejecución anterior para comparar p99")
+    args = parser.parse_args()
+
+    app = load_app(args.backend, args.module, args.fake_uri)
+
+    print(f"🚦 Prueba de carga: {args.users} usuarios x {args.iterations} iteraciones ({args.backend}, {args.flow})")
+    result = LoadTest(app, args.users, args.iterations, args.seed, args.flow).run()
+    result["config"] = {
+        "users": args.users,
+        "iterations": args.iterations,
+        "backend": args.backend,
+        "fake_uri": args.fake_uri if args.backend == "fake" else None,
+        "module": args.module,
+        "flow": args.flow,
+        "seed": args.seed
+    }
+    result["revision"] = git_revision()
+    result["timestamp"] = datetime.now().isoformat()
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else None
+    print_report(result, baseline)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"💾 Resultados guardados en {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Comparación de los modos de consulta del recomendador
+standard: los CANDIDATE_LIMIT autos más baratos que cumplen los filtros, puntuados en Python
+compact:  una expansión por relación, puntuación y LIMIT en Cypher (build_compact_query)
+
+Para cada combinación de preferencias mide la latencia de ambos modos, las filas que
+viajan desde Neo4j y la puntuación media del top 10, y comprueba que el modo compacto
+coincide con puntuar en Python todos los candidatos
+
+Ejemplos:
+    python scripts/bench/query_modes.py
+    python scripts/bench/query_modes.py --uri "fake://synthetic?cars=50000&latency_ms=2" --combinations 100
+    python scripts/bench/query_modes.py --uri bolt://localhost:7687 --output bench/query-modes.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+from load_test import (PROJECT_ROOT, APP_DIR, BENCH_SLOW_QUERY_LOG, BRANDS, BUDGETS, FUELS, TYPES, TRANSMISSIONS, GENDERS, AGE_RANGES,
+                       percentile, git_revision)
+
+def load_recommenders(uri: str, user: str, password: str):
+    """Un recomendador por modo sobre el mismo driver (sin caché, snapshot ni prefetch)"""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("SLOW_QUERY_LOG", str(BENCH_SLOW_QUERY_LOG))
+    sys.path.insert(0, str(PROJECT_ROOT))
+    sys.path.insert(0, str(APP_DIR))
+    import fake_neo4j
+    from neo4j import GraphDatabase
+    from recommender import CarRecommender
+
+    driver = fake_neo4j.driver_from_uri(uri) if fake_neo4j.is_fake_uri(uri) else GraphDatabase.driver(uri, auth=(user, password))
+    standard = CarRecommender(uri, user, password, cache_size=0, driver=driver)
+    compact = CarRecommender(uri, user, password, cache_size=0, driver=driver, query_mode="compact")
+    return driver, standard, compact
+
+def random_combination(rng: random.Random) -> dict:
+    """Preferencias y perfil al azar (algunas respuestas vacías, como usuarios que omiten pasos)"""
+    gender = rng.choice(GENDERS + [None])
+    return {
+        "brands": rng.sample(BRANDS, rng.randint(0, 4)),
+        "budget": rng.choice(BUDGETS + [None]),
+        "fuel": rng.choice(FUELS + [None]),
+        "types": rng.sample(TYPES, rng.randint(0, 3)),
+        "transmission": rng.choice(TRANSMISSIONS + [None]),
+        "gender": gender,
+        "age_range": rng.choice(AGE_RANGES) if gender else None
+    }
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+def run_standard(recommender, combination: dict):
+    preferences = recommender.normalize_preferences(*[combination[key] for key in ("brands", "budget", "fuel", "types", "transmission")])
+    candidates = recommender.fetch_candidates(preferences)
+    ranked = recommender.rank_recommendations(candidates, preferences, combination["gender"], combination["age_range"])
+    return ranked, len(candidates)
+
+def run_compact(recommender, combination: dict):
+    preferences = recommender.normalize_preferences(*[combination[key] for key in ("brands", "budget", "fuel", "types", "transmission")])
+    ranked = recommender.fetch_ranked_recommendations(preferences, combination["gender"], combination["age_range"])
+    return ranked, len(ranked)
+
+def run_reference(recommender, combination: dict):
+    """Todos los candidatos puntuados en Python: lo que debe devolver el modo compacto"""
+    preferences = recommender.normalize_preferences(*[combination[key] for key in ("brands", "budget", "fuel", "types", "transmission")])
+    query, parameters = recommender.build_recommendation_query(preferences, limit=None)
+    candidates = recommender.execute_recommendation_query(query, parameters)
+    return recommender.rank_recommendations(candidates, preferences, combination["gender"], combination["age_range"])
+
+def summarize(samples: list, rows: list, scores: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "mean_ms": round(sum(samples) / len(samples), 3),
+        "p50_ms": round(percentile(ordered, 50), 3),
+        "p95_ms": round(percentile(ordered, 95), 3),
+        "p99_ms": round(percentile(ordered, 99), 3),
+        "mean_rows": round(sum(rows) / len(rows), 1),
+        "mean_top_score": round(sum(scores) / len(scores), 2) if scores else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparar los modos de consulta standard y compact")
+    parser.add_argument("--uri", default="fake://synthetic?cars=10000",
+                        help="URI de Neo4j o del driver simulado (ver app/fake_neo4j.py)")
+    parser.add_argument("--user", default="neo4j")
+    parser.add_argument("--password", default="proyectoNEO4J")
+    parser.add_argument("--combinations", type=int, default=200, help="Combinaciones de preferencias")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    driver, standard, compact = load_recommenders(args.uri, args.user, args.password)
+    rng = random.Random(args.seed)
+    combinations = [random_combination(rng) for _ in range(args.combinations)]
+
+    print(f"⚖️  Modos de consulta: {len(combinations)} combinaciones ({args.uri})")
+
+    # Calentamiento (conexiones del pool)
+    run_standard(standard, combinations[0])
+    run_compact(compact, combinations[0])
+
+    samples = {"standard": [], "compact": []}
+    rows = {"standard": [], "compact": []}
+    scores = {"standard": [], "compact": []}
+    mismatches = 0
+    try:
+        for combination in combinations:
+            # Alternar el orden para no favorecer a un modo con cachés calientes
+            modes = [("standard", run_standard, standard), ("compact", run_compact, compact)]
+            if rng.random() < 0.5:
+                modes.reverse()
+            results = {}
+            for name, run, recommender in modes:
+                (ranked, fetched), elapsed_ms = timed(run, recommender, combination)
+                samples[name].append(elapsed_ms)
+                rows[name].append(fetched)
+                results[name] = ranked
+                if ranked:
+                    scores[name].append(sum(car["similarity_score"] for car in ranked) / len(ranked))
+
+            reference = run_reference(standard, combination)
+            if [car["id"] for car in reference] != [car["id"] for car in results["compact"]]:
+                mismatches += 1
+    finally:
+        driver.close()
+
+    result = {mode: summarize(samples[mode], rows[mode], scores[mode]) for mode in samples}
+    result["compact_mismatches"] = mismatches
+    result["config"] = {"uri": args.uri, "combinations": len(combinations), "seed": args.seed}
+    result["revision"] = git_revision()
+
+    print(f"\n{'Modo':<10}{'media':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'filas':>8}{'score top':>11}")
+    print("-" * 65)
+    for mode in ("standard", "compact"):
+        stats = result[mode]
+        print(f"{mode:<10}{stats['mean_ms']:>9.2f}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}"
+              f"{stats['p99_ms']:>9.2f}{stats['mean_rows']:>8.1f}{stats['mean_top_score']:>11.2f}")
+    print("-" * 65)
+    if mismatches:
+        print(f"⚠️  {mismatches} combinaciones donde compact no coincide con puntuar todos los candidatos en Python")
+    else:
+        print("✓ compact coincide con puntuar todos los candidatos en Python")
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"💾 Resultados guardados en {args.output}")
+
+if __name__ == "__main__":
+    main()
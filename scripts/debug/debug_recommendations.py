@@ -1,10 +1,35 @@
 #!/usr/bin/env python3
 """
 Script para diagnosticar problemas con las recomendaciones
+
+Subcomandos:
+    diagnose   Revisar conexión, contenido y recomendaciones (por defecto)
+    benchmark  Ejecutar la consulta de recomendaciones con una matriz de preferencias y
+               reportar db hits, filas y tiempo de cada combinación (EXPLAIN/PROFILE)
+
+Ejemplos:
+    python scripts/debug/debug_recommendations.py
+    python scripts/debug/debug_recommendations.py benchmark --uri "fake://synthetic?cars=10000"
+    python scripts/debug/debug_recommendations.py benchmark --sample 50 --output bench/query_plans.csv
 """
 
 from neo4j import GraphDatabase
+import argparse
+import csv
+import itertools
 import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+APP_DIR = PROJECT_ROOT / "app"
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(PROJECT_ROOT))
 
 def test_neo4j_connection():
     """Probar conexión y contenido de Neo4j"""
@@ -235,7 +260,204 @@ def simulate_user_preferences():
         for i, rec in enumerate(recs[:2], 1):
             print(f"{i}. {rec['name']} - ${rec['price']:,}")
 
-def main():
+# ===== Benchmark de planes de consulta =====
+
+# Valores que envía el frontend (ver templates/*.html); se normalizan con normalize_preferences
+BENCH_BRANDS = [[], ["Toyota"], ["Toyota", "Honda", "Ford", "BMW"]]
+BENCH_BUDGETS = [None, "15000-30000", "30000-50000", "50000-100000", "100000+"]
+BENCH_FUELS = [None, "gasolina", "electrico"]
+BENCH_TYPES = [[], ["sedan"], ["sedan", "suv", "hatchback"]]
+BENCH_TRANSMISSIONS = [None, "automatic", "manual"]
+
+# Operadores que recorren todos los nodos de una etiqueta en vez de usar un índice
+SCAN_OPERATORS = ("AllNodesScan", "NodeByLabelScan")
+
+CSV_COLUMNS = [
+    "rank", "brands", "budget", "fuel", "types", "transmission",
+    "wall_ms_p50", "wall_ms_max", "rows", "db_hits", "estimated_rows",
+    "scans", "missing_indexes", "query"
+]
+
+def preference_matrix(sample: int = 0, seed: int = 42) -> list:
+    """Combinaciones de preferencias (todas, o una muestra reproducible si sample > 0)"""
+    combinations = [
+        {"brands": brands, "budget": budget, "fuel": fuel, "types": types, "transmission": transmission}
+        for brands, budget, fuel, types, transmission in itertools.product(
+            BENCH_BRANDS, BENCH_BUDGETS, BENCH_FUELS, BENCH_TYPES, BENCH_TRANSMISSIONS
+        )
+    ]
+    if sample and sample < len(combinations):
+        combinations = random.Random(seed).sample(combinations, sample)
+    return combinations
+
+def indexed_properties(statements: list) -> dict:
+    """
+    Propiedades con índice o restricción de unicidad por etiqueta
+
+    Solo cuenta la primera propiedad de cada índice: es la que puede usar un filtro por sí sola
+    """
+    indexed = {}
+    for statement in statements:
+        label = re.search(r'FOR \((\w+):(\w+)\)', statement)
+        properties = re.search(r'(?:ON \(|REQUIRE \(?)(\w+)\.([\wñ]+)', statement)
+        if label and properties:
+            indexed.setdefault(label.group(2), set()).add(properties.group(2))
+    return indexed
+
+def filtered_properties(query: str, parameters: dict) -> list:
+    """(etiqueta, propiedad) de cada filtro del WHERE con parámetro definido"""
+    aliases = dict(re.findall(r'\((\w+):(\w+)[ )]', query))
+    where = query.split(" WHERE ", 1)[1] if " WHERE " in query else ""
+    where = re.split(r' (?:OPTIONAL MATCH|RETURN|WITH) ', where, maxsplit=1)[0]
+
+    found = []
+    for variable, prop, param in re.findall(r'(\w+)\.([\wñ]+)\s*(?:>=|<=|=|<|>|IN)\s*\$(\w+)', where):
+        pair = (aliases.get(variable, variable), prop)
+        if parameters.get(param) is not None and pair not in found:
+            found.append(pair)
+    return found
+
+def missing_indexes(query: str, parameters: dict, indexed: dict) -> list:
+    """Filtros sin índice en setup_neo4j_database.SCHEMA_STATEMENTS, ej: Auto(marca)"""
+    return [
+        f"{label}({prop})" for label, prop in filtered_properties(query, parameters)
+        if prop not in indexed.get(label, set())
+    ]
+
+def plan_operators(plan: dict) -> list:
+    """Operadores del árbol de plan_to_dict (con sus detalles) en preorden"""
+    if not plan:
+        return []
+    operators = [(plan.get("operator") or "", plan.get("details") or "")]
+    for child in plan.get("children", []):
+        operators.extend(plan_operators(child))
+    return operators
+
+def suggest_index(label: str, properties: list) -> str:
+    """Sentencia CREATE INDEX para las propiedades sin índice de una etiqueta"""
+    variable = label[0].lower()
+    name = "_".join([label.lower()] + [prop.lower() for prop in properties])
+    columns = ", ".join(f"{variable}.{prop}" for prop in properties)
+    return f"CREATE INDEX {name} IF NOT EXISTS FOR ({variable}:{label}) ON ({columns})"
+
+def benchmark_combination(recommender, session, preferences: dict, repeat: int, indexed: dict,
+                          query_mode: str = "standard") -> dict:
+    """Tiempo, EXPLAIN y PROFILE de la consulta generada para una combinación de preferencias"""
+    from shared.slow_query_log import plan_to_dict, total_db_hits
+
+    normalized = recommender.normalize_preferences(**preferences)
+    if query_mode == "compact":
+        query, parameters = recommender.build_compact_query(normalized)
+    elif query_mode == "denormalized":
+        query, parameters = recommender.build_denormalized_query(normalized)
+    else:
+        query, parameters = recommender.build_recommendation_query(normalized)
+
+    # Tiempo de pared de la consulta tal como la ejecuta la app (con todas las filas consumidas)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        session.run(query, parameters).consume()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    explain = plan_to_dict(session.run("EXPLAIN " + query, parameters).consume().plan) or {}
+    profile = plan_to_dict(session.run("PROFILE " + query, parameters).consume().profile) or {}
+
+    scans = sorted({details or operator for operator, details in plan_operators(profile)
+                    if operator.split("@")[0] in SCAN_OPERATORS})
+
+    return {
+        "brands": "|".join(preferences["brands"]),
+        "budget": preferences["budget"] or "",
+        "fuel": preferences["fuel"] or "",
+        "types": "|".join(preferences["types"]),
+        "transmission": preferences["transmission"] or "",
+        "wall_ms_p50": round(statistics.median(timings), 3),
+        "wall_ms_max": round(max(timings), 3),
+        "rows": profile.get("rows", ""),
+        "db_hits": total_db_hits(profile),
+        "estimated_rows": explain.get("estimated_rows", ""),
+        "scans": "|".join(scans),
+        "missing_indexes": "|".join(missing_indexes(query, parameters, indexed)),
+        "query": " ".join(query.split())
+    }
+
+def create_benchmark_driver(uri: str, user: str, password: str):
+    """Driver real o simulado (fake://) según la URI"""
+    import fake_neo4j
+    if fake_neo4j.is_fake_uri(uri):
+        return fake_neo4j.driver_from_uri(uri)
+    return GraphDatabase.driver(uri, auth=(user, password))
+
+def run_benchmark(args) -> int:
+    """Ejecutar la matriz de preferencias y escribir el CSV ordenado por tiempo"""
+    from recommender import CarRecommender
+    from setup_neo4j_database import SCHEMA_STATEMENTS
+
+    combinations = preference_matrix(args.sample, args.seed)
+    indexed = indexed_properties(SCHEMA_STATEMENTS)
+
+    print(f"⏱️  Benchmark de planes: {len(combinations)} combinaciones x {args.repeat} repeticiones "
+          f"({args.uri}, consulta {args.query_mode})")
+
+    driver = create_benchmark_driver(args.uri, args.user, args.password)
+    try:
+        recommender = CarRecommender(args.uri, args.user, args.password, cache_size=0, driver=driver)
+        results = []
+        with driver.session() as session:
+            for number, preferences in enumerate(combinations, 1):
+                try:
+                    results.append(benchmark_combination(recommender, session, preferences, args.repeat, indexed,
+                                                         args.query_mode))
+                except Exception as e:
+                    print(f"✗ Error con {preferences}: {e}")
+                if number % 50 == 0:
+                    print(f"   {number}/{len(combinations)}")
+    finally:
+        driver.close()
+
+    sort_key = "db_hits" if args.sort == "db_hits" else "wall_ms_p50"
+    results.sort(key=lambda row: row[sort_key], reverse=True)
+    for rank, row in enumerate(results, 1):
+        row["rank"] = rank
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", newline="", encoding="utf-8") as output_file:
+        writer = csv.DictWriter(output_file, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerows(results)
+
+    print(f"\n🐢 {min(args.top, len(results))} combinaciones más lentas (por {sort_key}):")
+    for row in results[:args.top]:
+        filters = ", ".join(f"{key}={row[key]}" for key in ("brands", "budget", "fuel", "types", "transmission") if row[key])
+        print(f"{row['rank']:>4}. {row['wall_ms_p50']:>9.2f} ms  {row['db_hits']:>9} db hits  "
+              f"{row['rows']!s:>6} filas  {filters or '(sin filtros)'}")
+
+    # Índices que faltan: propiedades filtradas sin índice, agrupadas por etiqueta
+    missing = {}
+    for row in results:
+        for item in filter(None, row["missing_indexes"].split("|")):
+            label, prop = re.match(r'(\w+)\((.+)\)', item).groups()
+            missing.setdefault(label, {}).setdefault(prop, 0)
+            missing[label][prop] += 1
+
+    if missing:
+        print("\n⚠️  Filtros sin índice en setup_neo4j_database.create_constraints:")
+        for label, properties in sorted(missing.items()):
+            for prop, count in sorted(properties.items(), key=lambda item: -item[1]):
+                print(f"   {label}({prop}): {count} combinaciones")
+            print(f"   -> {suggest_index(label, sorted(properties, key=lambda prop: -properties[prop]))}")
+    else:
+        print("\n✓ Todas las propiedades filtradas tienen índice en create_constraints")
+
+    scanned = sum(1 for row in results if row["scans"])
+    if scanned:
+        print(f"⚠️  {scanned} combinaciones recorren una etiqueta completa (columna scans del CSV)")
+
+    print(f"\n📄 Resultados en {args.output}")
+    return 0 if results else 1
+
+def run_diagnostics():
     print("🔍 Diagnóstico completo del sistema de recomendaciones\n")
     
     # 1. Verificar Neo4j
@@ -264,5 +486,29 @@ def main():
     print("3. Completa el flujo de preferencias")
     print("="*50)
 
+def main():
+    parser = argparse.ArgumentParser(description="Diagnóstico y benchmark de las recomendaciones")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("diagnose", help="Revisar conexión, contenido y recomendaciones")
+
+    bench = subparsers.add_parser("benchmark", help="EXPLAIN/PROFILE de la consulta por combinación de preferencias")
+    bench.add_argument("--uri", default=os.environ.get("NEO4J_URI", "neo4j://localhost:7687"),
+                       help="URI de Neo4j o del driver simulado (fake://synthetic?cars=10000)")
+    bench.add_argument("--user", default="neo4j")
+    bench.add_argument("--password", default="proyectoNEO4J")
+    bench.add_argument("--repeat", type=int, default=3, help="Ejecuciones por combinación para medir el tiempo")
+    bench.add_argument("--sample", type=int, default=0, help="Combinaciones al azar (0 = matriz completa)")
+    bench.add_argument("--seed", type=int, default=42)
+    bench.add_argument("--query-mode", choices=["standard", "compact", "denormalized"], default="standard",
+                       help="Consulta a medir: build_recommendation_query, build_compact_query o build_denormalized_query")
+    bench.add_argument("--sort", choices=["wall_ms", "db_hits"], default="wall_ms", help="Criterio del ranking")
+    bench.add_argument("--top", type=int, default=10, help="Combinaciones más lentas que se muestran")
+    bench.add_argument("--output", type=Path, default=Path("bench/query_plans.csv"), help="CSV de resultados")
+    args = parser.parse_args()
+
+    if args.command == "benchmark":
+        sys.exit(run_benchmark(args))
+    run_diagnostics()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
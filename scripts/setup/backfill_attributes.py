@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Rellenar los atributos desnormalizados de los autos existentes
+Copia marca, tipo, combustible y transmisión de las relaciones a propiedades del nodo
+Auto y crea los índices compuestos (atributo, precio) que usa el modo de consulta
+"denormalized" del recomendador (RECOMMENDATION_QUERY_MODE=denormalized). También calcula
+las etiquetas precalculadas (shared/car_tags.py) que necesita el modo "compact": sin
+ellas el recomendador no usa ese modo
+
+Se puede repetir sin riesgo: los valores siempre se leen de las relaciones
+
+Ejemplos:
+    python scripts/setup/backfill_attributes.py
+    python scripts/setup/backfill_attributes.py --uri neo4j://localhost:7687 --batch-size 5000
+    python scripts/setup/backfill_attributes.py --car-id auto_1
+"""
+
+from neo4j import GraphDatabase
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Atributos desnormalizados y etiquetas de los autos (shared/) y driver simulado (app/fake_neo4j.py)
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "app"))
+import fake_neo4j
+from shared import car_attributes, car_tags
+
+def verify_attributes(session) -> int:
+    """Autos cuya propiedad no coincide con su relación (0 si el relleno está completo)"""
+    stale = 0
+    check = session.run("""
+        MATCH (a:Auto)
+        RETURN a.id as id, a.marca as marca, a.tipo as tipo,
+               a.combustible as combustible, a.transmision as transmision
+    """)
+    stored = {record["id"]: record for record in check}
+    for rows in car_attributes.iter_attribute_rows(session):
+        for record in rows:
+            current = stored.get(record["id"])
+            if current is None or any(current[field] != record[field] for field in car_attributes.ATTRIBUTE_FIELDS):
+                stale += 1
+    return stale
+
+def main():
+    parser = argparse.ArgumentParser(description="Rellenar marca/tipo/combustible/transmisión y etiquetas como propiedades de Auto")
+    parser.add_argument("--uri", default=os.environ.get("NEO4J_URI", "neo4j://localhost:7687"),
+                        help="URI de Neo4j (o fake://... para probar con el driver simulado)")
+    parser.add_argument("--user", default="neo4j")
+    parser.add_argument("--password", default="proyectoNEO4J")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Autos por escritura UNWIND")
+    parser.add_argument("--car-id", help="Rellenar solo este auto")
+    parser.add_argument("--skip-indexes", action="store_true", help="No crear los índices compuestos")
+    args = parser.parse_args()
+
+    print("🧩 Relleno de atributos desnormalizados")
+    print("=" * 50)
+
+    if fake_neo4j.is_fake_uri(args.uri):
+        driver = fake_neo4j.driver_from_uri(args.uri)
+    else:
+        driver = GraphDatabase.driver(args.uri, auth=(args.user, args.password))
+
+    try:
+        with driver.session() as session:
+            if not args.skip_indexes:
+                print("1️⃣ Creando índices compuestos...")
+                car_attributes.create_indexes(session)
+                for statement in car_attributes.INDEX_STATEMENTS:
+                    print(f"   {statement}")
+
+            print("\n2️⃣ Copiando categorías a propiedades...")
+            start = time.perf_counter()
+            updated = car_attributes.assign_attributes(session, args.car_id, args.batch_size)
+            print(f"   ✅ {updated} autos actualizados en {time.perf_counter() - start:.2f}s")
+
+            print("\n3️⃣ Calculando etiquetas...")
+            start = time.perf_counter()
+            tagged = car_tags.assign_tags(session, args.car_id, args.batch_size)
+            print(f"   ✅ {tagged} autos etiquetados en {time.perf_counter() - start:.2f}s")
+
+            if args.car_id is None:
+                print("\n4️⃣ Verificando...")
+                stale = verify_attributes(session)
+                if stale:
+                    print(f"   ⚠️ {stale} autos siguen sin coincidir con sus relaciones")
+                else:
+                    print("   ✅ Todas las propiedades coinciden con las relaciones")
+                untagged = car_tags.count_untagged(session)
+                if untagged:
+                    print(f"   ⚠️ {untagged} autos siguen sin etiquetas")
+                else:
+                    print("   ✅ Todos los autos tienen etiquetas")
+
+        print("\n✅ Listo: RECOMMENDATION_QUERY_MODE=denormalized o compact usan estas propiedades")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    finally:
+        driver.close()
+
+if __name__ == "__main__":
+    main()
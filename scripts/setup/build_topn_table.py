@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Construir la tabla top-N materializada de recomendaciones
+Precalcula los mejores autos de cada combinación (marca, tipo, combustible, transmisión,
+tramo de presupuesto) y los guarda en un archivo que la aplicación abre con mmap
+(RECOMMENDATION_TOPN_TABLE=<archivo>). Con --car-id solo se recalculan las celdas de la
+marca de ese auto; con --sync se aplican los cambios que el Gestionador registró desde que
+se escribió la tabla, como hace la aplicación al detectarlos
+
+Ejemplos:
+    python scripts/setup/build_topn_table.py --output data/topn.bin
+    python scripts/setup/build_topn_table.py --uri "fake://synthetic?cars=10000" --output /tmp/topn.bin --verify 300
+    python scripts/setup/build_topn_table.py --output data/topn.bin --car-id auto_1
+    python scripts/setup/build_topn_table.py --output data/topn.bin --sync
+"""
+
+from neo4j import GraphDatabase
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "app"))
+import fake_neo4j
+import materialized_topn
+
+def ranking(recommendations) -> list:
+    return [(round(car['similarity_score'], 2), car['price']) for car in recommendations]
+
+def verify_table(recommender, samples: int, seed: int = 0) -> int:
+    """
+    Comparar la tabla del recomendador con la consulta compacta en combinaciones aleatorias
+
+    Returns:
+        Combinaciones con resultados distintos (0 si la tabla coincide)
+    """
+    meta = recommender.topn_table.meta
+    brands = [brand for brand in meta['brands'] if brand is not None]
+    rng = random.Random(seed)
+    mismatches = 0
+    answered = 0
+    for _ in range(samples):
+        preferences = recommender.normalize_preferences(
+            rng.sample(brands, rng.randint(0, min(3, len(brands)))),
+            rng.choice([None] + [label for label, _, _ in meta['budgets']]),
+            rng.choice([None] + meta['fuels']),
+            rng.sample(meta['types'], rng.randint(0, min(2, len(meta['types'])))),
+            rng.choice([None] + meta['transmissions'])
+        )
+        gender, age_range = rng.choice([(None, None), ('femenino', '26-35'), ('masculino', '18-25'), ('femenino', '56+')])
+
+        from_table = recommender.lookup_topn_table(preferences, gender, age_range)
+        if from_table is None:
+            continue
+        answered += 1
+        from_query = recommender.fetch_ranked_recommendations(preferences, gender, age_range)
+        # Autos empatados en puntuación y precio pueden venir en cualquier orden (como en Neo4j)
+        if ranking(from_table) != ranking(from_query):
+            mismatches += 1
+            print(f"   ⚠️ Distinto: {preferences} {gender} {age_range}")
+
+    print(f"   {answered}/{samples} combinaciones respondidas por la tabla, {mismatches} distintas")
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Construir la tabla top-N materializada de recomendaciones")
+    parser.add_argument("--uri", default=os.environ.get("NEO4J_URI", "neo4j://localhost:7687"),
+                        help="URI de Neo4j (o fake://... para probar con el driver simulado)")
+    parser.add_argument("--user", default="neo4j")
+    parser.add_argument("--password", default="proyectoNEO4J")
+    parser.add_argument("--database", default=os.environ.get("NEO4J_DATABASE"))
+    parser.add_argument("--output", default=os.environ.get("RECOMMENDATION_TOPN_TABLE", "topn.bin"),
+                        help="Archivo de la tabla")
+    parser.add_argument("--top-n", type=int, default=materialized_topn.DEFAULT_TOP_N, help="Autos por celda")
+    parser.add_argument("--car-id", help="Actualizar solo las celdas de la marca de este auto")
+    parser.add_argument("--sync", action="store_true",
+                        help="Aplicar los cambios del catálogo registrados desde que se escribió la tabla")
+    parser.add_argument("--verify", type=int, default=0, metavar="N",
+                        help="Comparar con la consulta compacta en N combinaciones aleatorias")
+    args = parser.parse_args()
+
+    print("🧮 Tabla top-N materializada")
+    print("=" * 50)
+
+    if fake_neo4j.is_fake_uri(args.uri):
+        driver = fake_neo4j.driver_from_uri(args.uri)
+    else:
+        driver = GraphDatabase.driver(args.uri, auth=(args.user, args.password))
+
+    try:
+        start = time.perf_counter()
+        if args.car_id:
+            print(f"1️⃣ Recalculando celdas del auto {args.car_id}...")
+            result = materialized_topn.update_car(driver, args.output, args.car_id, args.database)
+        elif args.sync:
+            print("1️⃣ Aplicando los cambios del catálogo...")
+            result = materialized_topn.sync(driver, args.output, args.top_n, args.database)
+        else:
+            print(f"1️⃣ Calculando los {args.top_n} mejores autos de cada celda...")
+            result = materialized_topn.rebuild(driver, args.output, args.top_n, args.database)
+        print(f"   ✅ {result} en {time.perf_counter() - start:.2f}s")
+        print(f"   📄 {args.output}: {os.path.getsize(args.output) / 1024:.1f} KB")
+
+        if args.verify:
+            print("\n2️⃣ Verificando contra la consulta compacta...")
+            from recommender import CarRecommender
+            recommender = CarRecommender(args.uri, args.user, args.password, cache_size=0, driver=driver,
+                                         query_mode='compact', database=args.database, topn_table=args.output)
+            if verify_table(recommender, args.verify):
+                sys.exit(1)
+
+        print(f"\n✅ Listo: RECOMMENDATION_TOPN_TABLE={args.output}")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    finally:
+        driver.close()
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,12 @@ Asegura que TODAS las combinaciones de preferencias tengan resultados
 
 from neo4j import GraphDatabase
 import random
+import sys
+from pathlib import Path
+
+# Etiquetas precalculadas de los autos (shared/car_tags.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from shared import car_tags
 
 class DatabaseExpander:
     def __init__(self):
@@ -191,16 +197,17 @@ class DatabaseExpander:
                 if i % 10 == 0:
                     print(f"  Progreso: {i}/{len(cars)} autos creados...")
                 
-                # Crear el auto
+                # Crear el auto con sus etiquetas precalculadas
                 session.run("""
                     CREATE (a:Auto {
                         id: $id,
                         modelo: $modelo,
                         año: $año,
                         precio: $precio,
-                        caracteristicas: $caracteristicas
+                        caracteristicas: $caracteristicas,
+                        etiquetas: $etiquetas
                     })
-                """, **car)
+                """, **car, etiquetas=car_tags.compute_tags(car))
                 
                 # Crear relaciones
                 session.run("""
@@ -5,6 +5,12 @@ Borra todo y recrea con relaciones correctas
 """
 
 from neo4j import GraphDatabase
+import sys
+from pathlib import Path
+
+# Etiquetas precalculadas de los autos (shared/car_tags.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from shared import car_tags
 
 class DatabaseFixer:
     def __init__(self):
@@ -213,6 +219,10 @@ class DatabaseFixer:
             """)
             
             print("✅ Todos los datos y relaciones creados correctamente")
+            
+            # Etiquetas precalculadas a partir de los autos recién creados
+            tagged = car_tags.assign_tags(session)
+            print(f"🏷️ Etiquetados {tagged} autos")
     
     def verify_data(self):
         """Verificar que todo esté creado correctamente"""
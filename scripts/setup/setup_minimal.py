@@ -4,6 +4,12 @@ Configuración simplificada para Neo4j (compatible con Python 3.13)
 """
 
 from neo4j import GraphDatabase
+import sys
+from pathlib import Path
+
+# Etiquetas precalculadas de los autos (shared/car_tags.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from shared import car_tags
 
 class Neo4jSetup:
     def __init__(self, uri, user, password):
@@ -103,12 +109,19 @@ class Neo4jSetup:
         
         print(f"Creados {len(cars_data)} autos")
     
+    def tag_cars(self):
+        """Guardar las etiquetas precalculadas de los autos"""
+        with self.driver.session() as session:
+            tagged = car_tags.assign_tags(session)
+        print(f"Etiquetados {tagged} autos")
+    
     def setup_database(self):
         """Configurar base de datos completa"""
         print("Configurando base de datos...")
         self.clear_database()
         self.create_sample_data()
         self.create_cars()
+        self.tag_cars()
         print("¡Configuración completada!")
 
 def test_connections():
@@ -7,10 +7,24 @@ y poblarla con datos de ejemplo para el sistema de recomendaciones de autos
 from neo4j import GraphDatabase
 import logging
 
+# Etiquetas precalculadas y atributos desnormalizados de los autos (shared/car_tags.py, shared/car_attributes.py)
+from shared import car_attributes, car_tags
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Índices y restricciones (scripts/debug/debug_recommendations.py los lee para sugerir índices)
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT auto_id IF NOT EXISTS FOR (a:Auto) REQUIRE a.id IS UNIQUE",
+    "CREATE CONSTRAINT marca_nombre IF NOT EXISTS FOR (m:Marca) REQUIRE m.nombre IS UNIQUE",
+    "CREATE CONSTRAINT tipo_categoria IF NOT EXISTS FOR (t:Tipo) REQUIRE t.categoria IS UNIQUE",
+    "CREATE CONSTRAINT combustible_tipo IF NOT EXISTS FOR (c:Combustible) REQUIRE c.tipo IS UNIQUE",
+    "CREATE CONSTRAINT transmision_tipo IF NOT EXISTS FOR (tr:Transmision) REQUIRE tr.tipo IS UNIQUE",
+    "CREATE INDEX auto_precio IF NOT EXISTS FOR (a:Auto) ON (a.precio)",
+    "CREATE INDEX auto_año IF NOT EXISTS FOR (a:Auto) ON (a.año)"
+] + car_attributes.INDEX_STATEMENTS
+
 class Neo4jSetup:
     def __init__(self, uri, user, password):
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
@@ -26,18 +40,8 @@ class Neo4jSetup:
     
     def create_constraints(self):
         """Crear índices y restricciones para mejor rendimiento"""
-        constraints = [
-            "CREATE CONSTRAINT auto_id IF NOT EXISTS FOR (a:Auto) REQUIRE a.id IS UNIQUE",
-            "CREATE CONSTRAINT marca_nombre IF NOT EXISTS FOR (m:Marca) REQUIRE m.nombre IS UNIQUE",
-            "CREATE CONSTRAINT tipo_categoria IF NOT EXISTS FOR (t:Tipo) REQUIRE t.categoria IS UNIQUE",
-            "CREATE CONSTRAINT combustible_tipo IF NOT EXISTS FOR (c:Combustible) REQUIRE c.tipo IS UNIQUE",
-            "CREATE CONSTRAINT transmision_tipo IF NOT EXISTS FOR (tr:Transmision) REQUIRE tr.tipo IS UNIQUE",
-            "CREATE INDEX auto_precio IF NOT EXISTS FOR (a:Auto) ON (a.precio)",
-            "CREATE INDEX auto_año IF NOT EXISTS FOR (a:Auto) ON (a.año)"
-        ]
-        
         with self.driver.session() as session:
-            for constraint in constraints:
+            for constraint in SCHEMA_STATEMENTS:
                 try:
                     session.run(constraint)
                     logger.info(f"Creada restricción: {constraint.split()[1]}")
@@ -207,6 +211,18 @@ class Neo4jSetup:
         
         logger.info("Agregadas características a los autos")
     
+    def tag_cars(self):
+        """Guardar las etiquetas precalculadas una vez cargados autos y características"""
+        with self.driver.session() as session:
+            tagged = car_tags.assign_tags(session)
+        logger.info(f"Etiquetados {tagged} autos")
+    
+    def denormalize_cars(self):
+        """Copiar marca, tipo, combustible y transmisión a propiedades del auto"""
+        with self.driver.session() as session:
+            updated = car_attributes.assign_attributes(session)
+        logger.info(f"Atributos desnormalizados en {updated} autos")
+    
     def setup_complete_database(self):
         """Configurar completamente la base de datos"""
         logger.info("Iniciando configuración de base de datos Neo4j...")
@@ -226,6 +242,8 @@ class Neo4jSetup:
         # Crear autos y sus relaciones
         self.create_cars()
         self.add_car_features()
+        self.tag_cars()
+        self.denormalize_cars()
         
         logger.info("¡Configuración de base de datos completada!")
         
@@ -0,0 +1,6 @@
+"""
+Módulos compartidos por la aplicación Flask (app/) y el backend (backend/)
+Etiquetas y atributos desnormalizados de los autos, logging y registro de consultas lentas
+
+Se importa desde la raíz del proyecto: from shared import car_tags
+"""
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Atributos desnormalizados de los autos
+Además de las relaciones con Marca, Tipo, Combustible y Transmision, cada nodo Auto guarda
+el valor de esas categorías como propiedades (marca, tipo, combustible, transmision) con
+índices compuestos junto al precio, así los filtros del recomendador (modo "denormalized")
+son búsquedas en índice en vez de recorridos de relaciones
+
+Las relaciones siguen siendo la fuente de verdad: Gestionador las mantiene sincronizadas
+con las propiedades y scripts/setup/backfill_attributes.py rellena los autos existentes
+"""
+
+import logging
+from typing import List, Dict, Any, Optional, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Propiedad del auto -> (relación, etiqueta, propiedad identificadora de la categoría)
+ATTRIBUTE_SCHEMA = {
+    'marca': ('ES_MARCA', 'Marca', 'nombre'),
+    'tipo': ('ES_TIPO', 'Tipo', 'categoria'),
+    'combustible': ('USA_COMBUSTIBLE', 'Combustible', 'tipo'),
+    'transmision': ('TIENE_TRANSMISION', 'Transmision', 'tipo')
+}
+ATTRIBUTE_FIELDS = tuple(ATTRIBUTE_SCHEMA)
+
+# Índices compuestos (atributo, precio): igualdad o IN sobre el atributo y rango de precio
+INDEX_STATEMENTS = [
+    f"CREATE INDEX auto_{field}_precio IF NOT EXISTS FOR (a:Auto) ON (a.{field}, a.precio)"
+    for field in ATTRIBUTE_FIELDS
+]
+
+# Valores actuales de las relaciones de un auto (búsqueda por id en el índice)
+ATTRIBUTE_SOURCE_QUERY = """
+    MATCH (a:Auto {id: $car_id})
+    OPTIONAL MATCH (a)-[:ES_MARCA]->(m:Marca)
+    OPTIONAL MATCH (a)-[:ES_TIPO]->(t:Tipo)
+    OPTIONAL MATCH (a)-[:USA_COMBUSTIBLE]->(c:Combustible)
+    OPTIONAL MATCH (a)-[:TIENE_TRANSMISION]->(tr:Transmision)
+    RETURN a.id as id, m.nombre as marca, t.categoria as tipo,
+           c.tipo as combustible, tr.tipo as transmision
+"""
+
+# Los mismos valores para todos los autos, por páginas en orden de id (ids de texto)
+ATTRIBUTE_SOURCE_PAGE_QUERY = """
+    MATCH (a:Auto)
+    WHERE a.id > $after_id
+    WITH a ORDER BY a.id LIMIT $batch_size
+    OPTIONAL MATCH (a)-[:ES_MARCA]->(m:Marca)
+    OPTIONAL MATCH (a)-[:ES_TIPO]->(t:Tipo)
+    OPTIONAL MATCH (a)-[:USA_COMBUSTIBLE]->(c:Combustible)
+    OPTIONAL MATCH (a)-[:TIENE_TRANSMISION]->(tr:Transmision)
+    RETURN a.id as id, m.nombre as marca, t.categoria as tipo,
+           c.tipo as combustible, tr.tipo as transmision
+"""
+
+ATTRIBUTE_UPDATE_QUERY = """
+    UNWIND $rows AS row
+    MATCH (a:Auto {id: row.id})
+    SET a.marca = row.marca, a.tipo = row.tipo, a.combustible = row.combustible, a.transmision = row.transmision
+"""
+
+def relink_query(field: str) -> str:
+    """Consulta que enlaza un auto con la categoría $value (la relación anterior se borra aparte)"""
+    relation, label, key = ATTRIBUTE_SCHEMA[field]
+    return f"""
+        MATCH (a:Auto {{id: $car_id}})
+        MERGE (n:{label} {{{key}: $value}})
+        MERGE (a)-[:{relation}]->(n)
+    """
+
+def unlink_query(field: str) -> str:
+    """Consulta que borra la relación del auto $car_id con su categoría actual"""
+    relation = ATTRIBUTE_SCHEMA[field][0]
+    return f"MATCH (a:Auto {{id: $car_id}})-[r:{relation}]->() DELETE r"
+
+def create_indexes(session):
+    """Crear los índices compuestos de los atributos desnormalizados"""
+    for statement in INDEX_STATEMENTS:
+        session.run(statement)
+    logger.info(f"Índices de atributos desnormalizados: {len(INDEX_STATEMENTS)}")
+
+def iter_attribute_rows(session, batch_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+    """Valores de las relaciones de todos los autos, de batch_size en batch_size"""
+    after_id = ''
+    while True:
+        rows = [dict(record) for record in session.run(ATTRIBUTE_SOURCE_PAGE_QUERY, after_id=after_id,
+                                                       batch_size=batch_size)]
+        if not rows:
+            return
+        yield rows
+        after_id = max(row['id'] for row in rows)
+
+def assign_attributes(session, car_id: Optional[str] = None, batch_size: int = 1000) -> int:
+    """
+    Copiar a cada auto los valores de sus relaciones de categoría
+
+    Usado por los scripts de carga y por scripts/setup/backfill_attributes.py. Sin car_id
+    se recorren todos los autos por lotes: cada lote se lee y se escribe aparte, así que
+    la memoria y el tamaño de cada transacción dependen de batch_size y no del catálogo
+
+    Returns:
+        Número de autos actualizados
+    """
+    if car_id is not None:
+        pages = [[dict(record) for record in session.run(ATTRIBUTE_SOURCE_QUERY, car_id=car_id)]]
+    else:
+        pages = iter_attribute_rows(session, batch_size)
+
+    updated = 0
+    for rows in pages:
+        if rows:
+            session.run(ATTRIBUTE_UPDATE_QUERY, rows=rows).consume()
+            updated += len(rows)
+    logger.info(f"Atributos desnormalizados para {updated} autos")
+    return updated
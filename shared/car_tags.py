@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Etiquetas precalculadas de los autos
+Las reglas demográficas buscan palabras en el nombre y las características de cada auto;
+aquí se calculan una sola vez al escribir el auto y se guardan como máscara de bits
+en la propiedad `etiquetas` del nodo Auto
+"""
+
+import logging
+from typing import List, Dict, Any, Optional, Iterator
+
+logger = logging.getLogger(__name__)
+
+# ===== Bits de etiqueta =====
+
+TAG_SPORT_BODY = 1 << 0      # Tipo coupé o convertible
+TAG_SUV = 1 << 1             # Tipo SUV
+TAG_SEDAN = 1 << 2           # Tipo sedán
+TAG_SPORT_NAME = 1 << 3      # 'sport', 'gt' o 'turbo' en el nombre
+TAG_SPORT_MODEL = 1 << 4     # Modelos deportivos conocidos ('mustang', 'm3')
+TAG_FAMILY = 1 << 5          # Características familiares
+TAG_PREMIUM = 1 << 6         # 'premium', 'lujo' o 'cuero' en las características
+TAG_CONFORT = 1 << 7         # 'confort' en las características
+TAG_LUXURY_EN = 1 << 8       # 'leather' o 'luxury' en las características
+TAG_LUXURY_BRAND = 1 << 9    # Marca de lujo
+
+# Combinaciones usadas por los distintos scorers
+SPORTY = TAG_SPORT_BODY | TAG_SPORT_NAME
+SPORTY_EXTENDED = SPORTY | TAG_SPORT_MODEL
+COMFORT = TAG_PREMIUM | TAG_CONFORT | TAG_LUXURY_EN
+COMFORT_ES = TAG_PREMIUM | TAG_CONFORT
+ALL_TAGS = (TAG_LUXURY_BRAND << 1) - 1
+
+# Palabras buscadas (en minúsculas, como subcadenas)
+SPORT_TYPES = ('coupé', 'convertible')
+SPORT_WORDS = ('sport', 'gt', 'turbo')
+SPORT_MODELS = ('mustang', 'm3')
+FAMILY_WORDS = ('familia', 'seguridad', 'espacio', 'asientos')
+PREMIUM_WORDS = ('premium', 'lujo', 'cuero')
+CONFORT_WORDS = ('confort',)
+LUXURY_EN_WORDS = ('leather', 'luxury')
+LUXURY_BRANDS = ('mercedes', 'bmw', 'audi', 'lexus')
+
+# Campos del auto que cambian sus etiquetas
+TAG_FIELDS = ('modelo', 'año', 'caracteristicas', 'marca', 'tipo')
+
+# Datos necesarios para etiquetar un auto ya guardado (búsqueda por id en el índice)
+TAG_SOURCE_QUERY = """
+    MATCH (a:Auto {id: $car_id})
+    OPTIONAL MATCH (a)-[:ES_MARCA]->(m:Marca)
+    OPTIONAL MATCH (a)-[:ES_TIPO]->(t:Tipo)
+    RETURN a.id as id, a.modelo as modelo, a.año as año,
+           a.caracteristicas as caracteristicas,
+           m.nombre as marca, t.categoria as tipo
+"""
+
+# Los mismos datos para todos los autos, por páginas en orden de id (ids de texto)
+TAG_SOURCE_PAGE_QUERY = """
+    MATCH (a:Auto)
+    WHERE a.id > $after_id
+    WITH a ORDER BY a.id LIMIT $batch_size
+    OPTIONAL MATCH (a)-[:ES_MARCA]->(m:Marca)
+    OPTIONAL MATCH (a)-[:ES_TIPO]->(t:Tipo)
+    RETURN a.id as id, a.modelo as modelo, a.año as año,
+           a.caracteristicas as caracteristicas,
+           m.nombre as marca, t.categoria as tipo
+"""
+
+# Autos sin etiquetas precalculadas (creados antes de las etiquetas o fuera del Gestionador)
+UNTAGGED_COUNT_QUERY = """
+    MATCH (a:Auto)
+    WHERE a.etiquetas IS NULL
+    RETURN count(a) as untagged
+"""
+
+TAG_UPDATE_QUERY = """
+    UNWIND $rows AS row
+    MATCH (a:Auto {id: row.id})
+    SET a.etiquetas = row.etiquetas
+"""
+
+def tags_from_text(name: str, brand: str, car_type: str, features) -> int:
+    """Calcular la máscara a partir de los textos que revisan los scorers"""
+    car_type = (car_type or '').lower()
+    car_brand = (brand or '').lower()
+    car_name = (name or '').lower()
+    features_text = str(features).lower()
+
+    tags = 0
+    if car_type in SPORT_TYPES:
+        tags |= TAG_SPORT_BODY
+    if car_type == 'suv':
+        tags |= TAG_SUV
+    if car_type == 'sedán':
+        tags |= TAG_SEDAN
+    if any(word in car_name for word in SPORT_WORDS):
+        tags |= TAG_SPORT_NAME
+    if any(word in car_name for word in SPORT_MODELS):
+        tags |= TAG_SPORT_MODEL
+    if any(word in features_text for word in FAMILY_WORDS):
+        tags |= TAG_FAMILY
+    if any(word in features_text for word in PREMIUM_WORDS):
+        tags |= TAG_PREMIUM
+    if any(word in features_text for word in CONFORT_WORDS):
+        tags |= TAG_CONFORT
+    if any(word in features_text for word in LUXURY_EN_WORDS):
+        tags |= TAG_LUXURY_EN
+    if any(luxury in car_brand for luxury in LUXURY_BRANDS):
+        tags |= TAG_LUXURY_BRAND
+    return tags
+
+def compute_tags(car_data: Dict[str, Any]) -> int:
+    """
+    Calcular etiquetas de un auto en formato de base de datos
+
+    Args:
+        car_data: Diccionario con modelo, año, caracteristicas, marca y tipo
+    """
+    marca = car_data.get('marca')
+    name = f"{marca} {car_data.get('modelo')} {car_data.get('año')}" if marca else f"{car_data.get('modelo')} {car_data.get('año')}"
+    return tags_from_text(name, marca, car_data.get('tipo'), car_data.get('caracteristicas') or [])
+
+def tags_for_car(car: Dict[str, Any]) -> int:
+    """Etiquetas de un auto en formato de la API (calculadas si el auto no las trae)"""
+    tags = car.get('tags')
+    if tags is None:
+        tags = tags_from_text(car.get('name', ''), car.get('brand', ''), car.get('type', ''), car.get('features', []))
+    return tags
+
+def count_untagged(tx) -> int:
+    """Autos sin la propiedad etiquetas (0 si el relleno está completo)"""
+    return tx.run(UNTAGGED_COUNT_QUERY).single()['untagged']
+
+def assign_tags(session, car_id: Optional[str] = None, batch_size: int = 1000) -> int:
+    """
+    Calcular y guardar etiquetas de autos ya creados
+
+    Usado por los scripts de carga tras crear autos y características (todos los autos,
+    por lotes de batch_size) y por update_car cuando cambia un campo que afecta a las etiquetas
+
+    Returns:
+        Número de autos etiquetados
+    """
+    if car_id is not None:
+        pages = [[dict(record) for record in session.run(TAG_SOURCE_QUERY, car_id=car_id)]]
+    else:
+        pages = _iter_tag_sources(session, batch_size)
+
+    tagged = 0
+    for cars in pages:
+        if cars:
+            rows = [{'id': car['id'], 'etiquetas': compute_tags(car)} for car in cars]
+            session.run(TAG_UPDATE_QUERY, rows=rows).consume()
+            tagged += len(rows)
+    logger.info(f"Etiquetas calculadas para {tagged} autos")
+    return tagged
+
+def _iter_tag_sources(session, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Datos de etiquetado de todos los autos, de batch_size en batch_size"""
+    after_id = ''
+    while True:
+        cars = [dict(record) for record in session.run(TAG_SOURCE_PAGE_QUERY, after_id=after_id, batch_size=batch_size)]
+        if not cars:
+            return
+        yield cars
+        after_id = max(car['id'] for car in cars)
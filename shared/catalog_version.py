@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Versión del catálogo compartida entre procesos
+Gestionador corre en otro proceso que la aplicación: cada cambio del catálogo incrementa,
+en la misma transacción que el cambio, la versión del nodo :CatalogVersion y deja un
+:CatalogChange con la acción y el id del auto. La aplicación lee la versión (como mucho una
+vez por intervalo) antes de responder desde la caché y aplica los cambios que no conocía
+
+El registro de cambios guarda los últimos CHANGE_LOG_SIZE: si un proceso se quedó más
+atrás, recibe un cambio completo (FULL_CHANGE) y recarga todo
+"""
+
+import logging
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+VERSION_ID = 'catalogo'
+
+# Cambios que se conservan en el registro
+CHANGE_LOG_SIZE = 1000
+
+# Cambio que no se puede aplicar auto por auto (carga masiva o registro incompleto)
+FULL_CHANGE = ('full', None)
+
+RECORD_CHANGE_QUERY = """
+    MERGE (v:CatalogVersion {id: $version_id})
+    SET v.version = coalesce(v.version, 0) + 1
+    CREATE (c:CatalogChange {version: v.version, action: $action, car_id: $car_id})
+    RETURN v.version as version
+"""
+
+PRUNE_CHANGES_QUERY = """
+    MATCH (c:CatalogChange)
+    WHERE c.version <= $oldest
+    DELETE c
+"""
+
+VERSION_QUERY = """
+    MATCH (v:CatalogVersion {id: $version_id})
+    RETURN v.version as version
+"""
+
+CHANGES_QUERY = """
+    MATCH (c:CatalogChange)
+    WHERE c.version > $since
+    RETURN c.version as version, c.action as action, c.car_id as car_id
+    ORDER BY c.version
+"""
+
+def record_change(tx, action: str, car_id: Optional[str]) -> int:
+    """Anotar un cambio dentro de la transacción de escritura que lo hace (devuelve la nueva versión)"""
+    version = tx.run(RECORD_CHANGE_QUERY, version_id=VERSION_ID, action=action, car_id=car_id).single()['version']
+    tx.run(PRUNE_CHANGES_QUERY, oldest=version - CHANGE_LOG_SIZE).consume()
+    return version
+
+def read_version(tx) -> int:
+    """Versión actual del catálogo (0 si nunca cambió)"""
+    record = tx.run(VERSION_QUERY, version_id=VERSION_ID).single()
+    return record['version'] if record is not None else 0
+
+def read_changes(tx, since: int) -> List[Dict[str, Any]]:
+    """Cambios posteriores a la versión since, en orden"""
+    return [dict(record) for record in tx.run(CHANGES_QUERY, since=since)]
+
+def read_state(tx, since: Optional[int]) -> tuple:
+    """(versión, cambios posteriores a since); los cambios solo se leen si la versión avanzó"""
+    version = read_version(tx)
+    changes = read_changes(tx, since) if since is not None and version > since else []
+    return version, changes
+
+def pending_changes(since: Optional[int], version: int, changes: List[Dict[str, Any]]) -> Optional[List[tuple]]:
+    """
+    Cambios (acción, id_auto) que llevan de since a version
+
+    Returns:
+        None si el registro no los cubre todos (versión desconocida, base de datos recreada
+        o registro recortado) y hay que recargar todo
+    """
+    if since is None or version < since:
+        return None
+    # Cambios confirmados después de leer la versión se aplican en la próxima lectura
+    changes = [change for change in changes if change['version'] <= version]
+    if [change['version'] for change in changes] != list(range(since + 1, version + 1)):
+        return None
+    return [(change['action'], change['car_id']) for change in changes]
+
+class CatalogVersionWatcher:
+    def __init__(self, check_interval: float = 1.0):
+        """
+        Seguimiento de la versión del catálogo en un proceso de la aplicación
+
+        Args:
+            check_interval: Segundos mínimos entre lecturas de la versión en Neo4j
+        """
+        self.check_interval = check_interval
+        self.version = None  # None hasta la primera lectura
+        self.checks = 0
+        self.changes_applied = 0
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def due(self) -> bool:
+        """True si toca leer la versión; solo un llamador por intervalo lo recibe"""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check:
+                return False
+            self._next_check = now + self.check_interval
+            self.checks += 1
+            return True
+
+    def advance(self, since: Optional[int], version: int, changes: List[Dict[str, Any]]) -> List[tuple]:
+        """
+        Pasar a version y devolver los cambios (acción, id_auto) que hay que aplicar
+
+        Args:
+            since: Versión conocida cuando se leyó el registro (self.version en ese momento)
+            version: Versión leída de Neo4j
+            changes: Cambios posteriores a since (ver read_state)
+        """
+        with self._lock:
+            if self.version != since or version == since:
+                # Otro hilo ya aplicó esta lectura, o no hubo cambios
+                return []
+            self.version = version
+            if since is None:
+                # Primera lectura: punto de partida, nada que aplicar
+                return []
+            pending = pending_changes(since, version, changes)
+            if pending is None:
+                self.changes_applied += 1
+                return [FULL_CHANGE]
+            self.changes_applied += len(pending)
+            return pending
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'version': self.version,
+                'check_interval': self.check_interval,
+                'checks': self.checks,
+                'changes_applied': self.changes_applied
+            }
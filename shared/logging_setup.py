@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Configuración de logging de la aplicación
+Los registros se encolan sin bloquear (el hilo de la petición nunca escribe en stdout/stderr)
+y un hilo de fondo los escribe como JSON, una línea por evento
+
+Variables de entorno:
+    LOG_LEVEL: Nivel global (por defecto INFO)
+    LOG_LEVELS: Niveles por módulo, ej: "recommender=WARNING,user_store=DEBUG"
+    LOG_FORMAT: "json" (por defecto) o "text"
+    LOG_DEBUG_SAMPLE_RATE: Fracción de eventos DEBUG que se escriben (por defecto 0.01)
+    LOG_QUEUE_SIZE: Eventos en cola antes de descartar (por defecto 10000)
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# Atributos propios de LogRecord: el resto vienen de extra={...} y se escriben como campos
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_queue_handler = None
+_lock = threading.Lock()
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea con marca de tiempo, nivel, módulo, mensaje y campos extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class DebugSampler(logging.Filter):
+    """Dejar pasar solo una fracción de los eventos DEBUG (los demás niveles siempre pasan)"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler con cola acotada: si la cola está llena descarta el evento en vez de esperar"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Resolver mensaje y excepción en el hilo que registra (los argumentos pueden cambiar después)"""
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def parse_module_levels(spec: str) -> Dict[str, int]:
+    """Convertir "modulo=NIVEL,otro=NIVEL" en {modulo: nivel}"""
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        name, level = item.split('=', 1)
+        levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+def configure_logging(level: Optional[str] = None, module_levels: Optional[Dict[str, int]] = None,
+                      json_output: Optional[bool] = None, debug_sample_rate: Optional[float] = None,
+                      queue_size: Optional[int] = None, stream=None, force: bool = False):
+    """
+    Configurar el logging raíz (idempotente: solo la primera llamada tiene efecto salvo force=True)
+
+    Los argumentos omitidos se leen de las variables de entorno del módulo
+    """
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None and not force:
+            return
+        if _listener is not None:
+            _listener.stop()
+
+        level = level or os.environ.get('LOG_LEVEL', 'INFO')
+        if module_levels is None:
+            module_levels = parse_module_levels(os.environ.get('LOG_LEVELS', ''))
+        if json_output is None:
+            json_output = os.environ.get('LOG_FORMAT', 'json').lower() == 'json'
+        if debug_sample_rate is None:
+            debug_sample_rate = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '0.01'))
+        if queue_size is None:
+            queue_size = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        if json_output:
+            output.setFormatter(JsonFormatter())
+        else:
+            output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+        _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        _queue_handler.addFilter(DebugSampler(debug_sample_rate))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        root.setLevel(level.upper() if isinstance(level, str) else level)
+
+        for name, module_level in module_levels.items():
+            logging.getLogger(name).setLevel(module_level)
+
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+        _listener.start()
+
+def get_dropped_count() -> int:
+    """Eventos descartados porque la cola estaba llena"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+def shutdown():
+    """Escribir los eventos pendientes y detener el hilo de escritura"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+atexit.register(shutdown)
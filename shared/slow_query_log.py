@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Registro de consultas lentas
+Las consultas que superan el umbral se registran (texto, parámetros y duración) y se
+vuelven a ejecutar con PROFILE en un hilo de fondo; el plan resultante (operadores,
+filas y db hits) se guarda en un archivo JSON Lines rotativo para revisarlo después
+
+Solo para consultas de lectura: PROFILE ejecuta la consulta de verdad (en una transacción
+de lectura, así en un clúster no carga al líder). Cada forma de consulta se perfila como
+mucho una vez por intervalo, sean cuales sean sus parámetros, y nunca con el circuito
+de Neo4j abierto: una base de datos saturada no recibe además los PROFILE de sus consultas lentas
+
+Variables de entorno:
+    SLOW_QUERY_MS: Umbral en milisegundos (por defecto 200; 0 desactiva el registro)
+    SLOW_QUERY_LOG: Archivo de salida (por defecto logs/slow_queries.jsonl)
+    SLOW_QUERY_PROFILE: "0" para registrar sin ejecutar PROFILE
+    SLOW_QUERY_LOG_BYTES: Tamaño máximo de cada archivo (por defecto 5 MB)
+    SLOW_QUERY_LOG_BACKUPS: Archivos rotados que se conservan (por defecto 5)
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_LOG_PATH = PROJECT_ROOT / "logs" / "slow_queries.jsonl"
+
+def plan_to_dict(plan) -> Optional[Dict[str, Any]]:
+    """
+    Convertir el plan de summary.profile/summary.plan en un árbol compacto
+
+    El driver devuelve diccionarios con operatorType, rows, dbHits, args y children
+    (las claves que falten, como en EXPLAIN, se omiten)
+    """
+    if not plan:
+        return None
+    args = plan.get('args') or plan.get('arguments') or {}
+    node = {
+        'operator': plan.get('operatorType'),
+        'rows': plan.get('rows'),
+        'db_hits': plan.get('dbHits'),
+        'details': args.get('Details') or args.get('details'),
+        'estimated_rows': args.get('EstimatedRows'),
+        'children': [child for child in (plan_to_dict(c) for c in plan.get('children') or []) if child]
+    }
+    return {key: value for key, value in node.items() if value not in (None, [])}
+
+def total_db_hits(plan: Optional[Dict[str, Any]]) -> int:
+    """Suma de db hits de todos los operadores del árbol de plan_to_dict"""
+    if not plan:
+        return 0
+    return (plan.get('db_hits') or 0) + sum(total_db_hits(child) for child in plan.get('children', []))
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float = 200, path: Path = DEFAULT_LOG_PATH, profile: bool = True,
+                 max_bytes: int = 5 * 1024 * 1024, backup_count: int = 5,
+                 profile_cooldown: float = 300, max_pending: int = 16):
+        """
+        Inicializar registro de consultas lentas
+
+        Args:
+            threshold_ms: Duración a partir de la cual una consulta se considera lenta (0 = desactivado)
+            path: Archivo JSON Lines de salida (se rota por tamaño)
+            profile: Re-ejecutar las consultas lentas con PROFILE para guardar su plan
+            max_bytes: Tamaño máximo de cada archivo antes de rotar
+            backup_count: Archivos rotados que se conservan
+            profile_cooldown: Segundos antes de volver a perfilar la misma consulta (con cualquier parámetro)
+            max_pending: Perfiles en espera como máximo (el resto se registra sin plan)
+        """
+        self.threshold_ms = threshold_ms
+        self.path = Path(path)
+        self.profile = profile
+        self.profile_cooldown = profile_cooldown
+        self.max_pending = max_pending
+        self.slow_queries = 0
+        self.profiles_written = 0
+        self._pending = 0
+        self._last_profiled = {}  # texto normalizado de la consulta -> momento del último perfil
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-profile")
+
+        # Logger propio que solo escribe en el archivo rotativo
+        self._file_logger = logging.getLogger(f"{__name__}.file.{id(self)}")
+        self._file_logger.propagate = False
+        self._file_logger.setLevel(logging.INFO)
+        self._handler = None
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def _write(self, entry: Dict[str, Any]):
+        if self._handler is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._handler = logging.handlers.RotatingFileHandler(
+                self.path, maxBytes=self._max_bytes, backupCount=self._backup_count, encoding="utf-8"
+            )
+            self._handler.setFormatter(logging.Formatter("%(message)s"))
+            self._file_logger.addHandler(self._handler)
+        self._file_logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def observe(self, driver, query: str, parameters: Optional[Dict[str, Any]], elapsed_ms: float,
+                source: str, database: Optional[str] = None,
+                profile_allowed: Optional[Callable[[], bool]] = None) -> bool:
+        """
+        Registrar una consulta ya ejecutada si superó el umbral
+
+        Args:
+            profile_allowed: Función que dice si se puede consultar Neo4j (ej.
+                CarRecommender.catalog_reads_allowed); con False la consulta se registra sin PROFILE
+
+        Returns:
+            True si la consulta se consideró lenta
+        """
+        if not self.enabled or elapsed_ms < self.threshold_ms:
+            return False
+
+        self.slow_queries += 1
+        parameters = dict(parameters or {})
+        logger.warning("Consulta lenta (%.1f ms) en %s", elapsed_ms, source,
+                       extra={"query": " ".join(query.split()), "parameters": parameters, "elapsed_ms": round(elapsed_ms, 2)})
+
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "source": source,
+            "elapsed_ms": round(elapsed_ms, 2),
+            "threshold_ms": self.threshold_ms,
+            "query": " ".join(query.split()),
+            "parameters": parameters
+        }
+
+        if (not self.profile or driver is None or (profile_allowed is not None and not profile_allowed())
+                or not self._reserve_profile(entry["query"])):
+            with self._lock:
+                self._write(entry)
+            return True
+
+        self._executor.submit(self._profile, driver, query, parameters, entry, database, profile_allowed)
+        return True
+
+    def _reserve_profile(self, key: str) -> bool:
+        """
+        Evitar perfilar repetidamente la misma consulta o acumular perfiles pendientes
+
+        La clave es el texto normalizado: las consultas generadas llevan los valores como
+        parámetros, así que una misma forma con otros valores no se vuelve a perfilar
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return False
+            last = self._last_profiled.get(key)
+            if last is not None and now - last < self.profile_cooldown:
+                return False
+            self._last_profiled[key] = now
+            if len(self._last_profiled) > 1024:
+                oldest = min(self._last_profiled, key=self._last_profiled.get)
+                del self._last_profiled[oldest]
+            self._pending += 1
+            return True
+
+    def _profile(self, driver, query: str, parameters: Dict[str, Any], entry: Dict[str, Any],
+                 database: Optional[str], profile_allowed: Optional[Callable[[], bool]] = None):
+        try:
+            if profile_allowed is not None and not profile_allowed():
+                # El circuito se abrió mientras el perfil esperaba turno
+                entry["profile_skipped"] = "circuito abierto"
+                return
+            session_config = {"database": database} if database else {}
+            start = time.perf_counter()
+            with driver.session(**session_config) as session:
+                summary = session.execute_read(lambda tx: tx.run("PROFILE " + query, parameters).consume())
+            plan = plan_to_dict(summary.profile)
+            entry["profile_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            entry["db_hits"] = total_db_hits(plan)
+            entry["plan"] = plan
+        except Exception as e:
+            logger.warning("No se pudo perfilar la consulta lenta: %s", e)
+            entry["profile_error"] = str(e)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._write(entry)
+                if "profile_skipped" not in entry:
+                    self.profiles_written += 1
+
+    def flush(self, timeout: float = 5):
+        """Esperar a que terminen los perfiles en curso (scripts y pruebas)"""
+        self._executor.submit(lambda: None).result(timeout)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self._handler is not None:
+            self._file_logger.removeHandler(self._handler)
+            self._handler.close()
+            self._handler = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": self.threshold_ms,
+            "slow_queries": self.slow_queries,
+            "profiles_written": self.profiles_written,
+            "path": str(self.path)
+        }
+
+_slow_query_log = None
+_slow_query_lock = threading.Lock()
+
+def get_slow_query_log() -> SlowQueryLog:
+    """Obtener instancia singleton configurada con las variables de entorno"""
+    global _slow_query_log
+    with _slow_query_lock:
+        if _slow_query_log is None:
+            _slow_query_log = SlowQueryLog(
+                threshold_ms=float(os.environ.get("SLOW_QUERY_MS", "200")),
+                path=Path(os.environ.get("SLOW_QUERY_LOG", str(DEFAULT_LOG_PATH))),
+                profile=os.environ.get("SLOW_QUERY_PROFILE", "1") != "0",
+                max_bytes=int(os.environ.get("SLOW_QUERY_LOG_BYTES", str(5 * 1024 * 1024))),
+                backup_count=int(os.environ.get("SLOW_QUERY_LOG_BACKUPS", "5"))
+            )
+    return _slow_query_log
+
+def cleanup():
+    global _slow_query_log
+    if _slow_query_log is not None:
+        _slow_query_log.close()
+        _slow_query_log = None
+
+import atexit
+atexit.register(cleanup)
@@ -0,0 +1,14 @@
+"""
+Configuración común de las pruebas
+Los módulos de la aplicación viven en app/ y se importan como módulos de primer nivel
+(igual que los importa app.py), igual que gestionador desde backend/; los compartidos
+con el backend, desde el paquete shared
+"""
+
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+for path in (PROJECT_ROOT, PROJECT_ROOT / "app", PROJECT_ROOT / "backend"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,78 @@
+"""
+Pruebas del loop de recomendaciones asíncronas: conexión fallida, tiempo límite y modo compacto sin etiquetas
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+import fake_neo4j
+from async_recommender import AsyncCarRecommender, RecommendationLoop
+from recommender import CarRecommender
+from shared import car_tags
+
+URI = "fake://synthetic?cars=300"
+
+class UnreachableRecommender(AsyncCarRecommender):
+    async def connect(self):
+        raise ConnectionError("Neo4j no responde")
+
+class HangingRecommender(AsyncCarRecommender):
+    async def connect(self):
+        await asyncio.sleep(60)
+
+def loop_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "async-recommender"]
+
+def test_recommendations_through_shared_loop():
+    recommendation_loop = RecommendationLoop(lambda: AsyncCarRecommender(
+        URI, "", "", driver=fake_neo4j.async_driver_from_uri(URI)))
+    recommendations = recommendation_loop.run(
+        recommendation_loop.recommender.get_recommendations_async(["Toyota", "Honda"]), timeout=10)
+    assert recommendations
+    recommendation_loop.close()
+    assert not loop_threads()
+
+@pytest.mark.parametrize("recommender_class", [UnreachableRecommender, HangingRecommender])
+def test_failed_connect_closes_driver_and_loop(recommender_class):
+    drivers = []
+
+    def factory():
+        drivers.append(fake_neo4j.async_driver_from_uri(URI))
+        return recommender_class(URI, "", "", driver=drivers[-1])
+
+    with pytest.raises((ConnectionError, TimeoutError)):
+        RecommendationLoop(factory, connect_timeout=0.2)
+    assert drivers[0].closed
+    assert not loop_threads()
+
+def test_compact_mode_requires_the_tag_backfill():
+    graph = fake_neo4j.FakeGraph.synthetic(200, 4)
+    for car in graph.cars.values():
+        car.pop('etiquetas', None)
+    search = (["Toyota", "BMW", "Honda"], None, None, [], None, "femenino", "26-35")
+
+    recommendation_loop = RecommendationLoop(lambda: AsyncCarRecommender(
+        URI, "", "", cache_size=0, driver=fake_neo4j.FakeAsyncDriver(graph), query_mode="compact"))
+    try:
+        recommender = recommendation_loop.recommender
+        # Sin etiquetas la consulta compacta no daría bonificación demográfica
+        assert recommender.query_mode == "standard"
+        recommendations = recommendation_loop.run(recommender.get_recommendations_async(*search), timeout=10)
+    finally:
+        recommendation_loop.close()
+
+    expected = CarRecommender(URI, "", "", cache_size=0, driver=fake_neo4j.FakeDriver(graph)).get_recommendations(*search)
+    assert recommendations == expected
+    assert any(car.get('demographic_bonus') for car in recommendations)
+
+    # Con las etiquetas calculadas el modo compacto se mantiene
+    for car in graph.cars.values():
+        car['etiquetas'] = car_tags.compute_tags({**car, 'tipo': graph.links[car['id']].get('ES_TIPO')})
+    recommendation_loop = RecommendationLoop(lambda: AsyncCarRecommender(
+        URI, "", "", cache_size=0, driver=fake_neo4j.FakeAsyncDriver(graph), query_mode="compact"))
+    try:
+        assert recommendation_loop.recommender.query_mode == "compact"
+    finally:
+        recommendation_loop.close()
@@ -0,0 +1,57 @@
+"""
+Pruebas del relleno de etiquetas y atributos por lotes, de update_car y del modo compacto sin etiquetas
+"""
+
+import fake_neo4j
+from gestionador import Gestionador
+from shared import car_attributes, car_tags
+
+def test_batched_backfill_visits_every_car_once():
+    graph = fake_neo4j.FakeGraph.synthetic(1234, 4)
+    driver = fake_neo4j.FakeDriver(graph)
+    for car in graph.cars.values():
+        car.pop('etiquetas', None)
+
+    with driver.session() as session:
+        assert car_tags.assign_tags(session, batch_size=100) == 1234
+        assert car_attributes.assign_attributes(session, batch_size=100) == 1234
+        pages = list(car_attributes.iter_attribute_rows(session, batch_size=500))
+
+    assert [len(rows) for rows in pages] == [500, 500, 234]
+    assert len({row['id'] for rows in pages for row in rows}) == 1234
+    for car_id, car in graph.cars.items():
+        links = graph.links[car_id]
+        assert car['marca'] == links['ES_MARCA']
+        assert car['etiquetas'] == car_tags.compute_tags({**car, 'tipo': links.get('ES_TIPO')})
+
+def test_single_car_backfill_reads_only_that_car():
+    graph = fake_neo4j.FakeGraph.synthetic(50, 4)
+    with fake_neo4j.FakeDriver(graph).session() as session:
+        assert car_tags.assign_tags(session, 'car_7') == 1
+        assert car_attributes.assign_attributes(session, 'car_7') == 1
+        assert car_attributes.assign_attributes(session, 'no_existe') == 0
+
+def test_update_car_rejects_unknown_fields():
+    graph = fake_neo4j.FakeGraph.synthetic(20, 4)
+    gestionador = Gestionador(None, None, None, driver=fake_neo4j.FakeDriver(graph))
+    assert not gestionador.update_car('car_1', {'precio': 1, 'id = 0, a.x': 1})
+    assert graph.cars['car_1']['precio'] != 1
+    assert gestionador.update_car('car_1', {'precio': 1, 'tipo': 'SUV'})
+    assert graph.cars['car_1']['precio'] == 1 and graph.links['car_1']['ES_TIPO'] == 'SUV'
+
+def test_compact_mode_requires_the_tag_backfill():
+    from recommender import CarRecommender
+    graph = fake_neo4j.FakeGraph.synthetic(200, 4)
+    driver = fake_neo4j.FakeDriver(graph)
+    graph.cars['car_3'].pop('etiquetas')
+
+    # Sin etiquetas la consulta compacta no daría bonificación demográfica a ese auto
+    recommender = CarRecommender("fake://", "neo4j", "", cache_size=0, driver=driver, query_mode="compact")
+    assert recommender.query_mode == "standard"
+
+    with driver.session() as session:
+        assert car_tags.count_untagged(session) == 1
+        car_tags.assign_tags(session, 'car_3')
+        assert car_tags.count_untagged(session) == 0
+    recommender = CarRecommender("fake://", "neo4j", "", cache_size=0, driver=driver, query_mode="compact")
+    assert recommender.query_mode == "compact"
@@ -0,0 +1,65 @@
+"""
+Pruebas de los índices de bits del catálogo contra un filtrado directo de las filas
+"""
+
+import random
+
+import pytest
+
+from catalog_index import CatalogIndex
+
+BRANDS = ["Toyota", "Honda", "Ford", "BMW", None]
+TYPES = ["SUV", "Sedán", "Pickup", None]
+FUELS = ["Gasolina", "Diésel", "Eléctrico"]
+TRANSMISSIONS = ["Automática", "Manual"]
+
+def catalog(count, seed=0):
+    rng = random.Random(seed)
+    rows = [{'id': f"car_{number}", 'precio': rng.randrange(10000, 150000, 500), 'marca': rng.choice(BRANDS),
+             'tipo': rng.choice(TYPES), 'combustible': rng.choice(FUELS), 'transmision': rng.choice(TRANSMISSIONS)}
+            for number in range(count)]
+    return sorted(rows, key=lambda row: row['precio'])
+
+def random_preferences(rng):
+    low = rng.choice([0, 15000, 30000, 50000])
+    return {
+        'brands': rng.sample(BRANDS[:-1], rng.randint(0, 2)),
+        'types': rng.sample(TYPES[:-1], rng.randint(0, 2)),
+        'fuel': rng.choice([None] + FUELS),
+        'transmission': rng.choice([None] + TRANSMISSIONS),
+        'min_price': low,
+        'max_price': rng.choice([low + 20000, float('inf')])
+    }
+
+def matches(row, preferences):
+    return (preferences['min_price'] <= row['precio'] <= preferences['max_price']
+            and (not preferences['brands'] or row['marca'] in preferences['brands'])
+            and (not preferences['types'] or row['tipo'] in preferences['types'])
+            and (not preferences['fuel'] or row['combustible'] == preferences['fuel'])
+            and (not preferences['transmission'] or row['transmision'] == preferences['transmission']))
+
+@pytest.mark.parametrize("size", [0, 1, 7, 8, 9, 3000])
+def test_search_matches_direct_filter(size):
+    rows = catalog(size, seed=size)
+    index = CatalogIndex(rows)
+    rng = random.Random(1)
+    for _ in range(50):
+        preferences = random_preferences(rng)
+        expected = [row for row in rows if matches(row, preferences)]
+        assert index.count(preferences) == len(expected)
+        assert index.search(preferences, limit=None) == expected
+        assert index.search(preferences, limit=5) == expected[:5]
+
+def test_positions_of_sparse_and_dense_masks():
+    index = CatalogIndex(catalog(100))
+    assert index.positions(0) == []
+    assert index.positions(index.all_mask) == list(range(100))
+    sparse = (1 << 3) | (1 << 64) | (1 << 99)
+    assert index.positions(sparse) == [3, 64, 99]
+    assert index.positions(sparse, limit=2) == [3, 64]
+    assert index.positions(sparse, limit=0) == []
+
+def test_values_exclude_missing_attribute():
+    index = CatalogIndex(catalog(500))
+    assert None not in index.values('marca')
+    assert index.value_mask('marca', ['Inexistente']) == 0
@@ -0,0 +1,90 @@
+"""
+Pruebas de la versión del catálogo compartida entre procesos
+El Gestionador y el recomendador usan drivers distintos sobre el mismo grafo simulado,
+como dos procesos sobre la misma base de datos
+"""
+
+import time
+
+import pytest
+
+import fake_neo4j
+from recommender import CarRecommender
+from shared import catalog_version
+from shared.catalog_version import CatalogVersionWatcher, FULL_CHANGE
+from gestionador import Gestionador
+
+SEARCH = (["Toyota", "Honda"], None, None, [], None, None, None)
+
+@pytest.fixture
+def graph():
+    return fake_neo4j.FakeGraph.synthetic(1000, 5)
+
+def make_recommender(graph, interval):
+    return CarRecommender("fake://", "", "", driver=fake_neo4j.FakeDriver(graph), query_mode='compact',
+                          catalog_check_interval=interval)
+
+def test_watcher_first_read_is_baseline():
+    watcher = CatalogVersionWatcher(check_interval=0)
+    assert watcher.advance(None, 4, []) == []
+    assert watcher.version == 4
+
+def test_watcher_returns_changes_in_order():
+    watcher = CatalogVersionWatcher(check_interval=0)
+    watcher.advance(None, 1, [])
+    changes = [{'version': 2, 'action': 'update', 'car_id': 'a'}, {'version': 3, 'action': 'delete', 'car_id': 'b'}]
+    assert watcher.advance(1, 3, changes) == [('update', 'a'), ('delete', 'b')]
+    assert watcher.version == 3
+    # Una lectura vieja (otro hilo ya avanzó) no se aplica dos veces
+    assert watcher.advance(1, 3, changes) == []
+
+def test_watcher_full_change_on_gap_or_reset():
+    watcher = CatalogVersionWatcher(check_interval=0)
+    watcher.advance(None, 1, [])
+    assert watcher.advance(1, 4, [{'version': 4, 'action': 'update', 'car_id': 'a'}]) == [FULL_CHANGE]
+    assert watcher.advance(4, 2, []) == [FULL_CHANGE]
+
+def test_watcher_rate_limits_checks():
+    watcher = CatalogVersionWatcher(check_interval=60)
+    assert watcher.due()
+    assert not watcher.due()
+
+def test_gestionador_records_changes_in_write_transaction(graph):
+    gestionador = Gestionador(None, None, None, driver=fake_neo4j.FakeDriver(graph))
+    car_id = next(iter(graph.cars))
+    assert gestionador.update_car(car_id, {'precio': 1234})
+    assert gestionador.delete_car(car_id)
+    assert not gestionador.delete_car(car_id)
+
+    with fake_neo4j.FakeDriver(graph).session() as session:
+        version, changes = session.execute_read(catalog_version.read_state, 0)
+    assert version == 2
+    assert [(change['action'], change['car_id']) for change in changes] == [('update', car_id), ('delete', car_id)]
+
+def test_change_in_other_process_invalidates_cache(graph):
+    recommender = make_recommender(graph, 0.01)
+    first = recommender.get_recommendations(*SEARCH)
+    assert recommender.get_recommendations(*SEARCH) == first
+
+    gestionador = Gestionador(None, None, None, driver=fake_neo4j.FakeDriver(graph))
+    removed = first[0]['id']
+    assert gestionador.delete_car(removed)
+
+    time.sleep(0.02)
+    second = recommender.get_recommendations(*SEARCH)
+    assert removed not in [car['id'] for car in second]
+    assert recommender.catalog_watcher.version == 1
+    recommender.close()
+
+def test_cache_served_until_next_check(graph):
+    recommender = make_recommender(graph, 60)
+    first = recommender.get_recommendations(*SEARCH)
+
+    gestionador = Gestionador(None, None, None, driver=fake_neo4j.FakeDriver(graph))
+    assert gestionador.delete_car(first[0]['id'])
+
+    # Dentro del intervalo la caché sigue respondiendo; el cambio se ve en la próxima lectura
+    assert recommender.get_recommendations(*SEARCH) == first
+    recommender.catalog_watcher._next_check = 0
+    assert first[0]['id'] not in [car['id'] for car in recommender.get_recommendations(*SEARCH)]
+    recommender.close()
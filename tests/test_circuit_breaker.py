@@ -0,0 +1,134 @@
+"""
+Pruebas del circuit breaker y de la caché vencida con Neo4j caído
+"""
+
+import time
+
+import pytest
+
+import circuit_breaker
+import fake_neo4j
+from circuit_breaker import CircuitBreaker, DatabaseUnavailableError
+from recommender import CarRecommender
+
+SEARCH = (["Toyota", "Ford"], "15000-30000", None, [], None, "femenino", "26-35")
+
+def wait_for_state(breaker, state, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while breaker.state != state and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return breaker.state
+
+def test_consecutive_failures_open_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure(RuntimeError("caído"))
+    breaker.record_failure(RuntimeError("caído"))
+    # Un éxito reinicia la cuenta de fallos seguidos
+    breaker.record_success(5)
+    breaker.record_failure(RuntimeError("caído"))
+    breaker.record_failure(RuntimeError("caído"))
+    assert breaker.state == circuit_breaker.CLOSED
+
+    breaker.record_failure(RuntimeError("caído"))
+    assert breaker.state == circuit_breaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.stats()['rejected'] == 1
+    assert breaker.stats()['times_opened'] == 1
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker(failure_threshold=2, latency_threshold_ms=100, reset_timeout=60)
+    breaker.record_success(150)
+    breaker.record_success(99)
+    breaker.record_success(100)
+    assert breaker.state == circuit_breaker.CLOSED
+    breaker.record_success(2000)
+    assert breaker.state == circuit_breaker.OPEN
+    assert breaker.slow_calls == 3
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure(RuntimeError("caído"))
+    assert not breaker.allow_request()
+
+    # Sin sonda, la primera petición tras reset_timeout hace de prueba
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert breaker.state == circuit_breaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+    # La prueba falla: vuelve a abrirse con un solo fallo
+    breaker.record_failure(RuntimeError("sigue caído"))
+    assert breaker.state == circuit_breaker.OPEN
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success(5)
+    assert breaker.state == circuit_breaker.CLOSED
+    assert breaker.allow_request() and breaker.allow_request()
+
+def test_probe_half_opens_when_the_database_answers():
+    database_up = False
+
+    def probe():
+        if not database_up:
+            raise ConnectionError("sin respuesta")
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.02, probe=probe)
+    try:
+        breaker.record_failure(RuntimeError("caído"))
+        time.sleep(0.1)
+        # Con sonda no se deja pasar ninguna petición mientras la sonda falla
+        assert breaker.state == circuit_breaker.OPEN
+        assert not breaker.allow_request()
+
+        database_up = True
+        assert wait_for_state(breaker, circuit_breaker.HALF_OPEN) == circuit_breaker.HALF_OPEN
+        assert breaker.allow_request()
+        breaker.record_success(5)
+        assert breaker.state == circuit_breaker.CLOSED
+    finally:
+        breaker.close()
+
+def test_disabled_breaker_never_opens():
+    breaker = CircuitBreaker(failure_threshold=0)
+    for _ in range(10):
+        breaker.record_failure(RuntimeError("caído"))
+    assert breaker.state == circuit_breaker.CLOSED
+    assert breaker.allow_request()
+
+def test_recommender_serves_the_last_good_result_while_open(monkeypatch):
+    driver = fake_neo4j.FakeDriver(fake_neo4j.FakeGraph.synthetic(300, 5))
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.02)
+    recommender = CarRecommender("fake://", "neo4j", "", driver=driver, cache_ttl=0.01, breaker=breaker)
+    try:
+        fresh = recommender.get_recommendations(*SEARCH)
+        assert fresh
+
+        attempts = []
+
+        def unavailable(query, parameters):
+            if "RETURN 1" not in query:  # Las sondas (ping) siguen intentándolo
+                attempts.append(query)
+            raise fake_neo4j.FakeQueryError("Neo4j caído")
+
+        monkeypatch.setattr(driver.engine, "run", unavailable)
+        time.sleep(0.02)
+
+        # La entrada venció: la consulta falla, abre el circuito y responde la caché vencida
+        assert recommender.get_recommendations(*SEARCH) == fresh
+        assert breaker.state == circuit_breaker.OPEN
+        # Con el circuito abierto ni siquiera se intenta la consulta
+        tried = len(attempts)
+        assert recommender.get_recommendations(*SEARCH) == fresh
+        assert len(attempts) == tried
+
+        # Sin resultado previo para esas preferencias el error llega al llamador
+        with pytest.raises(DatabaseUnavailableError):
+            recommender.get_recommendations(["BMW"], "100000+", None, [], None)
+
+        # Neo4j vuelve: la sonda (ping) semiabre el circuito y la prueba lo cierra
+        monkeypatch.undo()
+        assert wait_for_state(breaker, circuit_breaker.HALF_OPEN) == circuit_breaker.HALF_OPEN
+        assert recommender.get_recommendations(*SEARCH) == fresh
+        assert breaker.state == circuit_breaker.CLOSED
+    finally:
+        recommender.close()
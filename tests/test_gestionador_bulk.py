@@ -0,0 +1,74 @@
+"""
+Pruebas de la carga masiva del Gestionador: qué errores parten el lote y cuáles lo detienen
+"""
+
+from neo4j.exceptions import ConstraintError, ServiceUnavailable
+
+import fake_neo4j
+from gestionador import Gestionador
+
+def cars(count, start=0):
+    return [{'id': f"bulk_{number}", 'modelo': 'Modelo', 'año': 2024, 'precio': 20000 + number,
+             'caracteristicas': [], 'marca': 'Toyota'} for number in range(start, start + count)]
+
+class FailingSession:
+    """Sesión que falla en execute_write según las filas del lote"""
+
+    def __init__(self, session, fail):
+        self._session = session
+        self._fail = fail
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return self._session.__exit__(*exc)
+
+    def execute_write(self, work, *args):
+        error = self._fail(args[0] if args else None)
+        if error is not None:
+            raise error
+        return self._session.execute_write(work, *args)
+
+class FailingDriver(fake_neo4j.FakeDriver):
+    def __init__(self, graph, fail):
+        super().__init__(graph)
+        self.fail = fail
+        self.write_attempts = 0
+
+    def session(self, **config):
+        def fail(rows):
+            self.write_attempts += 1
+            return self.fail(rows)
+        return FailingSession(super().session(**config).__enter__(), fail)
+
+def test_constraint_error_is_isolated_to_its_row():
+    graph = fake_neo4j.FakeGraph()
+    driver = FailingDriver(graph, lambda rows: ConstraintError("id repetido")
+                           if rows and any(row['id'] == 'bulk_3' for row in rows) else None)
+    summary = Gestionador(None, None, None, driver=driver).create_cars_bulk(cars(5), batch_size=5)
+    assert summary['created'] == 4 and summary['aborted'] is None
+    assert [failure['id'] for failure in summary['failed']] == ['bulk_3']
+
+def test_connection_error_stops_the_load_without_splitting():
+    graph = fake_neo4j.FakeGraph()
+    driver = FailingDriver(graph, lambda rows: ServiceUnavailable("sin conexión")
+                           if rows and rows[0]['id'] == 'bulk_5' else None)
+    gestionador = Gestionador(None, None, None, driver=driver)
+    attempts = driver.write_attempts
+    summary = gestionador.create_cars_bulk(cars(15), batch_size=5)
+    assert summary['created'] == 5 and 'sin conexión' in summary['aborted']
+    assert len(summary['failed']) == 5
+    # Primer lote escrito, segundo intentado una vez, el tercero ni se envía
+    assert driver.write_attempts - attempts == 2
+
+def test_resending_a_batch_does_not_duplicate_cars():
+    graph = fake_neo4j.FakeGraph()
+    gestionador = Gestionador(None, None, None, driver=fake_neo4j.FakeDriver(graph))
+    gestionador.create_cars_bulk(cars(5))
+    summary = gestionador.create_cars_bulk(cars(5, start=3))
+    assert summary['created'] == 5
+    assert gestionador.get_cars_count() == 8
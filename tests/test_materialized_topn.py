@@ -0,0 +1,129 @@
+"""
+Pruebas de la tabla top-N materializada: fusión de celdas y actualización incremental
+"""
+
+import random
+
+import pytest
+
+import fake_neo4j
+import materialized_topn
+from gestionador import Gestionador
+from materialized_topn import MaterializedTopN
+from recommender import CarRecommender
+
+PROFILES = [(None, None), ('femenino', '26-35'), ('masculino', '18-25'), ('femenino', '56+')]
+
+@pytest.fixture
+def graph():
+    return fake_neo4j.FakeGraph.synthetic(2000, 11)
+
+@pytest.fixture
+def table_path(graph, tmp_path):
+    path = str(tmp_path / "topn.bin")
+    materialized_topn.rebuild(fake_neo4j.FakeDriver(graph), path, top_n=30)
+    return path
+
+def ranking(recommendations):
+    return [(round(car['similarity_score'], 2), car['price']) for car in recommendations]
+
+def random_search(recommender, rng):
+    meta = recommender.topn_table.meta
+    preferences = recommender.normalize_preferences(
+        rng.sample(meta['brands'], rng.randint(0, 3)),
+        rng.choice([None] + [label for label, _, _ in meta['budgets']]),
+        rng.choice([None] + meta['fuels']),
+        rng.sample(meta['types'], rng.randint(0, 2)),
+        rng.choice([None] + meta['transmissions'])
+    )
+    return (preferences,) + rng.choice(PROFILES)
+
+def cells_of(path):
+    table = MaterializedTopN(path)
+    try:
+        return table.export()[0]
+    finally:
+        table.close()
+
+def test_merged_cells_match_compact_query(graph, table_path):
+    recommender = CarRecommender("fake://", "", "", cache_size=0, driver=fake_neo4j.FakeDriver(graph),
+                                 query_mode='compact', topn_table=table_path)
+    rng = random.Random(2)
+    answered = 0
+    for _ in range(60):
+        preferences, gender, age_range = random_search(recommender, rng)
+        from_table = recommender.lookup_topn_table(preferences, gender, age_range)
+        if from_table is None:
+            continue
+        answered += 1
+        assert ranking(from_table) == ranking(recommender.fetch_ranked_recommendations(preferences, gender, age_range))
+    assert answered > 40
+    recommender.close()
+
+def test_truncated_cell_falls_back_to_query(graph, tmp_path):
+    path = str(tmp_path / "tiny.bin")
+    materialized_topn.rebuild(fake_neo4j.FakeDriver(graph), path, top_n=1)
+    table = MaterializedTopN(path)
+    preferences = {'brands': ['Toyota'], 'types': [], 'fuel': None, 'transmission': None,
+                   'min_price': 0, 'max_price': float('inf')}
+    assert table.lookup(preferences, limit=10) is None
+    assert table.misses == 1
+    table.close()
+
+def test_update_car_matches_rebuild(graph, table_path, tmp_path):
+    driver = fake_neo4j.FakeDriver(graph)
+    car_id = next(iter(graph.cars))
+    assert Gestionador(None, None, None, driver=driver).update_car(car_id, {'precio': 12500})
+
+    result = materialized_topn.update_car(driver, table_path, car_id)
+    assert result['brands']
+    fresh = str(tmp_path / "fresh.bin")
+    materialized_topn.rebuild(driver, fresh, top_n=30)
+    assert cells_of(table_path) == cells_of(fresh)
+
+def test_sync_applies_change_log(graph, table_path):
+    driver = fake_neo4j.FakeDriver(graph)
+    gestionador = Gestionador(None, None, None, driver=driver)
+    car_ids = list(graph.cars)[:2]
+    assert gestionador.update_car(car_ids[0], {'precio': 13000})
+    assert gestionador.delete_car(car_ids[1])
+
+    result = materialized_topn.sync(driver, table_path)
+    assert result['brands'] and result['catalog_version'] == 2
+    assert materialized_topn.sync(driver, table_path) == {'up_to_date': True, 'catalog_version': 2}
+
+    # Una carga masiva no dice qué autos cambiaron: la tabla se reconstruye
+    gestionador.create_cars_bulk([{'id': 'nuevo_1', 'modelo': 'X', 'año': 2024, 'precio': 20000,
+                                   'caracteristicas': [], 'marca': 'Toyota'}])
+    result = materialized_topn.sync(driver, table_path)
+    assert 'brands' not in result and result['catalog_version'] == 3
+
+def test_lookup_waits_for_known_version(graph, table_path):
+    table = MaterializedTopN(table_path)
+    preferences = {'brands': ['Toyota'], 'types': [], 'fuel': None, 'transmission': None,
+                   'min_price': 0, 'max_price': float('inf')}
+    assert table.catalog_version == 0
+    assert table.lookup(preferences, min_version=0) is not None
+    assert table.lookup(preferences, min_version=1) is None
+    table.close()
+
+def test_recommender_catches_up_with_changes_from_other_process(graph, table_path):
+    gestionador = Gestionador(None, None, None, driver=fake_neo4j.FakeDriver(graph))
+    car_ids = list(graph.cars)
+    # Cambio anterior al arranque: la tabla se pone al día al abrirla
+    assert gestionador.update_car(car_ids[0], {'precio': 12500})
+    recommender = CarRecommender("fake://", "", "", cache_size=0, driver=fake_neo4j.FakeDriver(graph),
+                                 query_mode='compact', topn_table=table_path, catalog_check_interval=0.001)
+
+    def settle():
+        # El hilo de recarga es único: esperar a una tarea vacía es esperar a las anteriores
+        recommender.catalog_refresher.submit(lambda: None).result()
+
+    settle()
+    assert recommender.topn_table.catalog_version == 1
+
+    assert gestionador.delete_car(car_ids[1])
+    recommender.check_catalog_version()
+    settle()
+    assert recommender.topn_table.catalog_version == recommender.catalog_watcher.version == 2
+    recommender.close()
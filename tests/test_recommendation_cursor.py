@@ -0,0 +1,73 @@
+"""Pruebas de los cursores de paginación (app/recommendation_cursor.py)"""
+
+import random
+
+import pytest
+
+import recommendation_cursor
+from recommendation_cursor import InvalidCursorError
+
+SEARCH = recommendation_cursor.fingerprint(["Toyota", "Ford"], "15000-30000", "gasolina", ["suv"], None, None, None)
+
+def make_cars(count, seed=0):
+    rng = random.Random(seed)
+    cars = []
+    for number in range(count):
+        bonus = rng.choice([0, 0, 8, 15])
+        cars.append({
+            "id": f"car_{number}",
+            "price": float(rng.choice([20000, 25000, 30000])),
+            "similarity_score": float(rng.choice([50, 60, 70])) + bonus,
+            "demographic_bonus": bonus
+        })
+    return cars
+
+def test_cursor_roundtrip():
+    key = (85.37, 8, 24999.5, "car_7")
+    cursor = recommendation_cursor.encode_cursor(key, SEARCH)
+    assert "=" not in cursor
+    assert recommendation_cursor.decode_cursor(cursor, SEARCH) == key
+
+@pytest.mark.parametrize("cursor", ["", "no-es-base64!", "W10", "WzEsMiwzXQ"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        recommendation_cursor.decode_cursor(cursor, SEARCH)
+
+def test_cursor_from_another_search_is_rejected():
+    other = recommendation_cursor.fingerprint(["BMW"], None, None, [], None, None, None)
+    cursor = recommendation_cursor.encode_cursor((70.0, 0, 20000.0, "car_1"), other)
+    with pytest.raises(InvalidCursorError):
+        recommendation_cursor.decode_cursor(cursor, SEARCH)
+
+def test_fingerprint_ignores_list_order():
+    assert recommendation_cursor.fingerprint(["a", "b"], "x") == recommendation_cursor.fingerprint(["b", "a"], "x")
+    assert recommendation_cursor.fingerprint(["a"], "x") != recommendation_cursor.fingerprint(["a"], "y")
+
+def test_sort_key_matches_unpaged_order():
+    # Misma puntuación: más puntuación base (menos bonificación) primero, luego el más barato
+    cars = [
+        {"id": "b", "price": 20000.0, "similarity_score": 70.0, "demographic_bonus": 8},
+        {"id": "c", "price": 25000.0, "similarity_score": 70.0},
+        {"id": "a", "price": 20000.0, "similarity_score": 70.0},
+        {"id": "d", "price": 10000.0, "similarity_score": 80.0}
+    ]
+    assert [car["id"] for car in sorted(cars, key=recommendation_cursor.sort_key)] == ["d", "a", "c", "b"]
+
+@pytest.mark.parametrize("page_size", [1, 3, 7, 50])
+def test_paginate_walks_the_whole_list_once(page_size):
+    cars = make_cars(40)
+    expected = [car["id"] for car in sorted(cars, key=recommendation_cursor.sort_key)]
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = recommendation_cursor.paginate(cars, cursor, page_size, SEARCH)
+        assert len(page) <= page_size
+        seen += [car["id"] for car in page]
+        if cursor is None:
+            break
+
+    assert seen == expected
+
+def test_paginate_empty_list():
+    assert recommendation_cursor.paginate([], None, 10, SEARCH) == ([], None)
@@ -0,0 +1,68 @@
+"""Paginación en el motor (CarRecommender.get_recommendation_page) con el driver simulado"""
+
+import pytest
+
+import fake_neo4j
+from recommender import CarRecommender, RESULT_LIMIT
+
+SEARCHES = [
+    (["Toyota", "Ford"], "15000-30000", None, [], None, None, None),
+    (["Toyota", "BMW", "Honda"], None, "gasolina", ["suv", "sedan"], None, "femenino", "26-35"),
+    (["Audi", "Ford", "Honda"], "30000-50000", None, [], None, "masculino", "56+")
+]
+
+@pytest.fixture(scope="module")
+def driver():
+    driver = fake_neo4j.driver_from_uri("fake://synthetic?cars=3000&seed=3")
+    yield driver
+    driver.close()
+
+def walk_pages(recommender, search, page_size):
+    ids = []
+    cursor = None
+    while True:
+        page, cursor = recommender.get_recommendation_page(*search, cursor=cursor, page_size=page_size)
+        ids += [car["id"] for car in page]
+        if cursor is None:
+            return ids
+
+@pytest.mark.parametrize("search", SEARCHES)
+@pytest.mark.parametrize("use_snapshot", [False, True])
+def test_pages_follow_the_unpaged_order(driver, search, use_snapshot):
+    recommender = CarRecommender("fake://", "neo4j", "", cache_size=0, driver=driver,
+                                 query_mode="compact", use_snapshot=use_snapshot)
+    ids = walk_pages(recommender, search, page_size=3)
+
+    assert len(ids) == len(set(ids))
+    # Todos los autos que cumplen los filtros, no solo los primeros candidatos
+    assert len(ids) > RESULT_LIMIT
+
+    unpaged = [car["id"] for car in recommender.get_recommendations(*search)]
+    if use_snapshot:
+        # Con snapshot la lista sin paginar puntúa solo los candidatos más baratos: mismo orden relativo
+        assert unpaged == [car_id for car_id in ids if car_id in set(unpaged)]
+    else:
+        assert unpaged == ids[:len(unpaged)]
+
+@pytest.mark.parametrize("search", SEARCHES)
+@pytest.mark.parametrize("query_mode", ["standard", "denormalized", "compact"])
+def test_pages_without_precomputed_tags_match_the_unpaged_list(search, query_mode):
+    graph = fake_neo4j.FakeGraph.synthetic(400, 7)
+    for car in graph.cars.values():
+        car.pop("etiquetas", None)
+    # En modo compacto el recomendador rechaza ese modo y pagina como standard
+    recommender = CarRecommender("fake://", "neo4j", "", cache_size=0, driver=fake_neo4j.FakeDriver(graph),
+                                 query_mode=query_mode)
+
+    pages = []
+    cursor = None
+    while True:
+        page, cursor = recommender.get_recommendation_page(*search, cursor=cursor, page_size=3)
+        pages += page
+        if cursor is None:
+            break
+
+    # Mismos autos, puntuaciones y bonificaciones demográficas que la lista sin paginar
+    unpaged = recommender.get_recommendations(*search)
+    assert unpaged
+    assert pages == unpaged
@@ -0,0 +1,52 @@
+"""
+Pruebas del PROFILE de consultas lentas: una vez por forma de consulta y nunca con el circuito abierto
+"""
+
+import json
+
+import fake_neo4j
+from shared.slow_query_log import SlowQueryLog
+
+QUERY = "MATCH (a:Auto) WHERE a.precio <= $max_price RETURN a.id as id"
+
+def read_entries(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+def test_profile_cooldown_ignores_parameter_values(tmp_path):
+    driver = fake_neo4j.FakeDriver(fake_neo4j.FakeGraph.synthetic(50, 1))
+    log = SlowQueryLog(threshold_ms=1, path=tmp_path / "slow.jsonl", profile_cooldown=300)
+    try:
+        for max_price in (20000, 30000, 40000):
+            assert log.observe(driver, QUERY, {"max_price": max_price}, 50, source="test")
+        # Mismo texto con otros espacios: misma forma
+        assert log.observe(driver, QUERY.replace(" ", "  "), {"max_price": 50000}, 50, source="test")
+        log.flush()
+    finally:
+        log.close()
+
+    entries = read_entries(tmp_path / "slow.jsonl")
+    assert len(entries) == 4
+    assert sum("plan" in entry for entry in entries) == 1
+    assert driver.queries_run == 1
+    assert log.profiles_written == 1
+
+def test_no_profile_while_the_circuit_is_open(tmp_path):
+    driver = fake_neo4j.FakeDriver(fake_neo4j.FakeGraph.synthetic(50, 1))
+    log = SlowQueryLog(threshold_ms=1, path=tmp_path / "slow.jsonl")
+    circuit_closed = False
+    try:
+        assert log.observe(driver, QUERY, {"max_price": 20000}, 50, source="test",
+                           profile_allowed=lambda: circuit_closed)
+        log.flush()
+        assert driver.queries_run == 0
+
+        # Al cerrarse el circuito la misma forma se puede perfilar: no gastó su intervalo
+        circuit_closed = True
+        assert log.observe(driver, QUERY, {"max_price": 20000}, 50, source="test",
+                           profile_allowed=lambda: circuit_closed)
+        log.flush()
+    finally:
+        log.close()
+
+    assert driver.queries_run == 1
+    assert [("plan" in entry) for entry in read_entries(tmp_path / "slow.jsonl")] == [False, True]
@@ -0,0 +1,94 @@
+"""
+Pruebas del almacén de usuarios: favoritos compartidos entre procesos
+"""
+
+import json
+import multiprocessing
+import sqlite3
+import threading
+
+import pytest
+
+from user_store import FAVORITES, MemoryBackend, SQLiteBackend, UserStore
+
+EMAIL = 'ana@example.com'
+
+def car(number):
+    return {'id': f"car_{number}", 'modelo': f"Modelo {number}", 'precio': 20000 + number}
+
+def add_range(path, start, count):
+    """Proceso que agrega sus propios autos, uno por petición, con su propia conexión"""
+    store = UserStore(SQLiteBackend(path), sync_interval=0)
+    for number in range(start, start + count):
+        store.add_favorites(EMAIL, [car(number)])
+        store.get_favorites(EMAIL)  # Caché caliente del proceso entre escrituras
+    store.close()
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    backend = MemoryBackend() if request.param == 'memory' else SQLiteBackend(tmp_path / "users.db")
+    store = UserStore(backend, sync_interval=0)
+    yield store
+    store.close()
+
+def test_add_remove_and_order(store):
+    assert store.add_favorites(EMAIL, [car(2), car(1), car(2)]) == ['car_2', 'car_1']
+    assert store.add_favorites(EMAIL, [car(1)]) == []
+    assert [favorite['id'] for favorite in store.get_favorites(EMAIL)] == ['car_2', 'car_1']
+    assert store.has_favorite(EMAIL, 'car_1') and store.favorite_count(EMAIL) == 2
+
+    assert store.remove_favorites(EMAIL, ['car_2', 'car_9']) == 1
+    assert store.clear_favorites(EMAIL) == 1
+    assert store.get_favorites(EMAIL) == [] and store.count_favorites() == 0
+
+def test_concurrent_processes_do_not_lose_favorites(tmp_path):
+    path = tmp_path / "users.db"
+    SQLiteBackend(path).close()
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=add_range, args=(path, start * 25, 25)) for start in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    store = UserStore(SQLiteBackend(path))
+    assert store.favorite_count(EMAIL) == 100
+    store.close()
+
+def test_concurrent_threads_do_not_lose_favorites(store):
+    threads = [threading.Thread(target=lambda start=start: [store.add_favorites(EMAIL, [car(number)])
+                                                          for number in range(start, start + 50)])
+               for start in range(0, 200, 50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.favorite_count(EMAIL) == 200
+
+def test_writes_from_other_process_are_seen(tmp_path):
+    path = tmp_path / "users.db"
+    first = UserStore(SQLiteBackend(path), sync_interval=0)
+    second = UserStore(SQLiteBackend(path), sync_interval=0)
+    first.add_favorites(EMAIL, [car(1)])
+    assert second.get_favorites(EMAIL) == [car(1)]
+
+    # La caché de second no decide la escritura: la base ya tiene el auto
+    second.remove_favorites(EMAIL, ['car_1'])
+    assert first.add_favorites(EMAIL, [car(1)]) == ['car_1']
+    assert second.favorite_count(EMAIL) == 1
+    first.close()
+    second.close()
+
+def test_migrates_favorites_stored_as_one_value(tmp_path):
+    path = tmp_path / "users.db"
+    connection = sqlite3.connect(str(path))
+    connection.execute(SQLiteBackend.SCHEMA)
+    connection.execute("INSERT INTO kv VALUES (?, ?, ?, 0)",
+                       (FAVORITES, EMAIL, json.dumps({'ids': ['car_2', 'car_1'], 'cars': {'car_1': car(1), 'car_2': car(2)}})))
+    connection.commit()
+    connection.close()
+
+    store = UserStore(SQLiteBackend(path))
+    assert store.get_favorites(EMAIL) == [car(2), car(1)]
+    store.close()